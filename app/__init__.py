@@ -4,6 +4,8 @@ Crea y configura la instancia de Flask con todos sus componentes
 """
 
 import os
+import threading
+import time
 from flask import Flask
 from flask_talisman import Talisman
 
@@ -11,10 +13,6 @@ from flask_talisman import Talisman
 from app.extensions import cors, csrf, limiter, cache
 from app.config import config
 
-# Importar registro de fuentes (PDF)
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-
 
 def create_app(config_name=None):
     """
@@ -31,6 +29,8 @@ def create_app(config_name=None):
     if config_name is None:
         config_name = 'production' if os.getenv('FLASK_ENV') == 'production' else 'development'
     
+    cronometro = _Cronometro()
+    
     # Crear instancia de Flask
     app = Flask(__name__, 
                 template_folder='../templates',  # Templates en raíz del proyecto
@@ -38,31 +38,102 @@ def create_app(config_name=None):
     
     # Cargar configuración
     app.config.from_object(config[config_name])
+    diferido = app.config['ARRANQUE_DIFERIDO']
+    app.extensions['arranque'] = cronometro.tiempos
+    cronometro.marcar('config')
+    
+    # Instrumentación (antes que cualquier import de prometheus_client)
+    from app.utils.metricas import init_metricas
+    init_metricas(app)
     
-    # Registra fuentes para PDF (ReportLab)
-    _register_pdf_fonts(app)
+    # Registra fuentes para PDF (ReportLab); en modo diferido, en el primer PDF
+    if not diferido:
+        from app.utils.fuentes import registrar_fuentes_pdf
+        registrar_fuentes_pdf(app)
+        cronometro.marcar('fuentes')
     
     # Inicializa extensiones
     cors.init_app(app)
     csrf.init_app(app)
     limiter.init_app(app)
     cache.init_app(app)
+    cronometro.marcar('extensiones')
+    
+    # Pool acotado para Argon2id (login / registro)
+    from app.utils.hash_pool import init_hash_pool
+    init_hash_pool(app)
+    
+    # Cola de migración diferida PBKDF2 -> Argon2id
+    from app.utils.rehash import cola_rehash
+    cola_rehash.init_app(app)
+    
+    # Motor de comprobantes PDF (el pool de procesos se crea en el primer uso)
+    from app.utils.comprobantes import motor_comprobantes
+    motor_comprobantes.init_app(app)
+    
+    # Registro de sesiones revocadas / usuarios y agencias activos
+    from app.utils.sesiones import registro_sesiones
+    registro_sesiones.init_app(app)
+    
+    # Eventos de check-in (el LISTEN se abre con el primer cliente SSE)
+    from app.utils.eventos import bus_eventos
+    bus_eventos.init_app(app)
+    
+    # Búsqueda de cupones (detecta pg_trgm en la primera búsqueda)
+    from app.utils.busqueda import buscador_cupones
+    buscador_cupones.init_app(app)
     
     # Inicializa Connection Pool
-    from app.utils.db import init_pool, close_pool
+    # (tamaño por worker según DB_POOL_* y el presupuesto DB_MAX_CONEXIONES;
+    # réplica de lectura opcional según DATABASE_REPLICA_URL y DB_REPLICA_*)
+    from app.utils.db import init_pool, init_lectura_propia, PoolAgotado
+    init_pool(config=app.config)
+    if app.config['DATABASE_REPLICA_URL']:
+        init_lectura_propia(app)
     
-    # Crear pool con 3-12 conexiones
-    init_pool(minconn=5, maxconn=50)
+    @app.errorhandler(PoolAgotado)
+    def _pool_agotado(error):
+        # Back-pressure: sin conexión disponible se responde 503 en lugar de encolar
+        app.logger.warning(f"Pool de conexiones agotado: {error}")
+        return 'Servicio saturado, intenta de nuevo en unos segundos', 503, {'Retry-After': '2'}
+    cronometro.marcar('servicios')
     
     # Configurar Talisman (seguridad HTTPS)
     _configure_talisman(app, config_name)
     
-    # Ejecutar migraciones automáticas en producción
-    if config_name == 'production':
+    # Estáticos versionados/precomprimidos (flask estaticos compilar) y gzip de JSON
+    from app.utils.estaticos import estaticos
+    from app.utils.condicional import init_compresion
+    estaticos.init_app(app)
+    init_compresion(app)
+    
+    # Migraciones al arrancar sólo si se pide explícitamente; lo normal es
+    # ejecutarlas una vez como paso previo al deploy (flask db migrar)
+    if config_name == 'production' and app.config['MIGRAR_AL_ARRANCAR']:
         _run_auto_migration(app)
+        cronometro.marcar('migraciones')
     
-    # Registrar blueprints
-    _register_blueprints(app)
+    # Registrar blueprints (en modo diferido, al recibir la primera petición)
+    if diferido:
+        app.wsgi_app = _BlueprintsDiferidos(app, app.wsgi_app)
+    else:
+        _register_blueprints(app)
+        cronometro.marcar('blueprints')
+    
+    # Creación automática de particiones futuras de cupones (opcional)
+    if app.config['CUPONES_PARTICIONES_SCHEDULER']:
+        from app.utils.particiones import iniciar_scheduler_particiones
+        iniciar_scheduler_particiones(app)
+    
+    # Consolidación periódica del resumen diario (desde la primera petición)
+    if app.config['RESUMEN_DIARIO_SCHEDULER']:
+        from app.utils.resumen_diario import iniciar_scheduler_resumen_diario
+        iniciar_scheduler_resumen_diario(app)
+    
+    # Registrar comandos CLI
+    from app.cli import register_cli
+    register_cli(app)
+    cronometro.marcar('cli')
     
     # Mensajes de debug
     if app.config['DEBUG']:
@@ -73,30 +144,57 @@ def create_app(config_name=None):
     return app
 
 
-def _register_pdf_fonts(app):
-    """Registra fuentes TrueType para generación de PDFs"""
-    try:
-        font_paths = {
-            'Roboto-Regular': 'fonts/Roboto-Regular.ttf',
-            'Roboto-Bold': 'fonts/Roboto-Bold.ttf'
-        }
-        
-        for font_name, font_path in font_paths.items():
-            try:
-                # Intentar ruta relativa
-                pdfmetrics.registerFont(TTFont(font_name, font_path))
-            except:
-                try:
-                    # Intentar ruta absoluta
-                    absolute_path = os.path.join(os.path.dirname(app.root_path), font_path)
-                    pdfmetrics.registerFont(TTFont(font_name, absolute_path))
-                except Exception as font_error:
-                    app.logger.warning(f"Error al registrar {font_name}: {font_error}")
-                    continue
-        
-        app.logger.info("✓ Fuentes PDF registradas correctamente")
-    except Exception as e:
-        app.logger.error(f"Error al registrar fuentes PDF: {e}")
+class _Cronometro:
+    """Acumula la duración de cada fase del arranque (segundos)"""
+    
+    def __init__(self):
+        self.tiempos = {}
+        self._ultimo = time.perf_counter()
+    
+    def marcar(self, fase):
+        ahora = time.perf_counter()
+        self.tiempos[fase] = self.tiempos.get(fase, 0.0) + ahora - self._ultimo
+        self._ultimo = ahora
+
+
+class _BlueprintsDiferidos:
+    """
+    Middleware WSGI que importa y registra los blueprints en la primera petición.
+    
+    Flask no admite registrar blueprints después de atender una petición;
+    el registro ocurre aquí, antes de entrar en app.wsgi_app.
+    
+    Todos los imports ocurren antes del primer registro. Si el registro
+    falla a mitad, algunos blueprints ya quedaron en la app y reintentarlo
+    sólo daría errores de registro duplicado: el error original se conserva
+    y se vuelve a lanzar en cada petición (el worker debe reiniciarse).
+    """
+    
+    def __init__(self, app, wsgi_app):
+        self.app = app
+        self.wsgi_app = wsgi_app
+        self._lock = threading.Lock()
+        self._listo = False
+        self._error = None
+    
+    def __call__(self, environ, start_response):
+        if not self._listo:
+            with self._lock:
+                if self._error is not None:
+                    raise self._error
+                if not self._listo:
+                    inicio = time.perf_counter()
+                    registrados = len(self.app.blueprints)
+                    try:
+                        _register_blueprints(self.app)
+                    except Exception as e:
+                        # Si falló al importar no se registró nada y se puede reintentar
+                        if len(self.app.blueprints) != registrados:
+                            self._error = e
+                        raise
+                    self.app.extensions['arranque']['blueprints'] = time.perf_counter() - inicio
+                    self._listo = True
+        return self.wsgi_app(environ, start_response)
 
 
 def _configure_talisman(app, config_name):
@@ -123,6 +221,13 @@ def _run_auto_migration(app):
     except Exception as e:
         app.logger.error(f"Error en migración automática: {e}")
         # Continuar de todas formas
+    
+    try:
+        from app.utils.migraciones import aplicar_migraciones
+        aplicadas = aplicar_migraciones(app.config['DATABASE_URL'])
+        app.logger.info(f"✓ Migraciones versionadas aplicadas: {len(aplicadas)}")
+    except Exception as e:
+        app.logger.error(f"Error en migraciones versionadas: {e}")
 
 
 def _register_blueprints(app):
@@ -137,8 +242,22 @@ def _register_blueprints(app):
     from app.routes.cupones import cupones_bp
     from app.routes.agencias import agencias_bp
     from app.routes.reportes import reportes_bp
+    from app.routes.exportaciones import exportaciones_bp
+    from app.routes.comprobantes import comprobantes_bp
+    from app.routes.importaciones import importaciones_bp
+    from app.routes.metricas import metricas_bp
+    from app.routes.eventos import eventos_bp
+    from app.routes.resumenes import resumenes_bp
+    from app.routes.busqueda import busqueda_bp
     from app.utils.decorators import login_required
     
+    # Preparar las rutas personalizadas antes de registrar nada: un fallo
+    # aquí no deja la app con una parte de los blueprints
+    login_url = app.config['LOGIN_URL']
+    dashboard_url = app.config['DASHBOARD_URL']
+    decorated_login = limiter.limit("5 per minute")(limiter.limit("20 per hour")(csrf.exempt(login)))
+    decorated_dashboard = login_required(dashboard)
+    
     # Registrar blueprints normalmente
     app.register_blueprint(auth_bp)
     app.register_blueprint(public_bp)
@@ -148,14 +267,14 @@ def _register_blueprints(app):
     app.register_blueprint(cupones_bp)
     app.register_blueprint(agencias_bp)
     app.register_blueprint(reportes_bp)
+    app.register_blueprint(exportaciones_bp)
+    app.register_blueprint(comprobantes_bp)
+    app.register_blueprint(importaciones_bp)
+    app.register_blueprint(metricas_bp)
+    app.register_blueprint(eventos_bp)
+    app.register_blueprint(resumenes_bp)
+    app.register_blueprint(busqueda_bp)
     
     # Registrar rutas con URLs personalizadas (ofuscadas)
-    login_url = app.config['LOGIN_URL']
-    dashboard_url = app.config['DASHBOARD_URL']
-    
-    # Aplicar decoradores y registrar
-    decorated_login = limiter.limit("5 per minute")(limiter.limit("20 per hour")(csrf.exempt(login)))
-    decorated_dashboard = login_required(dashboard)
-    
     app.add_url_rule(f'/{login_url}', 'custom_login', decorated_login, methods=['GET', 'POST'])
     app.add_url_rule(f'/{dashboard_url}', 'custom_dashboard', decorated_dashboard, methods=['GET'])
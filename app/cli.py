@@ -0,0 +1,265 @@
+"""
+Comandos CLI (flask <grupo> <comando>)
+Tareas de mantenimiento ejecutables fuera del ciclo de peticiones
+"""
+
+import os
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+
+
+db_cli = AppGroup('db', help='Migraciones y mantenimiento de la base de datos')
+resumen_cli = AppGroup('resumen', help='Resúmenes semanal y diario de cupones')
+cupones_cli = AppGroup('cupones', help='Mantenimiento de la tabla de cupones')
+usuarios_cli = AppGroup('usuarios', help='Mantenimiento de usuarios')
+estaticos_cli = AppGroup('estaticos', help='Build de los archivos estáticos')
+
+
+@db_cli.command('migrar')
+def migrar():
+    """Aplica las migraciones pendientes (paso previo al deploy, una sola vez)"""
+    from app.utils.migraciones import aplicar_migraciones
+
+    try:
+        from migrate_render_complete import migrate_render_complete
+    except ImportError:
+        migrate_render_complete = None
+    if migrate_render_complete is not None:
+        migrate_render_complete()
+        click.echo("✓ Migración base completada")
+
+    aplicadas = aplicar_migraciones(current_app.config['DATABASE_URL'])
+    if aplicadas:
+        for version in aplicadas:
+            click.echo(f"✓ {version}")
+    else:
+        click.echo("Sin migraciones pendientes")
+
+
+@db_cli.command('verificar-indices')
+def verificar_indices():
+    """Comprueba con EXPLAIN que las consultas críticas usan sus índices"""
+    from app.utils.planes import verificar_planes
+
+    resultados = verificar_planes()
+    for r in resultados:
+        marca = '✓' if r['ok'] else '✗'
+        usados = ', '.join(r['usados']) or 'ninguno'
+        click.echo(f"{marca} {r['nombre']}: esperado {r['esperado']} (usados: {usados})")
+
+    if not all(r['ok'] for r in resultados):
+        raise SystemExit(1)
+
+
+@db_cli.command('replica')
+def replica():
+    """Muestra el retraso de la réplica de lectura y si las lecturas la usarían"""
+    from app.utils.db import monitor_replica
+
+    if not current_app.config['DATABASE_REPLICA_URL']:
+        click.echo("Sin réplica configurada (DATABASE_REPLICA_URL): todo se lee del primario")
+        return
+
+    motivo = monitor_replica.motivo_desvio()
+    lag = monitor_replica.lag()
+    if motivo is None:
+        click.echo(f"✓ Réplica en uso: retraso {lag:.2f}s (máximo {monitor_replica.lag_max:g}s)")
+    else:
+        detalle = 'sin respuesta' if lag is None else f'retraso {lag:.2f}s'
+        click.echo(f"✗ Lecturas al primario ({motivo}): {detalle} (máximo {monitor_replica.lag_max:g}s)")
+        raise SystemExit(1)
+
+
+@resumen_cli.command('reconstruir')
+@click.option('--completo', is_flag=True, help='Ignora la marca de agua y recalcula todas las semanas')
+@click.option('--lote', default=12, show_default=True, help='Semanas por transacción')
+def reconstruir(completo, lote):
+    """Recalcula las semanas de resumen_semanas afectadas desde la última ejecución"""
+    from app.utils.resumenes import reconstruir_resumen_semanas
+
+    resultado = reconstruir_resumen_semanas(completo=completo, tamano_lote=lote)
+    click.echo(f"✓ {resultado['semanas']} semanas recalculadas en {resultado['lotes']} lotes")
+
+
+@resumen_cli.command('verificar')
+@click.option('--corregir', is_flag=True, help='Recalcula las semanas con diferencias')
+def verificar(corregir):
+    """Compara los contadores mantenidos con un recálculo completo desde cupones"""
+    from app.utils.resumenes import verificar_resumen_semanas
+
+    diferencias = verificar_resumen_semanas(corregir=corregir)
+    for row in diferencias:
+        click.echo(
+            f"✗ Semana {row['fecha_inicio_semana']}: "
+            f"total {row['total_mantenido']}/{row['total_real']}, "
+            f"usados {row['usados_mantenido']}/{row['usados_real']}, "
+            f"pendientes {row['pendientes_mantenido']}/{row['pendientes_real']}, "
+            f"monto {row['monto_total_mantenido']}/{row['monto_total_real']}"
+        )
+
+    if not diferencias:
+        click.echo("✓ resumen_semanas coincide con cupones")
+    elif corregir:
+        click.echo(f"✓ {len(diferencias)} semanas corregidas")
+    else:
+        raise SystemExit(1)
+
+
+@resumen_cli.command('consolidar-diario')
+@click.option('--completo', is_flag=True, help='Recalcula todos los días presentes en cupones')
+@click.option('--lote', default=31, show_default=True, help='Días por transacción')
+def consolidar_diario(completo, lote):
+    """Consolida en resumen_diario los días cerrados modificados desde la última pasada"""
+    from app.utils.resumen_diario import consolidar_resumen_diario
+
+    resultado = consolidar_resumen_diario(completo=completo, tamano_lote=lote)
+    if resultado['consolidado_hasta'] is None:
+        click.echo("✗ Otra consolidación está en curso")
+        raise SystemExit(1)
+    click.echo(
+        f"✓ {resultado['dias']} días recalculados en {resultado['lotes']} lotes "
+        f"(consolidado hasta {resultado['consolidado_hasta']})"
+    )
+
+
+@resumen_cli.command('verificar-diario')
+@click.option('--corregir', is_flag=True, help='Recalcula los días con diferencias')
+def verificar_diario(corregir):
+    """Compara resumen_diario con un recálculo desde cupones"""
+    from app.utils.resumen_diario import verificar_resumen_diario
+
+    dias = verificar_resumen_diario(corregir=corregir)
+    for dia in dias:
+        click.echo(f"✗ Día {dia}")
+
+    if not dias:
+        click.echo("✓ resumen_diario coincide con cupones")
+    elif corregir:
+        click.echo(f"✓ {len(dias)} días corregidos")
+    else:
+        raise SystemExit(1)
+
+
+@cupones_cli.command('particiones')
+@click.option('--meses', type=int, default=None, help='Meses a crear por adelantado')
+def particiones(meses):
+    """Crea las particiones mensuales futuras de cupones"""
+    from app.utils.particiones import crear_particiones_futuras, filas_sin_particion
+
+    meses = meses or current_app.config['CUPONES_PARTICIONES_ADELANTO']
+    total = crear_particiones_futuras(meses)
+    click.echo(f"✓ {total} particiones verificadas")
+
+    filas = filas_sin_particion()
+    if filas:
+        click.echo(f"✗ cupones_default tiene {filas} filas sin partición mensual")
+        raise SystemExit(1)
+
+
+@cupones_cli.command('archivar')
+@click.option('--retencion', type=int, default=None, help='Meses que permanecen en cupones')
+def archivar(retencion):
+    """Desvincula las particiones antiguas y las mueve al schema archivo"""
+    from app.utils.particiones import archivar_particiones
+
+    retencion = retencion or current_app.config['CUPONES_RETENCION_MESES']
+    archivadas = archivar_particiones(current_app.config['DATABASE_URL'], retencion)
+    for nombre in archivadas:
+        click.echo(f"✓ archivo.{nombre}")
+    if not archivadas:
+        click.echo("Sin particiones para archivar")
+
+
+@cupones_cli.command('importar')
+@click.argument('archivo', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--agencia', type=int, default=None, help='Agencia para todas las filas (si no, columna agencia_id)')
+@click.option('--empleado', type=int, default=None, help='ID del usuario que emite los cupones')
+@click.option('--validar', is_flag=True, help='Sólo validar, sin insertar')
+@click.option('--parcial', is_flag=True, help='Insertar las filas válidas aunque otras fallen')
+def importar(archivo, agencia, empleado, validar, parcial):
+    """Importa cupones desde un CSV (COPY + merge en una transacción)"""
+    from app.utils.importacion import ErrorImportacion, importar_csv
+
+    try:
+        resultado = importar_csv(
+            archivo, agencia_id=agencia, empleado_id=empleado, parcial=parcial, validar_solo=validar,
+            max_filas=current_app.config['IMPORTACION_MAX_FILAS'],
+        )
+    except ErrorImportacion as e:
+        raise click.ClickException(str(e))
+
+    for error in resultado['errores']:
+        click.echo(f"✗ fila {error['fila']} ({error['campo']}): {error['mensaje']}")
+    click.echo(f"✓ {resultado['insertados']} cupones insertados, {len(resultado['errores'])} errores")
+    if resultado['errores'] and not resultado['insertados']:
+        raise SystemExit(1)
+
+
+@usuarios_cli.command('rehash-estado')
+def rehash_estado():
+    """Muestra cuántos usuarios conservan hashes legacy (PBKDF2)"""
+    from app.utils.rehash import contar_hashes_legacy
+
+    conteo = contar_hashes_legacy()
+    migrados = conteo['total'] - conteo['legacy']
+    click.echo(f"Argon2id: {migrados}/{conteo['total']} usuarios ({conteo['legacy']} legacy pendientes)")
+
+
+@usuarios_cli.command('revocar-sesiones')
+@click.argument('user_id', type=int)
+def revocar_sesiones(user_id):
+    """Cierra todas las sesiones abiertas de un usuario"""
+    from app.utils.sesiones import revocar_sesiones_usuario
+
+    revocar_sesiones_usuario(user_id)
+    click.echo(f"✓ Sesiones del usuario {user_id} revocadas")
+
+
+@usuarios_cli.command('sincronizar-estado')
+@click.option('--agencias/--usuarios', default=False, help='Sincronizar agencias en lugar de usuarios')
+def sincronizar_estado(agencias):
+    """Registra el flag activo actual de la BD (tras cambios hechos fuera de la app)"""
+    from app.utils.db import get_db
+    from app.utils.sesiones import registro_sesiones
+
+    tipo, tabla = ('a', 'agencias') if agencias else ('u', 'usuarios')
+    with get_db() as (conn, cur):
+        cur.execute(f"SELECT id, activo FROM {tabla}")
+        filas = cur.fetchall()
+
+    for fila in filas:
+        registro_sesiones.registrar(tipo, fila['id'], bool(fila['activo']))
+    inactivos = sum(1 for fila in filas if not fila['activo'])
+    click.echo(f"✓ {len(filas)} {tabla} registrados ({inactivos} inactivos)")
+
+
+@estaticos_cli.command('compilar')
+def compilar():
+    """Genera copias versionadas, variantes .gz/.br y static/manifest.json (paso del deploy)"""
+    from app.utils.estaticos import brotli, compilar_estaticos
+
+    directorio = current_app.static_folder
+    if not directorio or not os.path.isdir(directorio):
+        click.echo(f"✗ Sin carpeta de estáticos ({directorio})")
+        raise SystemExit(1)
+
+    manifiesto = compilar_estaticos(directorio)
+    for nombre, entrada in sorted(manifiesto.items()):
+        variantes = ', '.join(
+            f"{codificacion} {entrada[codificacion]} B"
+            for codificacion in ('brotli', 'gzip') if entrada[codificacion]
+        ) or 'sin comprimir'
+        click.echo(f"✓ {nombre} -> {entrada['archivo']} ({entrada['bytes']} B; {variantes})")
+    if brotli is None:
+        click.echo("Sin variantes .br: instala el paquete 'brotli' para generarlas")
+
+
+def register_cli(app):
+    """Registra los grupos de comandos en la aplicación"""
+    app.cli.add_command(db_cli)
+    app.cli.add_command(resumen_cli)
+    app.cli.add_command(cupones_cli)
+    app.cli.add_command(usuarios_cli)
+    app.cli.add_command(estaticos_cli)
@@ -4,6 +4,7 @@ Contiene clases de configuración para diferentes entornos (desarrollo, producci
 """
 
 import os
+import tempfile
 from datetime import timedelta
 
 
@@ -15,19 +16,116 @@ class Config:
     
     # Base de datos
     DATABASE_URL = os.getenv('DATABASE_URL')
-    
+
+    # Pool de conexiones por worker; WEB_CONCURRENCY x (max + overflow)
+    # se recorta para no superar DB_MAX_CONEXIONES del servidor
+    WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', 2))
+    DB_POOL_MIN = int(os.getenv('DB_POOL_MIN', 1))
+    DB_POOL_MAX = int(os.getenv('DB_POOL_MAX', 5))
+    DB_POOL_OVERFLOW = int(os.getenv('DB_POOL_OVERFLOW', 2))
+    DB_MAX_CONEXIONES = int(os.getenv('DB_MAX_CONEXIONES', 20))
+    DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))  # segundos esperando conexión
+    DB_POOL_VERIFICAR_TRAS = float(os.getenv('DB_POOL_VERIFICAR_TRAS', 30))  # inactividad antes de SELECT 1
+
+    # Réplica de lectura (opcional) para reportes y dashboards (@solo_lectura);
+    # pool propio con su presupuesto. Con retraso mayor que DB_REPLICA_LAG_MAX
+    # o tras una escritura del propio usuario se lee del primario
+    DATABASE_REPLICA_URL = os.getenv('DATABASE_REPLICA_URL')
+    DB_REPLICA_POOL_MIN = int(os.getenv('DB_REPLICA_POOL_MIN', 1))
+    DB_REPLICA_POOL_MAX = int(os.getenv('DB_REPLICA_POOL_MAX', 5))
+    DB_REPLICA_POOL_OVERFLOW = int(os.getenv('DB_REPLICA_POOL_OVERFLOW', 2))
+    DB_REPLICA_MAX_CONEXIONES = int(os.getenv('DB_REPLICA_MAX_CONEXIONES', 20))
+    DB_REPLICA_LAG_MAX = float(os.getenv('DB_REPLICA_LAG_MAX', 5))  # segundos
+    DB_REPLICA_VERIFICAR = float(os.getenv('DB_REPLICA_VERIFICAR', 2))  # cache de la medición del retraso
+
     # Sesiones
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
     
+    # Arranque diferido: fuentes PDF en el primer PDF y blueprints en la primera petición
+    ARRANQUE_DIFERIDO = os.getenv('ARRANQUE_DIFERIDO', '1') == '1'
+    
+    # Migraciones en cada worker al arrancar (por defecto se ejecutan como
+    # paso previo al deploy con 'flask db migrar')
+    MIGRAR_AL_ARRANCAR = os.getenv('MIGRAR_AL_ARRANCAR') == '1'
+    
     # URLs dinámicas (rutas ofuscadas)
     LOGIN_URL = os.getenv('')
-    DASHBOARD_URL = os.getenv(')
+    DASHBOARD_URL = os.getenv('')
     
-    # Cache (SimpleCache por defecto, Redis si esta disponible)
-    CACHE_TYPE = 'RedisCache' if os.getenv('REDIS_URL') else 'SimpleCache'
+    # Cache de dos niveles: LRU por worker delante de Redis (SimpleCache si no hay Redis)
+    CACHE_TYPE = 'app.utils.cache_backend.CacheDosNiveles'
     CACHE_REDIS_URL = os.getenv('REDIS_URL')
     CACHE_DEFAULT_TIMEOUT = 120
+    CACHE_LOCAL_MAX = int(os.getenv('CACHE_LOCAL_MAX', 1000))  # entradas por worker
+    CACHE_LOCAL_TTL = int(os.getenv('CACHE_LOCAL_TTL', 30))  # segundos
+    
+    # Rate limiting compartido entre workers: Redis si esta disponible,
+    # si no SQLite en memoria compartida (/dev/shm) de la máquina
+    RATELIMIT_STORAGE_URI = os.getenv('RATELIMIT_STORAGE_URI') or os.getenv('REDIS_URL') or 'sqlite:///' + os.path.join(
+        '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'agencias_ratelimit.sqlite'
+    )
+    RATELIMIT_STRATEGY = os.getenv('RATELIMIT_STRATEGY', 'moving-window')
+    
+    # Registro de sesiones (revocación y flags activo sin consultar la BD por petición)
+    SESIONES_REDIS_URL = os.getenv('SESIONES_REDIS_URL') or os.getenv('REDIS_URL')
+    SESIONES_SQLITE_PATH = os.path.join(
+        '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'agencias_sesiones.sqlite'
+    )
+    SESIONES_CACHE_MAX = int(os.getenv('SESIONES_CACHE_MAX', 10000))  # entradas por worker
+    SESIONES_CACHE_TTL = int(os.getenv('SESIONES_CACHE_TTL', 300))  # segundos
+    
+    # Pool de hashing Argon2id (64 MB por hilo ocupado)
+    HASH_POOL_WORKERS = int(os.getenv('HASH_POOL_WORKERS', 2))
+    HASH_POOL_COLA = int(os.getenv('HASH_POOL_COLA', 8))
+    HASH_POOL_TIMEOUT = float(os.getenv('HASH_POOL_TIMEOUT', 5))
+    
+    # Motor de comprobantes PDF
+    PDF_PROCESOS = int(os.getenv('PDF_PROCESOS', 2))  # procesos de render por worker
+    PDF_LOTE = int(os.getenv('PDF_LOTE', 50))  # cupones por tarea al generar un ZIP
+    PDF_MAX_LOTE = int(os.getenv('PDF_MAX_LOTE', 500))  # cupones por petición
+    PDF_CACHE_TIMEOUT = int(os.getenv('PDF_CACHE_TIMEOUT', 86400))
+    PDF_TIMEOUT = float(os.getenv('PDF_TIMEOUT', 30))  # segundos esperando un comprobante o lote (luego 503)
+    
+    # Respuestas condicionales (ETag por versión de datos) y compresión JSON
+    ETAG_VIGENCIA = int(os.getenv('ETAG_VIGENCIA', 60))  # segundos; cota de obsolescencia del ETag
+    COMPRESION_MIN_BYTES = int(os.getenv('COMPRESION_MIN_BYTES', 1024))  # 0 = sin gzip dinámico
+    COMPRESION_NIVEL = int(os.getenv('COMPRESION_NIVEL', 6))
+    
+    # Importación masiva de cupones (CSV)
+    IMPORTACION_MAX_FILAS = int(os.getenv('IMPORTACION_MAX_FILAS', 20000))
+    
+    # Eventos de check-in en tiempo real (LISTEN/NOTIFY -> SSE)
+    EVENTOS_ORIGEN = os.getenv('EVENTOS_ORIGEN', 'postgres')  # 'postgres' o 'memoria'
+    EVENTOS_HISTORIAL = int(os.getenv('EVENTOS_HISTORIAL', 1000))  # eventos para reanudar
+    EVENTOS_COLA_MAX = int(os.getenv('EVENTOS_COLA_MAX', 100))  # por cliente
+    EVENTOS_MAX_CLIENTES = int(os.getenv('EVENTOS_MAX_CLIENTES', 4))  # streams por worker
+    EVENTOS_HEARTBEAT = int(os.getenv('EVENTOS_HEARTBEAT', 15))  # segundos
+    EVENTOS_DURACION_MAX = int(os.getenv('EVENTOS_DURACION_MAX', 300))  # segundos por conexión
+    
+    # Búsqueda aproximada de cupones (pg_trgm o índice en memoria)
+    BUSQUEDA_MOTOR = os.getenv('BUSQUEDA_MOTOR', 'auto')  # 'auto', 'trgm' o 'memoria'
+    BUSQUEDA_UMBRAL = float(os.getenv('BUSQUEDA_UMBRAL', 0.5))  # word_similarity mínima
+    BUSQUEDA_REFRESCO = int(os.getenv('BUSQUEDA_REFRESCO', 30))  # segundos (índice en memoria)
+    
+    # Métricas Prometheus (multiproceso: un archivo mmap por worker en METRICAS_DIR)
+    METRICAS_HABILITADAS = os.getenv('METRICAS_HABILITADAS', '1') == '1'
+    METRICAS_DIR = os.getenv('PROMETHEUS_MULTIPROC_DIR') or os.path.join(
+        '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(), 'agencias_metricas'
+    )
+    METRICAS_TOKEN = os.getenv('METRICAS_TOKEN')  # Bearer para el scraper
+    METRICAS_SQL_LENTA_MS = int(os.getenv('METRICAS_SQL_LENTA_MS', 200))
+    
+    # Particiones mensuales de cupones
+    CUPONES_PARTICIONES_ADELANTO = int(os.getenv('CUPONES_PARTICIONES_ADELANTO', 3))  # meses
+    CUPONES_RETENCION_MESES = int(os.getenv('CUPONES_RETENCION_MESES', 24))
+    # Opcional (un solo proceso): por defecto se programa 'flask cupones particiones' en cron
+    CUPONES_PARTICIONES_SCHEDULER = os.getenv('CUPONES_PARTICIONES_SCHEDULER') == '1'
+    
+    # Consolidación de resumen_diario (días cerrados; hoy se lee de cupones). Arranca
+    # con la primera petición de cada worker, no en comandos flask; 0 la deja al cron
+    RESUMEN_DIARIO_SCHEDULER = os.getenv('RESUMEN_DIARIO_SCHEDULER', '1') == '1'
+    RESUMEN_DIARIO_INTERVALO = int(os.getenv('RESUMEN_DIARIO_INTERVALO', 15))  # minutos
 
 
 class DevelopmentConfig(Config):
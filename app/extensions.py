@@ -9,15 +9,18 @@ from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
 from flask_caching import Cache
 
+# Registra el esquema sqlite:// para el almacenamiento compartido del limiter
+import app.utils.limiter_storage  # noqa: F401
+
 # Instancias sin vincular (se vinculan con init_app en factory)
 cors = CORS()
 csrf = CSRFProtect()
 cache = Cache()
 
 # Limiter requiere configuración especial
+# Storage y estrategia se leen de RATELIMIT_STORAGE_URI / RATELIMIT_STRATEGY (config.py)
+# para que los contadores sean compartidos entre workers
 limiter = Limiter(
     key_func=get_remote_address,
-    default_limits=["200 per day", "100 per hour"],
-    storage_uri="memory://",
-    strategy="fixed-window"
+    default_limits=["200 per day", "100 per hour"]
 )
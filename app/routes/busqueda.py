@@ -0,0 +1,45 @@
+"""
+Rutas de Búsqueda
+Búsqueda aproximada de cupones para recepción (nombre, DNI/pasaporte o código)
+"""
+
+from flask import Blueprint, request, jsonify
+
+from app.extensions import limiter
+from app.utils.busqueda import ErrorBusqueda, IndiceNoDisponible, buscador_cupones
+from app.utils.decorators import agencia_de_sesion, login_required
+
+busqueda_bp = Blueprint('busqueda', __name__, url_prefix='/api/busqueda')
+
+
+@busqueda_bp.route('/cupones')
+@login_required
+@limiter.limit("120 per minute")
+def buscar_cupones():
+    """
+    Cupones ordenados por relevancia.
+
+    Query: q, limite (máx. 50), cursor ('siguiente' de la página anterior)
+    y agencia_id (sólo administración; los empleados ven su agencia)
+    """
+    permitido, agencia_id = agencia_de_sesion()
+    if not permitido:
+        return jsonify({'msg': 'No tienes permisos para buscar cupones'}), 403
+
+    try:
+        pagina = buscador_cupones.buscar(
+            request.args.get('q', ''),
+            limite=request.args.get('limite', 20, type=int),
+            cursor=request.args.get('cursor'),
+            agencia_id=agencia_id,
+        )
+    except IndiceNoDisponible as e:
+        return jsonify({'msg': str(e)}), 503, {'Retry-After': '5'}
+    except ErrorBusqueda as e:
+        return jsonify({'msg': str(e)}), 400
+
+    for fila in pagina['resultados']:
+        for campo in ('fecha_visita', 'created_at'):
+            if fila.get(campo) is not None:
+                fila[campo] = fila[campo].isoformat()
+    return jsonify(pagina)
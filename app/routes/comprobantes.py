@@ -0,0 +1,81 @@
+"""
+Rutas de Comprobantes
+Descarga del comprobante PDF de un cupón o de un lote (PDF combinado o ZIP)
+"""
+
+from flask import Blueprint, Response, current_app, request, session, jsonify
+
+from app.extensions import limiter
+from app.utils.comprobantes import MotorNoDisponible, motor_comprobantes, obtener_cupones
+from app.utils.decorators import login_required
+
+comprobantes_bp = Blueprint('comprobantes', __name__, url_prefix='/api/comprobantes')
+
+
+def _agencia_restringida():
+    """Los empleados sólo imprimen cupones de su agencia"""
+    return session.get('agencia_id') if session.get('rol') == 'empleado' else None
+
+
+def _no_disponible(e):
+    """El render no llegó a tiempo o su pool se reinicia: el cliente reintenta"""
+    return jsonify({'msg': str(e)}), 503, {'Retry-After': '5'}
+
+
+def _pdf(contenido, nombre, mimetype='application/pdf'):
+    return Response(contenido, mimetype=mimetype, headers={
+        'Content-Disposition': f'inline; filename="{nombre}"',
+        'Cache-Control': 'private, no-cache',
+    })
+
+
+@comprobantes_bp.route('/<int:cupon_id>.pdf')
+@login_required
+def comprobante(cupon_id):
+    """
+    Comprobante de un cupón (cacheado hasta que el cupón se modifique).
+    """
+    cupones = obtener_cupones([cupon_id], _agencia_restringida())
+    if not cupones:
+        return jsonify({'msg': 'Cupón no encontrado'}), 404
+
+    cupon = cupones[0]
+    try:
+        pdf = motor_comprobantes.comprobante(cupon)
+    except MotorNoDisponible as e:
+        return _no_disponible(e)
+    return _pdf(pdf, f"cupon_{cupon['codigo_alfanumerico']}.pdf")
+
+
+@comprobantes_bp.route('/lote', methods=['POST'])
+@login_required
+@limiter.limit("30 per hour")
+def lote():
+    """
+    Comprobantes de varios cupones.
+
+    Body JSON: {"ids": [1, 2, ...], "formato": "pdf" | "zip"}
+    """
+    datos = request.get_json(silent=True) or {}
+    ids = datos.get('ids')
+    formato = datos.get('formato', 'pdf')
+
+    if not isinstance(ids, list) or not ids or not all(isinstance(i, int) for i in ids):
+        return jsonify({'msg': 'ids debe ser una lista de enteros'}), 400
+    if formato not in ('pdf', 'zip'):
+        return jsonify({'msg': 'formato debe ser pdf o zip'}), 400
+
+    maximo = current_app.config['PDF_MAX_LOTE']
+    if len(ids) > maximo:
+        return jsonify({'msg': f'Máximo {maximo} cupones por lote'}), 400
+
+    cupones = obtener_cupones(list(dict.fromkeys(ids)), _agencia_restringida())
+    if not cupones:
+        return jsonify({'msg': 'Ningún cupón encontrado'}), 404
+
+    try:
+        if formato == 'zip':
+            return _pdf(motor_comprobantes.lote_zip(cupones), 'comprobantes.zip', 'application/zip')
+        return _pdf(motor_comprobantes.lote_pdf(cupones), 'comprobantes.pdf')
+    except MotorNoDisponible as e:
+        return _no_disponible(e)
@@ -0,0 +1,49 @@
+"""
+Rutas de Eventos
+Server-Sent Events de check-in: el panel recibe los cupones canjeados sin consultar
+"""
+
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context
+
+from app.utils.decorators import agencia_de_sesion, login_required
+from app.utils.eventos import bus_eventos, flujo_sse
+
+eventos_bp = Blueprint('eventos', __name__, url_prefix='/api/eventos')
+
+
+def _ultimo_id():
+    """Last-Event-ID (reconexión automática) o ?ultimo_id (primera conexión tras recargar)"""
+    valor = request.headers.get('Last-Event-ID') or request.args.get('ultimo_id')
+    try:
+        return int(valor) if valor else None
+    except ValueError:
+        return None
+
+
+@eventos_bp.route('/checkin')
+@login_required
+def checkin():
+    """
+    Stream de eventos 'checkin' (estado de un cupón) y 'recargar'.
+
+    Empleados: su agencia. Administración: ?agencia_id o todas.
+    """
+    permitido, agencia_id = agencia_de_sesion()
+    if not permitido:
+        return jsonify({'msg': 'No tienes permisos para ver estos eventos'}), 403
+
+    suscripcion, pendientes = bus_eventos.suscribir(agencia_id, _ultimo_id())
+    if suscripcion is None:
+        respuesta = jsonify({'msg': 'Demasiadas conexiones en tiempo real, reintenta en unos segundos'})
+        respuesta.headers['Retry-After'] = '5'
+        return respuesta, 503
+
+    cuerpo = flujo_sse(
+        suscripcion, pendientes,
+        heartbeat=current_app.config['EVENTOS_HEARTBEAT'],
+        duracion=current_app.config['EVENTOS_DURACION_MAX'],
+    )
+    return Response(stream_with_context(cuerpo), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
@@ -0,0 +1,79 @@
+"""
+Rutas de Exportación
+Descarga en streaming de cupones y resúmenes semanales (roles financieros)
+"""
+
+from datetime import date
+
+from flask import Blueprint, request, jsonify
+
+from app.extensions import limiter
+from app.utils.condicional import etag_datos
+from app.utils.decorators import financiero_required, solo_lectura
+from app.utils.exportacion import (
+    COLUMNAS_CUPONES, COLUMNAS_RESUMEN, ESTADOS_CUPON, FORMATOS,
+    consulta_cupones, consulta_resumen, respuesta_exportacion,
+)
+
+exportaciones_bp = Blueprint('exportaciones', __name__, url_prefix='/api/exportaciones')
+
+
+def _fecha(nombre):
+    """Lee un parámetro YYYY-MM-DD (None si no viene; ValueError si es inválido)"""
+    valor = request.args.get(nombre)
+    return date.fromisoformat(valor) if valor else None
+
+
+def _validar_formato(formato):
+    if formato not in FORMATOS:
+        return jsonify({'msg': f"Formato no soportado. Usa: {', '.join(FORMATOS)}"}), 400
+    return None
+
+
+@exportaciones_bp.route('/cupones.<formato>')
+@financiero_required
+@solo_lectura
+@limiter.limit("30 per hour")
+@etag_datos('cupones')
+def exportar_cupones(formato):
+    """
+    Exporta cupones filtrados por agencia_id, desde, hasta (fecha de creación) y estado.
+    """
+    error = _validar_formato(formato)
+    if error:
+        return error
+
+    try:
+        agencia_id = request.args.get('agencia_id', type=int)
+        desde, hasta = _fecha('desde'), _fecha('hasta')
+    except ValueError:
+        return jsonify({'msg': 'Fechas inválidas, usa el formato AAAA-MM-DD'}), 400
+
+    estado = request.args.get('estado') or None
+    if estado is not None and estado not in ESTADOS_CUPON:
+        return jsonify({'msg': f"Estado inválido. Usa: {', '.join(ESTADOS_CUPON)}"}), 400
+
+    sql, params = consulta_cupones(agencia_id, desde, hasta, estado)
+    return respuesta_exportacion('cupones', COLUMNAS_CUPONES, sql, params, formato)
+
+
+@exportaciones_bp.route('/resumen-semanas.<formato>')
+@financiero_required
+@solo_lectura
+@limiter.limit("30 per hour")
+@etag_datos('resumen_semanas')
+def exportar_resumen_semanas(formato):
+    """
+    Exporta el reporte semanal (vista_reportes_semanales) entre desde y hasta.
+    """
+    error = _validar_formato(formato)
+    if error:
+        return error
+
+    try:
+        desde, hasta = _fecha('desde'), _fecha('hasta')
+    except ValueError:
+        return jsonify({'msg': 'Fechas inválidas, usa el formato AAAA-MM-DD'}), 400
+
+    sql, params = consulta_resumen(desde, hasta)
+    return respuesta_exportacion('resumen_semanas', COLUMNAS_RESUMEN, sql, params, formato)
@@ -0,0 +1,65 @@
+"""
+Rutas de Importación
+Alta masiva de cupones desde CSV (COPY + merge en una transacción)
+"""
+
+import io
+
+from flask import Blueprint, current_app, request, session, jsonify
+
+from app.extensions import limiter
+from app.utils.decorators import login_required
+from app.utils.importacion import ErrorImportacion, importar_csv
+
+importaciones_bp = Blueprint('importaciones', __name__, url_prefix='/api/importaciones')
+
+
+@importaciones_bp.route('/cupones', methods=['POST'])
+@login_required
+@limiter.limit("20 per hour")
+def importar_cupones():
+    """
+    Importa cupones desde un CSV (campo 'archivo' multipart o cuerpo text/csv).
+
+    Query params:
+        validar=1: sólo valida, no inserta
+        parcial=1: inserta las filas válidas aunque otras tengan errores
+
+    Administración: la agencia de cada fila (columna agencia_id). Los
+    empleados sólo importan cupones de su propia agencia; los demás roles
+    (contador es de sólo lectura) y los empleados sin agencia no importan.
+    """
+    rol = session.get('rol')
+    if rol == 'admin':
+        agencia_id = None
+    elif rol == 'empleado' and session.get('agencia_id') is not None:
+        agencia_id = session.get('agencia_id')
+    else:
+        return jsonify({'msg': 'No tienes permisos para importar cupones'}), 403
+
+    if 'archivo' in request.files:
+        contenido = request.files['archivo'].stream.read()
+    else:
+        contenido = request.get_data()
+    if not contenido:
+        return jsonify({'msg': 'Envía el CSV en el campo "archivo" o como cuerpo text/csv'}), 400
+
+    try:
+        archivo = io.StringIO(contenido.decode('utf-8-sig'), newline='')
+    except UnicodeDecodeError:
+        return jsonify({'msg': 'El archivo debe estar codificado en UTF-8'}), 400
+
+    try:
+        resultado = importar_csv(
+            archivo,
+            agencia_id=agencia_id,
+            empleado_id=session.get('user_id'),
+            parcial=request.args.get('parcial') == '1',
+            validar_solo=request.args.get('validar') == '1',
+            max_filas=current_app.config['IMPORTACION_MAX_FILAS'],
+        )
+    except ErrorImportacion as e:
+        return jsonify({'msg': str(e)}), 400
+
+    estado = 422 if resultado['errores'] and not resultado['insertados'] else 200
+    return jsonify(resultado), estado
@@ -0,0 +1,35 @@
+"""
+Ruta de Métricas
+Exposición de métricas en formato Prometheus (administradores o token de scraping)
+"""
+
+import hmac
+
+from flask import Blueprint, Response, current_app, request
+
+from app.utils.decorators import admin_required
+from app.utils.metricas import exportar_metricas
+
+metricas_bp = Blueprint('metricas', __name__)
+
+
+def _token_valido():
+    """Authorization: Bearer <METRICAS_TOKEN> para el scraper de Prometheus"""
+    esperado = current_app.config.get('METRICAS_TOKEN')
+    recibido = request.headers.get('Authorization', '')
+    return bool(esperado) and hmac.compare_digest(recibido, f'Bearer {esperado}')
+
+
+def _exportar():
+    cuerpo, content_type = exportar_metricas()
+    return Response(cuerpo, content_type=content_type, headers={'Cache-Control': 'no-store'})
+
+
+@metricas_bp.route('/metrics')
+def metrics():
+    """
+    Métricas agregadas de todos los workers.
+    """
+    if _token_valido():
+        return _exportar()
+    return admin_required(_exportar)()
@@ -0,0 +1,76 @@
+"""
+Rutas de Resúmenes
+Series agregadas para los gráficos del panel (resumen_diario + cupones de hoy)
+"""
+
+from datetime import date
+
+from flask import Blueprint, request, jsonify
+
+from app.utils.condicional import etag_datos
+from app.utils.decorators import financiero_required, solo_lectura
+from app.utils.resumen_diario import DIMENSIONES, PERIODOS, consultar_resumen_diario, resumen_semanal
+
+resumenes_bp = Blueprint('resumenes', __name__, url_prefix='/api/resumenes')
+
+
+def _rango():
+    """desde/hasta obligatorios en formato AAAA-MM-DD (ValueError si faltan o son inválidos)"""
+    desde = date.fromisoformat(request.args.get('desde', ''))
+    hasta = date.fromisoformat(request.args.get('hasta', ''))
+    if desde > hasta:
+        raise ValueError('desde posterior a hasta')
+    return desde, hasta
+
+
+def _serializar(filas):
+    return [
+        {k: v.isoformat() if isinstance(v, date) else v for k, v in fila.items()}
+        for fila in filas
+    ]
+
+
+@resumenes_bp.route('/diario')
+@financiero_required
+@solo_lectura
+@etag_datos('resumen_diario', 'cupones')
+def diario():
+    """
+    Cupones y montos por periodo y dimensiones.
+
+    Query: desde, hasta, periodo (dia|semana|mes|total), agrupar (p. ej.
+    'agencia,vendedor'), agencia_id, empleado_id, estado
+    """
+    try:
+        desde, hasta = _rango()
+    except ValueError:
+        return jsonify({'msg': 'Rango inválido, usa desde/hasta con el formato AAAA-MM-DD'}), 400
+
+    agrupar = tuple(d for d in request.args.get('agrupar', '').split(',') if d)
+    periodo = request.args.get('periodo', 'dia')
+    if periodo not in PERIODOS or any(d not in DIMENSIONES for d in agrupar):
+        return jsonify({'msg': f"Usa periodo en {', '.join(PERIODOS)} y agrupar en {', '.join(DIMENSIONES)}"}), 400
+
+    filas = consultar_resumen_diario(
+        desde, hasta, agrupar, periodo,
+        agencia_id=request.args.get('agencia_id', type=int),
+        empleado_id=request.args.get('empleado_id', type=int),
+        estado=request.args.get('estado') or None,
+    )
+    return jsonify(_serializar(filas))
+
+
+@resumenes_bp.route('/semanal')
+@financiero_required
+@solo_lectura
+@etag_datos('resumen_diario', 'cupones')
+def semanal():
+    """
+    Semanas con la forma de vista_reportes_semanales (opcionalmente ?agencia_id).
+    """
+    try:
+        desde, hasta = _rango()
+    except ValueError:
+        return jsonify({'msg': 'Rango inválido, usa desde/hasta con el formato AAAA-MM-DD'}), 400
+
+    return jsonify(_serializar(resumen_semanal(desde, hasta, request.args.get('agencia_id', type=int))))
@@ -1,7 +1,9 @@
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash
+from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app
 
 from app.utils.db import get_db
 from app.utils.auth import hash_password, verify_password
+from app.utils.hash_pool import verificar_password, hashear_password, PoolSaturado
+from app.utils.sesiones import iniciar_sesion, cerrar_sesion
 from app.extensions import limiter, csrf
 
 # Crear blueprint
@@ -31,29 +33,27 @@ def login():
                 return render_template('login.html')
             
             # Verificar contraseña usando sistema híbrido (Argon2 + PBKDF2 legacy)
-            if not verify_password(password, user.password_hash):
+            # en el pool acotado: si está saturado se responde 503 de inmediato
+            try:
+                password_valida = verificar_password(password, user.password_hash)
+            except PoolSaturado:
+                flash('El servidor está ocupado. Intenta nuevamente en unos segundos.', 'warning')
+                return render_template('login.html'), 503
+            
+            if not password_valida:
                 flash('Credenciales inválidas', 'error')
                 return render_template('login.html')
             
             # ============================================
             # HOOK DE MIGRACIÓN CRIPTOGRÁFICA (TOFU)
-            # Migra silenciosamente de PBKDF2 a Argon2id
+            # Encola el re-hash PBKDF2 -> Argon2id; se calcula y guarda
+            # en segundo plano por lotes (app/utils/rehash.py)
             # ============================================
-            from app.utils.auth import needs_rehash, hash_password
-            from app.utils.db import get_db
+            from app.utils.auth import needs_rehash
+            from app.utils.rehash import cola_rehash
             
             if needs_rehash(user.password_hash):
-                try:
-                    new_hash = hash_password(password)
-                    with get_db() as (conn, cur):
-                        cur.execute(
-                            "UPDATE usuarios SET password_hash = %s WHERE id = %s",
-                            (new_hash, user.id)
-                        )
-                    print(f"Migración Argon2id completada para usuario ID={user.id}")
-                except Exception as migration_error:
-                    # No interrumpir el login si la migración falla
-                    print(f"Error en migración Argon2id (usuario {user.id}): {migration_error}")
+                cola_rehash.encolar(user.id, password, user.password_hash)
             # ============================================
             
             # Verificar que el usuario esté activo
@@ -62,10 +62,12 @@ def login():
                 return render_template('login.html')
             
             # Verificar que la agencia esté activa (solo para empleados)
+            agencia_activa = True
             if user.rol == 'empleado' and user.agencia_id:
                 from app.models import Agencia
                 agencia = Agencia.get_by_id(user.agencia_id)
-                if not agencia or not agencia.activo:
+                agencia_activa = bool(agencia and agencia.activo)
+                if not agencia_activa:
                     flash('Tu agencia ha sido desactivada. Contacta al administrador.', 'error')
                     return render_template('login.html')
             
@@ -89,6 +91,9 @@ def login():
             session['agencia_nombre'] = user.agencia_nombre
             session['user_telefono'] = user.telefono
             
+            # Check-in en el registro de sesiones (épocas vigentes de usuario/agencia)
+            iniciar_sesion(user, agencia_activa)
+            
             flash(f'Bienvenido, {user.nombre}!', 'success')
             
             # Redirigir según el rol del usuario
@@ -99,10 +104,8 @@ def login():
             else:
                 return redirect(url_for('custom_dashboard'))
                 
-        except Exception as e:
-            print(f" Error en login: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            current_app.logger.exception("Error en login")
             flash('Error al procesar el login', 'error')
             return render_template('login.html')
     
@@ -115,6 +118,8 @@ def logout():
     """
     Ruta para cerrar sesión.
     """
+    # La cookie firmada seguiría siendo válida si se reenvía: se revoca en el servidor
+    cerrar_sesion(current_app.permanent_session_lifetime.total_seconds())
     session.clear()
     flash('Sesión cerrada exitosamente', 'success')
     return redirect(url_for('custom_login'))
@@ -132,8 +137,8 @@ def registro():
                 cur.execute("SELECT id, nombre FROM agencias WHERE activo = TRUE ORDER BY nombre")
                 agencias = cur.fetchall()
                 return render_template("registro.html", agencias=agencias)
-        except Exception as e:
-            print(f"Error obteniendo agencias: {e}")
+        except Exception:
+            current_app.logger.exception("Error obteniendo agencias")
             flash("Error cargando formulario de registro", "error")
             return render_template("registro.html", agencias=[])
     
@@ -167,8 +172,13 @@ def registro():
                 flash("Este email ya está registrado", "error")
                 return redirect(url_for("auth.registro"))
             
-            # Crear usuario
-            password_hash = hash_password(password)
+            # Crear usuario (hash en el pool acotado)
+            try:
+                password_hash = hashear_password(password)
+            except PoolSaturado:
+                flash("El servidor está ocupado. Intenta nuevamente en unos segundos.", "warning")
+                return redirect(url_for("auth.registro"))
+            
             cur.execute("""
                 INSERT INTO usuarios (email, password_hash, nombre, apellido, telefono, agencia_id, rol, cuenta_aprobada, activo) 
                 VALUES (%s, %s, %s, %s, %s, %s, 'empleado', FALSE, FALSE)
@@ -178,7 +188,7 @@ def registro():
             flash("¡Cuenta creada exitosamente! Espera a que el Administrador Central la active.", "success")
             return redirect(url_for("custom_login"))
             
-    except Exception as e:
-        print(f"Error en registro: {e}")
+    except Exception:
+        current_app.logger.exception("Error en registro")
         flash("Error al crear la cuenta. Intenta nuevamente.", "error")
         return redirect(url_for("auth.registro"))
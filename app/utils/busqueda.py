@@ -0,0 +1,478 @@
+"""
+Búsqueda Aproximada de Cupones
+Búsqueda por nombre/apellido, DNI/pasaporte o código con tolerancia a errores
+
+- Con pg_trgm (migraciones 0009 y 0014): índices GIN de trigramas sobre los campos
+  normalizados; word_similarity (<%) para fragmentos de nombre o documento
+  y similarity (%) para códigos mal tipeados. Nada recorre cupones completa.
+- Sin la extensión: IndiceBusqueda, un índice invertido de trigramas en
+  memoria por worker con la misma normalización y una puntuación
+  equivalente. La primera búsqueda lanza su construcción en un hilo en
+  segundo plano (mientras tanto responde IndiceNoDisponible) y después se
+  refresca igual con los cupones modificados (updated_at); las búsquedas
+  usan la versión anterior hasta el reemplazo. Pensado para desarrollo e
+  instalaciones pequeñas: ocupa memoria en cada worker.
+
+Resultados ordenados por puntaje (0-1) e id, con paginación por cursor
+(keyset): el cursor codifica el último (puntaje, id) devuelto.
+"""
+
+import math
+import re
+import threading
+import time
+import unicodedata
+import uuid
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from datetime import timedelta
+
+from flask import current_app
+
+from app.utils.db import get_db
+
+
+LONGITUD_MINIMA = 3
+LIMITE_MAXIMO = 50
+
+COLUMNAS_RESULTADO = (
+    'id', 'codigo_alfanumerico', 'nombre', 'apellido', 'dni_pasaporte',
+    'agencia_id', 'fecha_visita', 'estado', 'created_at',
+)
+
+_PALABRA = re.compile(r'[0-9a-z]+')
+_NO_ALFANUMERICO = re.compile(r'[^0-9A-Z]')
+
+
+class ErrorBusqueda(ValueError):
+    """Consulta o cursor inválidos"""
+
+
+class IndiceNoDisponible(ErrorBusqueda):
+    """El índice en memoria todavía se está construyendo"""
+
+
+# ----------------------------------------------------------------------
+# Normalización (misma que normalizar_busqueda/normalizar_documento en SQL)
+# ----------------------------------------------------------------------
+
+def normalizar_texto(texto):
+    """Minúsculas y sin acentos"""
+    descompuesto = unicodedata.normalize('NFKD', texto or '')
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c)).lower()
+
+
+def normalizar_documento(texto):
+    """Sólo letras y dígitos, en mayúsculas"""
+    return _NO_ALFANUMERICO.sub('', (texto or '').upper())
+
+
+def trigramas(texto):
+    """
+    Trigramas al estilo pg_trgm: por palabra, con dos espacios delante y uno detrás.
+
+    Returns:
+        set[str]
+    """
+    resultado = set()
+    for palabra in _PALABRA.findall(texto.lower()):
+        relleno = f'  {palabra} '
+        resultado.update(relleno[i:i + 3] for i in range(len(relleno) - 2))
+    return resultado
+
+
+def codificar_cursor(puntaje, cupon_id):
+    return f'{puntaje!r}:{cupon_id}'
+
+
+def decodificar_cursor(cursor):
+    """
+    Returns:
+        tuple[float, int] | None: (puntaje, id) del último resultado entregado
+
+    Raises:
+        ErrorBusqueda: Cursor mal formado
+    """
+    if not cursor:
+        return None
+    try:
+        puntaje, cupon_id = cursor.split(':')
+        return float(puntaje), int(cupon_id)
+    except ValueError:
+        raise ErrorBusqueda('Cursor inválido')
+
+
+# ----------------------------------------------------------------------
+# Motor pg_trgm
+# ----------------------------------------------------------------------
+
+def buscar_trgm(cur, consulta, limite, cursor=None, agencia_id=None, umbral=0.5):
+    """
+    Búsqueda con los índices de trigramas de la migración 0014.
+
+    Args:
+        cur: Cursor de get_db()
+        consulta (str): Texto buscado
+        limite (int): Resultados por página
+        cursor (tuple[float, int]): Último (puntaje, id) de la página anterior
+        agencia_id (int): Restringe a una agencia
+        umbral (float): word_similarity mínima (0-1)
+
+    Returns:
+        list[dict]: Cupones con su puntaje
+    """
+    # Afecta sólo a esta transacción
+    cur.execute("SELECT set_config('pg_trgm.word_similarity_threshold', %s, true)", (str(umbral),))
+
+    params = {'q': consulta, 'limite': limite, 'agencia_id': agencia_id}
+    filtro_agencia = 'AND c.agencia_id = %(agencia_id)s' if agencia_id is not None else ''
+    filtro_cursor = ''
+    if cursor is not None:
+        params['puntaje'], params['ultimo_id'] = cursor
+        filtro_cursor = 'WHERE (r.puntaje, r.id) < (%(puntaje)s::real, %(ultimo_id)s)'
+
+    columnas = ', '.join(f'c.{c}' for c in COLUMNAS_RESULTADO)
+    # Las expresiones coinciden con las de los índices; normalizar_*(%(q)s)
+    # es IMMUTABLE y se evalúa una vez al planificar ('%%' = operador %)
+    cur.execute(f"""
+        SELECT * FROM (
+            SELECT {columnas},
+                   GREATEST(
+                       word_similarity(normalizar_busqueda(%(q)s), normalizar_busqueda(c.nombre || ' ' || c.apellido)),
+                       word_similarity(normalizar_documento(%(q)s), normalizar_documento(c.dni_pasaporte)),
+                       similarity(upper(%(q)s), upper(c.codigo_alfanumerico))
+                   )::real AS puntaje
+            FROM cupones c
+            WHERE (normalizar_busqueda(%(q)s) <%% normalizar_busqueda(c.nombre || ' ' || c.apellido)
+                   OR normalizar_documento(%(q)s) <%% normalizar_documento(c.dni_pasaporte)
+                   OR upper(%(q)s) %% upper(c.codigo_alfanumerico))
+              {filtro_agencia}
+        ) r
+        {filtro_cursor}
+        ORDER BY r.puntaje DESC, r.id DESC
+        LIMIT %(limite)s
+    """, params)
+    return cur.fetchall()
+
+
+# ----------------------------------------------------------------------
+# Motor en memoria
+# ----------------------------------------------------------------------
+
+_VACIA = array('I')
+
+
+def _coincidencias(postings, consulta, minimo):
+    """
+    Posiciones con al menos 'minimo' trigramas de la consulta.
+
+    Filtro por prefijo: un documento que alcance el mínimo contiene alguno
+    de los (n - minimo + 1) trigramas menos frecuentes, así que sólo esas
+    listas generan candidatos. El resto se comprueba por búsqueda binaria
+    si hay pocos candidatos, o se cuenta entera (en C) si hay muchos: las
+    posiciones que no son candidatas nunca llegan al mínimo.
+    """
+    listas = sorted((postings.get(t, _VACIA) for t in consulta), key=len)
+    prefijo = len(listas) - minimo + 1
+    conteo = Counter()
+    for lista in listas[:prefijo]:
+        conteo.update(lista)
+    for lista in listas[prefijo:]:
+        if len(lista) <= 16 * len(conteo):
+            conteo.update(lista)
+            continue
+        for posicion in list(conteo):
+            i = bisect_left(lista, posicion)
+            if i < len(lista) and lista[i] == posicion:
+                conteo[posicion] += 1
+    return {p: n for p, n in conteo.items() if n >= minimo}
+
+
+class IndiceBusqueda:
+    """
+    Índice invertido de trigramas de nombre, documento y código.
+
+    Cada versión de un cupón ocupa una posición; al refrescar, la versión
+    anterior queda marcada como obsoleta (id 0).
+
+    Args:
+        umbral (float): Fracción mínima de trigramas de la consulta presentes
+        refresco (int): Segundos entre lecturas de cupones modificados
+    """
+
+    CAMPOS = ('nombre', 'documento', 'codigo')
+
+    def __init__(self, umbral=0.5, refresco=30):
+        self.umbral = umbral
+        self.refresco = refresco
+        self._ids = array('i')
+        self._agencias = array('i')
+        self._tamanos = {campo: array('H') for campo in self.CAMPOS}
+        self._postings = {campo: {} for campo in self.CAMPOS}
+        self._posicion = {}
+        self._marca = None
+        self._ultimo_refresco = 0.0
+        self._refrescando = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._posicion)
+
+    @property
+    def listo(self):
+        """Completó al menos una carga completa"""
+        return self._marca is not None
+
+    def agregar(self, filas):
+        """
+        Indexa (o reindexa) cupones.
+
+        Args:
+            filas (iterable[tuple]): (id, agencia_id, nombre, apellido, dni_pasaporte, codigo)
+        """
+        for cupon_id, agencia_id, nombre, apellido, documento, codigo in filas:
+            anterior = self._posicion.get(cupon_id)
+            if anterior is not None:
+                self._ids[anterior] = 0
+
+            posicion = len(self._ids)
+            self._ids.append(cupon_id)
+            self._agencias.append(agencia_id or 0)
+            self._posicion[cupon_id] = posicion
+
+            campos = {
+                'nombre': trigramas(normalizar_texto(f'{nombre} {apellido}')),
+                'documento': trigramas(normalizar_documento(documento)),
+                'codigo': trigramas((codigo or '').lower()),
+            }
+            for campo, grams in campos.items():
+                self._tamanos[campo].append(min(len(grams), 65535))
+                postings = self._postings[campo]
+                for t in grams:
+                    lista = postings.get(t)
+                    if lista is None:
+                        lista = postings[t] = array('I')
+                    lista.append(posicion)
+
+    def buscar(self, consulta, limite, cursor=None, agencia_id=None):
+        """
+        Mejores coincidencias como (puntaje, id), en el mismo orden que buscar_trgm.
+
+        Returns:
+            list[tuple[float, int]]
+        """
+        consultas = {
+            'nombre': trigramas(normalizar_texto(consulta)),
+            'documento': trigramas(normalizar_documento(consulta)),
+            'codigo': trigramas(consulta.lower()),
+        }
+
+        puntajes = {}
+        with self._lock:
+            for campo, grams in consultas.items():
+                if not grams:
+                    continue
+                if campo == 'codigo':
+                    # similarity >= 0.3 (compartidos / unión) exige compartir 0.3 de la consulta
+                    minimo = max(1, math.ceil(0.3 * len(grams)))
+                else:
+                    # word_similarity aproximada: fracción de la consulta presente
+                    minimo = max(1, math.ceil(self.umbral * len(grams)))
+
+                tamanos = self._tamanos[campo]
+                for posicion, compartidos in _coincidencias(self._postings[campo], grams, minimo).items():
+                    if campo == 'codigo':
+                        puntaje = compartidos / (len(grams) + tamanos[posicion] - compartidos)
+                        if puntaje < 0.3:
+                            continue
+                    else:
+                        puntaje = compartidos / len(grams)
+                    if puntaje > puntajes.get(posicion, 0):
+                        puntajes[posicion] = puntaje
+
+            resultados = []
+            for posicion, puntaje in puntajes.items():
+                cupon_id = self._ids[posicion]
+                if not cupon_id or (agencia_id is not None and self._agencias[posicion] != agencia_id):
+                    continue
+                resultados.append((round(puntaje, 6), cupon_id))
+
+        resultados.sort(reverse=True)
+        if cursor is not None:
+            resultados = [r for r in resultados if r < cursor]
+        return resultados[:limite]
+
+    def sincronizar(self, forzar=False):
+        """
+        Carga completa la primera vez; después, cupones con updated_at posterior a la marca.
+
+        La lectura de la BD (y la construcción completa, en un índice nuevo)
+        ocurre fuera del lock: las búsquedas sólo esperan el reemplazo final.
+
+        Returns:
+            bool: False si no tocaba refrescar u otro hilo ya lo está haciendo
+        """
+        with self._lock:
+            if self._refrescando or (not forzar and time.monotonic() - self._ultimo_refresco < self.refresco):
+                return False
+            self._refrescando = True
+            marca = self._marca
+
+        try:
+            nuevo, filas = None, None
+            with get_db() as (conn, cur):
+                cur.execute("SELECT now()::timestamp AS ahora")
+                ahora = cur.fetchone()['ahora']
+                sql = """
+                    SELECT id, agencia_id, nombre, apellido, dni_pasaporte, codigo_alfanumerico
+                    FROM cupones
+                """
+                params = ()
+                if marca is not None:
+                    # Solape: transacciones abiertas durante la pasada anterior
+                    sql += ' WHERE updated_at > %s'
+                    params = (marca - timedelta(minutes=5),)
+                with conn.cursor(name=f'busqueda_{uuid.uuid4().hex}') as lector:
+                    lector.itersize = 5000
+                    lector.execute(sql, params)
+                    if marca is None:
+                        nuevo = IndiceBusqueda(self.umbral, self.refresco)
+                        nuevo.agregar(tuple(fila) for fila in lector)
+                    else:
+                        filas = [tuple(fila) for fila in lector]
+
+            with self._lock:
+                if nuevo is not None:
+                    self._ids, self._agencias = nuevo._ids, nuevo._agencias
+                    self._tamanos, self._postings = nuevo._tamanos, nuevo._postings
+                    self._posicion = nuevo._posicion
+                else:
+                    self.agregar(filas)
+                self._marca = ahora
+                self._ultimo_refresco = time.monotonic()
+        finally:
+            with self._lock:
+                self._refrescando = False
+        return True
+
+    def sincronizar_en_segundo_plano(self, app):
+        """Lanza sincronizar() en un hilo si toca refrescar; nunca bloquea la petición"""
+        if self._refrescando or time.monotonic() - self._ultimo_refresco < self.refresco:
+            return
+
+        def _tarea():
+            with app.app_context():
+                try:
+                    self.sincronizar()
+                except Exception as e:
+                    app.logger.error(f"Error sincronizando el índice de búsqueda: {e}")
+
+        threading.Thread(target=_tarea, name='busqueda-indice', daemon=True).start()
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: cupones, posiciones (incluye versiones obsoletas) y trigramas por campo
+        """
+        return {
+            'cupones': len(self._posicion),
+            'posiciones': len(self._ids),
+            **{f'trigramas_{campo}': len(self._postings[campo]) for campo in self.CAMPOS},
+        }
+
+
+# ----------------------------------------------------------------------
+# API
+# ----------------------------------------------------------------------
+
+class BuscadorCupones:
+    """
+    Elige pg_trgm o el índice en memoria (BUSQUEDA_MOTOR: auto, trgm, memoria).
+    """
+
+    def __init__(self):
+        self.motor = 'auto'
+        self.umbral = 0.5
+        self.indice = IndiceBusqueda()
+        self._trgm = None
+
+    def init_app(self, app):
+        self.motor = app.config['BUSQUEDA_MOTOR']
+        self.umbral = app.config['BUSQUEDA_UMBRAL']
+        self.indice = IndiceBusqueda(self.umbral, app.config['BUSQUEDA_REFRESCO'])
+
+    def usa_trgm(self):
+        """pg_trgm instalado y con el índice de la migración 0014 válido (comprobado una vez por proceso)"""
+        if self.motor != 'auto':
+            return self.motor == 'trgm'
+        if self._trgm is None:
+            with get_db() as (conn, cur):
+                cur.execute("""
+                    SELECT EXISTS (SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm')
+                       AND COALESCE((SELECT indisvalid FROM pg_index
+                                     WHERE indexrelid = to_regclass('public.idx_cupones_busqueda_nombre')),
+                                    false) AS disponible
+                """)
+                self._trgm = cur.fetchone()['disponible']
+        return self._trgm
+
+    def buscar(self, consulta, limite=20, cursor=None, agencia_id=None):
+        """
+        Busca cupones por nombre/apellido, DNI/pasaporte o código.
+
+        Args:
+            consulta (str): Texto buscado (mínimo LONGITUD_MINIMA caracteres)
+            limite (int): Resultados por página (máx. LIMITE_MAXIMO)
+            cursor (str): 'siguiente' de la página anterior
+            agencia_id (int): Restringe a una agencia
+
+        Returns:
+            dict: {'resultados': list[dict], 'siguiente': str | None, 'motor': str}
+
+        Raises:
+            ErrorBusqueda: Consulta demasiado corta o cursor inválido
+            IndiceNoDisponible: El índice en memoria aún no terminó su primera carga
+        """
+        consulta = (consulta or '').strip()
+        if len(consulta) < LONGITUD_MINIMA:
+            raise ErrorBusqueda(f'La búsqueda necesita al menos {LONGITUD_MINIMA} caracteres')
+        limite = max(1, min(limite, LIMITE_MAXIMO))
+        posicion = decodificar_cursor(cursor)
+
+        if self.usa_trgm():
+            motor = 'trgm'
+            with get_db() as (conn, cur):
+                resultados = buscar_trgm(cur, consulta, limite, posicion, agencia_id, self.umbral)
+        else:
+            motor = 'memoria'
+            self.indice.sincronizar_en_segundo_plano(current_app._get_current_object())
+            if not self.indice.listo:
+                raise IndiceNoDisponible('El índice de búsqueda se está construyendo, reintenta en unos segundos')
+            encontrados = self.indice.buscar(consulta, limite, posicion, agencia_id)
+            resultados = self._filas(encontrados)
+
+        siguiente = None
+        if len(resultados) == limite:
+            ultimo = resultados[-1]
+            siguiente = codificar_cursor(ultimo['puntaje'], ultimo['id'])
+        return {'resultados': resultados, 'siguiente': siguiente, 'motor': motor}
+
+    def _filas(self, encontrados):
+        """Lee los cupones encontrados en el índice, en su orden (omite los ya no existentes)"""
+        if not encontrados:
+            return []
+        with get_db() as (conn, cur):
+            cur.execute(
+                f"SELECT {', '.join(COLUMNAS_RESULTADO)} FROM cupones WHERE id = ANY(%s)",
+                ([cupon_id for _, cupon_id in encontrados],)
+            )
+            por_id = {fila['id']: fila for fila in cur.fetchall()}
+        return [
+            {**por_id[cupon_id], 'puntaje': puntaje}
+            for puntaje, cupon_id in encontrados if cupon_id in por_id
+        ]
+
+
+# Instancia compartida por el proceso
+buscador_cupones = BuscadorCupones()
@@ -0,0 +1,503 @@
+"""
+Cache de Dos Niveles para Flask-Caching
+LRU acotado en el proceso delante de Redis, con invalidación por etiquetas
+
+- Nivel 1: LRU por worker (CACHE_LOCAL_MAX entradas, TTL máximo CACHE_LOCAL_TTL)
+  que evita el round trip a Redis en los aciertos frecuentes.
+- Nivel 2: RedisCache si CACHE_REDIS_URL está definido; si no, SimpleCache
+  (mismo comportamiento que antes, por proceso).
+- Etiquetas (agencia, semana, servicio...): cada clave puede asociarse a
+  etiquetas; invalidar una etiqueta borra sus claves en Redis y publica la
+  lista por pub/sub para que cada worker las desaloje de su LRU. Sin Redis
+  el bus es local al proceso.
+- obtener_o_calcular(): recálculo single-flight (un hilo por proceso y, con
+  Redis, un proceso por clave mediante un lock SET NX).
+
+Uso:
+    CACHE_TYPE = 'app.utils.cache_backend.CacheDosNiveles'
+
+    @cacheado(etiquetas=lambda desde, hasta, agencia_id=None: etiquetas_rango(desde, hasta, agencia_id))
+    def consulta(desde, hasta, agencia_id=None): ...
+
+    # Tras confirmar la escritura de un cupón
+    invalidar_etiquetas(*etiquetas_cupon(agencia_id, created_at, servicio))
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from functools import wraps
+
+from flask_caching.backends.base import BaseCache
+from flask_caching.backends.rediscache import RedisCache
+from flask_caching.backends.simplecache import SimpleCache
+
+from app.utils.metricas import metricas
+
+
+CANAL_INVALIDACION = 'cache:invalidaciones'
+
+# Vida de los conjuntos de etiquetas en Redis (se renueva en cada escritura)
+TTL_ETIQUETAS = 24 * 3600
+
+
+class _LRULocal:
+    """
+    LRU acotado y thread-safe con expiración por entrada.
+
+    Args:
+        al_desalojar (callable): Recibe la lista de claves desalojadas por capacidad
+    """
+
+    def __init__(self, max_entradas, ttl_max, al_desalojar=None):
+        self.max_entradas = max_entradas
+        self.ttl_max = ttl_max
+        self.al_desalojar = al_desalojar
+        self._datos = OrderedDict()
+        self._lock = threading.Lock()
+        self.desalojos = 0
+
+    def get(self, clave):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is None:
+                return None
+            valor, expira = entrada
+            if expira < time.monotonic():
+                del self._datos[clave]
+                return None
+            self._datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor, timeout):
+        ttl = self.ttl_max if not timeout else min(timeout, self.ttl_max)
+        desalojadas = []
+        with self._lock:
+            self._datos[clave] = (valor, time.monotonic() + ttl)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                desalojadas.append(self._datos.popitem(last=False)[0])
+                self.desalojos += 1
+        if desalojadas and self.al_desalojar is not None:
+            self.al_desalojar(desalojadas)
+
+    def delete(self, *claves):
+        with self._lock:
+            for clave in claves:
+                self._datos.pop(clave, None)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+
+class CacheDosNiveles(BaseCache):
+    """
+    Backend de Flask-Caching: LRU local + cache remoto con etiquetas.
+
+    Args:
+        remoto (BaseCache): RedisCache o SimpleCache
+        max_local (int): Entradas máximas del LRU local
+        ttl_local (int): Segundos máximos de una entrada en el LRU local
+        default_timeout (int): Timeout por defecto del nivel remoto
+    """
+
+    def __init__(self, remoto, max_local=1000, ttl_local=30, default_timeout=300):
+        super().__init__(default_timeout=default_timeout)
+        self.remoto = remoto
+        self.local = _LRULocal(max_local, ttl_local, al_desalojar=self._desalojadas)
+        self._redis = getattr(remoto, '_write_client', None)
+        # Sin Redis: etiqueta -> claves y su índice inverso (para podarlas)
+        self._etiquetas_locales = {}
+        self._etiquetas_de_clave = {}
+        self._lock = threading.Lock()
+        self._calculando = {}
+        self._suscriptor = None
+        self._contadores = dict.fromkeys(
+            ('hits_local', 'hits_remoto', 'misses', 'escrituras', 'invalidaciones', 'calculos', 'esperas'), 0
+        )
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        if config.get('CACHE_REDIS_URL'):
+            remoto = RedisCache.factory(app, config, [], dict(kwargs))
+        else:
+            remoto = SimpleCache.factory(app, config, [], dict(kwargs))
+        return cls(
+            remoto,
+            max_local=config.get('CACHE_LOCAL_MAX', 1000),
+            ttl_local=config.get('CACHE_LOCAL_TTL', 30),
+            default_timeout=kwargs.get('default_timeout', 300),
+        )
+
+    def _contar(self, nombre, n=1):
+        with self._lock:
+            self._contadores[nombre] += n
+        metricas.cache_eventos.labels(nombre).inc(n)
+
+    # ------------------------------------------------------------------
+    # Bus de invalidación (pub/sub de Redis o local)
+    # ------------------------------------------------------------------
+
+    def _asegurar_suscripcion(self):
+        """Arranca el hilo de pub/sub en el primer uso (después del fork de gunicorn)"""
+        if self._redis is None or (self._suscriptor and self._suscriptor.is_alive()):
+            return
+        with self._lock:
+            if self._suscriptor and self._suscriptor.is_alive():
+                return
+            self._suscriptor = threading.Thread(target=self._escuchar, name='cache-invalidaciones', daemon=True)
+            self._suscriptor.start()
+
+    def _escuchar(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CANAL_INVALIDACION)
+                for mensaje in pubsub.listen():
+                    if mensaje.get('type') != 'message':
+                        continue
+                    datos = json.loads(mensaje['data'])
+                    # Las invalidaciones propias ya se aplicaron al publicar
+                    if datos['origen'] != self._origen():
+                        self.local.delete(*datos['claves'])
+            except Exception:
+                # Conexión perdida: lo cacheado localmente puede estar obsoleto
+                self.local.clear()
+                time.sleep(1)
+
+    def _origen(self):
+        return f'{os.getpid()}:{id(self)}'
+
+    def _publicar(self, claves):
+        self.local.delete(*claves)
+        if self._redis is not None and claves:
+            self._redis.publish(
+                CANAL_INVALIDACION,
+                json.dumps({'origen': self._origen(), 'claves': list(claves)})
+            )
+
+    # ------------------------------------------------------------------
+    # API de BaseCache
+    # ------------------------------------------------------------------
+
+    def get(self, key):
+        self._asegurar_suscripcion()
+        valor = self.local.get(key)
+        if valor is not None:
+            self._contar('hits_local')
+            return valor
+
+        valor = self.remoto.get(key)
+        if valor is None:
+            self._contar('misses')
+            return None
+
+        self._contar('hits_remoto')
+        self.local.set(key, valor, None)
+        return valor
+
+    def set(self, key, value, timeout=None, etiquetas=()):
+        self._asegurar_suscripcion()
+        timeout = self._normalize_timeout(timeout)
+        resultado = self.remoto.set(key, value, timeout=timeout)
+        self._contar('escrituras')
+        # Otros workers pueden tener una versión anterior en su LRU
+        self._publicar([key])
+        self.local.set(key, value, timeout)
+        if etiquetas:
+            self.etiquetar(key, *etiquetas, timeout=timeout)
+        return resultado
+
+    def add(self, key, value, timeout=None):
+        timeout = self._normalize_timeout(timeout)
+        agregado = self.remoto.add(key, value, timeout=timeout)
+        if agregado:
+            self.local.set(key, value, timeout)
+        return agregado
+
+    def delete(self, key):
+        self._publicar([key])
+        self._olvidar([key])
+        return self.remoto.delete(key)
+
+    def delete_many(self, *keys):
+        self._publicar(list(keys))
+        self._olvidar(keys)
+        return self.remoto.delete_many(*keys)
+
+    def has(self, key):
+        return self.local.get(key) is not None or self.remoto.has(key)
+
+    def clear(self):
+        self.local.clear()
+        with self._lock:
+            self._etiquetas_locales.clear()
+            self._etiquetas_de_clave.clear()
+        return self.remoto.clear()
+
+    def inc(self, key, delta=1):
+        self.local.delete(key)
+        return self.remoto.inc(key, delta)
+
+    def dec(self, key, delta=1):
+        self.local.delete(key)
+        return self.remoto.dec(key, delta)
+
+    # ------------------------------------------------------------------
+    # Etiquetas
+    # ------------------------------------------------------------------
+
+    def _clave_etiqueta(self, etiqueta):
+        prefijo = getattr(self.remoto, 'key_prefix', '') or ''
+        if callable(prefijo):
+            prefijo = prefijo()
+        return f'{prefijo}etiqueta:{etiqueta}'
+
+    def _olvidar(self, claves):
+        """Quita las claves de las etiquetas locales (sin Redis)"""
+        if self._redis is not None:
+            return
+        with self._lock:
+            for clave in claves:
+                for etiqueta in self._etiquetas_de_clave.pop(clave, ()):
+                    miembros = self._etiquetas_locales.get(etiqueta)
+                    if miembros is not None:
+                        miembros.discard(clave)
+                        if not miembros:
+                            del self._etiquetas_locales[etiqueta]
+
+    def _desalojadas(self, claves):
+        # Desalojada del LRU: si tampoco sigue en el nivel remoto, su etiqueta ya no la necesita
+        if self._redis is None:
+            self._olvidar([clave for clave in claves if not self.remoto.has(clave)])
+
+    def etiquetar(self, key, *etiquetas, timeout=None):
+        """Asocia la clave a las etiquetas indicadas"""
+        if self._redis is not None:
+            pipe = self._redis.pipeline(transaction=False)
+            for etiqueta in etiquetas:
+                clave_etiqueta = self._clave_etiqueta(etiqueta)
+                pipe.sadd(clave_etiqueta, key)
+                pipe.expire(clave_etiqueta, max(timeout or 0, TTL_ETIQUETAS))
+            pipe.execute()
+        else:
+            with self._lock:
+                for etiqueta in etiquetas:
+                    self._etiquetas_locales.setdefault(etiqueta, set()).add(key)
+                self._etiquetas_de_clave.setdefault(key, set()).update(etiquetas)
+                indexadas = ()
+                if len(self._etiquetas_de_clave) > 2 * self.local.max_entradas:
+                    indexadas = list(self._etiquetas_de_clave)
+            # Claves desalojadas del LRU que expiraron después en el nivel remoto
+            if indexadas:
+                self._olvidar([clave for clave in indexadas if not self.remoto.has(clave)])
+
+    def invalidar_etiquetas(self, *etiquetas):
+        """
+        Borra todas las claves asociadas a las etiquetas en ambos niveles.
+
+        Returns:
+            int: Claves invalidadas
+        """
+        if self._redis is not None:
+            pipe = self._redis.pipeline(transaction=False)
+            for etiqueta in etiquetas:
+                pipe.smembers(self._clave_etiqueta(etiqueta))
+            claves = set()
+            for miembros in pipe.execute():
+                claves |= {m.decode() if isinstance(m, bytes) else m for m in miembros}
+            self._redis.delete(*[self._clave_etiqueta(e) for e in etiquetas])
+        else:
+            with self._lock:
+                claves = set()
+                for etiqueta in etiquetas:
+                    claves |= self._etiquetas_locales.pop(etiqueta, set())
+            self._olvidar(claves)
+
+        if claves:
+            self.remoto.delete_many(*claves)
+            self._publicar(list(claves))
+        self._contar('invalidaciones', len(claves))
+        return len(claves)
+
+    # ------------------------------------------------------------------
+    # Single-flight
+    # ------------------------------------------------------------------
+
+    def obtener_o_calcular(self, key, calcular, timeout=None, etiquetas=(), espera_max=5.0):
+        """
+        Devuelve el valor cacheado o lo calcula una sola vez aunque lleguen
+        muchas peticiones a la vez (protección contra estampida).
+
+        Args:
+            key (str): Clave
+            calcular (callable): Función sin argumentos que produce el valor
+            timeout (int): Timeout de la entrada
+            etiquetas (iterable): Etiquetas para invalidación
+            espera_max (float): Segundos que se espera a otro proceso antes de calcular igualmente
+
+        Returns:
+            Valor cacheado o recién calculado
+        """
+        valor = self.get(key)
+        if valor is not None:
+            return valor
+
+        # Un solo hilo por proceso
+        with self._lock:
+            evento = self._calculando.get(key)
+            propietario = evento is None
+            if propietario:
+                evento = self._calculando[key] = threading.Event()
+
+        if not propietario:
+            self._contar('esperas')
+            evento.wait(espera_max)
+            valor = self.get(key)
+            if valor is not None:
+                return valor
+
+        try:
+            # Un solo proceso por clave (lock distribuido en Redis)
+            lock_redis = None
+            if self._redis is not None:
+                lock_redis = self._redis.lock(f'{self._clave_etiqueta(key)}:lock', timeout=espera_max * 2,
+                                              blocking_timeout=espera_max)
+                if not lock_redis.acquire():
+                    lock_redis = None
+                else:
+                    valor = self.get(key)
+                    if valor is not None:
+                        return valor
+
+            try:
+                self._contar('calculos')
+                valor = calcular()
+                self.set(key, valor, timeout=timeout, etiquetas=etiquetas)
+                return valor
+            finally:
+                if lock_redis is not None:
+                    try:
+                        lock_redis.release()
+                    except Exception:
+                        pass
+        finally:
+            if propietario:
+                with self._lock:
+                    self._calculando.pop(key, None)
+                evento.set()
+
+    def estadisticas(self):
+        """
+        Contadores de aciertos y fallos.
+
+        Returns:
+            dict: hits_local, hits_remoto, misses, escrituras, invalidaciones,
+                  calculos, esperas, desalojos y tamaño del LRU
+        """
+        with self._lock:
+            datos = dict(self._contadores)
+        datos['desalojos'] = self.local.desalojos
+        datos['entradas_local'] = len(self.local)
+        return datos
+
+
+def _lunes(fecha):
+    dia = fecha.date() if hasattr(fecha, 'date') else fecha
+    return dia - timedelta(days=dia.weekday())
+
+
+def etiquetas_cupon(agencia_id=None, fecha=None, servicio=None):
+    """
+    Etiquetas afectadas por la escritura de un cupón.
+
+    Sólo su agencia, su semana y su servicio: la escritura no desaloja las
+    entradas de otras agencias ni de otras semanas.
+
+    Args:
+        agencia_id (int): Agencia del cupón
+        fecha (date | datetime): created_at del cupón (determina la semana)
+        servicio (str): Servicio/actividad del cupón
+
+    Returns:
+        list[str]
+    """
+    etiquetas = []
+    if agencia_id is not None:
+        etiquetas.append(f'agencia:{agencia_id}')
+    if fecha is not None:
+        lunes = _lunes(fecha).isoformat()
+        etiquetas.append(f'semana:{lunes}')
+        if agencia_id is not None:
+            etiquetas.append(f'agencia:{agencia_id}:semana:{lunes}')
+    if servicio is not None:
+        etiquetas.append(f'servicio:{servicio}')
+    return etiquetas
+
+
+def etiquetas_rango(desde, hasta, agencia_id=None):
+    """
+    Etiquetas de una lectura de cupones creados entre dos fechas.
+
+    Una por semana cubierta: 'semana:<lunes>' si abarca todas las agencias o
+    'agencia:<id>:semana:<lunes>' si se limita a una, las mismas que
+    etiquetas_cupon() produce para las escrituras que la afectan.
+
+    Args:
+        desde (date): Primer día
+        hasta (date): Último día
+        agencia_id (int): Agencia a la que se limita la lectura
+
+    Returns:
+        list[str]
+    """
+    prefijo = f'agencia:{agencia_id}:' if agencia_id is not None else ''
+    etiquetas, lunes = [], _lunes(desde)
+    while lunes <= hasta:
+        etiquetas.append(f'{prefijo}semana:{lunes.isoformat()}')
+        lunes += timedelta(days=7)
+    return etiquetas
+
+
+def invalidar_etiquetas(*etiquetas):
+    """Invalida etiquetas en el cache de la app (no-op si el backend no las soporta)"""
+    from app.extensions import cache
+
+    backend = cache.cache
+    if hasattr(backend, 'invalidar_etiquetas'):
+        return backend.invalidar_etiquetas(*etiquetas)
+    return 0
+
+
+def cacheado(timeout=None, etiquetas=None):
+    """
+    Decorador con protección contra estampida y etiquetas.
+
+    Args:
+        timeout (int): Timeout de la entrada
+        etiquetas (callable): Recibe los mismos argumentos que la función y devuelve sus etiquetas
+    """
+    def decorador(f):
+        @wraps(f)
+        def envoltura(*args, **kwargs):
+            from app.extensions import cache
+
+            backend = cache.cache
+            clave = f'{f.__module__}.{f.__qualname__}:{args!r}:{sorted(kwargs.items())!r}'
+            if not hasattr(backend, 'obtener_o_calcular'):
+                return f(*args, **kwargs)
+            return backend.obtener_o_calcular(
+                clave,
+                lambda: f(*args, **kwargs),
+                timeout=timeout,
+                etiquetas=etiquetas(*args, **kwargs) if etiquetas else (),
+            )
+        return envoltura
+    return decorador
@@ -0,0 +1,86 @@
+"""
+Calendario
+Semana natural (lunes a domingo) y semana del mes leídas de la tabla calendario (migración 0010)
+
+La tabla es inmutable, así que cada worker carga un año completo en la
+primera consulta de una fecha de ese año y lo conserva. Las fechas fuera
+de la tabla se calculan con la misma regla que extender_calendario().
+"""
+
+from collections import namedtuple
+from datetime import date, timedelta
+from functools import lru_cache
+
+from app.utils.db import get_db
+
+
+# Horizonte que mantiene el job diario de particiones
+ANIOS_ADELANTO = 10
+
+Semana = namedtuple('Semana', 'año mes semana_mes fecha_inicio_semana fecha_fin_semana')
+
+
+def _calcular(fecha):
+    """Regla de extender_calendario(): la semana pertenece al mes de su lunes"""
+    inicio = fecha - timedelta(days=fecha.weekday())
+    return Semana(inicio.year, inicio.month, -(-inicio.day // 7), inicio, inicio + timedelta(days=6))
+
+
+@lru_cache(maxsize=32)
+def _anio(anio):
+    with get_db() as (conn, cur):
+        cur.execute("""
+            SELECT fecha, "año", mes, semana_mes, fecha_inicio_semana, fecha_fin_semana
+            FROM calendario
+            WHERE fecha >= %s AND fecha < %s
+        """, (date(anio, 1, 1), date(anio + 1, 1, 1)))
+        return {
+            fila['fecha']: Semana(fila['año'], fila['mes'], fila['semana_mes'],
+                                  fila['fecha_inicio_semana'], fila['fecha_fin_semana'])
+            for fila in cur.fetchall()
+        }
+
+
+def semana_natural(fecha):
+    """
+    Semana a la que pertenece una fecha (equivalente a obtener_semana_natural()).
+
+    Args:
+        fecha (date): Día a consultar
+
+    Returns:
+        Semana: año, mes, semana_mes, fecha_inicio_semana, fecha_fin_semana
+    """
+    if hasattr(fecha, 'date'):
+        fecha = fecha.date()
+    return _anio(fecha.year).get(fecha) or _calcular(fecha)
+
+
+def semanas_entre(desde, hasta):
+    """
+    Semanas que tocan el rango, en orden.
+
+    Returns:
+        list[Semana]
+    """
+    semanas, lunes = [], semana_natural(desde).fecha_inicio_semana
+    while lunes <= hasta:
+        semanas.append(semana_natural(lunes))
+        lunes += timedelta(days=7)
+    return semanas
+
+
+def extender_calendario(cur, desde, anios=ANIOS_ADELANTO):
+    """
+    Genera los días que falten desde 'desde' hasta 'anios' años después.
+
+    Args:
+        cur: Cursor de una transacción abierta
+        desde (date): Primer día
+
+    Returns:
+        int: Días añadidos
+    """
+    hasta = date(desde.year + anios, 12, 31)
+    cur.execute("SELECT extender_calendario(%s, %s) AS total", (desde, hasta))
+    return cur.fetchone()['total']
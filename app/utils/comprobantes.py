@@ -0,0 +1,353 @@
+"""
+Motor de Comprobantes PDF
+Genera comprobantes de cupones en un pool de procesos, por unidad o en lote
+
+- Plantilla: la parte estática del comprobante (marco, cabecera, etiquetas,
+  pie) se dibuja una vez por documento como form XObject y cada página sólo
+  la referencia; en un lote de cientos de páginas el PDF la contiene una vez.
+- Pool de procesos: ReportLab es CPU puro; el render sale del worker web a
+  PDF_PROCESOS procesos hijos (creados en el primer uso de cada worker).
+- Lotes: PDF combinado (un documento, una sola tarea) o ZIP con un PDF por
+  cupón (repartido en tareas de PDF_LOTE cupones).
+- Cache: el comprobante individual se guarda por (id, updated_at) en el
+  cache de la app; editar el cupón cambia la clave.
+"""
+
+import io
+import multiprocessing
+import os
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+
+
+# ReportLab se importa en los procesos de render, no al arrancar la app
+mm = 72 / 25.4
+PLANTILLA = 'plantilla_comprobante'
+ANCHO, ALTO = 148 * mm, 210 * mm  # A5
+
+# Posición (y) de cada campo dinámico; las etiquetas van en la plantilla
+CAMPOS = (
+    ('Cliente', 'cliente', 150 * mm),
+    ('DNI / Pasaporte', 'dni_pasaporte', 140 * mm),
+    ('Teléfono', 'telefono', 130 * mm),
+    ('Fecha de visita', 'fecha_visita', 120 * mm),
+    ('Agencia', 'agencia_nombre', 110 * mm),
+    ('Vendedor', 'vendedor', 100 * mm),
+    ('Depósito', 'deposito', 90 * mm),
+    ('Monto total', 'monto_total', 80 * mm),
+    ('Monto abonado', 'monto_parcial', 70 * mm),
+)
+
+CONSULTA_CUPONES = """
+    SELECT c.id, c.codigo_alfanumerico, c.nombre, c.apellido, c.dni_pasaporte,
+           c.telefono, c.fecha_visita, c.vendedor, c.telefono_vendedor, c.deposito,
+           c.monto_total, c.monto_parcial, c.actividades_tour, c.actividades_extras,
+           c.estado, c.updated_at, a.nombre AS agencia_nombre
+    FROM cupones c
+    LEFT JOIN agencias a ON a.id = c.agencia_id
+    WHERE c.id = ANY(%s)
+"""
+
+
+# ----------------------------------------------------------------------
+# Render (se ejecuta en los procesos hijos)
+# ----------------------------------------------------------------------
+
+def _fuentes():
+    """Roboto si está registrada; Helvetica en su defecto"""
+    from reportlab.pdfbase import pdfmetrics
+
+    registradas = pdfmetrics.getRegisteredFontNames()
+    if 'Roboto-Regular' in registradas and 'Roboto-Bold' in registradas:
+        return 'Roboto-Regular', 'Roboto-Bold'
+    return 'Helvetica', 'Helvetica-Bold'
+
+
+def _inicializar_proceso():
+    """Initializer del pool: cada hijo registra las fuentes una sola vez"""
+    from app.utils.fuentes import registrar_fuentes_pdf
+    registrar_fuentes_pdf()
+
+
+def _dibujar_plantilla(c, normal, negrita):
+    """Parte estática del comprobante, definida como form XObject"""
+    c.beginForm(PLANTILLA)
+    c.setStrokeColorRGB(0.2, 0.2, 0.2)
+    c.setLineWidth(1)
+    c.roundRect(8 * mm, 8 * mm, ANCHO - 16 * mm, ALTO - 16 * mm, 4 * mm)
+
+    c.setFillColorRGB(0.12, 0.25, 0.45)
+    c.rect(8 * mm, ALTO - 38 * mm, ANCHO - 16 * mm, 30 * mm, stroke=0, fill=1)
+    c.setFillColorRGB(1, 1, 1)
+    c.setFont(negrita, 18)
+    c.drawString(16 * mm, ALTO - 22 * mm, 'COMPROBANTE DE CUPÓN')
+    c.setFont(normal, 9)
+    c.drawString(16 * mm, ALTO - 30 * mm, 'Presente este comprobante el día de su visita')
+
+    c.setFillColorRGB(0.35, 0.35, 0.35)
+    c.setFont(negrita, 9)
+    for etiqueta, _, y in CAMPOS:
+        c.drawString(16 * mm, y, etiqueta)
+    c.drawString(16 * mm, 58 * mm, 'Actividades')
+
+    c.setStrokeColorRGB(0.8, 0.8, 0.8)
+    c.line(16 * mm, 24 * mm, ANCHO - 16 * mm, 24 * mm)
+    c.setFont(normal, 7)
+    c.drawString(16 * mm, 18 * mm, 'Documento personal e intransferible. Válido sólo para la fecha indicada.')
+    c.endForm()
+
+
+def _valor(cupon, campo):
+    if campo == 'cliente':
+        return f"{cupon.get('nombre', '')} {cupon.get('apellido', '')}".strip()
+    valor = cupon.get(campo)
+    if valor is None:
+        return '-'
+    if campo.startswith('monto'):
+        return f'$ {valor:,.2f}'
+    if hasattr(valor, 'strftime'):
+        return valor.strftime('%d/%m/%Y')
+    return str(valor)
+
+
+def _dibujar_cupon(c, cupon, normal, negrita):
+    c.doForm(PLANTILLA)
+
+    c.setFillColorRGB(1, 1, 1)
+    c.setFont(negrita, 20)
+    c.drawRightString(ANCHO - 16 * mm, ALTO - 24 * mm, cupon['codigo_alfanumerico'])
+
+    c.setFillColorRGB(0.1, 0.1, 0.1)
+    c.setFont(normal, 10)
+    for _, campo, y in CAMPOS:
+        c.drawString(52 * mm, y, _valor(cupon, campo)[:60])
+
+    actividades = list(cupon.get('actividades_tour') or []) + list(cupon.get('actividades_extras') or [])
+    y = 58 * mm
+    for actividad in actividades[:6]:
+        c.drawString(52 * mm, y, f'• {actividad}'[:60])
+        y -= 5 * mm
+
+    if cupon.get('estado') == 'usado':
+        c.setFillColorRGB(0.75, 0.1, 0.1)
+        c.setFont(negrita, 12)
+        c.drawRightString(ANCHO - 16 * mm, 30 * mm, 'UTILIZADO')
+    c.showPage()
+
+
+def renderizar_pdf(cupones):
+    """
+    Renderiza uno o varios cupones en un único PDF (una página por cupón).
+
+    Args:
+        cupones (list[dict]): Filas de CONSULTA_CUPONES
+
+    Returns:
+        bytes: Documento PDF
+    """
+    from reportlab.pdfgen import canvas
+
+    normal, negrita = _fuentes()
+    salida = io.BytesIO()
+    c = canvas.Canvas(salida, pagesize=(ANCHO, ALTO), pageCompression=1)
+    c.setTitle('Comprobantes' if len(cupones) > 1 else f"Comprobante {cupones[0]['codigo_alfanumerico']}")
+    _dibujar_plantilla(c, normal, negrita)
+    for cupon in cupones:
+        _dibujar_cupon(c, cupon, normal, negrita)
+    c.save()
+    return salida.getvalue()
+
+
+def renderizar_individuales(cupones):
+    """
+    Un PDF por cupón (para el ZIP).
+
+    Returns:
+        list[tuple[str, bytes]]: (nombre de archivo, PDF)
+    """
+    return [(f"cupon_{cupon['codigo_alfanumerico']}.pdf", renderizar_pdf([cupon])) for cupon in cupones]
+
+
+# ----------------------------------------------------------------------
+# Motor (proceso web)
+# ----------------------------------------------------------------------
+
+class MotorNoDisponible(Exception):
+    """El pool de render no entregó el comprobante (tiempo agotado o proceso caído)"""
+
+
+class MotorComprobantes:
+    """
+    Pool de procesos y cache de comprobantes.
+
+    Args:
+        procesos (int): Procesos hijos de render
+        tamano_lote (int): Cupones por tarea al generar un ZIP
+        timeout_cache (int): Segundos que se cachea un comprobante individual
+        timeout (float): Segundos máximos de espera por un comprobante o lote
+    """
+
+    def __init__(self, procesos=2, tamano_lote=50, timeout_cache=86400, timeout=30.0):
+        self.procesos = procesos
+        self.tamano_lote = tamano_lote
+        self.timeout_cache = timeout_cache
+        self.timeout = timeout
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._contadores = dict.fromkeys(('renderizados', 'hits_cache', 'lotes', 'timeouts'), 0)
+
+    def init_app(self, app):
+        self.procesos = app.config['PDF_PROCESOS']
+        self.tamano_lote = app.config['PDF_LOTE']
+        self.timeout_cache = app.config['PDF_CACHE_TIMEOUT']
+        self.timeout = app.config['PDF_TIMEOUT']
+
+    def _pool(self):
+        """Crea el pool en el primer uso de cada proceso (nunca antes del fork de gunicorn)"""
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                # forkserver: no se hace fork de un worker con hilos (pool de BD, pub/sub)
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.procesos,
+                    mp_context=multiprocessing.get_context('forkserver'),
+                    initializer=_inicializar_proceso,
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def cerrar(self):
+        """Detiene los procesos de render"""
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _enviar(self, pool, fn, *args):
+        try:
+            return pool.submit(fn, *args)
+        except BrokenProcessPool:
+            self._descartar(pool)
+            raise MotorNoDisponible('El generador de comprobantes se está reiniciando')
+
+    def _descartar(self, pool):
+        """Un proceso de render murió (p. ej. por memoria): el siguiente uso crea otro pool"""
+        with self._lock:
+            if self._executor is pool:
+                self._executor = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _resultados(self, pool, tareas):
+        """
+        Espera las tareas con un plazo total de self.timeout segundos.
+
+        Raises:
+            MotorNoDisponible: Si el plazo se agota o el pool se rompe
+        """
+        limite = time.monotonic() + self.timeout
+        try:
+            for tarea in tareas:
+                yield tarea.result(timeout=max(0, limite - time.monotonic()))
+        except FutureTimeout:
+            # Lo que el pool aún no tomó se cancela; lo demás termina en su proceso
+            for tarea in tareas:
+                tarea.cancel()
+            self._contar('timeouts')
+            raise MotorNoDisponible('Tiempo de espera agotado generando los comprobantes')
+        except BrokenProcessPool:
+            self._descartar(pool)
+            raise MotorNoDisponible('El generador de comprobantes se está reiniciando')
+
+    def _contar(self, nombre, n=1):
+        with self._lock:
+            self._contadores[nombre] += n
+
+    def comprobante(self, cupon):
+        """
+        PDF de un cupón, cacheado por (id, updated_at).
+
+        Args:
+            cupon (dict): Fila de CONSULTA_CUPONES
+
+        Returns:
+            bytes: Documento PDF
+        """
+        from app.extensions import cache
+
+        sello = cupon['updated_at'].timestamp() if cupon.get('updated_at') else 0
+        clave = f"comprobante:{cupon['id']}:{sello}"
+        pdf = cache.get(clave)
+        if pdf is not None:
+            self._contar('hits_cache')
+            return pdf
+
+        pool = self._pool()
+        pdf = next(self._resultados(pool, [self._enviar(pool, renderizar_pdf, [cupon])]))
+        self._contar('renderizados')
+        cache.set(clave, pdf, timeout=self.timeout_cache)
+        return pdf
+
+    def lote_pdf(self, cupones):
+        """Un único PDF con todos los cupones (plantilla compartida por todas las páginas)"""
+        self._contar('lotes')
+        pool = self._pool()
+        pdf = next(self._resultados(pool, [self._enviar(pool, renderizar_pdf, cupones)]))
+        self._contar('renderizados', len(cupones))
+        return pdf
+
+    def lote_zip(self, cupones):
+        """ZIP con un PDF por cupón, renderizado en paralelo por tareas de tamano_lote"""
+        self._contar('lotes')
+        pool = self._pool()
+        tareas = [
+            self._enviar(pool, renderizar_individuales, cupones[i:i + self.tamano_lote])
+            for i in range(0, len(cupones), self.tamano_lote)
+        ]
+
+        salida = io.BytesIO()
+        # Los PDF ya van comprimidos: ZIP_STORED evita recomprimir
+        with zipfile.ZipFile(salida, 'w', compression=zipfile.ZIP_STORED) as zf:
+            for individuales in self._resultados(pool, tareas):
+                for nombre, pdf in individuales:
+                    zf.writestr(nombre, pdf)
+        self._contar('renderizados', len(cupones))
+        return salida.getvalue()
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: procesos, renderizados, hits de cache, lotes y timeouts en este worker
+        """
+        with self._lock:
+            return {'procesos': self.procesos, **self._contadores}
+
+
+# Instancia compartida por el proceso
+motor_comprobantes = MotorComprobantes()
+
+
+def obtener_cupones(ids, agencia_id=None):
+    """
+    Lee los cupones a imprimir, en el orden pedido.
+
+    Args:
+        ids (list[int]): IDs de cupones
+        agencia_id (int): Si se indica, sólo cupones de esa agencia (empleados)
+
+    Returns:
+        list[dict]: Filas encontradas (los IDs inexistentes se omiten)
+    """
+    from app.utils.db import get_db
+
+    sql, params = CONSULTA_CUPONES, [list(ids)]
+    if agencia_id is not None:
+        sql += ' AND c.agencia_id = %s'
+        params.append(agencia_id)
+
+    with get_db() as (conn, cur):
+        cur.execute(sql, params)
+        por_id = {fila['id']: dict(fila) for fila in cur.fetchall()}
+    return [por_id[i] for i in ids if i in por_id]
@@ -0,0 +1,152 @@
+"""
+Peticiones Condicionales y Compresión
+ETags débiles derivados de la versión de los datos y gzip para las respuestas JSON
+
+- @etag_datos('cupones', ...): antes de ejecutar la vista consulta la
+  versión de sus fuentes (FUENTES, una sola sentencia indexada) y, si el
+  navegador ya tiene esa versión (If-None-Match), responde 304 sin
+  ejecutar la consulta completa.
+- La versión es max(updated_at) de cada fuente (por agencia para cupones).
+  Un cambio cuya transacción empezó antes del último updated_at visto pero
+  confirmó después, o un borrado, no la mueven: el ETag incluye además el
+  tramo de ETAG_VIGENCIA segundos en curso, que acota esa obsolescencia.
+- init_compresion(): gzip de las respuestas JSON no streaming mayores que
+  COMPRESION_MIN_BYTES si el cliente lo acepta.
+"""
+
+import gzip
+import hashlib
+import time
+from functools import wraps
+
+from flask import current_app, make_response, request, session
+
+from app.utils.db import get_db
+
+
+# Fuente -> versión (escalar). 'cupones' admite acotarse a una agencia
+FUENTES = {
+    'cupones': "SELECT max(updated_at) FROM cupones",
+    'resumen_semanas': "SELECT max(updated_at) FROM resumen_semanas",
+    'resumen_diario': "SELECT updated_at FROM resumen_diario_watermark WHERE id",
+}
+
+FUENTES_POR_AGENCIA = {
+    'cupones': "SELECT max(updated_at) FROM cupones WHERE agencia_id = %s",
+}
+
+
+def version_datos(fuentes, agencia_id=None):
+    """
+    Versión actual de las fuentes, en una sola sentencia.
+
+    Args:
+        fuentes (tuple[str]): Claves de FUENTES
+        agencia_id (int): Acota las fuentes de FUENTES_POR_AGENCIA
+
+    Returns:
+        tuple: Un valor por fuente
+    """
+    partes, params = [], []
+    for i, fuente in enumerate(fuentes):
+        if agencia_id is not None and fuente in FUENTES_POR_AGENCIA:
+            partes.append(f"({FUENTES_POR_AGENCIA[fuente]}) AS v{i}")
+            params.append(agencia_id)
+        else:
+            partes.append(f"({FUENTES[fuente]}) AS v{i}")
+
+    with get_db() as (conn, cur):
+        cur.execute(f"SELECT {', '.join(partes)}", params)
+        fila = cur.fetchone()
+    return tuple(fila[f'v{i}'] for i in range(len(fuentes)))
+
+
+def _agencia_solicitada():
+    # Mismo alcance que las vistas: los empleados sólo ven su agencia
+    if session.get('rol') == 'empleado':
+        return session.get('agencia_id')
+    return request.args.get('agencia_id', type=int)
+
+
+def calcular_etag(fuentes, agencia_id=None):
+    """
+    ETag de la petición actual: ruta, parámetros, alcance y versión de los datos.
+
+    Returns:
+        str: Valor del ETag (sin comillas ni W/)
+    """
+    vigencia = current_app.config['ETAG_VIGENCIA']
+    clave = (
+        request.path,
+        sorted(request.args.items(multi=True)),
+        agencia_id,
+        version_datos(fuentes, agencia_id),
+        int(time.time() // vigencia) if vigencia else 0,
+    )
+    return hashlib.sha1(repr(clave).encode()).hexdigest()[:20]
+
+
+def _revalidar(respuesta):
+    # Caché privada del navegador que siempre pregunta: la sesión decide el alcance
+    respuesta.cache_control.private = True
+    respuesta.cache_control.no_cache = True
+    respuesta.vary.add('Cookie')
+    return respuesta
+
+
+def etag_datos(*fuentes):
+    """
+    Decorator que responde 304 si los datos de las fuentes no cambiaron.
+
+    Va debajo de los decoradores de acceso (y de @solo_lectura, para que la
+    versión se lea del mismo servidor que los datos).
+
+    Args:
+        fuentes (str): Claves de FUENTES de las que depende la respuesta
+    """
+    desconocidas = [f for f in fuentes if f not in FUENTES]
+    if desconocidas:
+        raise ValueError(f"Fuentes de versión desconocidas: {', '.join(desconocidas)}")
+
+    def decorador(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            etag = calcular_etag(fuentes, _agencia_solicitada())
+            if request.if_none_match.contains_weak(etag):
+                respuesta = current_app.response_class(status=304)
+            else:
+                respuesta = make_response(f(*args, **kwargs))
+                if respuesta.status_code != 200:
+                    return respuesta
+            respuesta.set_etag(etag, weak=True)
+            return _revalidar(respuesta)
+        return decorated_function
+    return decorador
+
+
+def _comprimir(respuesta):
+    config = current_app.config
+    if (
+        respuesta.status_code != 200
+        or respuesta.mimetype != 'application/json'
+        or respuesta.direct_passthrough
+        or respuesta.is_streamed
+        or 'Content-Encoding' in respuesta.headers
+        or not request.accept_encodings['gzip']
+    ):
+        return respuesta
+
+    cuerpo = respuesta.get_data()
+    if len(cuerpo) < config['COMPRESION_MIN_BYTES']:
+        return respuesta
+
+    respuesta.set_data(gzip.compress(cuerpo, compresslevel=config['COMPRESION_NIVEL'], mtime=0))
+    respuesta.headers['Content-Encoding'] = 'gzip'
+    respuesta.vary.add('Accept-Encoding')
+    return respuesta
+
+
+def init_compresion(app):
+    """Comprime con gzip las respuestas JSON (los estáticos se sirven ya comprimidos)"""
+    if app.config['COMPRESION_MIN_BYTES'] > 0:
+        app.after_request(_comprimir)
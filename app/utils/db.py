@@ -0,0 +1,511 @@
+"""
+Conexión a Base de Datos
+Pool de conexiones PostgreSQL con límites por worker, health checks y métricas
+
+- Tamaño por worker: DB_POOL_MIN / DB_POOL_MAX, recortado por el presupuesto
+  total DB_MAX_CONEXIONES repartido entre WEB_CONCURRENCY workers de gunicorn.
+- Desborde: hasta DB_POOL_OVERFLOW conexiones temporales adicionales que se
+  cierran al devolverse.
+- Back-pressure: si no hay conexión disponible se espera como máximo
+  DB_POOL_TIMEOUT segundos y se lanza PoolAgotado.
+- Health check al prestar: las conexiones cerradas o inactivas más de
+  DB_POOL_VERIFICAR_TRAS segundos se validan con SELECT 1 y se reemplazan si
+  fallan (p. ej. tras un failover), sin que la petición lo note.
+"""
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+import psycopg2.extras
+from flask import current_app, g, has_app_context, has_request_context, request, session
+
+from app.utils.metricas import CursorInstrumentado, metricas
+
+
+# Límites superiores (segundos) del histograma de espera
+BUCKETS_ESPERA = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, float('inf'))
+
+
+class PoolAgotado(Exception):
+    """No se obtuvo conexión dentro del tiempo de espera"""
+
+
+class PoolConexiones:
+    """
+    Pool de conexiones bloqueante con desborde acotado.
+
+    Args:
+        dsn (str): URL de conexión
+        minconn (int): Conexiones abiertas al iniciar
+        maxconn (int): Conexiones persistentes máximas
+        overflow (int): Conexiones temporales adicionales
+        timeout (float): Segundos máximos de espera por una conexión
+        verificar_tras (float): Inactividad tras la cual se valida la conexión al prestarla
+    """
+
+    def __init__(self, dsn, minconn=1, maxconn=10, overflow=0, timeout=5.0, verificar_tras=30.0, **kwargs):
+        self.dsn = dsn
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.overflow = overflow
+        self.timeout = timeout
+        self.verificar_tras = verificar_tras
+        self.kwargs = kwargs
+        self.pid = os.getpid()
+
+        self._cond = threading.Condition()
+        self._libres = []          # [(conn, devuelta_en)]
+        self._en_uso = set()
+        self._temporales = set()
+        self._reservadas = 0
+        self._esperando = 0
+        self._creadas = 0
+        self._descartadas = 0
+        self._timeouts = 0
+        self._espera_total = 0.0
+        self._histograma = [0] * len(BUCKETS_ESPERA)
+
+        for _ in range(minconn):
+            self._libres.append((self._conectar(), time.monotonic()))
+
+    def _conectar(self):
+        conn = psycopg2.connect(self.dsn, **self.kwargs)
+        self._creadas += 1
+        return conn
+
+    def _descartar(self, conn):
+        self._descartadas += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _ocupadas(self):
+        return len(self._en_uso) + len(self._libres) + self._reservadas
+
+    def _registrar_espera(self, segundos):
+        self._espera_total += segundos
+        for i, limite in enumerate(BUCKETS_ESPERA):
+            if segundos <= limite:
+                self._histograma[i] += 1
+                break
+
+    def _sana(self, conn, devuelta_en):
+        """Valida la conexión si está cerrada o lleva tiempo inactiva"""
+        if conn.closed:
+            return False
+        if time.monotonic() - devuelta_en < self.verificar_tras:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute('SELECT 1')
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+
+    def obtener(self):
+        """
+        Presta una conexión sana.
+
+        Raises:
+            PoolAgotado: Si no hay conexión disponible dentro de timeout
+        """
+        inicio = time.monotonic()
+        limite = inicio + self.timeout
+
+        with self._cond:
+            while True:
+                if self._libres:
+                    conn, devuelta_en = self._libres.pop()
+                    self._en_uso.add(conn)
+                    break
+                if self._ocupadas() < self.maxconn + self.overflow:
+                    # Reserva el cupo; la conexión se abre fuera del lock
+                    conn, devuelta_en = None, None
+                    self._reservadas += 1
+                    break
+
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    self._timeouts += 1
+                    raise PoolAgotado(
+                        f'Sin conexiones disponibles tras {self.timeout}s '
+                        f'({len(self._en_uso)} en uso, {self._esperando} esperando)'
+                    )
+                self._esperando += 1
+                try:
+                    self._cond.wait(restante)
+                finally:
+                    self._esperando -= 1
+
+            self._registrar_espera(time.monotonic() - inicio)
+
+        if conn is not None:
+            if self._sana(conn, devuelta_en):
+                return conn
+            # Conexión caída (p. ej. failover): se reemplaza conservando el cupo
+            with self._cond:
+                self._en_uso.discard(conn)
+                self._reservadas += 1
+            self._descartar(conn)
+
+        try:
+            conn = self._conectar()
+        except Exception:
+            with self._cond:
+                self._reservadas -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._reservadas -= 1
+            if self._ocupadas() >= self.maxconn:
+                self._temporales.add(conn)
+            self._en_uso.add(conn)
+        return conn
+
+    def devolver(self, conn, cerrar=False):
+        """Devuelve la conexión al pool (las temporales y las rotas se cierran)"""
+        with self._cond:
+            self._en_uso.discard(conn)
+            temporal = conn in self._temporales
+            self._temporales.discard(conn)
+            if cerrar or temporal or conn.closed:
+                self._descartar(conn)
+            else:
+                self._libres.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def cerrar(self):
+        """Cierra todas las conexiones libres"""
+        with self._cond:
+            for conn, _ in self._libres:
+                self._descartar(conn)
+            self._libres.clear()
+
+    def estadisticas(self):
+        """
+        Métricas del pool.
+
+        Returns:
+            dict: en_uso, libres, esperando, límites, contadores e histograma de espera
+        """
+        with self._cond:
+            return {
+                'en_uso': len(self._en_uso),
+                'libres': len(self._libres),
+                'temporales': len(self._temporales),
+                'esperando': self._esperando,
+                'minconn': self.minconn,
+                'maxconn': self.maxconn,
+                'overflow': self.overflow,
+                'creadas': self._creadas,
+                'descartadas': self._descartadas,
+                'timeouts': self._timeouts,
+                'espera_total_segundos': self._espera_total,
+                'espera_buckets': dict(zip(BUCKETS_ESPERA, self._histograma)),
+            }
+
+
+_pools = {}         # 'primario' / 'replica' -> PoolConexiones del proceso
+_pools_config = {}  # 'primario' / 'replica' -> argumentos de PoolConexiones
+_pools_lock = threading.Lock()  # creación perezosa desde los hilos de gthread
+
+# Lecturas dirigidas a la réplica fuera de una petición (en_replica())
+_lectura = contextvars.ContextVar('db_lectura', default=False)
+
+METODOS_LECTURA = ('GET', 'HEAD', 'OPTIONS')
+
+
+def calcular_limites(config, prefijo='DB_POOL', presupuesto='DB_MAX_CONEXIONES'):
+    """
+    Tamaño de un pool por worker a partir de la configuración.
+
+    El máximo por worker es <prefijo>_MAX, recortado para que
+    WEB_CONCURRENCY x (max + overflow) no supere el presupuesto de
+    conexiones del servidor.
+
+    Args:
+        config (dict): Configuración de la app
+        prefijo (str): 'DB_POOL' (primario) o 'DB_REPLICA_POOL'
+        presupuesto (str): Clave con el máximo de conexiones del servidor
+
+    Returns:
+        tuple[int, int, int]: (minconn, maxconn, overflow)
+    """
+    workers = max(1, int(config.get('WEB_CONCURRENCY', 1)))
+    minconn = config.get(f'{prefijo}_MIN', 1)
+    maxconn = config.get(f'{prefijo}_MAX', 10)
+    overflow = config.get(f'{prefijo}_OVERFLOW', 0)
+    maximo = config.get(presupuesto)
+
+    if maximo:
+        por_worker = max(1, maximo // workers)
+        maxconn = min(maxconn, por_worker)
+        overflow = max(0, min(overflow, por_worker - maxconn))
+    minconn = min(minconn, maxconn)
+    return minconn, maxconn, overflow
+
+
+def init_pool(minconn=None, maxconn=None, config=None):
+    """
+    Configura los pools del proceso (primario y, si hay DATABASE_REPLICA_URL, réplica).
+
+    Args:
+        minconn (int): Conexiones iniciales del primario (por defecto según configuración)
+        maxconn (int): Conexiones máximas del primario (por defecto según configuración)
+        config (dict): Configuración de la app (por defecto current_app.config)
+    """
+    if config is None:
+        config = current_app.config if has_app_context() else {}
+    cfg_min, cfg_max, overflow = calcular_limites(config)
+
+    _pools_config.clear()
+    _pools_config['primario'] = {
+        'dsn': config.get('DATABASE_URL') or os.getenv('DATABASE_URL'),
+        'minconn': minconn if minconn is not None else cfg_min,
+        'maxconn': maxconn if maxconn is not None else cfg_max,
+        'overflow': overflow,
+        'timeout': config.get('DB_POOL_TIMEOUT', 5.0),
+        'verificar_tras': config.get('DB_POOL_VERIFICAR_TRAS', 30.0),
+    }
+
+    replica = config.get('DATABASE_REPLICA_URL')
+    if replica:
+        rep_min, rep_max, rep_overflow = calcular_limites(config, 'DB_REPLICA_POOL', 'DB_REPLICA_MAX_CONEXIONES')
+        _pools_config['replica'] = {
+            'dsn': replica,
+            'minconn': rep_min,
+            'maxconn': rep_max,
+            'overflow': rep_overflow,
+            'timeout': config.get('DB_POOL_TIMEOUT', 5.0),
+            'verificar_tras': config.get('DB_POOL_VERIFICAR_TRAS', 30.0),
+            # Una escritura enviada por error a la réplica falla en lugar de perderse
+            'options': '-c default_transaction_read_only=on',
+        }
+        monitor_replica.configurar(config.get('DB_REPLICA_LAG_MAX', 5.0), config.get('DB_REPLICA_VERIFICAR', 2.0))
+
+    # Las conexiones se abren en el primer uso de cada proceso: abrirlas
+    # antes del fork de gunicorn las compartiría entre workers
+    _pools.clear()
+
+
+def _obtener_pool(nombre='primario'):
+    pool = _pools.get(nombre)
+    if pool is None or pool.pid != os.getpid():
+        with _pools_lock:
+            # Otro hilo pudo crearlo mientras se esperaba el lock
+            pool = _pools.get(nombre)
+            if pool is None or pool.pid != os.getpid():
+                if not _pools_config:
+                    init_pool()
+                pool = _pools[nombre] = PoolConexiones(**_pools_config[nombre])
+    return pool
+
+
+def close_pool():
+    """Cierra las conexiones libres de los pools del proceso"""
+    for pool in _pools.values():
+        if pool.pid == os.getpid():
+            pool.cerrar()
+    _pools.clear()
+
+
+class MonitorReplica:
+    """
+    Retraso de replicación medido en la propia réplica (cacheado unos segundos).
+
+    Un servidor que no está en recuperación cuenta como réplica sin retraso:
+    DATABASE_REPLICA_URL puede apuntar a una segunda instancia cualquiera (o
+    a la misma) en desarrollo y pruebas.
+    """
+
+    CONSULTA_LAG = """
+        SELECT CASE
+            WHEN NOT pg_is_in_recovery() THEN 0
+            WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+        END AS lag
+    """
+
+    def __init__(self, lag_max=5.0, verificar=2.0):
+        self.lag_max = lag_max
+        self.verificar = verificar
+        self._lag = None
+        self._medido_en = 0.0
+        self._refrescando = False
+        self._lock = threading.Lock()
+
+    def configurar(self, lag_max, verificar):
+        self.lag_max = lag_max
+        self.verificar = verificar
+        self._medido_en = 0.0
+
+    def lag(self):
+        """
+        Un solo hilo mide a la vez; los demás devuelven la última medición
+        sin esperar la conexión ni la consulta.
+
+        Returns:
+            float | None: Segundos de retraso (None si la réplica no responde)
+        """
+        if time.monotonic() - self._medido_en < self.verificar:
+            return self._lag
+        with self._lock:
+            if self._refrescando or time.monotonic() - self._medido_en < self.verificar:
+                return self._lag
+            self._refrescando = True
+
+        lag, pool, conn = None, _obtener_pool('replica'), None
+        try:
+            conn = pool.obtener()
+            with conn.cursor() as cur:
+                cur.execute(self.CONSULTA_LAG)
+                valor = cur.fetchone()[0]
+            conn.rollback()
+            lag = float(valor) if valor is not None else None
+        except Exception:
+            lag = None
+        finally:
+            if conn is not None:
+                pool.devolver(conn, cerrar=conn.closed)
+            with self._lock:
+                self._lag = lag
+                self._medido_en = time.monotonic()
+                self._refrescando = False
+
+        if lag is not None:
+            metricas.db_replica_lag.set(lag)
+        return lag
+
+    def motivo_desvio(self, escritura_en=None):
+        """
+        Motivo para leer del primario en lugar de la réplica.
+
+        Args:
+            escritura_en (float): time.time() de la última escritura del usuario
+
+        Returns:
+            str | None: 'caida', 'retraso', 'lectura_propia' o None (usar la réplica)
+        """
+        lag = self.lag()
+        if lag is None:
+            return 'caida'
+        if lag > self.lag_max:
+            return 'retraso'
+        # La réplica contiene lo confirmado hasta (ahora - lag): leer del
+        # primario mientras la última escritura del usuario sea posterior
+        if escritura_en and time.time() - escritura_en <= lag + 1:
+            return 'lectura_propia'
+        return None
+
+
+monitor_replica = MonitorReplica()
+
+
+@contextmanager
+def en_replica():
+    """Dirige a la réplica los get_db() del bloque (tareas y scripts de sólo lectura)"""
+    token = _lectura.set(True)
+    try:
+        yield
+    finally:
+        _lectura.reset(token)
+
+
+def _destino(lectura):
+    """'replica' o 'primario' para un get_db()"""
+    if lectura is None:
+        lectura = _lectura.get() or (has_request_context() and g.get('_db_replica', False))
+    if not lectura or 'replica' not in _pools_config:
+        return 'primario'
+
+    escritura_en = session.get('escritura_en') if has_request_context() else None
+    motivo = monitor_replica.motivo_desvio(escritura_en)
+    if motivo is not None:
+        metricas.db_replica_desvios.labels(motivo).inc()
+        return 'primario'
+    return 'replica'
+
+
+def init_lectura_propia(app):
+    """
+    Read-your-writes: una petición de escritura confirmada en el primario
+    deja su hora en la sesión, y las lecturas de ese usuario no van a la
+    réplica hasta que ésta la haya alcanzado.
+    """
+    @app.after_request
+    def _marcar_escritura(respuesta):
+        if g.get('_db_escritura') and respuesta.status_code < 400:
+            session['escritura_en'] = time.time()
+        return respuesta
+
+
+@contextmanager
+def get_db(lectura=None):
+    """
+    Presta una conexión y un cursor (RealDictCursor instrumentado: cada
+    sentencia suma al tiempo SQL de la petición).
+
+    Confirma la transacción al salir sin errores y la revierte si hubo una
+    excepción. Una conexión rota durante el uso se descarta en lugar de
+    volver al pool.
+
+    Las lecturas (lectura=True, en_replica() o rutas con @solo_lectura) van
+    a la réplica si hay una configurada, su retraso es menor que
+    DB_REPLICA_LAG_MAX y ya contiene la última escritura del usuario; si
+    no, al primario.
+
+    Args:
+        lectura (bool): Fuerza el destino (None = según el contexto)
+
+    Yields:
+        tuple: (conn, cur)
+
+    Raises:
+        PoolAgotado: Si no hay conexión disponible dentro de DB_POOL_TIMEOUT
+    """
+    destino = _destino(lectura)
+    pool = _obtener_pool(destino)
+    inicio = time.perf_counter()
+    try:
+        conn = pool.obtener()
+    except PoolAgotado:
+        metricas.db_timeouts.labels(destino).inc()
+        raise
+    metricas.db_checkout.labels(destino).observe(time.perf_counter() - inicio)
+    metricas.db_en_uso.labels(destino).inc()
+
+    rota = False
+    try:
+        with conn.cursor(cursor_factory=CursorInstrumentado) as cur:
+            yield conn, cur
+        conn.commit()
+        if destino == 'primario' and 'replica' in _pools_config and has_request_context() \
+                and request.method not in METODOS_LECTURA:
+            g._db_escritura = True
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        rota = True
+        raise
+    except BaseException:
+        # Incluye GeneratorExit: un generador en streaming cerrado a medias
+        # no debe devolver la conexión con la transacción abierta
+        if not conn.closed:
+            conn.rollback()
+        raise
+    finally:
+        metricas.db_en_uso.labels(destino).dec()
+        pool.devolver(conn, cerrar=rota or conn.closed)
+
+
+def estadisticas_pool(nombre='primario'):
+    """Métricas de un pool del proceso (vacío si aún no se abrió)"""
+    pool = _pools.get(nombre)
+    if pool is None or pool.pid != os.getpid():
+        return {}
+    return pool.estadisticas()
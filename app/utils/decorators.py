@@ -4,9 +4,28 @@ Decoradores para proteger rutas según roles de usuario
 """
 
 from functools import wraps
-from flask import session, redirect, url_for, flash, request, jsonify
+from flask import g, session, redirect, url_for, flash, request, jsonify
 from datetime import datetime, timedelta
 
+from app.utils.sesiones import motivo_sesion_invalida
+
+
+def _sesion_revocada():
+    """
+    Valida la sesión contra el registro de sesiones (sin consulta a la BD).
+
+    Returns:
+        Respuesta 401 / redirect si la sesión fue revocada, None si es válida
+    """
+    motivo = motivo_sesion_invalida()
+    if motivo is None:
+        return None
+    session.clear()
+    if request.path.startswith('/api/'):
+        return jsonify({'msg': motivo}), 401
+    flash(motivo, 'error')
+    return redirect(url_for('auth.login'))
+
 
 def login_required(f):
     """
@@ -15,6 +34,7 @@ def login_required(f):
     Verifica:
     - Usuario tiene sesión activa ('user_id' en session)
     - Sesión no ha expirado (TTL)
+    - Sesión no revocada y usuario/agencia activos (registro de sesiones)
     
     Returns:
         - JSON 401 si es API endpoint
@@ -46,6 +66,11 @@ def login_required(f):
                 flash('Tu sesión ha expirado. Por favor, inicia sesión nuevamente.', 'warning')
                 return redirect(url_for('auth.login'))
         
+        # Usuario/agencia desactivados o sesión cerrada desde otro lugar
+        respuesta = _sesion_revocada()
+        if respuesta is not None:
+            return respuesta
+        
         return f(*args, **kwargs)
     return decorated_function
 
@@ -55,7 +80,7 @@ def admin_required(f):
     Decorator para requerir rol de administrador.
     
     Verifica:
-    - Usuario autenticado
+    - Usuario autenticado y sesión no revocada
     - Rol es 'admin'
     """
     @wraps(f)
@@ -63,6 +88,10 @@ def admin_required(f):
         if 'user_id' not in session:
             return redirect(url_for('auth.login'))
         
+        respuesta = _sesion_revocada()
+        if respuesta is not None:
+            return respuesta
+        
         # Verificar rol 'admin'
         if session.get('rol') != 'admin':
             flash('No tienes permisos para acceder a esta sección', 'error')
@@ -77,7 +106,7 @@ def financiero_required(f):
     Decorator para requerir rol financiero (admin o contador).
     
     Verifica:
-    - Usuario autenticado
+    - Usuario autenticado y sesión no revocada
     - Rol es 'admin' o 'contador'
     """
     @wraps(f)
@@ -85,6 +114,10 @@ def financiero_required(f):
         if 'user_id' not in session:
             return redirect(url_for('auth.login'))
         
+        respuesta = _sesion_revocada()
+        if respuesta is not None:
+            return respuesta
+        
         # Permitir acceso a admin y contador
         user_rol = session.get('rol')
         if user_rol not in ['admin', 'contador']:
@@ -93,3 +126,37 @@ def financiero_required(f):
         
         return f(*args, **kwargs)
     return decorated_function
+
+
+def solo_lectura(f):
+    """
+    Decorator para rutas de sólo lectura (reportes, dashboards).
+    
+    Sus consultas van a la réplica (DATABASE_REPLICA_URL) si está al día;
+    va debajo del decorador de acceso para que la verificación de sesión
+    siga leyendo del primario.
+    """
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        g._db_replica = True
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def agencia_de_sesion():
+    """
+    Agencia a la que se limitan los datos de la petición según el rol.
+
+    Empleados: su agencia (un empleado sin agencia no tiene alcance).
+    Administración (admin, contador): ?agencia_id o todas (None).
+
+    Returns:
+        tuple[bool, int | None]: (permitido, agencia_id)
+    """
+    rol = session.get('rol')
+    if rol == 'empleado':
+        agencia_id = session.get('agencia_id')
+        return agencia_id is not None, agencia_id
+    if rol in ('admin', 'contador'):
+        return True, request.args.get('agencia_id', type=int)
+    return False, None
@@ -0,0 +1,173 @@
+"""
+Estáticos Versionados y Precomprimidos
+Copias con hash de contenido, variantes .br/.gz generadas en el build y caché de larga duración
+
+- compilar_estaticos() (flask estaticos compilar, paso del deploy): por
+  cada archivo de static/ escribe nombre.<hash>.ext, sus variantes .gz y
+  .br (brotli es opcional) si reducen el tamaño, y static/manifest.json
+  con el nombre versionado y el hash SRI de cada original.
+- Estaticos.servir() reemplaza la vista 'static' de Flask: entrega la
+  variante comprimida que acepte el cliente (Vary: Accept-Encoding) y
+  marca los archivos versionados como public, max-age=1 año, immutable.
+  Los no versionados conservan la revalidación por ETag de Flask.
+- Las plantillas usan estatico('js/app.js') e integridad_estatico(...).
+  Todo se sirve desde el mismo origen ('self' en la CSP de Talisman) y el
+  atributo integrity no requiere nonces ni 'unsafe-inline' adicionales.
+"""
+
+import base64
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from flask import request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+MANIFIESTO = 'manifest.json'
+UN_ANIO = 365 * 24 * 3600
+
+# Texto: vale la pena precomprimir (imágenes y fuentes woff2 ya lo están)
+EXTENSIONES_COMPRIMIBLES = ('.js', '.mjs', '.css', '.map', '.json', '.svg', '.html', '.txt', '.ico', '.ttf')
+
+# Variantes en orden de preferencia: (Content-Encoding, sufijo)
+CODIFICACIONES = (('br', '.br'), ('gzip', '.gz'))
+
+_VERSIONADO = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+
+
+def _es_generado(ruta):
+    return ruta.endswith(('.gz', '.br')) or _VERSIONADO.search(ruta) or ruta == MANIFIESTO
+
+
+def _escribir(ruta, contenido):
+    # Escritura atómica: un worker sirviendo durante el build no ve archivos a medias
+    temporal = f'{ruta}.tmp'
+    with open(temporal, 'wb') as f:
+        f.write(contenido)
+    os.replace(temporal, ruta)
+
+
+def compilar_estaticos(directorio, nivel_gzip=9, nivel_brotli=11):
+    """
+    Genera las copias versionadas, sus variantes comprimidas y el manifiesto.
+
+    Las versiones anteriores se conservan: las páginas ya cargadas durante
+    un deploy siguen pidiendo los nombres viejos.
+
+    Args:
+        directorio (str): Carpeta static de la app
+        nivel_gzip (int): Nivel de gzip (1-9)
+        nivel_brotli (int): Calidad de brotli (0-11), si está instalado
+
+    Returns:
+        dict: Nombre lógico -> {'archivo', 'integridad', 'bytes', 'gzip', 'brotli'}
+    """
+    manifiesto = {}
+    for raiz, _, archivos in os.walk(directorio):
+        for nombre in sorted(archivos):
+            ruta = os.path.join(raiz, nombre)
+            relativa = os.path.relpath(ruta, directorio).replace(os.sep, '/')
+            if _es_generado(relativa) or nombre.endswith('.tmp'):
+                continue
+
+            with open(ruta, 'rb') as f:
+                contenido = f.read()
+            base, extension = os.path.splitext(relativa)
+            versionada = f'{base}.{hashlib.sha256(contenido).hexdigest()[:12]}{extension}'
+            destino = os.path.join(directorio, versionada)
+            if not os.path.exists(destino):
+                _escribir(destino, contenido)
+
+            entrada = {
+                'archivo': versionada,
+                'integridad': 'sha384-' + base64.b64encode(hashlib.sha384(contenido).digest()).decode(),
+                'bytes': len(contenido),
+                'gzip': None,
+                'brotli': None,
+            }
+            if extension.lower() in EXTENSIONES_COMPRIMIBLES:
+                variantes = {'gzip': gzip.compress(contenido, compresslevel=nivel_gzip, mtime=0)}
+                if brotli is not None:
+                    variantes['brotli'] = brotli.compress(contenido, quality=nivel_brotli)
+                for codificacion, comprimido in variantes.items():
+                    # Sólo si ahorra: un archivo diminuto puede crecer al comprimirse
+                    if len(comprimido) < len(contenido):
+                        sufijo = '.br' if codificacion == 'brotli' else '.gz'
+                        if not os.path.exists(destino + sufijo):
+                            _escribir(destino + sufijo, comprimido)
+                        entrada[codificacion] = len(comprimido)
+            manifiesto[relativa] = entrada
+
+    _escribir(os.path.join(directorio, MANIFIESTO),
+              json.dumps(manifiesto, indent=2, sort_keys=True).encode())
+    return manifiesto
+
+
+class Estaticos:
+    """Manifiesto de estáticos versionados y vista que los sirve precomprimidos"""
+
+    def __init__(self):
+        self.directorio = None
+        self.manifiesto = {}
+        self._versionados = set()
+
+    def init_app(self, app):
+        self.directorio = app.static_folder
+        self.cargar()
+        app.jinja_env.globals['estatico'] = self.url
+        app.jinja_env.globals['integridad_estatico'] = self.integridad
+        if 'static' in app.view_functions:
+            app.view_functions['static'] = self.servir
+
+    def cargar(self):
+        """Lee static/manifest.json (sin manifiesto se sirven los originales)"""
+        ruta = os.path.join(self.directorio or '', MANIFIESTO)
+        try:
+            with open(ruta, encoding='utf-8') as f:
+                self.manifiesto = json.load(f)
+        except (OSError, ValueError):
+            self.manifiesto = {}
+        self._versionados = {e['archivo'] for e in self.manifiesto.values()}
+
+    def url(self, nombre):
+        """URL del archivo versionado (o del original si no está en el manifiesto)"""
+        entrada = self.manifiesto.get(nombre)
+        return url_for('static', filename=entrada['archivo'] if entrada else nombre)
+
+    def integridad(self, nombre):
+        """Hash SRI para el atributo integrity (None si no está en el manifiesto)"""
+        entrada = self.manifiesto.get(nombre)
+        return entrada['integridad'] if entrada else None
+
+    def servir(self, filename):
+        versionado = filename in self._versionados
+        max_age = UN_ANIO if versionado else None
+        tipo = mimetypes.guess_type(filename)[0]
+
+        respuesta, ruta = None, safe_join(self.directorio, filename)
+        for codificacion, sufijo in CODIFICACIONES:
+            if ruta and request.accept_encodings[codificacion] and os.path.isfile(ruta + sufijo):
+                respuesta = send_from_directory(self.directorio, filename + sufijo, mimetype=tipo, max_age=max_age)
+                respuesta.headers['Content-Encoding'] = codificacion
+                break
+        if respuesta is None:
+            respuesta = send_from_directory(self.directorio, filename, max_age=max_age)
+
+        respuesta.vary.add('Accept-Encoding')
+        if versionado:
+            respuesta.cache_control.public = True
+            respuesta.cache_control.immutable = True
+        return respuesta
+
+
+# Instancia compartida por el proceso
+estaticos = Estaticos()
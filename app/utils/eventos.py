@@ -0,0 +1,317 @@
+"""
+Eventos de Check-in en Tiempo Real
+Reparte los avisos de cupones canjeados (LISTEN/NOTIFY) a los clientes SSE
+
+- Origen: el trigger de la migración 0007 emite NOTIFY 'cupones_checkin'
+  cuando cambia estado o fecha_uso. Cada worker mantiene UNA conexión
+  dedicada en LISTEN (fuera del pool; cuenta como una conexión más por
+  worker) y un hilo que reparte los avisos en memoria. Los clientes no
+  consultan la BD: abrir tablets no añade carga.
+- Alcance: cada suscripción filtra por agencia_id (None = todas).
+- Cola acotada por cliente: si un cliente lento acumula EVENTOS_COLA_MAX
+  eventos se descartan y recibe 'recargar' (vuelve a leer el estado).
+- Reanudación: el id SSE es el de la secuencia global cupones_eventos_seq,
+  igual en todos los workers. Con Last-Event-ID se reenvían los eventos
+  posteriores desde un historial de EVENTOS_HISTORIAL entradas; si el id ya
+  no está cubierto (historial rotado, reconexión del LISTEN) se envía
+  'recargar'. Los eventos llevan el estado completo del cupón, por lo que
+  aplicarlos dos veces es inocuo.
+- EVENTOS_ORIGEN='memoria' no abre LISTEN: los eventos se publican con
+  bus_eventos.publicar() (desarrollo y pruebas sin PostgreSQL).
+"""
+
+import json
+import select
+import threading
+import time
+from collections import deque
+
+import psycopg2
+
+
+CANAL_CHECKIN = 'cupones_checkin'
+RECONEXION_MS = 3000  # 'retry' indicado al EventSource del navegador
+
+# Marca devuelta por Suscripcion.esperar() cuando el cliente debe recargar
+RECARGAR = object()
+
+
+class Suscripcion:
+    """
+    Cola acotada de un cliente SSE.
+
+    Args:
+        agencia_id (int): Agencia cuyos eventos recibe (None = todas)
+        max_cola (int): Eventos pendientes antes de pasar a 'recargar'
+    """
+
+    def __init__(self, agencia_id, max_cola):
+        self.agencia_id = agencia_id
+        self.max_cola = max_cola
+        self._cola = deque()
+        self._desbordada = False
+        self._cond = threading.Condition()
+
+    def admite(self, evento):
+        return self.agencia_id is None or evento.get('agencia_id') == self.agencia_id
+
+    def entregar(self, evento):
+        with self._cond:
+            if len(self._cola) >= self.max_cola:
+                self._cola.clear()
+                self._desbordada = True
+            elif not self._desbordada:
+                self._cola.append(evento)
+            self._cond.notify()
+
+    def forzar_recarga(self):
+        with self._cond:
+            self._cola.clear()
+            self._desbordada = True
+            self._cond.notify()
+
+    def esperar(self, timeout):
+        """
+        Bloquea hasta que haya eventos o venza el timeout.
+
+        Returns:
+            list[dict] | object: Eventos (vacía si venció el timeout) o RECARGAR
+        """
+        with self._cond:
+            if not self._cola and not self._desbordada:
+                self._cond.wait(timeout)
+            if self._desbordada:
+                self._desbordada = False
+                return RECARGAR
+            eventos = list(self._cola)
+            self._cola.clear()
+            return eventos
+
+
+class BusEventos:
+    """
+    Historial y suscripciones de eventos de check-in de un worker.
+
+    Args:
+        historial (int): Eventos recientes guardados para reanudar
+        max_cola (int): Cola máxima por cliente
+    """
+
+    def __init__(self, historial=1000, max_cola=100):
+        self.origen = 'postgres'
+        self.dsn = None
+        self.max_cola = max_cola
+        self.max_clientes = 4
+        self._historial = deque(maxlen=historial)
+        # Los ids <= cobertura pueden no estar en el historial (None: aún sin LISTEN)
+        self._cobertura = None
+        self._ultimo_id = 0
+        self._suscripciones = set()
+        self._lock = threading.Lock()
+        self._oyente = None
+        self._contadores = dict.fromkeys(('recibidos', 'reconexiones', 'recargas'), 0)
+
+    def init_app(self, app):
+        self.origen = app.config['EVENTOS_ORIGEN']
+        self.dsn = app.config['DATABASE_URL']
+        self.max_cola = app.config['EVENTOS_COLA_MAX']
+        self.max_clientes = app.config['EVENTOS_MAX_CLIENTES']
+        self._historial = deque(maxlen=app.config['EVENTOS_HISTORIAL'])
+        if self.origen == 'memoria':
+            self._cobertura = 0
+
+    # ------------------------------------------------------------------
+    # LISTEN (hilo por worker)
+    # ------------------------------------------------------------------
+
+    def _asegurar_oyente(self):
+        """Arranca el hilo LISTEN en el primer cliente (después del fork de gunicorn)"""
+        if self.origen != 'postgres':
+            return
+        if self._oyente and self._oyente.is_alive():
+            return
+        with self._lock:
+            if self._oyente and self._oyente.is_alive():
+                return
+            self._oyente = threading.Thread(target=self._escuchar, name='eventos-checkin', daemon=True)
+            self._oyente.start()
+
+    def _escuchar(self):
+        espera = 1
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.autocommit = True
+                with conn.cursor() as cur:
+                    cur.execute(f'LISTEN {CANAL_CHECKIN}')
+                    # Todo evento con id mayor llegará por este LISTEN
+                    cur.execute('SELECT last_value FROM cupones_eventos_seq')
+                    cobertura = cur.fetchone()[0]
+                self._reanudar(cobertura)
+                espera = 1
+
+                while True:
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        aviso = conn.notifies.pop(0)
+                        self.publicar(json.loads(aviso.payload))
+            except Exception:
+                # Los avisos emitidos mientras no hay LISTEN se pierden
+                time.sleep(espera)
+                espera = min(espera * 2, 30)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+    def _reanudar(self, cobertura):
+        """(Re)conexión del LISTEN: lo anterior a cobertura puede faltar"""
+        with self._lock:
+            reconexion = self._cobertura is not None
+            self._cobertura = max(cobertura, self._cobertura or 0)
+            suscripciones = list(self._suscripciones) if reconexion else []
+            if reconexion:
+                self._contadores['reconexiones'] += 1
+        for suscripcion in suscripciones:
+            suscripcion.forzar_recarga()
+
+    # ------------------------------------------------------------------
+    # Publicación y suscripción
+    # ------------------------------------------------------------------
+
+    def publicar(self, evento):
+        """
+        Reparte un evento a las suscripciones de su agencia.
+
+        Args:
+            evento (dict): Payload del NOTIFY (id, cupon_id, agencia_id, codigo, estado, fecha_uso)
+        """
+        with self._lock:
+            if 'id' not in evento:
+                evento = {**evento, 'id': self._ultimo_id + 1}
+            if len(self._historial) == self._historial.maxlen:
+                self._cobertura = max(self._cobertura or 0, self._historial[0]['id'])
+            self._historial.append(evento)
+            self._ultimo_id = max(self._ultimo_id, evento['id'])
+            self._contadores['recibidos'] += 1
+            destinatarios = [s for s in self._suscripciones if s.admite(evento)]
+        for suscripcion in destinatarios:
+            suscripcion.entregar(evento)
+
+    def _pendientes(self, ultimo_id, agencia_id):
+        """Eventos posteriores a ultimo_id en orden de entrega, o None si no hay cobertura"""
+        historial = list(self._historial)
+        for posicion in range(len(historial) - 1, -1, -1):
+            if historial[posicion]['id'] == ultimo_id:
+                eventos = historial[posicion + 1:]
+                break
+        else:
+            if self._cobertura is None or ultimo_id < self._cobertura:
+                return None
+            eventos = [e for e in historial if e['id'] > ultimo_id]
+        return [e for e in eventos if agencia_id is None or e.get('agencia_id') == agencia_id]
+
+    def suscribir(self, agencia_id, ultimo_id=None):
+        """
+        Registra un cliente y calcula lo que debe reenviarse, de forma atómica.
+
+        Args:
+            agencia_id (int): Alcance del cliente (None = todas las agencias)
+            ultimo_id (int): Last-Event-ID recibido al reconectar
+
+        Returns:
+            tuple[Suscripcion, list | None]: Suscripción y eventos a reenviar
+            (None = el cliente debe recargar), o (None, None) si se alcanzó
+            EVENTOS_MAX_CLIENTES en este worker
+        """
+        self._asegurar_oyente()
+        suscripcion = Suscripcion(agencia_id, self.max_cola)
+        with self._lock:
+            if len(self._suscripciones) >= self.max_clientes:
+                return None, None
+            pendientes = [] if ultimo_id is None else self._pendientes(ultimo_id, agencia_id)
+            if pendientes is None:
+                self._contadores['recargas'] += 1
+            self._suscripciones.add(suscripcion)
+        return suscripcion, pendientes
+
+    def cancelar(self, suscripcion):
+        with self._lock:
+            self._suscripciones.discard(suscripcion)
+
+    @property
+    def ultimo_id(self):
+        return self._ultimo_id
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: origen, clientes, historial, cobertura y contadores de este worker
+        """
+        with self._lock:
+            return {
+                'origen': self.origen,
+                'clientes': len(self._suscripciones),
+                'historial': len(self._historial),
+                'cobertura': self._cobertura,
+                'escuchando': bool(self._oyente and self._oyente.is_alive()),
+                **self._contadores,
+            }
+
+
+# Instancia compartida por el proceso
+bus_eventos = BusEventos()
+
+
+# ----------------------------------------------------------------------
+# Formato SSE
+# ----------------------------------------------------------------------
+
+def _mensaje(evento, datos, id_evento=None):
+    lineas = [f'id: {id_evento}'] if id_evento is not None else []
+    lineas += [f'event: {evento}', f'data: {json.dumps(datos, default=str)}']
+    return '\n'.join(lineas) + '\n\n'
+
+
+def _recargar():
+    # Con el id actual: tras recargar, la reconexión reanuda desde aquí
+    return _mensaje('recargar', {}, bus_eventos.ultimo_id or None)
+
+
+def flujo_sse(suscripcion, pendientes, heartbeat=15, duracion=300):
+    """
+    Generador del cuerpo text/event-stream de un cliente.
+
+    La conexión se cierra tras 'duracion' segundos para liberar el hilo del
+    worker; el navegador reconecta solo enviando Last-Event-ID.
+
+    Args:
+        suscripcion (Suscripcion): Devuelta por bus_eventos.suscribir()
+        pendientes (list | None): Eventos a reenviar (None = recargar)
+        heartbeat (int): Segundos sin eventos antes de enviar un comentario
+        duracion (int): Segundos máximos de la conexión
+
+    Yields:
+        str: Mensajes SSE
+    """
+    try:
+        yield f'retry: {RECONEXION_MS}\n\n'
+        if pendientes is None:
+            yield _recargar()
+        else:
+            for evento in pendientes:
+                yield _mensaje('checkin', evento, evento['id'])
+
+        fin = time.monotonic() + duracion
+        while time.monotonic() < fin:
+            eventos = suscripcion.esperar(min(heartbeat, max(fin - time.monotonic(), 0)))
+            if eventos is RECARGAR:
+                yield _recargar()
+            elif not eventos:
+                yield ': ping\n\n'
+            else:
+                yield ''.join(_mensaje('checkin', e, e['id']) for e in eventos)
+    finally:
+        bus_eventos.cancelar(suscripcion)
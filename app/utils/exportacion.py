@@ -0,0 +1,338 @@
+"""
+Exportación en Streaming
+Exporta cupones y resúmenes semanales en CSV, NDJSON o XLSX con memoria constante
+
+Las filas se leen con un cursor de servidor (named cursor) en lotes de
+TAMANO_LOTE y se serializan a medida que llegan: el primer byte sale en
+cuanto PostgreSQL devuelve el primer lote y la memoria no crece con el
+número de filas. El XLSX se escribe directamente como ZIP en streaming
+(hoja con cadenas inline, sin sharedStrings), sin archivos temporales.
+
+Los textos del CSV que empiezan como una fórmula (=, +, -, @, tabulador o
+retorno de carro) se anteponen con un apóstrofo, salvo números y teléfonos
+(+54 9 ...): un nombre cargado por una agencia no se ejecuta al abrir el
+archivo en Excel. El XLSX no lo necesita: sus celdas son cadenas inline,
+que nunca se evalúan, y conservan el texto tal cual.
+"""
+
+import csv
+import io
+import json
+import re
+import uuid
+import zipfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from flask import Response, stream_with_context
+
+from app.utils.db import get_db
+
+
+TAMANO_LOTE = 2000
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+ESTADOS_CUPON = ('nuevo', 'usado')
+
+COLUMNAS_CUPONES = (
+    'id', 'codigo_alfanumerico', 'nombre', 'apellido', 'dni_pasaporte', 'telefono',
+    'vendedor', 'telefono_vendedor', 'agencia_id', 'fecha_visita', 'deposito',
+    'monto_total', 'monto_parcial', 'actividades_tour', 'actividades_extras',
+    'estado', 'fecha_uso', 'created_at',
+)
+
+COLUMNAS_RESUMEN = (
+    'año', 'mes', 'semana_mes', 'fecha_inicio_semana', 'fecha_fin_semana',
+    'total_cupones', 'monto_total_semana', 'monto_parcial_semana',
+    'cupones_usados', 'cupones_pendientes', 'tasa_conversion', 'ticket_promedio',
+)
+
+
+def consulta_cupones(agencia_id=None, desde=None, hasta=None, estado=None):
+    """
+    SQL de exportación de cupones con filtros opcionales.
+
+    Args:
+        agencia_id (int): Filtrar por agencia
+        desde (date): Fecha de creación inicial (inclusive)
+        hasta (date): Fecha de creación final (inclusive)
+        estado (str): 'nuevo' o 'usado'
+
+    Returns:
+        tuple[str, list]: (sql, parámetros)
+    """
+    condiciones, params = [], []
+    if agencia_id is not None:
+        condiciones.append('agencia_id = %s')
+        params.append(agencia_id)
+    # Rango semiabierto sobre created_at: poda particiones mensuales
+    if desde is not None:
+        condiciones.append('created_at >= %s')
+        params.append(desde)
+    if hasta is not None:
+        condiciones.append('created_at < %s')
+        params.append(hasta + timedelta(days=1))
+    if estado is not None:
+        condiciones.append('estado = %s')
+        params.append(estado)
+
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ''
+    columnas = ', '.join(COLUMNAS_CUPONES)
+    return f'SELECT {columnas} FROM cupones {where} ORDER BY created_at, id', params
+
+
+def consulta_resumen(desde=None, hasta=None):
+    """
+    SQL de exportación de resúmenes semanales.
+
+    Returns:
+        tuple[str, list]: (sql, parámetros)
+    """
+    condiciones, params = [], []
+    if desde is not None:
+        condiciones.append('fecha_inicio_semana >= %s')
+        params.append(desde)
+    if hasta is not None:
+        condiciones.append('fecha_inicio_semana <= %s')
+        params.append(hasta)
+
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ''
+    columnas = ', '.join(f'"{c}"' for c in COLUMNAS_RESUMEN)
+    return f'SELECT {columnas} FROM vista_reportes_semanales {where} ORDER BY fecha_inicio_semana', params
+
+
+def iterar_lotes(sql, params, tamano_lote=TAMANO_LOTE):
+    """
+    Lee el resultado con un cursor de servidor.
+
+    La conexión del pool queda prestada mientras dura la descarga y se
+    devuelve (con rollback) aunque el cliente corte a medias.
+
+    Yields:
+        list[tuple]: Lotes de hasta tamano_lote filas
+    """
+    with get_db() as (conn, _):
+        with conn.cursor(name=f'exportacion_{uuid.uuid4().hex}') as cur:
+            cur.itersize = tamano_lote
+            cur.execute(sql, params)
+            while True:
+                lote = cur.fetchmany(tamano_lote)
+                if not lote:
+                    break
+                yield lote
+
+
+# ----------------------------------------------------------------------
+# Serializadores (cada uno produce bytes por lote)
+# ----------------------------------------------------------------------
+
+# Primer carácter con el que una hoja de cálculo interpreta una fórmula
+_INICIO_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+# Números y teléfonos escritos como texto (+54 9 11 1234-5678, -12.50): no son fórmulas
+_NUMERO_O_TELEFONO = re.compile(r'^[+-]?[\d\s().-]+$')
+
+
+def _texto(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, (list, tuple)):
+        return ', '.join(str(v) for v in valor)
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _texto_csv(valor):
+    """_texto() con las fórmulas neutralizadas (apóstrofo delante): Excel evalúa el CSV al abrirlo"""
+    texto = _texto(valor)
+    if isinstance(valor, (str, list, tuple)) and texto.startswith(_INICIO_FORMULA) \
+            and not _NUMERO_O_TELEFONO.match(texto):
+        return "'" + texto
+    return texto
+
+
+def _json_default(valor):
+    if isinstance(valor, (date, datetime)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    raise TypeError(f'No serializable: {type(valor).__name__}')
+
+
+def generar_csv(columnas, lotes):
+    """CSV con BOM UTF-8 (Excel reconoce la codificación)"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    buffer.write('\ufeff')
+    escritor.writerow(columnas)
+    yield buffer.getvalue().encode('utf-8')
+
+    for lote in lotes:
+        buffer.seek(0)
+        buffer.truncate()
+        escritor.writerows([_texto_csv(v) for v in fila] for fila in lote)
+        yield buffer.getvalue().encode('utf-8')
+
+
+def generar_ndjson(columnas, lotes):
+    """Un objeto JSON por línea"""
+    for lote in lotes:
+        yield ''.join(
+            json.dumps(dict(zip(columnas, fila)), default=_json_default, ensure_ascii=False) + '\n'
+            for fila in lote
+        ).encode('utf-8')
+
+
+class _Tuberia(io.RawIOBase):
+    """Destino no seekable del ZIP: acumula bytes hasta que el generador los entrega"""
+
+    def __init__(self):
+        self._partes = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        return len(datos)
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+
+# Caracteres de control no admitidos en XML 1.0
+_XML_INVALIDO = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_XLSX_ESTATICOS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" '
+        'Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/styles.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+        '<borders count="1"><border/></borders>'
+        '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+        '<cellXfs count="1"><xf/></cellXfs>'
+        '</styleSheet>'
+    ),
+}
+
+
+def _celda_xlsx(valor):
+    if valor is None:
+        return '<c/>'
+    if isinstance(valor, bool):
+        return f'<c t="b"><v>{int(valor)}</v></c>'
+    if isinstance(valor, (int, float, Decimal)):
+        return f'<c><v>{valor}</v></c>'
+    # Siempre cadena inline (nunca <f>): el texto no se evalúa como fórmula
+    texto = escape(_XML_INVALIDO.sub('', _texto(valor)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{texto}</t></is></c>'
+
+
+def generar_xlsx(columnas, lotes, hoja='Datos'):
+    """XLSX de una hoja escrito en streaming (memoria constante)"""
+    tuberia = _Tuberia()
+    with zipfile.ZipFile(tuberia, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for nombre, contenido in _XLSX_ESTATICOS.items():
+            zf.writestr(nombre, contenido)
+        zf.writestr('xl/workbook.xml', (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f'<sheets><sheet name="{escape(hoja)}" sheetId="1" r:id="rId1"/></sheets>'
+            '</workbook>'
+        ))
+
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as hoja_xml:
+            hoja_xml.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                '<row>' + ''.join(_celda_xlsx(c) for c in columnas) + '</row>'
+            ).encode('utf-8'))
+            yield tuberia.vaciar()
+
+            for lote in lotes:
+                hoja_xml.write(''.join(
+                    '<row>' + ''.join(_celda_xlsx(v) for v in fila) + '</row>' for fila in lote
+                ).encode('utf-8'))
+                datos = tuberia.vaciar()
+                if datos:
+                    yield datos
+
+            hoja_xml.write(b'</sheetData></worksheet>')
+
+    yield tuberia.vaciar()
+
+
+GENERADORES = {
+    'csv': generar_csv,
+    'ndjson': generar_ndjson,
+    'xlsx': generar_xlsx,
+}
+
+
+def respuesta_exportacion(nombre, columnas, sql, params, formato):
+    """
+    Response de Flask que transmite la exportación mientras se lee.
+
+    Args:
+        nombre (str): Nombre base del archivo descargado
+        columnas (tuple): Encabezados, en el orden del SELECT
+        sql (str): Consulta de exportación
+        params (list): Parámetros de la consulta
+        formato (str): 'csv', 'ndjson' o 'xlsx'
+
+    Returns:
+        Response: Respuesta en streaming con Content-Disposition de descarga
+    """
+    cuerpo = GENERADORES[formato](columnas, iterar_lotes(sql, params))
+    return Response(
+        stream_with_context(cuerpo),
+        mimetype=FORMATOS[formato],
+        headers={
+            'Content-Disposition': f'attachment; filename="{nombre}.{formato}"',
+            'X-Accel-Buffering': 'no',  # Que el proxy no acumule la respuesta
+            'Cache-Control': 'no-store',
+        },
+    )
@@ -0,0 +1,69 @@
+"""
+Fuentes PDF
+Registro diferido de las fuentes TrueType de ReportLab
+
+Importar ReportLab y leer los TTF cuesta decenas de milisegundos; con el
+arranque diferido sólo lo paga el primer PDF generado en cada worker.
+Los generadores de PDF llaman a registrar_fuentes_pdf() antes de dibujar.
+"""
+
+import os
+import threading
+
+from flask import current_app, has_app_context
+
+
+FUENTES_PDF = {
+    'Roboto-Regular': 'fonts/Roboto-Regular.ttf',
+    'Roboto-Bold': 'fonts/Roboto-Bold.ttf',
+}
+
+_registradas = False
+_lock = threading.Lock()
+
+
+def _ruta_fuente(ruta, app):
+    """Ruta relativa al directorio actual o, si no existe, a la raíz del proyecto"""
+    if os.path.exists(ruta) or app is None:
+        return ruta
+    return os.path.join(os.path.dirname(app.root_path), ruta)
+
+
+def registrar_fuentes_pdf(app=None):
+    """
+    Registra las fuentes una sola vez por proceso (idempotente y thread-safe).
+
+    Args:
+        app (Flask): Aplicación (por defecto current_app si hay contexto)
+
+    Returns:
+        bool: True si las fuentes quedaron registradas
+    """
+    global _registradas
+    if _registradas:
+        return True
+
+    if app is None and has_app_context():
+        app = current_app._get_current_object()
+
+    with _lock:
+        if _registradas:
+            return True
+
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+
+        errores = 0
+        for nombre, ruta in FUENTES_PDF.items():
+            try:
+                pdfmetrics.registerFont(TTFont(nombre, _ruta_fuente(ruta, app)))
+            except Exception as e:
+                errores += 1
+                if app is not None:
+                    app.logger.warning(f"Error al registrar {nombre}: {e}")
+
+        # Aunque falle alguna fuente no se reintenta en cada PDF
+        _registradas = True
+        if app is not None and not errores:
+            app.logger.info("✓ Fuentes PDF registradas correctamente")
+        return errores == 0
@@ -0,0 +1,180 @@
+"""
+Pool de Hashing Argon2id
+Ejecuta hash/verificación de contraseñas en un pool de hilos acotado con control de admisión
+
+Cada verificación Argon2id reserva 64 MB; limitar los hilos limita la memoria
+por worker de gunicorn (max_workers x 64 MB). argon2-cffi libera el GIL durante
+el cálculo, por lo que los hilos trabajan en paralelo sin bloquear el resto de
+peticiones. Cuando el pool y su cola están llenos, se rechaza de inmediato con
+PoolSaturado en lugar de acumular peticiones.
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from app.utils.metricas import metricas
+
+
+# Límites superiores (segundos) del histograma de latencia
+BUCKETS_LATENCIA = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, float('inf'))
+
+
+class PoolSaturado(Exception):
+    """El pool de hashing no admite más trabajos en este momento"""
+
+
+class HashPool:
+    """
+    Pool acotado para operaciones Argon2id.
+
+    Args:
+        max_workers (int): Hilos de cálculo simultáneos
+        max_cola (int): Trabajos en espera admitidos además de los que están en ejecución
+        timeout (float): Segundos máximos de espera por un resultado
+    """
+
+    def __init__(self, max_workers=2, max_cola=8, timeout=5.0):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pendientes = 0
+        self._en_ejecucion = 0
+        self._completados = 0
+        self._rechazados = 0
+        self._timeouts = 0
+        self._espera_total = 0.0
+        self._latencia_total = 0.0
+        self._histograma = [0] * len(BUCKETS_LATENCIA)
+        self.configurar(max_workers, max_cola, timeout)
+
+    def configurar(self, max_workers, max_cola, timeout):
+        """
+        Aplica nuevos límites.
+
+        El executor se crea con el primer trabajo. Si ya está en marcha, se
+        drena: los trabajos nuevos van a un executor con los nuevos cupos y
+        los que estaban en curso terminan y liberan los del semáforo con el
+        que fueron admitidos.
+        """
+        with self._lock:
+            anterior = self._executor
+            self._executor = None
+            self.max_workers = max_workers
+            self.max_cola = max_cola
+            self.timeout = timeout
+            self._cupos = threading.BoundedSemaphore(max_workers + max_cola)
+        if anterior is not None:
+            anterior.shutdown(wait=True)
+
+    def _registrar_latencia(self, segundos):
+        for i, limite in enumerate(BUCKETS_LATENCIA):
+            if segundos <= limite:
+                self._histograma[i] += 1
+                break
+        self._latencia_total += segundos
+
+    def _ejecutar_en_hilo(self, fn, args, encolado_en, cupos):
+        inicio = time.perf_counter()
+        with self._lock:
+            self._pendientes -= 1
+            self._en_ejecucion += 1
+            self._espera_total += inicio - encolado_en
+        try:
+            return fn(*args)
+        finally:
+            duracion = time.perf_counter() - inicio
+            with self._lock:
+                self._en_ejecucion -= 1
+                self._completados += 1
+                self._registrar_latencia(duracion)
+            cupos.release()
+
+    def ejecutar(self, fn, *args):
+        """
+        Ejecuta fn(*args) en el pool y espera el resultado.
+
+        Raises:
+            PoolSaturado: Si no hay cupo libre o el resultado no llega a tiempo
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='argon2')
+            executor, cupos = self._executor, self._cupos
+
+        if not cupos.acquire(blocking=False):
+            with self._lock:
+                self._rechazados += 1
+            metricas.hash_pool_rechazos.inc()
+            raise PoolSaturado('Pool de hashing saturado')
+
+        with self._lock:
+            self._pendientes += 1
+        try:
+            futuro = executor.submit(self._ejecutar_en_hilo, fn, args, time.perf_counter(), cupos)
+        except RuntimeError:
+            # configurar() apagó este executor entre la admisión y el envío
+            with self._lock:
+                self._pendientes -= 1
+                self._rechazados += 1
+            cupos.release()
+            metricas.hash_pool_rechazos.inc()
+            raise PoolSaturado('Pool de hashing reconfigurándose')
+
+        try:
+            return futuro.result(timeout=self.timeout)
+        except FutureTimeout:
+            # El cálculo sigue en curso y libera su cupo al terminar
+            with self._lock:
+                self._timeouts += 1
+            metricas.hash_pool_rechazos.inc()
+            raise PoolSaturado('Tiempo de espera agotado en el pool de hashing')
+
+    def estadisticas(self):
+        """
+        Métricas del pool.
+
+        Returns:
+            dict: Profundidad de cola, hilos ocupados, contadores y histograma de latencia
+        """
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'max_cola': self.max_cola,
+                'en_cola': self._pendientes,
+                'en_ejecucion': self._en_ejecucion,
+                'completados': self._completados,
+                'rechazados': self._rechazados,
+                'timeouts': self._timeouts,
+                'espera_total_segundos': self._espera_total,
+                'latencia_total_segundos': self._latencia_total,
+                'latencia_buckets': dict(zip(BUCKETS_LATENCIA, self._histograma)),
+            }
+
+
+# Instancia compartida por el proceso (se ajusta en init_hash_pool)
+hash_pool = HashPool()
+
+
+def init_hash_pool(app):
+    """Aplica los límites configurados al pool del proceso"""
+    hash_pool.configurar(
+        max_workers=app.config['HASH_POOL_WORKERS'],
+        max_cola=app.config['HASH_POOL_COLA'],
+        timeout=app.config['HASH_POOL_TIMEOUT'],
+    )
+
+
+def verificar_password(password, password_hash):
+    """verify_password ejecutado en el pool acotado (puede lanzar PoolSaturado)"""
+    from app.utils.auth import verify_password
+
+    inicio = time.perf_counter()
+    resultado = hash_pool.ejecutar(verify_password, password, password_hash)
+    metricas.argon2_verificacion.observe(time.perf_counter() - inicio)
+    return resultado
+
+
+def hashear_password(password):
+    """hash_password ejecutado en el pool acotado (puede lanzar PoolSaturado)"""
+    from app.utils.auth import hash_password
+    return hash_pool.ejecutar(hash_password, password)
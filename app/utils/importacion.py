@@ -0,0 +1,329 @@
+"""
+Importación Masiva de Cupones
+Carga miles de cupones desde CSV con COPY a una tabla staging y un merge set-based
+
+1. Validación por fila en Python (campos obligatorios, fechas, montos).
+2. COPY de las filas válidas a una tabla temporal.
+3. Validación contra la BD en bloque (agencias activas, códigos repetidos).
+4. Reserva de códigos sin colisiones (reservar_codigos_cupones, migración 0006)
+   para las filas sin código, e INSERT ... SELECT único en cupones: los
+   triggers de estadísticas y de códigos se ejecutan una vez por lote.
+
+Por defecto la importación es todo o nada: si alguna fila tiene errores no
+se inserta ninguna y se devuelven los errores por fila. Con parcial=True se
+insertan las válidas.
+
+Tras el COMMIT se invalidan en el cache las etiquetas de los cupones
+insertados (etiquetas_cupon: agencia, semana y servicio).
+"""
+
+import csv
+import io
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+
+COLUMNAS_OBLIGATORIAS = ('nombre', 'apellido', 'dni_pasaporte', 'fecha_visita', 'deposito', 'monto_total')
+
+# Orden de columnas en la tabla staging (y en el COPY)
+COLUMNAS_STAGING = (
+    'fila', 'codigo_alfanumerico', 'nombre', 'apellido', 'dni_pasaporte', 'fecha_visita',
+    'agencia_id', 'deposito', 'monto_total', 'monto_parcial', 'actividades_tour',
+    'actividades_extras', 'telefono', 'vendedor', 'telefono_vendedor',
+)
+
+LONGITUDES = {
+    'codigo_alfanumerico': 6, 'nombre': 255, 'apellido': 255, 'dni_pasaporte': 50,
+    'deposito': 20, 'telefono': 20, 'vendedor': 255, 'telefono_vendedor': 20,
+}
+
+# Separador de actividades dentro de una celda
+SEPARADOR_ACTIVIDADES = '|'
+
+
+class ErrorImportacion(Exception):
+    """El archivo no puede procesarse (formato, encabezados o tamaño)"""
+
+
+def _error(fila, campo, mensaje):
+    return {'fila': fila, 'campo': campo, 'mensaje': mensaje}
+
+
+def validar_fila(numero, fila, agencia_id=None):
+    """
+    Normaliza y valida una fila del CSV.
+
+    Args:
+        numero (int): Número de fila en el archivo (1 = primera fila de datos)
+        fila (dict): Fila leída por csv.DictReader
+        agencia_id (int): Agencia forzada (empleados); si es None se lee de la fila
+
+    Returns:
+        tuple[dict | None, list[dict]]: (fila normalizada, errores)
+    """
+    datos = {k: (v or '').strip() for k, v in fila.items() if k}
+    errores = []
+
+    for campo in COLUMNAS_OBLIGATORIAS:
+        if not datos.get(campo):
+            errores.append(_error(numero, campo, 'Campo obligatorio'))
+
+    for campo, maximo in LONGITUDES.items():
+        if len(datos.get(campo, '')) > maximo:
+            errores.append(_error(numero, campo, f'Máximo {maximo} caracteres'))
+
+    codigo = datos.get('codigo_alfanumerico', '').upper()
+    if codigo and (len(codigo) != 6 or not codigo.isalnum()):
+        errores.append(_error(numero, 'codigo_alfanumerico', 'Debe tener 6 caracteres alfanuméricos'))
+
+    fecha_visita = None
+    if datos.get('fecha_visita'):
+        try:
+            fecha_visita = date.fromisoformat(datos['fecha_visita'])
+        except ValueError:
+            errores.append(_error(numero, 'fecha_visita', 'Fecha inválida, usa AAAA-MM-DD'))
+
+    montos = {}
+    for campo in ('monto_total', 'monto_parcial'):
+        valor = datos.get(campo) or ('0' if campo == 'monto_parcial' else '')
+        if not valor:
+            continue
+        try:
+            montos[campo] = Decimal(valor.replace(',', '.'))
+        except InvalidOperation:
+            errores.append(_error(numero, campo, 'Monto inválido'))
+            continue
+        if not montos[campo].is_finite() or montos[campo] < 0 or montos[campo] >= Decimal('100000000'):
+            errores.append(_error(numero, campo, 'Monto fuera de rango'))
+            del montos[campo]
+    if montos.get('monto_parcial', 0) > montos.get('monto_total', Decimal('Infinity')):
+        errores.append(_error(numero, 'monto_parcial', 'No puede superar el monto total'))
+
+    if agencia_id is None:
+        try:
+            agencia_id = int(datos.get('agencia_id', ''))
+        except ValueError:
+            errores.append(_error(numero, 'agencia_id', 'Agencia obligatoria (número)'))
+
+    if errores:
+        return None, errores
+
+    return {
+        'fila': numero,
+        'codigo_alfanumerico': codigo or None,
+        'nombre': datos['nombre'],
+        'apellido': datos['apellido'],
+        'dni_pasaporte': datos['dni_pasaporte'],
+        'fecha_visita': fecha_visita.isoformat(),
+        'agencia_id': agencia_id,
+        'deposito': datos['deposito'],
+        'monto_total': montos['monto_total'],
+        'monto_parcial': montos.get('monto_parcial', Decimal('0')),
+        'actividades_tour': datos.get('actividades_tour') or None,
+        'actividades_extras': datos.get('actividades_extras') or None,
+        'telefono': datos.get('telefono') or None,
+        'vendedor': datos.get('vendedor') or None,
+        'telefono_vendedor': datos.get('telefono_vendedor') or None,
+    }, []
+
+
+def leer_csv(archivo, agencia_id=None, max_filas=20000):
+    """
+    Lee y valida el CSV completo.
+
+    Args:
+        archivo: Flujo de texto con encabezados en la primera línea
+        agencia_id (int): Agencia forzada para todas las filas
+        max_filas (int): Límite de filas por importación
+
+    Returns:
+        tuple[list[dict], list[dict]]: (filas válidas, errores por fila)
+
+    Raises:
+        ErrorImportacion: Si faltan encabezados o se supera max_filas
+    """
+    lector = csv.DictReader(archivo)
+    encabezados = {c.strip().lstrip('\ufeff') for c in (lector.fieldnames or [])}
+    faltan = [c for c in COLUMNAS_OBLIGATORIAS if c not in encabezados]
+    if agencia_id is None and 'agencia_id' not in encabezados:
+        faltan.append('agencia_id')
+    if faltan:
+        raise ErrorImportacion(f"Faltan columnas: {', '.join(faltan)}")
+    lector.fieldnames = [c.strip().lstrip('\ufeff') for c in lector.fieldnames]
+
+    validas, errores = [], []
+    vistos = {}
+    for numero, fila in enumerate(lector, start=1):
+        if numero > max_filas:
+            raise ErrorImportacion(f'Máximo {max_filas} filas por importación')
+        normalizada, errores_fila = validar_fila(numero, fila, agencia_id)
+        if errores_fila:
+            errores.extend(errores_fila)
+            continue
+
+        codigo = normalizada['codigo_alfanumerico']
+        if codigo and codigo in vistos:
+            errores.append(_error(numero, 'codigo_alfanumerico', f'Código repetido en la fila {vistos[codigo]}'))
+            continue
+        if codigo:
+            vistos[codigo] = numero
+        validas.append(normalizada)
+
+    return validas, errores
+
+
+def _buffer_copy(filas):
+    """CSV en memoria con el orden de COLUMNAS_STAGING (NULL = celda vacía sin comillas)"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    for fila in filas:
+        escritor.writerow(['' if fila[c] is None else fila[c] for c in COLUMNAS_STAGING])
+    buffer.seek(0)
+    return buffer
+
+
+def importar_cupones(filas, empleado_id=None, parcial=False, validar_solo=False):
+    """
+    Inserta las filas validadas en una sola transacción.
+
+    Args:
+        filas (list[dict]): Filas devueltas por leer_csv
+        empleado_id (int): Usuario que realiza la importación
+        parcial (bool): Insertar las filas válidas aunque otras fallen
+        validar_solo (bool): Ejecutar todas las validaciones sin insertar
+
+    Returns:
+        dict: {'insertados': int, 'errores': [...], 'cupones': [{'fila', 'id', 'codigo'}]}
+    """
+    from flask import current_app
+
+    from app.utils.cache_backend import etiquetas_cupon, invalidar_etiquetas
+    from app.utils.db import get_db
+
+    resultado = {'insertados': 0, 'errores': [], 'cupones': []}
+    if not filas:
+        return resultado
+
+    with get_db() as (conn, cur):
+        cur.execute("""
+            CREATE TEMP TABLE importacion_cupones (
+                fila integer PRIMARY KEY,
+                codigo_alfanumerico varchar(6),
+                nombre varchar(255) NOT NULL,
+                apellido varchar(255) NOT NULL,
+                dni_pasaporte varchar(50) NOT NULL,
+                fecha_visita date NOT NULL,
+                agencia_id integer NOT NULL,
+                deposito varchar(20) NOT NULL,
+                monto_total numeric(10,2) NOT NULL,
+                monto_parcial numeric(10,2) NOT NULL,
+                actividades_tour text,
+                actividades_extras text,
+                telefono varchar(20),
+                vendedor varchar(255),
+                telefono_vendedor varchar(20)
+            ) ON COMMIT DROP
+        """)
+        cur.copy_expert(
+            f"COPY importacion_cupones ({', '.join(COLUMNAS_STAGING)}) FROM STDIN WITH (FORMAT csv)",
+            _buffer_copy(filas)
+        )
+
+        # Validaciones contra la BD, en bloque
+        cur.execute("""
+            SELECT s.fila, 'agencia_id' AS campo, 'Agencia inexistente o inactiva' AS mensaje
+            FROM importacion_cupones s
+            LEFT JOIN agencias a ON a.id = s.agencia_id
+            WHERE a.id IS NULL OR a.activo IS NOT TRUE
+            UNION ALL
+            SELECT s.fila, 'codigo_alfanumerico', 'El código ya existe'
+            FROM importacion_cupones s
+            JOIN cupones_codigos cc ON cc.codigo_alfanumerico = s.codigo_alfanumerico
+            ORDER BY 1
+        """)
+        errores_bd = [dict(e) for e in cur.fetchall()]
+        resultado['errores'] = errores_bd
+
+        if errores_bd:
+            cur.execute(
+                "DELETE FROM importacion_cupones WHERE fila = ANY(%s)",
+                (sorted({e['fila'] for e in errores_bd}),)
+            )
+        if validar_solo or (errores_bd and not parcial):
+            conn.rollback()
+            return resultado
+
+        # Códigos para las filas que no traen uno propio
+        cur.execute("""
+            WITH sin_codigo AS (
+                SELECT fila, row_number() OVER (ORDER BY fila)::integer AS orden
+                FROM importacion_cupones
+                WHERE codigo_alfanumerico IS NULL
+            )
+            UPDATE importacion_cupones s
+            SET codigo_alfanumerico = r.codigo
+            FROM sin_codigo sc
+            JOIN reservar_codigos_cupones((SELECT COUNT(*)::integer FROM sin_codigo)) r
+                ON r.orden = sc.orden
+            WHERE s.fila = sc.fila
+        """)
+
+        cur.execute("""
+            INSERT INTO cupones (
+                codigo_alfanumerico, nombre, apellido, dni_pasaporte, fecha_visita,
+                agencia_id, deposito, monto_total, monto_parcial,
+                actividades_tour, actividades_extras, telefono, vendedor,
+                telefono_vendedor, empleado_id
+            )
+            SELECT
+                codigo_alfanumerico, nombre, apellido, dni_pasaporte, fecha_visita,
+                agencia_id, deposito, monto_total, monto_parcial,
+                COALESCE(string_to_array(actividades_tour, %(sep)s), '{}'),
+                COALESCE(string_to_array(actividades_extras, %(sep)s), '{}'),
+                telefono, vendedor, telefono_vendedor, %(empleado_id)s
+            FROM importacion_cupones
+            ORDER BY fila
+            RETURNING id, codigo_alfanumerico, agencia_id, created_at, actividades_tour
+        """, {'sep': SEPARADOR_ACTIVIDADES, 'empleado_id': empleado_id})
+        filas_insertadas = cur.fetchall()
+        insertados = {fila['codigo_alfanumerico']: fila['id'] for fila in filas_insertadas}
+
+        cur.execute("SELECT fila, codigo_alfanumerico FROM importacion_cupones ORDER BY fila")
+        resultado['cupones'] = [
+            {'fila': f['fila'], 'id': insertados[f['codigo_alfanumerico']], 'codigo': f['codigo_alfanumerico']}
+            for f in cur.fetchall()
+        ]
+        resultado['insertados'] = len(insertados)
+        conn.commit()
+
+    etiquetas = set()
+    for fila in filas_insertadas:
+        for servicio in fila['actividades_tour'] or (None,):
+            etiquetas.update(etiquetas_cupon(fila['agencia_id'], fila['created_at'], servicio))
+    try:
+        invalidar_etiquetas(*sorted(etiquetas))
+    except Exception as e:
+        # Los cupones ya están confirmados: un fallo del cache no debe invitar a reimportar
+        current_app.logger.warning(f"Error invalidando el cache tras la importación: {e}")
+
+    return resultado
+
+
+def importar_csv(archivo, agencia_id=None, empleado_id=None, parcial=False, validar_solo=False, max_filas=20000):
+    """
+    Lee, valida e importa un CSV de cupones.
+
+    Returns:
+        dict: {'insertados', 'errores' (de archivo y de BD, por fila), 'cupones'}
+
+    Raises:
+        ErrorImportacion: Si el archivo no tiene el formato esperado
+    """
+    validas, errores = leer_csv(archivo, agencia_id, max_filas)
+    # Con errores de formato y sin modo parcial igual se validan las demás
+    # filas contra la BD para devolver la lista completa
+    resultado = importar_cupones(
+        validas, empleado_id, parcial=parcial, validar_solo=validar_solo or (bool(errores) and not parcial)
+    )
+    resultado['errores'] = sorted(errores + resultado['errores'], key=lambda e: e['fila'])
+    return resultado
@@ -0,0 +1,225 @@
+"""
+Almacenamiento SQLite para Flask-Limiter
+Contadores de rate limiting compartidos entre workers de gunicorn sin Redis
+
+Registra el esquema 'sqlite://' en limits. El archivo se ubica por defecto en
+/dev/shm (memoria compartida), de modo que todos los workers de la máquina ven
+los mismos contadores con latencias de microsegundos. Cada operación es una
+única sentencia o una transacción IMMEDIATE, atómica entre procesos.
+
+    RATELIMIT_STORAGE_URI = "sqlite:////dev/shm/agencias_ratelimit.sqlite"
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from math import floor
+
+from limits.storage.base import (
+    MovingWindowSupport,
+    SlidingWindowCounterSupport,
+    Storage,
+    TimestampedSlidingWindow,
+)
+
+
+# Cada cuántas operaciones se purgan las claves expiradas
+INTERVALO_PURGA = 1000
+
+
+class SQLiteStorage(Storage, MovingWindowSupport, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """
+    Storage de limits respaldado por un archivo SQLite local.
+
+    Soporta las estrategias fixed-window, moving-window y sliding-window-counter.
+    """
+
+    STORAGE_SCHEME = ['sqlite']
+
+    def __init__(self, uri=None, wrap_exceptions=False, **options):
+        self.ruta = uri.split('://', 1)[1] if uri and '://' in uri else ':memory:'
+        self.timeout = float(options.get('timeout', 5))
+        self._local = threading.local()
+        self._operaciones = 0
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self._crear_esquema()
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    # ------------------------------------------------------------------
+    # Conexión (una por hilo y por proceso: no se comparte tras un fork)
+    # ------------------------------------------------------------------
+
+    def _conexion(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.ruta, timeout=self.timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _crear_esquema(self):
+        conn = self._conexion()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS contadores (
+                clave TEXT PRIMARY KEY,
+                valor INTEGER NOT NULL,
+                expira REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS eventos (
+                clave TEXT NOT NULL,
+                ts REAL NOT NULL,
+                expira REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_eventos_clave_ts ON eventos (clave, ts);
+        """)
+
+    def _purgar_si_toca(self, conn, ahora):
+        self._operaciones += 1
+        if self._operaciones % INTERVALO_PURGA == 0:
+            conn.execute('DELETE FROM contadores WHERE expira <= ?', (ahora,))
+            conn.execute('DELETE FROM eventos WHERE expira <= ?', (ahora,))
+
+    # ------------------------------------------------------------------
+    # Fixed window
+    # ------------------------------------------------------------------
+
+    def incr(self, key, expiry, amount=1):
+        ahora = time.time()
+        conn = self._conexion()
+        self._purgar_si_toca(conn, ahora)
+        fila = conn.execute("""
+            INSERT INTO contadores (clave, valor, expira) VALUES (?, ?, ?)
+            ON CONFLICT (clave) DO UPDATE SET
+                valor = CASE WHEN expira <= ? THEN excluded.valor ELSE valor + excluded.valor END,
+                expira = CASE WHEN expira <= ? THEN excluded.expira ELSE expira END
+            RETURNING valor
+        """, (key, amount, ahora + expiry, ahora, ahora)).fetchone()
+        return fila[0]
+
+    def get(self, key):
+        fila = self._conexion().execute(
+            'SELECT valor FROM contadores WHERE clave = ? AND expira > ?', (key, time.time())
+        ).fetchone()
+        return fila[0] if fila else 0
+
+    def get_expiry(self, key):
+        ahora = time.time()
+        fila = self._conexion().execute(
+            'SELECT expira FROM contadores WHERE clave = ? AND expira > ?', (key, ahora)
+        ).fetchone()
+        return fila[0] if fila else ahora
+
+    def clear(self, key):
+        conn = self._conexion()
+        conn.execute('DELETE FROM contadores WHERE clave = ?', (key,))
+        conn.execute('DELETE FROM eventos WHERE clave = ?', (key,))
+
+    def check(self):
+        try:
+            self._conexion().execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        conn = self._conexion()
+        total = conn.execute(
+            'SELECT (SELECT COUNT(*) FROM contadores) + (SELECT COUNT(DISTINCT clave) FROM eventos)'
+        ).fetchone()[0]
+        conn.execute('DELETE FROM contadores')
+        conn.execute('DELETE FROM eventos')
+        return total
+
+    # ------------------------------------------------------------------
+    # Moving window
+    # ------------------------------------------------------------------
+
+    def acquire_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+
+        ahora = time.time()
+        conn = self._conexion()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM eventos WHERE clave = ? AND ts <= ?', (key, ahora - expiry))
+            usados = conn.execute('SELECT COUNT(*) FROM eventos WHERE clave = ?', (key,)).fetchone()[0]
+            if usados + amount > limit:
+                conn.execute('COMMIT')
+                return False
+            conn.executemany(
+                'INSERT INTO eventos (clave, ts, expira) VALUES (?, ?, ?)',
+                [(key, ahora, ahora + expiry)] * amount
+            )
+            conn.execute('COMMIT')
+            return True
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get_moving_window(self, key, limit, expiry):
+        ahora = time.time()
+        inicio, usados = self._conexion().execute(
+            'SELECT MIN(ts), COUNT(*) FROM eventos WHERE clave = ? AND ts > ?',
+            (key, ahora - expiry)
+        ).fetchone()
+        return (inicio if usados else ahora), usados
+
+    # ------------------------------------------------------------------
+    # Sliding window counter
+    # ------------------------------------------------------------------
+
+    def _info_ventana(self, conn, previa, actual, expiry, ahora):
+        valores = dict(conn.execute(
+            'SELECT clave, valor FROM contadores WHERE clave IN (?, ?) AND expira > ?',
+            (previa, actual, ahora)
+        ).fetchall())
+        conteo_previo = valores.get(previa, 0)
+        conteo_actual = valores.get(actual, 0)
+        ttl_previo = 0.0 if conteo_previo == 0 else (1 - (((ahora - expiry) / expiry) % 1)) * expiry
+        ttl_actual = (1 - ((ahora / expiry) % 1)) * expiry + expiry
+        return conteo_previo, ttl_previo, conteo_actual, ttl_actual
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+
+        ahora = time.time()
+        previa, actual = self.sliding_window_keys(key, expiry, ahora)
+        conn = self._conexion()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conteo_previo, ttl_previo, conteo_actual, _ = self._info_ventana(
+                conn, previa, actual, expiry, ahora
+            )
+            if floor(conteo_previo * ttl_previo / expiry + conteo_actual) + amount > limit:
+                conn.execute('COMMIT')
+                return False
+            conn.execute("""
+                INSERT INTO contadores (clave, valor, expira) VALUES (?, ?, ?)
+                ON CONFLICT (clave) DO UPDATE SET
+                    valor = CASE WHEN expira <= ? THEN excluded.valor ELSE valor + excluded.valor END,
+                    expira = CASE WHEN expira <= ? THEN excluded.expira ELSE expira END
+            """, (actual, amount, ahora + 2 * expiry, ahora, ahora))
+            conn.execute('COMMIT')
+            return True
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get_sliding_window(self, key, expiry):
+        ahora = time.time()
+        previa, actual = self.sliding_window_keys(key, expiry, ahora)
+        return self._info_ventana(self._conexion(), previa, actual, expiry, ahora)
+
+    def clear_sliding_window(self, key, expiry):
+        previa, actual = self.sliding_window_keys(key, expiry, time.time())
+        self.clear(previa)
+        self.clear(actual)
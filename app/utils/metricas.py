@@ -0,0 +1,259 @@
+"""
+Métricas e Instrumentación
+Latencia por endpoint, SQL por petición, consultas lentas, pool de BD, Argon2, cache y rate limiting
+
+Usa prometheus_client en modo multiproceso: cada worker de gunicorn escribe
+sus valores en archivos mmap de METRICAS_DIR y /metrics suma los de todos
+los workers, sea cual sea el que atiende la petición. Registrar un valor es
+una escritura en memoria compartida (microsegundos), por lo que puede
+quedar activo en producción.
+
+PROMETHEUS_MULTIPROC_DIR debe estar definido antes de importar
+prometheus_client; por eso la librería se importa en init_metricas() y,
+mientras tanto (CLI, scripts), las métricas son no-ops. gunicorn.conf.py
+vacía el directorio al arrancar y marca los workers que terminan.
+"""
+
+import logging
+import os
+import re
+import time
+
+from flask import g, has_request_context, request
+
+import psycopg2.extras
+
+
+logger = logging.getLogger('app.sql')
+
+BUCKETS_HTTP = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+BUCKETS_SQL = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0)
+BUCKETS_CONSULTAS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+BUCKETS_ARGON2 = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Umbral de consulta lenta en segundos (se ajusta en init_metricas)
+_umbral_lenta = 0.2
+
+
+class _Nula:
+    """Métrica sin efecto mientras la instrumentación no está activa"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, valor):
+        pass
+
+    def inc(self, valor=1):
+        pass
+
+    def dec(self, valor=1):
+        pass
+
+    def set(self, valor):
+        pass
+
+
+class _Metricas:
+    """Contenedor de las métricas del proceso (no-ops hasta init_metricas)"""
+
+    def __init__(self):
+        self.activas = False
+        nula = _Nula()
+        for nombre in (
+            'http_duracion', 'http_sql_consultas', 'http_sql_segundos', 'rate_limit_rechazos',
+            'sql_duracion', 'sql_lentas', 'db_checkout', 'db_en_uso', 'db_timeouts',
+            'db_replica_lag', 'db_replica_desvios',
+            'argon2_verificacion', 'hash_pool_rechazos', 'cache_eventos', 'cupones_particion_default',
+        ):
+            setattr(self, nombre, nula)
+
+    def crear(self):
+        from prometheus_client import Counter, Gauge, Histogram
+
+        self.http_duracion = Histogram(
+            'http_request_duration_seconds', 'Latencia por endpoint',
+            ('endpoint', 'metodo', 'estado'), buckets=BUCKETS_HTTP)
+        self.http_sql_consultas = Histogram(
+            'http_request_sql_queries', 'Consultas SQL por petición',
+            ('endpoint',), buckets=BUCKETS_CONSULTAS)
+        self.http_sql_segundos = Histogram(
+            'http_request_sql_seconds', 'Tiempo SQL total por petición',
+            ('endpoint',), buckets=BUCKETS_SQL)
+        self.rate_limit_rechazos = Counter(
+            'rate_limit_rejections_total', 'Peticiones rechazadas por el rate limiter (429)',
+            ('endpoint',))
+        self.sql_duracion = Histogram(
+            'db_query_duration_seconds', 'Duración de cada sentencia SQL', buckets=BUCKETS_SQL)
+        self.sql_lentas = Counter(
+            'db_slow_queries_total', 'Sentencias por encima de METRICAS_SQL_LENTA_MS')
+        self.db_checkout = Histogram(
+            'db_pool_checkout_seconds', 'Espera para obtener una conexión del pool',
+            ('pool',), buckets=BUCKETS_SQL)
+        self.db_en_uso = Gauge(
+            'db_pool_connections_in_use', 'Conexiones prestadas (suma de workers)',
+            ('pool',), multiprocess_mode='livesum')
+        self.db_timeouts = Counter(
+            'db_pool_timeouts_total', 'Peticiones sin conexión dentro de DB_POOL_TIMEOUT', ('pool',))
+        self.db_replica_lag = Gauge(
+            'db_replica_lag_seconds', 'Retraso de replicación medido por los workers',
+            multiprocess_mode='livemax')
+        self.db_replica_desvios = Counter(
+            'db_replica_fallbacks_total', 'Lecturas enviadas al primario en lugar de la réplica',
+            ('motivo',))
+        self.argon2_verificacion = Histogram(
+            'argon2_verify_seconds', 'Verificación de contraseña (incluye cola del pool)',
+            buckets=BUCKETS_ARGON2)
+        self.hash_pool_rechazos = Counter(
+            'hash_pool_rejections_total', 'Operaciones Argon2 rechazadas por saturación')
+        self.cache_eventos = Counter(
+            'cache_events_total', 'Eventos del cache de dos niveles', ('evento',))
+        self.cupones_particion_default = Gauge(
+            'cupones_default_rows', 'Cupones en la partición DEFAULT (meses sin partición)',
+            multiprocess_mode='livemax')
+        self.activas = True
+
+
+# Instancia compartida por el proceso
+metricas = _Metricas()
+
+
+# ----------------------------------------------------------------------
+# SQL
+# ----------------------------------------------------------------------
+
+_LITERALES = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'%\(\w+\)s|%s'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))*'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+
+def normalizar_sql(sql):
+    """
+    Sentencia sin literales ni listas de valores (agrupa consultas equivalentes).
+
+    Args:
+        sql (str | bytes): Sentencia tal como se envió
+
+    Returns:
+        str: Sentencia normalizada (máx. 500 caracteres)
+    """
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    for patron, reemplazo in _LITERALES:
+        sql = patron.sub(reemplazo, sql)
+    return sql.strip()[:500]
+
+
+def _registrar_sql(sql, duracion):
+    metricas.sql_duracion.observe(duracion)
+    if has_request_context():
+        g._sql_consultas = g.get('_sql_consultas', 0) + 1
+        g._sql_segundos = g.get('_sql_segundos', 0.0) + duracion
+    if duracion >= _umbral_lenta:
+        metricas.sql_lentas.inc()
+        logger.warning(f"SQL lenta ({duracion * 1000:.0f} ms): {normalizar_sql(sql)}")
+
+
+class CursorInstrumentado(psycopg2.extras.RealDictCursor):
+    """RealDictCursor que mide cada sentencia (cursor de get_db)"""
+
+    def execute(self, query, vars=None):
+        inicio = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            _registrar_sql(query, time.perf_counter() - inicio)
+
+    def executemany(self, query, vars_list):
+        inicio = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            _registrar_sql(query, time.perf_counter() - inicio)
+
+    def copy_expert(self, sql, file, size=8192):
+        inicio = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            _registrar_sql(sql, time.perf_counter() - inicio)
+
+
+# ----------------------------------------------------------------------
+# Peticiones HTTP
+# ----------------------------------------------------------------------
+
+def _endpoint():
+    # request.endpoint acota la cardinalidad (las URLs desconocidas no crean series)
+    return request.endpoint or 'sin_ruta'
+
+
+def _antes_de_peticion():
+    g._inicio_peticion = time.perf_counter()
+    g._sql_consultas = 0
+    g._sql_segundos = 0.0
+
+
+def _despues_de_peticion(respuesta):
+    inicio = g.get('_inicio_peticion')
+    if inicio is None:
+        return respuesta
+
+    endpoint = _endpoint()
+    metricas.http_duracion.labels(endpoint, request.method, str(respuesta.status_code)).observe(
+        time.perf_counter() - inicio
+    )
+    metricas.http_sql_consultas.labels(endpoint).observe(g.get('_sql_consultas', 0))
+    metricas.http_sql_segundos.labels(endpoint).observe(g.get('_sql_segundos', 0.0))
+    if respuesta.status_code == 429:
+        metricas.rate_limit_rechazos.labels(endpoint).inc()
+    return respuesta
+
+
+def init_metricas(app):
+    """
+    Activa la instrumentación (si METRICAS_HABILITADAS) y registra los hooks de petición.
+    """
+    global _umbral_lenta
+    _umbral_lenta = app.config['METRICAS_SQL_LENTA_MS'] / 1000
+
+    if not app.config['METRICAS_HABILITADAS']:
+        return
+
+    # Las métricas son del proceso (se registran una vez); los hooks, de cada app
+    if not metricas.activas:
+        directorio = app.config['METRICAS_DIR']
+        os.makedirs(directorio, exist_ok=True)
+        os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', directorio)
+        metricas.crear()
+
+    app.before_request(_antes_de_peticion)
+    app.after_request(_despues_de_peticion)
+
+
+def exportar_metricas():
+    """
+    Métricas agregadas de todos los workers en formato de texto de Prometheus.
+
+    Returns:
+        tuple[bytes, str]: (cuerpo, content type)
+    """
+    from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, generate_latest
+    from prometheus_client.multiprocess import MultiProcessCollector
+
+    registro = CollectorRegistry()
+    MultiProcessCollector(registro)
+    return generate_latest(registro), CONTENT_TYPE_LATEST
+
+
+def limpiar_directorio(directorio):
+    """Borra los archivos de una ejecución anterior (llamar antes de crear los workers)"""
+    if not os.path.isdir(directorio):
+        return
+    for archivo in os.listdir(directorio):
+        if archivo.endswith('.db'):
+            os.remove(os.path.join(directorio, archivo))
@@ -0,0 +1,246 @@
+"""
+Migraciones Versionadas
+Aplica en orden los archivos SQL de migrations/ y registra cada versión en schema_migrations
+
+Las migraciones que empiezan con la marca '-- migracion: sin-transaccion' se
+ejecutan sentencia a sentencia en modo autocommit (necesario para
+CREATE INDEX CONCURRENTLY). PostgreSQL no admite CONCURRENTLY sobre una
+tabla particionada: en ese caso la sentencia se reparte en un índice
+ON ONLY en la tabla padre, un CREATE INDEX CONCURRENTLY por partición y
+ALTER INDEX ... ATTACH PARTITION (el índice padre queda válido al adjuntar
+la última). Es idempotente: una ejecución interrumpida se puede repetir.
+
+Una línea '-- migracion: requiere-extension <nombre>' deja la migración
+pendiente (sin registrarla) mientras la extensión no esté instalada: se
+aplica en la primera ejecución posterior a su instalación.
+
+Un advisory lock de sesión serializa ejecuciones concurrentes (varios
+workers o deploys a la vez): la segunda espera y no encuentra pendientes.
+"""
+
+import os
+import re
+
+import psycopg2
+
+
+# Directorio de migraciones (raíz del proyecto)
+MIGRACIONES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'migrations'
+)
+
+MARCA_SIN_TRANSACCION = '-- migracion: sin-transaccion'
+_REQUIERE_EXTENSION = re.compile(r'^-- migracion: requiere-extension (\w+)\s*$', re.MULTILINE)
+
+_INDICE_CONCURRENTE = re.compile(
+    r'^CREATE\s+INDEX\s+CONCURRENTLY\s+(?:IF\s+NOT\s+EXISTS\s+)?(\w+)\s+ON\s+(?:ONLY\s+)?([\w.]+)\s+(.+)$',
+    re.IGNORECASE | re.DOTALL
+)
+
+
+def listar_migraciones():
+    """
+    Lista los archivos de migración disponibles, ordenados por versión.
+
+    Returns:
+        list[tuple[str, str]]: Pares (version, ruta) donde version es el nombre sin extensión
+    """
+    if not os.path.isdir(MIGRACIONES_DIR):
+        return []
+
+    archivos = sorted(f for f in os.listdir(MIGRACIONES_DIR) if f.endswith('.sql'))
+    return [(os.path.splitext(f)[0], os.path.join(MIGRACIONES_DIR, f)) for f in archivos]
+
+
+def dividir_sentencias(sql):
+    """
+    Divide un script SQL en sentencias individuales.
+
+    Corta en ';' a final de línea, respetando bloques entre $$ (cuerpos plpgsql).
+
+    Args:
+        sql (str): Script completo
+
+    Returns:
+        list[str]: Sentencias sin el ';' final (comentarios y vacías excluidas)
+    """
+    sentencias = []
+    actual = []
+    en_dolar = False
+
+    for linea in sql.splitlines():
+        if linea.strip().startswith('--') and not en_dolar:
+            continue
+        actual.append(linea)
+        if linea.count('$$') % 2 == 1:
+            en_dolar = not en_dolar
+        if not en_dolar and linea.rstrip().endswith(';'):
+            sentencia = '\n'.join(actual).strip().rstrip(';').strip()
+            if sentencia:
+                sentencias.append(sentencia)
+            actual = []
+
+    resto = '\n'.join(actual).strip()
+    if resto:
+        sentencias.append(resto)
+    return sentencias
+
+
+def crear_indice_particionado(cur, sentencia):
+    """
+    Ejecuta un CREATE INDEX CONCURRENTLY sobre una tabla particionada.
+
+    Las particiones que ya tienen un índice adjunto al padre se omiten; un
+    índice de partición que quedó INVALID se elimina y se vuelve a crear.
+
+    Args:
+        cur: Cursor de una conexión en autocommit
+        sentencia (str): CREATE INDEX CONCURRENTLY [IF NOT EXISTS] nombre ON tabla ...
+
+    Returns:
+        bool: False si la sentencia no es un índice concurrente sobre una
+        tabla particionada (el llamador la ejecuta tal cual)
+    """
+    coincidencia = _INDICE_CONCURRENTE.match(sentencia.strip())
+    if not coincidencia:
+        return False
+    indice, tabla, definicion = coincidencia.groups()
+    cur.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (tabla,))
+    fila = cur.fetchone()
+    if not fila or fila[0] != 'p':
+        return False
+
+    esquema = tabla.split('.')[0] if '.' in tabla else 'public'
+    cur.execute(f'CREATE INDEX IF NOT EXISTS {indice} ON ONLY {tabla} {definicion}')
+    cur.execute("""
+        SELECT c.relname, left(c.relname || '_' || %(indice)s, 63), x.indisvalid
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        LEFT JOIN pg_class ix
+               ON ix.relname = left(c.relname || '_' || %(indice)s, 63)
+              AND ix.relnamespace = c.relnamespace
+        LEFT JOIN pg_index x ON x.indexrelid = ix.oid
+        WHERE i.inhparent = %(tabla)s::regclass
+          AND NOT EXISTS (
+              SELECT 1
+              FROM pg_inherits ii
+              JOIN pg_index xi ON xi.indexrelid = ii.inhrelid
+              WHERE ii.inhparent = to_regclass(%(padre)s) AND xi.indrelid = c.oid
+          )
+        ORDER BY c.relname
+    """, {'indice': indice, 'tabla': tabla, 'padre': f'{esquema}.{indice}'})
+
+    for particion, nombre, valido in cur.fetchall():
+        if valido is False:
+            cur.execute(f'DROP INDEX CONCURRENTLY IF EXISTS {esquema}."{nombre}"')
+        cur.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{nombre}" ON {esquema}."{particion}" {definicion}')
+        cur.execute(f'ALTER INDEX {esquema}.{indice} ATTACH PARTITION {esquema}."{nombre}"')
+    return True
+
+
+def _aplicar_sin_transaccion(conn, version, sql):
+    """Ejecuta cada sentencia en autocommit y registra la versión al final"""
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            for sentencia in dividir_sentencias(sql):
+                if not crear_indice_particionado(cur, sentencia):
+                    cur.execute(sentencia)
+            cur.execute(
+                "INSERT INTO public.schema_migrations (version) VALUES (%s)",
+                (version,)
+            )
+    finally:
+        conn.autocommit = False
+
+
+def _extensiones_faltantes(conn, sql):
+    """Extensiones marcadas con requiere-extension que no están instaladas"""
+    requeridas = _REQUIERE_EXTENSION.findall(sql)
+    if not requeridas:
+        return []
+    with conn.cursor() as cur:
+        cur.execute("SELECT extname FROM pg_extension WHERE extname = ANY(%s)", (requeridas,))
+        instaladas = {row[0] for row in cur.fetchall()}
+    conn.commit()
+    return [nombre for nombre in requeridas if nombre not in instaladas]
+
+
+def _asegurar_tabla_control(conn):
+    """Crea la tabla de control de versiones si no existe"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS public.schema_migrations (
+                version VARCHAR(255) PRIMARY KEY,
+                aplicada_en TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+    conn.commit()
+
+
+def _versiones_aplicadas(conn):
+    """Devuelve el conjunto de versiones ya registradas"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT version FROM public.schema_migrations")
+        return {row[0] for row in cur.fetchall()}
+
+
+def aplicar_migraciones(database_url=None):
+    """
+    Aplica las migraciones pendientes, cada una en su propia transacción
+    (salvo las marcadas como sin-transaccion).
+
+    Args:
+        database_url (str): URL de conexión (por defecto DATABASE_URL del entorno)
+
+    Returns:
+        list[str]: Versiones aplicadas en esta ejecución
+    """
+    database_url = database_url or os.getenv('DATABASE_URL')
+    conn = psycopg2.connect(database_url)
+    aplicadas = []
+
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_lock(hashtext('schema_migrations'))")
+        conn.commit()
+
+        _asegurar_tabla_control(conn)
+        ya_aplicadas = _versiones_aplicadas(conn)
+        # Cerrar la transacción del SELECT: autocommit no se puede activar dentro de una
+        conn.commit()
+
+        for version, ruta in listar_migraciones():
+            if version in ya_aplicadas:
+                continue
+
+            with open(ruta, encoding='utf-8') as f:
+                sql = f.read()
+
+            if _extensiones_faltantes(conn, sql):
+                continue
+
+            if sql.lstrip().startswith(MARCA_SIN_TRANSACCION):
+                _aplicar_sin_transaccion(conn, version, sql)
+                aplicadas.append(version)
+                continue
+
+            try:
+                with conn.cursor() as cur:
+                    cur.execute(sql)
+                    cur.execute(
+                        "INSERT INTO public.schema_migrations (version) VALUES (%s)",
+                        (version,)
+                    )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+            aplicadas.append(version)
+    finally:
+        # Cerrar la conexión también libera el lock de sesión
+        conn.close()
+
+    return aplicadas
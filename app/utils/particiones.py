@@ -0,0 +1,220 @@
+"""
+Mantenimiento de Particiones de Cupones
+Creación anticipada de particiones mensuales y archivado de las antiguas
+
+Las filas de un mes sin partición caen en cupones_default. La creación
+diaria también crea las particiones de los meses presentes en ella (la
+función SQL mueve las filas); las que queden (meses archivados) se
+informan con filas_sin_particion() y la métrica cupones_default_rows.
+"""
+
+import re
+import time
+from datetime import date, datetime
+
+import psycopg2
+import psycopg2.errors
+
+from app.utils.calendario import extender_calendario
+from app.utils.db import get_db
+from app.utils.metricas import metricas
+
+
+PATRON_PARTICION = re.compile(r'^cupones_p(\d{4})_(\d{2})$')
+
+
+def _sumar_meses(fecha, meses):
+    """Primer día del mes desplazado 'meses' respecto de fecha"""
+    total = fecha.year * 12 + (fecha.month - 1) + meses
+    return date(total // 12, total % 12 + 1, 1)
+
+
+def crear_particiones_futuras(meses=3):
+    """
+    Garantiza que existan las particiones desde el mes actual hasta 'meses' por delante.
+
+    Args:
+        meses (int): Meses a crear por adelantado
+
+    Returns:
+        int: Particiones comprobadas (existentes o creadas)
+    """
+    hoy = date.today()
+    with get_db() as (conn, cur):
+        # Serializar entre workers: todos pueden tener el job programado
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext('cupones_particiones'))")
+        cur.execute(
+            "SELECT crear_particiones_cupones(%s, %s) AS total",
+            (hoy, _sumar_meses(hoy, meses))
+        )
+        total = cur.fetchone()['total']
+        # Meses que recibieron filas sin tener partición (created_at fuera del horizonte)
+        # (se leen antes: ATTACH no admite un scan abierto sobre cupones_default)
+        cur.execute("SELECT DISTINCT date_trunc('month', created_at)::date AS mes FROM cupones_default")
+        for fila in cur.fetchall():
+            cur.execute("SELECT crear_particion_cupones(%s)", (fila['mes'],))
+            total += 1
+        # El calendario debe cubrir todo mes con partición (resumen_semanas lo une por fecha)
+        extender_calendario(cur, hoy)
+        conn.commit()
+    return total
+
+
+def filas_sin_particion():
+    """
+    Filas en cupones_default (deberían ser 0) y actualiza la métrica.
+
+    Returns:
+        int: Filas de meses sin partición propia
+    """
+    with get_db() as (conn, cur):
+        cur.execute("SELECT count(*) AS filas FROM cupones_default")
+        filas = cur.fetchone()['filas']
+    metricas.cupones_particion_default.set(filas)
+    return filas
+
+
+def listar_particiones():
+    """
+    Lista las particiones adjuntas a cupones.
+
+    Returns:
+        list[dict]: {'nombre', 'mes' (date)} ordenadas por mes
+    """
+    with get_db() as (conn, cur):
+        cur.execute("""
+            SELECT c.relname AS nombre
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'public.cupones'::regclass
+        """)
+        filas = cur.fetchall()
+
+    particiones = []
+    for fila in filas:
+        coincidencia = PATRON_PARTICION.match(fila['nombre'])
+        if coincidencia:
+            anio, mes = int(coincidencia.group(1)), int(coincidencia.group(2))
+            particiones.append({'nombre': fila['nombre'], 'mes': date(anio, mes, 1)})
+    return sorted(particiones, key=lambda p: p['mes'])
+
+
+def archivar_particiones(database_url, meses_retencion=24, lock_timeout='2s', intentos=5):
+    """
+    Desvincula y archiva las particiones más antiguas que el período de retención.
+
+    PostgreSQL no admite DETACH PARTITION CONCURRENTLY mientras exista una
+    partición DEFAULT (cupones_default), así que se usa un DETACH normal: toma
+    ACCESS EXCLUSIVE sobre cupones, pero con un lock_timeout corto no se queda
+    encolado delante de los check-ins; si no obtiene el lock se reintenta tras
+    una pausa. Abre su propia conexión en autocommit (cada partición en su
+    propia transacción) en lugar de usar el pool. La partición pasa al schema
+    'archivo' con sus datos, índices y FKs a agencias/usuarios; sus códigos
+    siguen reservados en cupones_codigos y resumen_semanas conserva sus
+    contadores (desvincular no dispara los triggers de DELETE).
+
+    Args:
+        database_url (str): URL de conexión
+        meses_retencion (int): Meses (contando el actual) que permanecen en cupones
+        lock_timeout (str): Espera máxima por el lock de cada intento
+        intentos (int): Intentos por partición antes de abandonar
+
+    Returns:
+        list[str]: Particiones archivadas
+    """
+    limite = _sumar_meses(date.today(), -meses_retencion + 1)
+    candidatas = [p['nombre'] for p in listar_particiones() if p['mes'] < limite]
+
+    archivadas = []
+    conn = psycopg2.connect(database_url)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT set_config('lock_timeout', %s, false)", (lock_timeout,))
+            for nombre in candidatas:
+                for intento in range(1, intentos + 1):
+                    try:
+                        cur.execute(f'ALTER TABLE public.cupones DETACH PARTITION public."{nombre}"')
+                        break
+                    except psycopg2.errors.LockNotAvailable:
+                        if intento == intentos:
+                            raise
+                        time.sleep(intento)
+                cur.execute(f'ALTER TABLE public."{nombre}" SET SCHEMA archivo')
+                archivadas.append(nombre)
+    finally:
+        conn.close()
+
+    return archivadas
+
+
+def buscar_codigo(codigo):
+    """
+    Busca un cupón por código, incluidas las particiones archivadas.
+
+    cupones_codigos indica la fecha de creación, lo que permite leer sólo la
+    partición que corresponde (o su copia en 'archivo').
+
+    Args:
+        codigo (str): codigo_alfanumerico
+
+    Returns:
+        dict | None: Fila del cupón con la clave adicional 'archivado'
+    """
+    with get_db() as (conn, cur):
+        cur.execute(
+            "SELECT cupon_id, created_at FROM cupones_codigos WHERE codigo_alfanumerico = %s",
+            (codigo,)
+        )
+        registro = cur.fetchone()
+        if not registro:
+            return None
+
+        cur.execute(
+            "SELECT * FROM cupones WHERE id = %s AND created_at = %s",
+            (registro['cupon_id'], registro['created_at'])
+        )
+        cupon = cur.fetchone()
+        if cupon:
+            return {**cupon, 'archivado': False}
+
+        nombre = f"cupones_p{registro['created_at']:%Y_%m}"
+        cur.execute("SELECT to_regclass(%s) AS tabla", (f'archivo.{nombre}',))
+        if not cur.fetchone()['tabla']:
+            return None
+
+        cur.execute(
+            f'SELECT * FROM archivo."{nombre}" WHERE id = %s',
+            (registro['cupon_id'],)
+        )
+        cupon = cur.fetchone()
+        return {**cupon, 'archivado': True} if cupon else None
+
+
+def iniciar_scheduler_particiones(app):
+    """
+    Programa la creación diaria de particiones futuras con APScheduler.
+
+    Alternativa a ejecutar 'flask cupones particiones' desde cron; activarla
+    (CUPONES_PARTICIONES_SCHEDULER=1) sólo en un proceso designado. Si aun así
+    varios la programan, el advisory lock evita trabajo duplicado.
+    """
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    meses = app.config['CUPONES_PARTICIONES_ADELANTO']
+
+    def _tarea():
+        with app.app_context():
+            try:
+                crear_particiones_futuras(meses)
+                filas = filas_sin_particion()
+                if filas:
+                    app.logger.error(f"cupones_default tiene {filas} filas sin partición mensual")
+            except Exception as e:
+                app.logger.error(f"Error creando particiones de cupones: {e}")
+
+    scheduler = BackgroundScheduler(daemon=True)
+    scheduler.add_job(_tarea, 'interval', hours=24, id='cupones_particiones',
+                      next_run_time=datetime.now())
+    scheduler.start()
+    return scheduler
@@ -0,0 +1,154 @@
+"""
+Verificación de Planes de Consulta
+Comprueba con EXPLAIN que las consultas críticas de check-in y reportes usan sus índices
+
+cupones está particionada (migración 0004): el plan nombra los índices de
+cada partición (cupones_p2026_10_codigo_alfanumerico_idx, ...), que se
+traducen al índice particionado raíz (idx_cupones_codigo) antes de comparar.
+"""
+
+from datetime import date, datetime, timedelta
+
+from app.utils.db import get_db
+
+
+# (nombre, consulta, parámetros, índice esperado)
+CONSULTAS_CRITICAS = [
+    (
+        'checkin_por_codigo',
+        "SELECT * FROM cupones WHERE codigo_alfanumerico = %s",
+        ('ABC123',),
+        'idx_cupones_codigo',
+    ),
+    (
+        'dashboard_agencia_dia',
+        "SELECT id, estado FROM cupones WHERE agencia_id = %s AND fecha_visita = %s",
+        (1, date.today()),
+        'idx_cupones_agencia_fecha_visita',
+    ),
+    (
+        'pendientes_del_dia',
+        "SELECT id FROM cupones WHERE estado = 'nuevo' AND fecha_visita = %s",
+        (date.today(),),
+        'idx_cupones_pendientes_fecha_visita',
+    ),
+    (
+        'reporte_semanal',
+        """
+        SELECT COUNT(*), SUM(monto_total), SUM(monto_parcial)
+        FROM cupones WHERE created_at >= %s AND created_at < %s
+        """,
+        (datetime.now() - timedelta(days=7), datetime.now()),
+        'idx_cupones_created_at',
+    ),
+    (
+        'reporte_agencia',
+        "SELECT id FROM cupones WHERE agencia_id = %s AND created_at >= %s AND created_at < %s",
+        (1, datetime.now() - timedelta(days=7), datetime.now()),
+        'idx_cupones_agencia_created_at',
+    ),
+    (
+        'cupones_del_dia',
+        "SELECT id FROM cupones WHERE DATE(created_at) = %s",
+        (date.today(),),
+        'idx_cupones_fecha_creacion',
+    ),
+    (
+        'usados_desde_marca',
+        "SELECT id FROM cupones WHERE fecha_uso > %s",
+        (datetime.now() - timedelta(hours=1),),
+        'idx_cupones_fecha_uso',
+    ),
+]
+
+
+def _indices_del_plan(nodo):
+    """Recorre el árbol de EXPLAIN (FORMAT JSON) y devuelve los índices usados"""
+    indices = set()
+    if 'Index Name' in nodo:
+        indices.add(nodo['Index Name'])
+    for hijo in nodo.get('Plans', []):
+        indices |= _indices_del_plan(hijo)
+    return indices
+
+
+def _raices(cur, indices):
+    """
+    Índice particionado raíz de cada índice (el mismo nombre si no es partición).
+
+    Returns:
+        dict[str, str]: Nombre en el plan -> nombre del índice raíz
+    """
+    if not indices:
+        return {}
+    cur.execute("""
+        SELECT nombre, COALESCE(raiz.relname, nombre) AS raiz
+        FROM unnest(%s::text[]) AS nombre
+        LEFT JOIN pg_class raiz ON raiz.oid = pg_partition_root(to_regclass(nombre))
+    """, (sorted(indices),))
+    return {fila['nombre']: fila['raiz'] for fila in cur.fetchall()}
+
+
+def comprobar_plan(nombre, plan, esperado, raices):
+    """
+    Compara los índices de un plan con el esperado.
+
+    Args:
+        nombre (str): Nombre de la consulta
+        plan (dict): Nodo 'Plan' de EXPLAIN (FORMAT JSON)
+        esperado (str): Índice (raíz) esperado
+        raices (dict): Índice del plan -> índice raíz (ver _raices)
+
+    Returns:
+        dict: 'nombre', 'esperado', 'usados' (raíces) y 'ok'
+    """
+    usados = {raices.get(indice, indice) for indice in _indices_del_plan(plan)}
+    return {
+        'nombre': nombre,
+        'esperado': esperado,
+        'usados': sorted(usados),
+        'ok': esperado in usados,
+    }
+
+
+def explicar_planes(cur, consultas=None):
+    """
+    Ejecuta EXPLAIN sobre cada consulta crítica y comprueba el índice usado.
+
+    Con tablas pequeñas el planificador prefiere un Seq Scan aunque el índice
+    exista, así que se desactiva enable_seqscan (SET LOCAL: la transacción
+    se revierte al final): lo que se verifica es que el índice sea utilizable
+    para la forma de la consulta.
+
+    Args:
+        cur: Cursor RealDictCursor (fuera de autocommit)
+        consultas (list): Lista de (nombre, sql, params, indice); por defecto CONSULTAS_CRITICAS
+
+    Returns:
+        list[dict]: Un resultado por consulta con 'nombre', 'esperado', 'usados' y 'ok'
+    """
+    resultados = []
+    try:
+        cur.execute("SET LOCAL enable_seqscan = off")
+        for nombre, sql, params, esperado in consultas or CONSULTAS_CRITICAS:
+            cur.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+            plan = cur.fetchone()['QUERY PLAN'][0]['Plan']
+            raices = _raices(cur, _indices_del_plan(plan))
+            resultados.append(comprobar_plan(nombre, plan, esperado, raices))
+    finally:
+        cur.connection.rollback()
+    return resultados
+
+
+def verificar_planes(consultas=None):
+    """
+    explicar_planes() con una conexión del pool.
+
+    Args:
+        consultas (list): Lista de (nombre, sql, params, indice); por defecto CONSULTAS_CRITICAS
+
+    Returns:
+        list[dict]: Un resultado por consulta con 'nombre', 'esperado', 'usados' y 'ok'
+    """
+    with get_db() as (conn, cur):
+        return explicar_planes(cur, consultas)
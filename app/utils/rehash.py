@@ -0,0 +1,165 @@
+"""
+Migración Diferida PBKDF2 → Argon2id
+Cola en segundo plano que re-hashea contraseñas legacy y las persiste en lotes
+
+El login sólo encola (usuario, contraseña, hash actual) y responde con el coste
+de una verificación normal. Un único hilo por proceso calcula los hashes
+Argon2id (64 MB a la vez) y los guarda con un UPDATE por lote. Si la cola está
+llena el trabajo se descarta: el usuario se migrará en su próximo login.
+"""
+
+import queue
+import threading
+import time
+
+from psycopg2.extras import execute_values
+
+from app.utils.db import get_db
+
+
+class ColaRehash:
+    """
+    Cola acotada de re-hash con escritura por lotes.
+
+    Args:
+        max_cola (int): Trabajos pendientes admitidos
+        tamano_lote (int): Máximo de UPDATEs agrupados por transacción
+        intervalo (float): Segundos máximos que un trabajo espera a completar lote
+    """
+
+    def __init__(self, max_cola=1000, tamano_lote=50, intervalo=2.0):
+        self.max_cola = max_cola
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        self._app = None
+        self._cola = queue.Queue(maxsize=max_cola)
+        self._encolados = set()
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._migrados = 0
+        self._descartados = 0
+        self._fallidos = 0
+        self._omitidos = 0
+
+    def init_app(self, app):
+        """Vincula la aplicación (contexto para get_db y logger en el hilo)"""
+        self._app = app
+
+    def encolar(self, user_id, password, hash_actual):
+        """
+        Programa el re-hash de un usuario.
+
+        Returns:
+            bool: False si el usuario ya estaba en cola o la cola está llena
+        """
+        with self._lock:
+            if user_id in self._encolados:
+                return False
+            try:
+                self._cola.put_nowait((user_id, password, hash_actual))
+            except queue.Full:
+                self._descartados += 1
+                return False
+            self._encolados.add(user_id)
+
+            # El hilo se crea en el primer uso (después del fork de gunicorn)
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name='rehash-argon2', daemon=True)
+                self._hilo.start()
+        return True
+
+    def _tomar_lote(self):
+        """Bloquea hasta el primer trabajo y agrupa los que lleguen dentro del intervalo"""
+        lote = [self._cola.get()]
+        limite = time.monotonic() + self.intervalo
+        while len(lote) < self.tamano_lote:
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                break
+            try:
+                lote.append(self._cola.get(timeout=restante))
+            except queue.Empty:
+                break
+        return lote
+
+    def _bucle(self):
+        from app.utils.auth import hash_password
+
+        while True:
+            lote = self._tomar_lote()
+            filas = []
+            for user_id, password, hash_actual in lote:
+                try:
+                    filas.append((user_id, hash_actual, hash_password(password)))
+                except Exception as e:
+                    with self._lock:
+                        self._fallidos += 1
+                    self._app.logger.error(f"Error calculando Argon2id (usuario {user_id}): {e}")
+
+            try:
+                actualizados = self._guardar(filas) if filas else 0
+                with self._lock:
+                    self._migrados += actualizados
+                    self._omitidos += len(filas) - actualizados
+            except Exception as e:
+                with self._lock:
+                    self._fallidos += len(filas)
+                self._app.logger.error(f"Error guardando lote de migración Argon2id: {e}")
+            finally:
+                with self._lock:
+                    for user_id, _, _ in lote:
+                        self._encolados.discard(user_id)
+
+    def _guardar(self, filas):
+        """
+        UPDATE por lote. Sólo reemplaza el hash si no cambió desde el login
+        (p. ej. el usuario cambió su contraseña mientras tanto).
+        """
+        with self._app.app_context():
+            with get_db() as (conn, cur):
+                execute_values(cur, """
+                    UPDATE usuarios AS u
+                    SET password_hash = v.nuevo
+                    FROM (VALUES %s) AS v(id, anterior, nuevo)
+                    WHERE u.id = v.id AND u.password_hash = v.anterior
+                """, filas, page_size=len(filas))
+                actualizados = cur.rowcount
+                conn.commit()
+        return actualizados
+
+    def estadisticas(self):
+        """
+        Progreso de la migración en este proceso.
+
+        Returns:
+            dict: en_cola, migrados, omitidos (hash cambiado), descartados (cola llena), fallidos
+        """
+        with self._lock:
+            return {
+                'en_cola': self._cola.qsize(),
+                'migrados': self._migrados,
+                'omitidos': self._omitidos,
+                'descartados': self._descartados,
+                'fallidos': self._fallidos,
+            }
+
+
+# Instancia compartida por el proceso
+cola_rehash = ColaRehash()
+
+
+def contar_hashes_legacy():
+    """
+    Usuarios cuyo hash aún no es Argon2id.
+
+    Returns:
+        dict: {'legacy': int, 'total': int}
+    """
+    with get_db() as (conn, cur):
+        cur.execute("""
+            SELECT COUNT(*) FILTER (WHERE password_hash NOT LIKE '$argon2id$%') AS legacy,
+                   COUNT(*) AS total
+            FROM usuarios
+        """)
+        fila = cur.fetchone()
+    return {'legacy': fila['legacy'], 'total': fila['total']}
@@ -0,0 +1,331 @@
+"""
+Resumen Diario Multidimensional
+Consolidación por lotes y consultas por rango/agrupación sobre resumen_diario (migración 0008)
+
+- consolidar_resumen_diario(): recalcula los días cerrados con cupones
+  creados o editados desde la última pasada (marca sobre updated_at) o
+  con cupones borrados (resumen_diario_pendientes, migración 0013) y
+  avanza consolidado_hasta hasta ayer. Se ejecuta sola cada
+  RESUMEN_DIARIO_INTERVALO minutos (iniciar_scheduler_resumen_diario) y
+  desde 'flask resumen consolidar-diario'.
+- consultar_resumen_diario(): suma filas preagregadas hasta
+  consolidado_hasta y agrega cupones sólo para los días posteriores (hoy),
+  agrupando por cualquier combinación de dimensiones y por día/semana/mes.
+  El resultado se cachea con las etiquetas de sus semanas (y agencia): una
+  escritura de cupones sólo desaloja las consultas que la incluyen.
+- resumen_semanal(): la forma de vista_reportes_semanales derivada del
+  resumen diario (opcionalmente por agencia).
+"""
+
+import os
+import threading
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from app.utils.cache_backend import cacheado, etiquetas_rango
+from app.utils.calendario import semana_natural
+from app.utils.db import get_db
+
+
+# Días recalculados por transacción
+TAMANO_LOTE_DIAS = 31
+
+# Solape sobre la marca: cubre transacciones que empezaron antes de la
+# pasada anterior (updated_at = su now()) pero hicieron commit después
+MARGEN_MARCA = timedelta(minutes=10)
+
+# Dimensión pública -> columna de resumen_diario
+DIMENSIONES = {
+    'agencia': 'agencia_id',
+    'empleado': 'empleado_id',
+    'vendedor': 'vendedor',
+    'estado': 'estado',
+}
+
+PERIODOS = {
+    'dia': 'dia',
+    'semana': "date_trunc('week', dia)::date",
+    'mes': "date_trunc('month', dia)::date",
+    'total': 'NULL::date',
+}
+
+
+def _leer_marca(cur):
+    cur.execute("""
+        SELECT ultima_actualizacion, consolidado_hasta
+        FROM resumen_diario_watermark
+        WHERE id
+    """)
+    marca = cur.fetchone()
+    if not marca:
+        return None, None
+    return marca['ultima_actualizacion'], marca['consolidado_hasta']
+
+
+def consolidar_resumen_diario(completo=False, tamano_lote=TAMANO_LOTE_DIAS):
+    """
+    Consolida en resumen_diario los días cerrados modificados desde la última pasada.
+
+    Args:
+        completo (bool): Recalcula todos los días presentes en cupones
+        tamano_lote (int): Días por transacción
+
+    Returns:
+        dict: {'dias': int, 'lotes': int, 'consolidado_hasta': date}
+    """
+    with get_db() as (conn, cur):
+        # Serializar consolidaciones concurrentes (scheduler en cada worker + CLI)
+        cur.execute("SELECT pg_try_advisory_lock(hashtext('resumen_diario')) AS adquirido")
+        if not cur.fetchone()['adquirido']:
+            return {'dias': 0, 'lotes': 0, 'consolidado_hasta': None}
+
+        try:
+            ultima, _ = (None, None) if completo else _leer_marca(cur)
+
+            # Reloj del servidor: la nueva marca se toma antes de leer
+            cur.execute("SELECT now()::timestamp AS ahora, CURRENT_DATE AS hoy")
+            reloj = cur.fetchone()
+
+            desde = ultima - MARGEN_MARCA if ultima is not None else None
+            cur.execute("SELECT dia FROM dias_modificados(%s, %s)", (desde, reloj['hoy']))
+            dias = {row['dia'] for row in cur.fetchall()}
+            # Días con cupones borrados (hoy se lee de cupones: se deja para cuando cierre)
+            cur.execute("SELECT dia FROM resumen_diario_pendientes WHERE dia < %s", (reloj['hoy'],))
+            dias = sorted(dias | {row['dia'] for row in cur.fetchall()})
+            conn.commit()
+
+            lotes = 0
+            for i in range(0, len(dias), tamano_lote):
+                lote = dias[i:i + tamano_lote]
+                cur.execute("SELECT recalcular_resumen_diario(%s::date[])", (lote,))
+                # En la misma transacción: si el recálculo falla, el día sigue pendiente
+                cur.execute("DELETE FROM resumen_diario_pendientes WHERE dia = ANY(%s::date[])", (lote,))
+                conn.commit()
+                lotes += 1
+
+            consolidado_hasta = reloj['hoy'] - timedelta(days=1)
+            cur.execute("""
+                UPDATE resumen_diario_watermark
+                SET ultima_actualizacion = %s,
+                    consolidado_hasta = %s,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id
+            """, (reloj['ahora'], consolidado_hasta))
+            conn.commit()
+
+            return {'dias': len(dias), 'lotes': lotes, 'consolidado_hasta': consolidado_hasta}
+        finally:
+            conn.rollback()
+            cur.execute("SELECT pg_advisory_unlock(hashtext('resumen_diario'))")
+            conn.commit()
+
+
+def _etiquetas_consulta(desde, hasta, agrupar=(), periodo='dia', agencia_id=None, empleado_id=None, estado=None):
+    """Semanas del rango (de la agencia si se filtra): las escrituras de cupones las invalidan"""
+    return etiquetas_rango(desde, hasta, agencia_id)
+
+
+@cacheado(etiquetas=_etiquetas_consulta)
+def consultar_resumen_diario(desde, hasta, agrupar=(), periodo='dia',
+                             agencia_id=None, empleado_id=None, estado=None):
+    """
+    Cupones y montos en un rango de días, agrupados por periodo y dimensiones.
+
+    Args:
+        desde (date): Primer día (inclusive)
+        hasta (date): Último día (inclusive)
+        agrupar (tuple[str]): Dimensiones de DIMENSIONES
+        periodo (str): 'dia', 'semana', 'mes' o 'total'
+        agencia_id (int): Filtrar por agencia
+        empleado_id (int): Filtrar por empleado
+        estado (str): Filtrar por estado
+
+    Returns:
+        list[dict]: periodo, una clave por dimensión, cupones, monto_total,
+        monto_parcial, usados y pendientes
+
+    Raises:
+        ValueError: Dimensión o periodo desconocidos
+    """
+    desconocidas = [d for d in agrupar if d not in DIMENSIONES]
+    if desconocidas or periodo not in PERIODOS:
+        raise ValueError(f"Agrupación no soportada: {', '.join(desconocidas) or periodo}")
+
+    filtros, params = [], []
+    for columna, valor in (('agencia_id', agencia_id), ('empleado_id', empleado_id), ('estado', estado)):
+        if valor is not None:
+            filtros.append(f'{columna} = %s')
+            params.append(valor)
+
+    with get_db() as (conn, cur):
+        _, consolidado_hasta = _leer_marca(cur)
+        consolidado_hasta = consolidado_hasta or date.min
+
+        partes = []
+        # Días consolidados: filas preagregadas
+        if desde <= consolidado_hasta:
+            condiciones = ['dia >= %s', 'dia <= %s'] + filtros
+            partes.append((f"""
+                SELECT dia, agencia_id, empleado_id, vendedor, estado,
+                       cupones, monto_total, monto_parcial
+                FROM resumen_diario
+                WHERE {' AND '.join(condiciones)}
+            """, [desde, min(hasta, consolidado_hasta)] + params))
+        # Días sin consolidar (hoy): agregación sobre cupones, podando particiones
+        if hasta > consolidado_hasta:
+            inicio = max(desde, consolidado_hasta + timedelta(days=1))
+            condiciones = ['created_at >= %s', 'created_at < %s'] + filtros
+            partes.append((f"""
+                SELECT dia, agencia_id, empleado_id, vendedor, estado,
+                       COUNT(*)::integer AS cupones, SUM(monto_total) AS monto_total,
+                       SUM(monto_parcial) AS monto_parcial
+                FROM (
+                    SELECT created_at::date AS dia,
+                           COALESCE(agencia_id, 0) AS agencia_id,
+                           COALESCE(empleado_id, 0) AS empleado_id,
+                           COALESCE(vendedor, '') AS vendedor,
+                           COALESCE(estado, 'nuevo') AS estado,
+                           monto_total,
+                           COALESCE(monto_parcial, 0) AS monto_parcial
+                    FROM cupones
+                    WHERE {' AND '.join(condiciones)}
+                ) c
+                GROUP BY 1, 2, 3, 4, 5
+            """, [inicio, hasta + timedelta(days=1)] + params))
+
+        if not partes:
+            return []
+
+        base = ' UNION ALL '.join(sql for sql, _ in partes)
+        columnas = [DIMENSIONES[d] for d in agrupar]
+        seleccion = ''.join(f', {c}' for c in columnas)
+        grupos = ', '.join(['1'] + [str(i) for i in range(2, len(columnas) + 2)])
+        cur.execute(f"""
+            SELECT {PERIODOS[periodo]} AS periodo{seleccion},
+                   SUM(cupones)::integer AS cupones,
+                   SUM(monto_total) AS monto_total,
+                   SUM(monto_parcial) AS monto_parcial,
+                   COALESCE(SUM(cupones) FILTER (WHERE estado = 'usado'), 0)::integer AS usados,
+                   COALESCE(SUM(cupones) FILTER (WHERE estado = 'nuevo'), 0)::integer AS pendientes
+            FROM ({base}) base
+            GROUP BY {grupos}
+            ORDER BY {grupos}
+        """, [p for _, ps in partes for p in ps])
+        return cur.fetchall()
+
+
+def resumen_semanal(desde, hasta, agencia_id=None):
+    """
+    Semanas con la forma de vista_reportes_semanales, derivadas de resumen_diario.
+
+    Args:
+        desde (date): Primer día (se amplía al lunes de su semana)
+        hasta (date): Último día (se amplía al domingo de su semana)
+        agencia_id (int): Sólo esa agencia (la vista global no permite filtrarla)
+
+    Returns:
+        list[dict]: año, mes, semana_mes, fechas, totales, tasa_conversion y ticket_promedio
+    """
+    desde = desde - timedelta(days=desde.weekday())
+    hasta = hasta + timedelta(days=6 - hasta.weekday())
+
+    semanas = []
+    for fila in consultar_resumen_diario(desde, hasta, periodo='semana', agencia_id=agencia_id):
+        semana, total = semana_natural(fila['periodo']), fila['cupones']
+        semanas.append({
+            'año': semana.año,
+            'mes': semana.mes,
+            'semana_mes': semana.semana_mes,
+            'fecha_inicio_semana': semana.fecha_inicio_semana,
+            'fecha_fin_semana': semana.fecha_fin_semana,
+            'total_cupones': total,
+            'monto_total_semana': fila['monto_total'],
+            'monto_parcial_semana': fila['monto_parcial'],
+            'cupones_usados': fila['usados'],
+            'cupones_pendientes': fila['pendientes'],
+            'tasa_conversion': round(Decimal(fila['usados'] * 100) / total, 2) if fila['usados'] else Decimal(0),
+            'ticket_promedio': round(fila['monto_total'] / total, 2) if total else Decimal(0),
+        })
+    return semanas
+
+
+def verificar_resumen_diario(corregir=False):
+    """
+    Compara los días consolidados (aún presentes en cupones) con un recálculo.
+
+    Args:
+        corregir (bool): Recalcula los días con diferencias
+
+    Returns:
+        list[date]: Días con diferencias
+    """
+    with get_db() as (conn, cur):
+        _, consolidado_hasta = _leer_marca(cur)
+        if consolidado_hasta is None:
+            return []
+
+        cur.execute("""
+            WITH recalculo AS (
+                SELECT created_at::date AS dia, COALESCE(agencia_id, 0) AS agencia_id,
+                       COALESCE(empleado_id, 0) AS empleado_id, COALESCE(vendedor, '') AS vendedor,
+                       COALESCE(estado, 'nuevo') AS estado, COUNT(*)::integer AS cupones,
+                       SUM(monto_total) AS monto_total, SUM(COALESCE(monto_parcial, 0)) AS monto_parcial
+                FROM cupones
+                WHERE created_at < %s
+                GROUP BY 1, 2, 3, 4, 5
+            ),
+            mantenido AS (
+                SELECT dia, agencia_id, empleado_id, vendedor, estado, cupones, monto_total, monto_parcial
+                FROM resumen_diario
+                WHERE dia IN (SELECT DISTINCT dia FROM recalculo)
+            )
+            SELECT DISTINCT dia FROM (
+                (SELECT * FROM recalculo EXCEPT SELECT * FROM mantenido)
+                UNION ALL
+                (SELECT * FROM mantenido EXCEPT SELECT * FROM recalculo)
+            ) diferencias
+            ORDER BY dia
+        """, (consolidado_hasta + timedelta(days=1),))
+        dias = [row['dia'] for row in cur.fetchall()]
+
+        if corregir and dias:
+            cur.execute("SELECT recalcular_resumen_diario(%s::date[])", (dias,))
+        conn.commit()
+
+    return dias
+
+
+def iniciar_scheduler_resumen_diario(app):
+    """
+    Programa la consolidación cada RESUMEN_DIARIO_INTERVALO minutos con APScheduler.
+
+    El scheduler arranca con la primera petición de cada proceso (después del
+    fork de gunicorn): los comandos 'flask' (migrar, importar...) no lo
+    inician. Con varios workers cada uno programa el job; el advisory lock
+    evita trabajo duplicado.
+    """
+    lock = threading.Lock()
+    estado = {'pid': None}
+
+    def _tarea():
+        with app.app_context():
+            try:
+                consolidar_resumen_diario()
+            except Exception as e:
+                app.logger.error(f"Error consolidando resumen_diario: {e}")
+
+    def _arrancar():
+        if estado['pid'] == os.getpid():
+            return
+        with lock:
+            if estado['pid'] == os.getpid():
+                return
+            from apscheduler.schedulers.background import BackgroundScheduler
+
+            scheduler = BackgroundScheduler(daemon=True)
+            scheduler.add_job(_tarea, 'interval', minutes=app.config['RESUMEN_DIARIO_INTERVALO'],
+                              id='resumen_diario', next_run_time=datetime.now())
+            scheduler.start()
+            estado['pid'] = os.getpid()
+
+    app.before_request(_arrancar)
@@ -0,0 +1,121 @@
+"""
+Resumen Semanal de Cupones
+resumen_semanas se mantiene por triggers de deltas (migración 0002). Este módulo
+ofrece la reconstrucción incremental (backfills, reparaciones) y la verificación
+de los contadores contra un recálculo completo
+"""
+
+from app.utils.db import get_db
+
+
+# Semanas recalculadas por transacción (mantiene cortos los bloqueos sobre resumen_semanas)
+TAMANO_LOTE_SEMANAS = 12
+
+
+def _leer_marca(cur):
+    """Lee la marca de agua actual (último id procesado y última fecha de uso)"""
+    cur.execute("""
+        SELECT ultimo_cupon_id, ultima_fecha_uso
+        FROM resumen_semanas_watermark
+        WHERE id
+    """)
+    marca = cur.fetchone()
+    if not marca:
+        return 0, None
+    return marca['ultimo_cupon_id'], marca['ultima_fecha_uso']
+
+
+def reconstruir_resumen_semanas(completo=False, tamano_lote=TAMANO_LOTE_SEMANAS):
+    """
+    Recalcula únicamente las semanas afectadas desde la última ejecución.
+
+    Una semana se considera afectada si contiene cupones creados (id mayor que
+    la marca) o usados (fecha_uso posterior a la marca) desde la última pasada.
+    Cada lote de semanas se recalcula con un único GROUP BY y se confirma en su
+    propia transacción.
+
+    Args:
+        completo (bool): Ignora la marca de agua y recalcula todas las semanas
+        tamano_lote (int): Semanas por transacción
+
+    Returns:
+        dict: {'semanas': int, 'lotes': int}
+    """
+    with get_db() as (conn, cur):
+        # Serializar reconstrucciones concurrentes (app + CLI)
+        cur.execute("SELECT pg_try_advisory_lock(hashtext('resumen_semanas')) AS adquirido")
+        if not cur.fetchone()['adquirido']:
+            return {'semanas': 0, 'lotes': 0}
+
+        try:
+            ultimo_id, ultima_fecha_uso = (0, None) if completo else _leer_marca(cur)
+
+            # Capturar la nueva marca antes de leer: lo que llegue después entra en la próxima pasada
+            cur.execute("""
+                SELECT COALESCE(MAX(id), 0) AS max_id, MAX(fecha_uso) AS max_fecha_uso
+                FROM cupones
+            """)
+            nueva_marca = cur.fetchone()
+
+            if completo:
+                cur.execute("""
+                    SELECT DISTINCT date_trunc('week', created_at)::date AS inicio
+                    FROM cupones
+                    WHERE created_at IS NOT NULL
+                    ORDER BY inicio
+                """)
+            else:
+                cur.execute(
+                    "SELECT inicio FROM semanas_modificadas(%s, %s)",
+                    (ultimo_id, ultima_fecha_uso)
+                )
+            semanas = [row['inicio'] for row in cur.fetchall() if row['inicio'] is not None]
+            conn.commit()
+
+            lotes = 0
+            for i in range(0, len(semanas), tamano_lote):
+                cur.execute(
+                    "SELECT recalcular_semanas(%s::date[])",
+                    (semanas[i:i + tamano_lote],)
+                )
+                conn.commit()
+                lotes += 1
+
+            cur.execute("""
+                UPDATE resumen_semanas_watermark
+                SET ultimo_cupon_id = %s,
+                    ultima_fecha_uso = COALESCE(%s, ultima_fecha_uso),
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE id
+            """, (nueva_marca['max_id'], nueva_marca['max_fecha_uso']))
+            conn.commit()
+
+            return {'semanas': len(semanas), 'lotes': lotes}
+        finally:
+            conn.rollback()
+            cur.execute("SELECT pg_advisory_unlock(hashtext('resumen_semanas'))")
+            conn.commit()
+
+
+def verificar_resumen_semanas(corregir=False):
+    """
+    Compara los contadores mantenidos por triggers con un recálculo completo.
+
+    Args:
+        corregir (bool): Recalcula las semanas con diferencias
+
+    Returns:
+        list[dict]: Semanas con diferencias (valor mantenido vs. real)
+    """
+    with get_db() as (conn, cur):
+        cur.execute("SELECT * FROM verificar_resumen_semanas()")
+        diferencias = cur.fetchall()
+
+        if corregir and diferencias:
+            cur.execute(
+                "SELECT recalcular_semanas(%s::date[])",
+                ([row['fecha_inicio_semana'] for row in diferencias],)
+            )
+        conn.commit()
+
+    return diferencias
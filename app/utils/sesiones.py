@@ -0,0 +1,448 @@
+"""
+Registro de Sesiones
+Revocación de sesiones y estado activo de usuarios/agencias sin consultar la BD por petición
+
+La sesión de Flask es una cookie firmada: desactivar un usuario o una agencia
+no la invalida. Este registro guarda, por usuario y por agencia, una época y
+el flag activo, más la lista de sesiones revocadas (logout):
+
+- Con Redis (SESIONES_REDIS_URL): claves 'sesion:u:<id>', 'sesion:a:<id>' y
+  'sesion:s:<sid>'; cada worker mantiene un LRU local y los cambios se
+  empujan por pub/sub, de modo que la comprobación es un acceso a memoria.
+- Sin Redis: un archivo SQLite en /dev/shm compartido por los workers de la
+  máquina (búsqueda por clave primaria, microsegundos).
+
+Al iniciar sesión se registra el estado (check-in) y la sesión guarda las
+épocas vigentes. Desactivar o revocar incrementa la época: toda sesión con
+una época anterior deja de ser válida en la siguiente petición. Si el
+estado no está en el registro (p. ej. Redis reiniciado) se lee una vez de
+la BD y se vuelve a registrar.
+
+Cada cambio es atómico entre procesos (script Lua en Redis, BEGIN IMMEDIATE
+en SQLite): la época se incrementa sobre el valor vigente y el check-in y la
+carga desde la BD sólo registran si no hay estado, de modo que un login que
+leyó activo=True no deshace una desactivación concurrente.
+"""
+
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import weakref
+
+from flask import session
+
+from app.utils.cache_backend import _LRULocal
+
+
+CANAL_SESIONES = 'sesiones:cambios'
+PREFIJO = 'sesion:'
+
+# Misma lógica que _siguiente_estado(), atómica en Redis; publica el cambio
+# KEYS[1]: clave; ARGV: incremento, activo ('1', '0' o '' = conservar),
+# solo_si_falta ('1' o ''), canal y clave sin prefijo
+_LUA_ACTUALIZAR = """
+local actual = redis.call('GET', KEYS[1])
+if actual and ARGV[3] == '1' then
+    return actual
+end
+local epoca, activo = 0, '1'
+if actual then
+    local e, a = string.match(actual, '^(%d+):(%d)$')
+    epoca, activo = tonumber(e), a
+end
+if ARGV[2] ~= '' then
+    activo = ARGV[2]
+end
+local valor = string.format('%d:%s', epoca + tonumber(ARGV[1]), activo)
+redis.call('SET', KEYS[1], valor)
+redis.call('PUBLISH', ARGV[4], cjson.encode({clave = ARGV[5], valor = valor}))
+return valor
+"""
+
+
+def _siguiente_estado(actual, incremento, activo, solo_si_falta=False):
+    """
+    Nuevo valor 'época:activo' a partir del vigente.
+
+    Args:
+        actual (str | None): Valor registrado
+        incremento (int): Suma a la época
+        activo (bool | None): Nuevo flag (None conserva el registrado)
+        solo_si_falta (bool): Si ya hay valor se devuelve sin cambios
+    """
+    if actual is not None and solo_si_falta:
+        return actual
+    epoca, flag = (actual.split(':') if actual else (0, '1'))
+    if activo is not None:
+        flag = '1' if activo else '0'
+    return f'{int(epoca) + incremento}:{flag}'
+
+
+# Almacenes SQLite vivos. Un hijo no puede usar un archivo que el padre tenía
+# abierto al hacer fork (p. ej. gunicorn con preload_app): hereda el estado de
+# los locks de SQLite y escribe sin tomarlos. Se cierran antes de cada fork
+_almacenes = weakref.WeakSet()
+
+
+def _cerrar_almacenes():
+    for almacen in list(_almacenes):
+        almacen.cerrar()
+
+
+def _cerrar_conexiones(abiertas):
+    """
+    Cierra las conexiones de un almacén que se libera: una sqlite3.Connection
+    está en un ciclo de referencias (su caché de sentencias) y sin esto
+    quedaría abierta hasta que pase el recolector, quizá ya en un hijo
+    """
+    while abiertas:
+        abiertas.pop().close()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(before=_cerrar_almacenes)
+
+
+class _AlmacenSQLite:
+    """Valores con expiración en un archivo SQLite compartido entre procesos"""
+
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self._local = threading.local()
+        self._abiertas = []
+        self._generacion = 0
+        self._lock = threading.Lock()
+        _almacenes.add(self)
+        weakref.finalize(self, _cerrar_conexiones, self._abiertas)
+        self._conexion().execute("""
+            CREATE TABLE IF NOT EXISTS valores (
+                clave TEXT PRIMARY KEY,
+                valor TEXT NOT NULL,
+                expira REAL
+            )
+        """)
+
+    def _conexion(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.generacion != self._generacion:
+            conn = sqlite3.connect(self.ruta, timeout=5, isolation_level=None, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=OFF')
+            with self._lock:
+                self._abiertas.append(conn)
+            self._local.conn = conn
+            self._local.generacion = self._generacion
+        return conn
+
+    def cerrar(self):
+        """Cierra las conexiones de todos los hilos; la siguiente operación reabre"""
+        with self._lock:
+            self._generacion += 1
+            _cerrar_conexiones(self._abiertas)
+
+    def get(self, clave):
+        fila = self._conexion().execute(
+            'SELECT valor FROM valores WHERE clave = ? AND (expira IS NULL OR expira > ?)',
+            (clave, time.time())
+        ).fetchone()
+        return fila[0] if fila else None
+
+    def set(self, clave, valor, ttl=None):
+        expira = time.time() + ttl if ttl else None
+        self._conexion().execute(
+            'INSERT OR REPLACE INTO valores (clave, valor, expira) VALUES (?, ?, ?)',
+            (clave, valor, expira)
+        )
+
+    def actualizar(self, clave, funcion):
+        """
+        Reescribe un valor a partir del vigente, atómico entre procesos.
+
+        BEGIN IMMEDIATE toma el lock de escritura antes de leer: otro proceso
+        no puede cambiar el valor entre la lectura y la escritura.
+
+        Returns:
+            str: Valor resultante de funcion(actual)
+        """
+        conn = self._conexion()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            actual = self.get(clave)
+            nuevo = funcion(actual)
+            if nuevo != actual:
+                self.set(clave, nuevo)
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return nuevo
+
+    def purgar(self):
+        self._conexion().execute('DELETE FROM valores WHERE expira <= ?', (time.time(),))
+
+
+class RegistroSesiones:
+    """
+    Épocas y flags activo de usuarios/agencias, y sesiones revocadas.
+
+    Args:
+        max_local (int): Entradas del LRU local (sólo con Redis)
+        ttl_local (int): Segundos máximos de una entrada local si se pierde un aviso de pub/sub
+    """
+
+    def __init__(self, max_local=10000, ttl_local=300):
+        self._redis = None
+        self._script = None
+        self._sqlite = None
+        self.local = _LRULocal(max_local, ttl_local)
+        self._lock = threading.Lock()
+        self._suscriptor = None
+        self._db_lecturas = 0
+
+    def init_app(self, app):
+        """Elige Redis o SQLite según la configuración"""
+        self.local = _LRULocal(app.config['SESIONES_CACHE_MAX'], app.config['SESIONES_CACHE_TTL'])
+        url = app.config.get('SESIONES_REDIS_URL')
+        if url:
+            import redis
+            self._redis = redis.Redis.from_url(url, decode_responses=True)
+            self._script = self._redis.register_script(_LUA_ACTUALIZAR)
+            self._sqlite = None
+        else:
+            self._redis = None
+            self._script = None
+            self._sqlite = _AlmacenSQLite(app.config['SESIONES_SQLITE_PATH'])
+
+    # ------------------------------------------------------------------
+    # Almacén (Redis + LRU con push, o SQLite)
+    # ------------------------------------------------------------------
+
+    def _asegurar_suscripcion(self):
+        """Arranca el hilo de pub/sub en el primer uso (después del fork de gunicorn)"""
+        if self._suscriptor and self._suscriptor.is_alive():
+            return
+        with self._lock:
+            if self._suscriptor and self._suscriptor.is_alive():
+                return
+            self._suscriptor = threading.Thread(target=self._escuchar, name='sesiones-cambios', daemon=True)
+            self._suscriptor.start()
+
+    def _escuchar(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CANAL_SESIONES)
+                for mensaje in pubsub.listen():
+                    if mensaje.get('type') != 'message':
+                        continue
+                    datos = json.loads(mensaje['data'])
+                    self.local.set(datos['clave'], datos['valor'], None)
+            except Exception:
+                # Sin avisos no se puede confiar en lo cacheado
+                self.local.clear()
+                time.sleep(1)
+
+    def _leer(self, clave):
+        if self._redis is None:
+            return self._sqlite.get(clave)
+
+        self._asegurar_suscripcion()
+        valor = self.local.get(clave)
+        if valor is None:
+            # '' marca "sin registro" para no repetir la consulta a Redis
+            valor = self._redis.get(PREFIJO + clave) or ''
+            self.local.set(clave, valor, None)
+        return valor or None
+
+    def _escribir(self, clave, valor, ttl=None):
+        if self._redis is None:
+            self._sqlite.set(clave, valor, ttl)
+            if ttl:
+                self._sqlite.purgar()
+            return
+
+        self._redis.set(PREFIJO + clave, valor, ex=ttl)
+        self.local.set(clave, valor, None)
+        self._redis.publish(CANAL_SESIONES, json.dumps({'clave': clave, 'valor': valor}))
+
+    def _actualizar_estado(self, clave, incremento, activo, solo_si_falta=False):
+        """Aplica _siguiente_estado() sobre el valor vigente de forma atómica"""
+        if self._redis is None:
+            return self._sqlite.actualizar(
+                clave, lambda actual: _siguiente_estado(actual, incremento, activo, solo_si_falta)
+            )
+
+        self._asegurar_suscripcion()
+        valor = self._script(keys=[PREFIJO + clave], args=[
+            incremento, '' if activo is None else ('1' if activo else '0'),
+            '1' if solo_si_falta else '', CANAL_SESIONES, clave,
+        ])
+        # Lo local se actualiza con el aviso (en orden); escribirlo aquí podría
+        # pisar un cambio posterior ya recibido
+        self.local.delete(clave)
+        return valor
+
+    # ------------------------------------------------------------------
+    # Estado de usuarios y agencias
+    # ------------------------------------------------------------------
+
+    def estado(self, tipo, entidad_id):
+        """
+        Estado registrado de un usuario ('u') o agencia ('a').
+
+        Returns:
+            tuple[int, bool] | None: (época, activo) o None si no está registrado
+        """
+        valor = self._leer(f'{tipo}:{entidad_id}')
+        if valor is None:
+            return None
+        epoca, activo = valor.split(':')
+        return int(epoca), activo == '1'
+
+    def registrar(self, tipo, entidad_id, activo, revocar=False):
+        """
+        Registra el flag activo; revocar (o desactivar) incrementa la época.
+
+        Args:
+            activo (bool | None): Nuevo flag (None conserva el registrado)
+
+        Returns:
+            int: Época vigente
+        """
+        incremento = 1 if revocar or activo is False else 0
+        valor = self._actualizar_estado(f'{tipo}:{entidad_id}', incremento, activo)
+        return int(valor.split(':')[0])
+
+    def registrar_si_falta(self, tipo, entidad_id, activo):
+        """
+        Registra el estado sólo si no hay uno (check-in y carga desde la BD).
+
+        Un flag leído antes de una desactivación concurrente no la pisa: si
+        ya hay estado se devuelve el registrado.
+
+        Returns:
+            tuple[int, bool]: (época, activo) vigentes
+        """
+        valor = self._actualizar_estado(f'{tipo}:{entidad_id}', 0, activo, solo_si_falta=True)
+        epoca, flag = valor.split(':')
+        return int(epoca), flag == '1'
+
+    def estado_o_cargar(self, tipo, entidad_id):
+        """estado() con carga desde la BD si no está registrado"""
+        actual = self.estado(tipo, entidad_id)
+        if actual is not None:
+            return actual
+
+        from app.utils.db import get_db
+
+        tabla = 'usuarios' if tipo == 'u' else 'agencias'
+        with get_db() as (conn, cur):
+            cur.execute(f'SELECT activo FROM {tabla} WHERE id = %s', (entidad_id,))
+            fila = cur.fetchone()
+        with self._lock:
+            self._db_lecturas += 1
+        return self.registrar_si_falta(tipo, entidad_id, bool(fila and fila['activo']))
+
+    # ------------------------------------------------------------------
+    # Sesiones revocadas
+    # ------------------------------------------------------------------
+
+    def revocar_sesion(self, sid, ttl):
+        """Añade la sesión a la lista de revocadas hasta que expire su cookie"""
+        self._escribir(f's:{sid}', '1', int(ttl))
+
+    def sesion_revocada(self, sid):
+        return self._leer(f's:{sid}') == '1'
+
+    def estadisticas(self):
+        """
+        Returns:
+            dict: backend, entradas en el LRU local y lecturas de respaldo a la BD
+        """
+        return {
+            'backend': 'redis' if self._redis is not None else 'sqlite',
+            'entradas_locales': len(self.local),
+            'lecturas_bd': self._db_lecturas,
+        }
+
+
+# Instancia compartida por el proceso
+registro_sesiones = RegistroSesiones()
+
+
+def iniciar_sesion(user, agencia_activa=True):
+    """
+    Check-in al iniciar sesión: registra el estado y guarda las épocas en la sesión.
+
+    Si el usuario o la agencia ya están registrados se conserva su estado (una
+    desactivación concurrente invalida la sesión en la siguiente petición);
+    las reactivaciones pasan por activar_usuario()/activar_agencia().
+
+    Args:
+        user: Usuario autenticado (id, activo, agencia_id)
+        agencia_activa (bool): Flag activo de su agencia ya leído en el login
+    """
+    session['sid'] = secrets.token_urlsafe(16)
+    session['epoca_usuario'] = registro_sesiones.registrar_si_falta('u', user.id, bool(user.activo))[0]
+    if user.agencia_id:
+        session['epoca_agencia'] = registro_sesiones.registrar_si_falta('a', user.agencia_id, agencia_activa)[0]
+
+
+def cerrar_sesion(ttl):
+    """Revoca la sesión actual (la cookie deja de servir aunque se reenvíe)"""
+    if session.get('sid'):
+        registro_sesiones.revocar_sesion(session['sid'], ttl)
+
+
+def motivo_sesion_invalida():
+    """
+    Comprueba la sesión actual contra el registro.
+
+    Returns:
+        str | None: Mensaje para el usuario si la sesión ya no es válida
+    """
+    sid = session.get('sid')
+    if sid is None:
+        # Sesión anterior a este registro: se exige un nuevo login
+        return 'Tu sesión ha caducado. Por favor, inicia sesión nuevamente.'
+    if registro_sesiones.sesion_revocada(sid):
+        return 'Tu sesión ha sido cerrada. Por favor, inicia sesión nuevamente.'
+
+    epoca, activo = registro_sesiones.estado_o_cargar('u', session['user_id'])
+    if not activo or session.get('epoca_usuario', 0) < epoca:
+        return 'Tu cuenta ha sido desactivada o tu sesión revocada. Contacta al administrador.'
+
+    agencia_id = session.get('agencia_id')
+    if agencia_id and session.get('rol') == 'empleado':
+        epoca, activo = registro_sesiones.estado_o_cargar('a', agencia_id)
+        if not activo or session.get('epoca_agencia', 0) < epoca:
+            return 'Tu agencia ha sido desactivada. Contacta al administrador.'
+    return None
+
+
+def desactivar_usuario(user_id):
+    """Cierra todas las sesiones del usuario (llamar tras el UPDATE de usuarios.activo)"""
+    registro_sesiones.registrar('u', user_id, False)
+
+
+def activar_usuario(user_id):
+    registro_sesiones.registrar('u', user_id, True)
+
+
+def revocar_sesiones_usuario(user_id):
+    """Cierra todas las sesiones del usuario sin desactivarlo (cambio de rol o contraseña)"""
+    # Cargar el flag si falta; la revocación lo conserva (no pisa una desactivación)
+    registro_sesiones.estado_o_cargar('u', user_id)
+    registro_sesiones.registrar('u', user_id, None, revocar=True)
+
+
+def desactivar_agencia(agencia_id):
+    """Cierra las sesiones de los empleados de la agencia (tras el UPDATE de agencias.activo)"""
+    registro_sesiones.registrar('a', agencia_id, False)
+
+
+def activar_agencia(agencia_id):
+    registro_sesiones.registrar('a', agencia_id, True)
@@ -0,0 +1,79 @@
+"""
+Tiempo de Arranque de la Aplicación
+Mide en procesos nuevos la importación del paquete, cada fase de create_app
+y la primera petición, con arranque diferido y sin él
+
+Uso:
+    python benchmarks/arranque.py [--repeticiones 5] [--config development]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Se ejecuta en un intérprete limpio para que la caché de imports no falsee la medida
+SONDA = r'''
+import json, sys, time
+inicio = time.perf_counter()
+import app
+resultado = {'import': time.perf_counter() - inicio}
+
+inicio = time.perf_counter()
+try:
+    instancia = app.create_app(sys.argv[1])
+except Exception as e:
+    resultado['error_create_app'] = f'{type(e).__name__}: {e}'
+    print(json.dumps(resultado))
+    sys.exit(0)
+resultado['create_app'] = time.perf_counter() - inicio
+resultado.update({'fase:' + k: v for k, v in instancia.extensions['arranque'].items()})
+
+inicio = time.perf_counter()
+try:
+    instancia.test_client().get('/')
+    resultado['primera_peticion'] = time.perf_counter() - inicio
+except Exception as e:
+    resultado['error_primera_peticion'] = f'{type(e).__name__}: {e}'
+
+inicio = time.perf_counter()
+from app.utils.fuentes import registrar_fuentes_pdf
+with instancia.app_context():
+    registrar_fuentes_pdf()
+resultado['primer_pdf_fuentes'] = time.perf_counter() - inicio
+print(json.dumps(resultado))
+'''
+
+
+def _medir(diferido, config_name):
+    entorno = dict(os.environ, ARRANQUE_DIFERIDO='1' if diferido else '0')
+    salida = subprocess.run(
+        [sys.executable, '-c', SONDA, config_name],
+        cwd=RAIZ, env=entorno, capture_output=True, text=True, check=True
+    )
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--config', default='development')
+    args = parser.parse_args()
+
+    for diferido in (False, True):
+        muestras = [_medir(diferido, args.config) for _ in range(args.repeticiones)]
+        print(f"\nARRANQUE_DIFERIDO={'1' if diferido else '0'} (mediana de {args.repeticiones})")
+        claves = [k for k in muestras[0] if not k.startswith('error')]
+        for clave in claves:
+            valores = [m[clave] for m in muestras if clave in m]
+            print(f"  {clave:<24} {statistics.median(valores) * 1000:8.1f} ms")
+        for clave in (k for k in muestras[0] if k.startswith('error')):
+            print(f"  {clave:<24} {muestras[0][clave]}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+"""
+Benchmark de Búsqueda de Cupones
+Índice de trigramas en memoria frente a un recorrido completo, sobre cupones sintéticos
+
+    python benchmarks/busqueda.py [--cupones 1000000] [--dsn postgresql://...]
+
+Sin --dsn mide IndiceBusqueda (construcción, memoria y latencia por tipo de
+consulta) contra un recorrido lineal con 'in' (el equivalente a ILIKE
+'%...%' sin índice). Con --dsn crea la tabla UNLOGGED bench_busqueda con
+los mismos índices GIN de la migración 0014 y compara con EXPLAIN ANALYZE
+el ILIKE secuencial con la consulta de trigramas (requiere pg_trgm).
+"""
+
+import argparse
+import io
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.busqueda import IndiceBusqueda, normalizar_documento, normalizar_texto
+
+
+NOMBRES = (
+    'María', 'José', 'Juan', 'Ana', 'Luis', 'Carmen', 'Jorge', 'Lucía', 'Andrés', 'Sofía',
+    'Martín', 'Valentina', 'Diego', 'Camila', 'Julián', 'Florencia', 'Tomás', 'Agustina',
+    'Matías', 'Paula', 'Nicolás', 'Rocío', 'Ignacio', 'Belén', 'Joaquín', 'Inés',
+)
+APELLIDOS = (
+    'González', 'Rodríguez', 'Fernández', 'López', 'Martínez', 'García', 'Pérez', 'Sánchez',
+    'Romero', 'Sosa', 'Álvarez', 'Torres', 'Ruiz', 'Ramírez', 'Flores', 'Benítez', 'Acosta',
+    'Medina', 'Herrera', 'Suárez', 'Aguirre', 'Giménez', 'Gutiérrez', 'Pereyra', 'Molina',
+    'Castro', 'Ortiz', 'Silva', 'Núñez', 'Luna', 'Juárez', 'Cabrera', 'Ríos', 'Morales',
+    'Domínguez', 'Peralta', 'Ibáñez', 'Quiroga', 'Zárate', 'Echeverría', 'Villalba', 'Ledesma',
+)
+SILABAS = ('ba', 'ro', 'li', 'ta', 'mer', 'gan', 'za', 'vel', 'ca', 'ni', 'dor', 'qui', 'es', 'lan', 'tu', 'bre')
+ALFABETO = '23456789ABCDEFGHJKLMNPQRSTUVWXYZ'
+
+
+def generar_cupones(n, semilla=7):
+    aleatorio = random.Random(semilla)
+    for cupon_id in range(1, n + 1):
+        yield (
+            cupon_id,
+            aleatorio.randint(1, 40),
+            aleatorio.choice(NOMBRES),
+            # Primer apellido frecuente, segundo sintético (alta cardinalidad, como los datos reales)
+            f"{aleatorio.choice(APELLIDOS)} {''.join(aleatorio.choices(SILABAS, k=4)).capitalize()}",
+            f'{aleatorio.randint(10, 45)}.{aleatorio.randint(0, 999):03d}.{aleatorio.randint(0, 999):03d}',
+            ''.join(aleatorio.choice(ALFABETO) for _ in range(6)),
+        )
+
+
+def _errata(texto, aleatorio):
+    """Cambia una letra (error de tipeo)"""
+    i = aleatorio.randrange(1, len(texto) - 1)
+    return texto[:i] + aleatorio.choice('aeiourstn') + texto[i + 1:]
+
+
+def consultas_de_prueba(muestra, aleatorio):
+    """Tipos de consulta de recepción a partir de cupones existentes"""
+    tipos = {'apellido parcial': [], 'nombre con errata': [], 'dni parcial': [], 'código con errata': []}
+    for _, _, nombre, apellido, dni, codigo in muestra:
+        primero, segundo = apellido.split()
+        tipos['apellido parcial'].append(segundo[:max(5, len(segundo) - 2)])
+        tipos['nombre con errata'].append(f'{nombre} {primero} {_errata(segundo, aleatorio)}')
+        tipos['dni parcial'].append(normalizar_documento(dni)[-6:])
+        tipos['código con errata'].append(codigo[:2] + aleatorio.choice(ALFABETO) + codigo[3:])
+    return tipos
+
+
+def _lineal(filas, consulta):
+    """Recorrido completo con subcadena (ILIKE '%...%' sin índice, sin tolerancia a erratas)"""
+    texto = normalizar_texto(consulta)
+    documento = normalizar_documento(consulta)
+    return [
+        f[0] for f in filas
+        if texto in f[2] or (documento and documento in f[3]) or consulta.upper() == f[4]
+    ]
+
+
+def benchmark_memoria(n, repeticiones):
+    aleatorio = random.Random(11)
+    indice = IndiceBusqueda()
+
+    rss_inicio = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    inicio = time.perf_counter()
+    indice.agregar(generar_cupones(n))
+    construccion = time.perf_counter() - inicio
+    rss = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_inicio) / 1024
+    print(f"Índice en memoria: {n} cupones en {construccion:.1f}s, +{rss:.0f} MB RSS, {indice.estadisticas()}")
+
+    muestra = aleatorio.sample(list(generar_cupones(min(n, 50000))), repeticiones)
+    for tipo, consultas in consultas_de_prueba(muestra, aleatorio).items():
+        tiempos, aciertos = [], 0
+        for consulta, cupon in zip(consultas, muestra):
+            inicio = time.perf_counter()
+            resultados = indice.buscar(consulta, 20)
+            tiempos.append(time.perf_counter() - inicio)
+            aciertos += any(cupon_id == cupon[0] for _, cupon_id in indice.buscar(consulta, 1000))
+        print(f"  {tipo:<18} p50 {statistics.median(tiempos) * 1000:7.1f} ms  "
+              f"max {max(tiempos) * 1000:7.1f} ms  cupón buscado entre los resultados {aciertos}/{len(consultas)}")
+
+    # Referencia: recorrido completo (sólo unas pocas consultas, es lento)
+    filas = [
+        (c[0], c[1], normalizar_texto(f'{c[2]} {c[3]}'), normalizar_documento(c[4]), c[5])
+        for c in generar_cupones(n)
+    ]
+    tiempos = []
+    for cupon in muestra[:5]:
+        inicio = time.perf_counter()
+        _lineal(filas, cupon[3].split()[1][:6])
+        tiempos.append(time.perf_counter() - inicio)
+    print(f"  recorrido completo p50 {statistics.median(tiempos) * 1000:7.1f} ms (sin tolerancia a erratas)")
+
+
+def benchmark_postgres(dsn, n):
+    import psycopg2
+
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    cur = conn.cursor()
+    cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    cur.execute("DROP TABLE IF EXISTS bench_busqueda")
+    cur.execute("""
+        CREATE UNLOGGED TABLE bench_busqueda (
+            id integer PRIMARY KEY, agencia_id integer, nombre text, apellido text,
+            dni_pasaporte text, codigo_alfanumerico text
+        )
+    """)
+    inicio = time.perf_counter()
+    with conn.cursor() as copia:
+        lote = []
+        for fila in generar_cupones(n):
+            lote.append('\t'.join(str(v) for v in fila))
+            if len(lote) == 50000:
+                copia.copy_from(io.StringIO('\n'.join(lote) + '\n'), 'bench_busqueda')
+                lote = []
+        if lote:
+            copia.copy_from(io.StringIO('\n'.join(lote) + '\n'), 'bench_busqueda')
+    cur.execute("""
+        CREATE INDEX ON bench_busqueda USING gin (normalizar_busqueda(nombre || ' ' || apellido) gin_trgm_ops);
+        CREATE INDEX ON bench_busqueda USING gin (normalizar_documento(dni_pasaporte) gin_trgm_ops);
+        CREATE INDEX ON bench_busqueda USING gin (upper(codigo_alfanumerico) gin_trgm_ops);
+        ANALYZE bench_busqueda;
+    """)
+    print(f"PostgreSQL: {n} filas cargadas e indexadas en {time.perf_counter() - inicio:.1f}s")
+
+    consultas = {
+        'ILIKE secuencial': (
+            "SELECT id FROM bench_busqueda WHERE nombre || ' ' || apellido ILIKE %s LIMIT 20", '%gimen%'),
+        'trigramas': ("""
+            SELECT id FROM bench_busqueda
+            WHERE normalizar_busqueda(%s) <%% normalizar_busqueda(nombre || ' ' || apellido)
+               OR normalizar_documento(%s) <%% normalizar_documento(dni_pasaporte)
+            ORDER BY word_similarity(normalizar_busqueda(%s), normalizar_busqueda(nombre || ' ' || apellido)) DESC
+            LIMIT 20""", 'maria gimenez quiroga'),
+    }
+    for nombre, (sql, valor) in consultas.items():
+        params = (valor,) * sql.count('%s')
+        cur.execute('EXPLAIN (ANALYZE, FORMAT JSON) ' + sql, params)
+        plan = cur.fetchone()[0][0]
+        print(f"  {nombre:<18} {plan['Execution Time']:8.1f} ms")
+
+    cur.execute("DROP TABLE bench_busqueda")
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cupones', type=int, default=1_000_000)
+    parser.add_argument('--consultas', type=int, default=50)
+    parser.add_argument('--dsn', help='Compara además ILIKE y pg_trgm en PostgreSQL')
+    args = parser.parse_args()
+
+    benchmark_memoria(args.cupones, args.consultas)
+    if args.dsn:
+        benchmark_postgres(args.dsn, args.cupones)
+
+
+if __name__ == '__main__':
+    main()
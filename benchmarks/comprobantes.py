@@ -0,0 +1,103 @@
+"""
+Rendimiento del Motor de Comprobantes
+Mide comprobantes/segundo y RSS máximo generando cupones sintéticos en
+proceso, en un PDF combinado y en ZIP a través del pool de procesos
+
+Uso:
+    python benchmarks/comprobantes.py [--cupones 500] [--procesos 4] [--lote 50]
+"""
+
+import argparse
+import os
+import random
+import resource
+import string
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.comprobantes import MotorComprobantes, renderizar_pdf
+
+
+def cupones_sinteticos(n):
+    hoy = date.today()
+    return [{
+        'id': i,
+        'codigo_alfanumerico': ''.join(random.choices(string.ascii_uppercase + string.digits, k=6)),
+        'nombre': random.choice(['Ana', 'Luis', 'María', 'Jorge', 'Lucía']),
+        'apellido': random.choice(['Pérez', 'Gómez', 'Rodríguez', 'Fernández']),
+        'dni_pasaporte': str(random.randint(10_000_000, 99_999_999)),
+        'telefono': f'+54 9 11 {random.randint(1000, 9999)}-{random.randint(1000, 9999)}',
+        'fecha_visita': hoy + timedelta(days=random.randint(0, 60)),
+        'vendedor': 'Vendedor Demo',
+        'telefono_vendedor': None,
+        'deposito': 'efectivo',
+        'monto_total': Decimal(random.randint(10_000, 90_000)),
+        'monto_parcial': Decimal(random.randint(0, 10_000)),
+        'actividades_tour': ['Cabalgata', 'Almuerzo'],
+        'actividades_extras': ['Traslado'],
+        'estado': random.choice(['nuevo', 'usado']),
+        'updated_at': datetime.now(),
+        'agencia_nombre': 'Agencia Demo',
+    } for i in range(1, n + 1)]
+
+
+def _rss_mb(quien):
+    # ru_maxrss está en KB en Linux
+    return resource.getrusage(quien).ru_maxrss / 1024
+
+
+def _rss_hijos_mb(pool):
+    """Pico de RSS (VmHWM) de los procesos de render vivos (Linux)"""
+    total = 0.0
+    for pid in list(getattr(pool, '_processes', {}) or {}):
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for linea in f:
+                    if linea.startswith('VmHWM:'):
+                        total = max(total, int(linea.split()[1]) / 1024)
+        except OSError:
+            continue
+    return total
+
+
+def _medir(nombre, n, fn):
+    inicio = time.perf_counter()
+    tamano = fn()
+    duracion = time.perf_counter() - inicio
+    print(f"  {nombre:<32} {n / duracion:8.1f} comprobantes/s  {tamano / 1024:9.1f} KB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--cupones', type=int, default=500)
+    parser.add_argument('--procesos', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--lote', type=int, default=50)
+    args = parser.parse_args()
+
+    cupones = cupones_sinteticos(args.cupones)
+    motor = MotorComprobantes(procesos=args.procesos, tamano_lote=args.lote)
+    print(f"{args.cupones} cupones, {args.procesos} procesos, lotes de {args.lote}")
+
+    _medir('uno por documento (en proceso)', args.cupones,
+           lambda: sum(len(renderizar_pdf([c])) for c in cupones))
+    _medir('PDF combinado (en proceso)', args.cupones, lambda: len(renderizar_pdf(cupones)))
+
+    # Arranque de los procesos (imports de ReportLab) fuera de la medida
+    pool = motor._pool()
+    for tarea in [pool.submit(renderizar_pdf, cupones[:1]) for _ in range(args.procesos * 2)]:
+        tarea.result()
+    _medir('PDF combinado (pool)', args.cupones, lambda: len(motor.lote_pdf(cupones)))
+    _medir('ZIP (pool)', args.cupones, lambda: len(motor.lote_zip(cupones)))
+
+    hijos = _rss_hijos_mb(pool)
+    motor.cerrar()
+    print(f"  RSS máximo: proceso web {_rss_mb(resource.RUSAGE_SELF):.1f} MB, "
+          f"proceso de render {hijos:.1f} MB (x{args.procesos})")
+
+
+if __name__ == '__main__':
+    main()
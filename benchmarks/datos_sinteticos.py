@@ -0,0 +1,217 @@
+"""
+Datos Sintéticos
+Agencias, usuarios y cupones reproducibles (misma semilla, mismos datos) a cualquier escala
+
+    python -m benchmarks.datos_sinteticos --dsn postgresql://... --cupones 1m [--meses 24]
+
+Los cupones se cargan con COPY en lotes sobre la tabla particionada, de
+modo que los triggers de sentencia (cupones_codigos, resumen_semanas) se
+ejecutan como en una importación real. Los códigos se reservan con
+reservar_codigos_cupones() (migración 0006): nunca colisionan con los que
+la app emita después. Todas las contraseñas son CONTRASENA, con el hash
+Argon2 de la app calculado una sola vez.
+"""
+
+import argparse
+import io
+import random
+import time
+from datetime import date, datetime, timedelta
+
+import psycopg2
+
+from app.utils.hash_pool import hashear_password
+from benchmarks.busqueda import APELLIDOS, NOMBRES, SILABAS
+
+
+CONTRASENA = 'benchmark-2025'
+TAMANO_LOTE = 50_000
+
+DEPOSITOS = ('efectivo', 'transferencia', 'tarjeta')
+TOURS = ('City Tour', 'Navegación', 'Glaciar', 'Bodegas', 'Trekking', 'Cabalgata', 'Kayak')
+EXTRAS = ('Almuerzo', 'Traslado', 'Fotos', 'Guía privado')
+
+COLUMNAS_CUPONES = (
+    'codigo_alfanumerico', 'nombre', 'apellido', 'vendedor', 'dni_pasaporte', 'fecha_visita',
+    'agencia_id', 'deposito', 'monto_total', 'monto_parcial', 'actividades_tour',
+    'actividades_extras', 'telefono', 'telefono_vendedor', 'estado', 'fecha_uso',
+    'created_at', 'empleado_id',
+)
+
+
+def escala(valor):
+    """'10k', '2.5m' o '1000' -> entero"""
+    valor = str(valor).strip().lower()
+    multiplicador = {'k': 1_000, 'm': 1_000_000}.get(valor[-1:], 1)
+    return int(float(valor.rstrip('km')) * multiplicador)
+
+
+def _columnas(cur, tabla):
+    cur.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = %s
+    """, (tabla,))
+    return {fila[0] for fila in cur.fetchall()}
+
+
+def _copiar(cur, tabla, columnas, filas):
+    buffer = io.StringIO()
+    for fila in filas:
+        buffer.write('\t'.join(r'\N' if v is None else str(v) for v in fila) + '\n')
+    buffer.seek(0)
+    cur.copy_from(buffer, tabla, columns=columnas)
+
+
+def _arreglo(valores):
+    return '{' + ','.join(f'"{v}"' for v in valores) + '}'
+
+
+def generar_agencias_usuarios(cur, agencias, usuarios_por_agencia, aleatorio):
+    """
+    Returns:
+        tuple[list[int], dict[int, list[tuple[int, str]]]]: Ids de agencia y
+        (id, nombre) de sus empleados
+    """
+    columnas_agencias = _columnas(cur, 'agencias')
+    columnas_usuarios = _columnas(cur, 'usuarios')
+    password_hash = hashear_password(CONTRASENA)
+
+    ids_agencias = []
+    for i in range(agencias):
+        # La columna activo existe en las bases migradas con migrate_render_complete
+        if 'activo' in columnas_agencias:
+            cur.execute("INSERT INTO agencias (nombre, activo) VALUES (%s, true) RETURNING id",
+                        (f'Agencia {i + 1:04d}',))
+        else:
+            cur.execute("INSERT INTO agencias (nombre) VALUES (%s) RETURNING id", (f'Agencia {i + 1:04d}',))
+        ids_agencias.append(cur.fetchone()[0])
+
+    columnas = ['nombre', 'email', 'password_hash', 'rol', 'activo']
+    if 'agencia_id' in columnas_usuarios:
+        columnas.append('agencia_id')
+    filas = [('Administración', 'admin@benchmark.local', password_hash, 'administrador', 'true')
+             + ((None,) if 'agencia_id' in columnas_usuarios else ())]
+    for agencia_id in ids_agencias:
+        for j in range(usuarios_por_agencia):
+            nombre = f'{aleatorio.choice(NOMBRES)} {aleatorio.choice(APELLIDOS)}'
+            fila = (nombre, f'empleado{agencia_id}-{j}@benchmark.local', password_hash, 'empleado', 'true')
+            filas.append(fila + ((agencia_id,) if 'agencia_id' in columnas_usuarios else ()))
+    _copiar(cur, 'usuarios', columnas, filas)
+
+    cur.execute("SELECT id, nombre, email FROM usuarios WHERE rol = 'empleado' ORDER BY id")
+    empleados = {}
+    for user_id, nombre, email in cur.fetchall():
+        agencia_id = int(email[len('empleado'):].split('-')[0])
+        empleados.setdefault(agencia_id, []).append((user_id, nombre))
+    return ids_agencias, empleados
+
+
+def _cupones(codigos, ids_agencias, empleados, inicio, segundos, hoy, aleatorio):
+    ahora = datetime.now()
+    for codigo in codigos:
+        agencia_id = aleatorio.choice(ids_agencias)
+        empleado_id, vendedor = aleatorio.choice(empleados[agencia_id])
+        created_at = inicio + timedelta(seconds=aleatorio.uniform(0, segundos))
+        fecha_visita = created_at.date() + timedelta(days=aleatorio.randint(0, 30))
+        monto_total = aleatorio.randrange(20_000, 400_000, 500) / 100
+        # Check-in el día de la visita para la mayoría de las visitas pasadas
+        usado = fecha_visita < hoy and aleatorio.random() < 0.85
+        fecha_uso = datetime.combine(fecha_visita, datetime.min.time()) + timedelta(
+            hours=aleatorio.randint(7, 19), minutes=aleatorio.randint(0, 59))
+        yield (
+            codigo,
+            aleatorio.choice(NOMBRES),
+            f"{aleatorio.choice(APELLIDOS)} {''.join(aleatorio.choices(SILABAS, k=3)).capitalize()}",
+            vendedor,
+            f'{aleatorio.randint(10, 45)}{aleatorio.randint(0, 999999):06d}',
+            fecha_visita,
+            agencia_id,
+            aleatorio.choice(DEPOSITOS),
+            f'{monto_total:.2f}',
+            f'{monto_total * aleatorio.choice((0, 0, 0.3, 0.5)):.2f}',
+            _arreglo(aleatorio.sample(TOURS, aleatorio.randint(1, 3))),
+            _arreglo(aleatorio.sample(EXTRAS, aleatorio.randint(0, 2))),
+            f'+54 9 11 {aleatorio.randint(1000, 9999)}-{aleatorio.randint(1000, 9999)}',
+            None,
+            'usado' if usado else 'nuevo',
+            min(fecha_uso, ahora) if usado else None,
+            created_at,
+            empleado_id,
+        )
+
+
+def generar(dsn, cupones, agencias=None, usuarios_por_agencia=5, meses=24, semilla=7, progreso=print):
+    """
+    Carga el conjunto sintético en una base con el esquema de la app.
+
+    Args:
+        dsn (str): Base destino (se asume vacía)
+        cupones (int): Cupones a generar
+        agencias (int): Agencias (por defecto una cada 25.000 cupones, mínimo 10)
+        usuarios_por_agencia (int): Empleados por agencia
+        meses (int): Antigüedad del cupón más viejo
+        semilla (int): Semilla del generador
+        progreso (callable): Recibe mensajes de avance
+
+    Returns:
+        dict: agencias, usuarios, cupones, segundos, filas_por_segundo
+    """
+    aleatorio = random.Random(semilla)
+    agencias = agencias or max(10, cupones // 25_000)
+    hoy = date.today()
+    inicio = datetime.combine(hoy - timedelta(days=meses * 30), datetime.min.time())
+    segundos = (datetime.now() - inicio).total_seconds()
+
+    conn = psycopg2.connect(dsn)
+    comienzo = time.perf_counter()
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT crear_particiones_cupones(%s, %s)", (inicio.date(), hoy + timedelta(days=92)))
+            cur.execute("SELECT extender_calendario(%s, %s)", (inicio.date(), hoy + timedelta(days=3660)))
+            ids_agencias, empleados = generar_agencias_usuarios(cur, agencias, usuarios_por_agencia, aleatorio)
+            conn.commit()
+
+            cargados = 0
+            while cargados < cupones:
+                lote = min(TAMANO_LOTE, cupones - cargados)
+                cur.execute("SELECT codigo FROM reservar_codigos_cupones(%s) ORDER BY orden", (lote,))
+                codigos = [fila[0] for fila in cur.fetchall()]
+                _copiar(cur, 'cupones', COLUMNAS_CUPONES,
+                        _cupones(codigos, ids_agencias, empleados, inicio, segundos, hoy, aleatorio))
+                conn.commit()
+                cargados += lote
+                progreso(f"  {cargados}/{cupones} cupones")
+
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("ANALYZE")
+    finally:
+        conn.close()
+
+    duracion = time.perf_counter() - comienzo
+    return {
+        'agencias': agencias,
+        'usuarios': agencias * usuarios_por_agencia + 1,
+        'cupones': cupones,
+        'segundos': round(duracion, 1),
+        'filas_por_segundo': round(cupones / duracion) if duracion else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dsn', required=True)
+    parser.add_argument('--cupones', default='100k', help='10k, 1m, 10m...')
+    parser.add_argument('--agencias', type=int)
+    parser.add_argument('--usuarios-por-agencia', type=int, default=5)
+    parser.add_argument('--meses', type=int, default=24)
+    parser.add_argument('--semilla', type=int, default=7)
+    args = parser.parse_args()
+
+    resultado = generar(args.dsn, escala(args.cupones), args.agencias, args.usuarios_por_agencia,
+                        args.meses, args.semilla)
+    print(f"✓ {resultado}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Benchmark de Eventos de Check-in
+Latencia de reparto y reanudación con el bus en memoria (EVENTOS_ORIGEN='memoria')
+
+    python benchmarks/eventos.py [--clientes 200] [--eventos 2000]
+
+Mide el tiempo entre publicar() y que cada cliente suscrito reciba el evento,
+comprueba el filtro por agencia, el desborde de la cola acotada y la
+reanudación con Last-Event-ID. No necesita PostgreSQL.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.eventos import RECARGAR, BusEventos
+
+
+def _cliente(bus, agencia_id, total, latencias, listo):
+    suscripcion, _ = bus.suscribir(agencia_id)
+    listo.release()
+    recibidos = 0
+    while recibidos < total:
+        eventos = suscripcion.esperar(5)
+        ahora = time.perf_counter()
+        if eventos is RECARGAR or not eventos:
+            break
+        for evento in eventos:
+            assert evento['agencia_id'] == agencia_id
+            latencias.append(ahora - evento['t'])
+        recibidos += len(eventos)
+    bus.cancelar(suscripcion)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clientes', type=int, default=200)
+    parser.add_argument('--eventos', type=int, default=2000)
+    parser.add_argument('--agencias', type=int, default=10)
+    args = parser.parse_args()
+
+    bus = BusEventos(historial=args.eventos, max_cola=args.eventos)
+    bus.origen, bus.max_clientes, bus._cobertura = 'memoria', args.clientes, 0
+
+    latencias, listo = [], threading.Semaphore(0)
+    por_agencia = args.eventos // args.agencias
+    hilos = [
+        threading.Thread(target=_cliente, args=(bus, i % args.agencias + 1, por_agencia, latencias, listo))
+        for i in range(args.clientes)
+    ]
+    for hilo in hilos:
+        hilo.start()
+    for _ in hilos:
+        listo.acquire()
+
+    inicio = time.perf_counter()
+    for i in range(args.eventos):
+        bus.publicar({'cupon_id': i, 'agencia_id': i % args.agencias + 1, 'estado': 'usado', 't': time.perf_counter()})
+    for hilo in hilos:
+        hilo.join()
+    total = time.perf_counter() - inicio
+
+    latencias.sort()
+    print(f"{args.clientes} clientes, {args.eventos} eventos, {len(latencias)} entregas en {total:.2f}s")
+    print(f"  latencia p50 {statistics.median(latencias) * 1000:.2f} ms, "
+          f"p99 {latencias[int(len(latencias) * 0.99)] * 1000:.2f} ms")
+
+    # Cola acotada: un cliente que no lee pasa a 'recargar'
+    bus = BusEventos(historial=10, max_cola=5)
+    bus.origen, bus._cobertura = 'memoria', 0
+    lento, _ = bus.suscribir(None)
+    for i in range(20):
+        bus.publicar({'cupon_id': i, 'agencia_id': 1})
+    print(f"  desborde -> recargar: {'✓' if lento.esperar(0) is RECARGAR else '✗'}")
+
+    # Reanudación: dentro del historial se reenvía, fuera se pide recargar
+    _, pendientes = bus.suscribir(1, ultimo_id=17)
+    print(f"  reanudar desde 17: {'✓' if [e['id'] for e in pendientes] == [18, 19, 20] else '✗'}")
+    _, pendientes = bus.suscribir(1, ultimo_id=3)
+    print(f"  reanudar desde 3 (rotado): {'✓' if pendientes is None else '✗'}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Verificación del Rate Limiting entre Procesos
+Lanza varios procesos (como workers de gunicorn) contra el mismo storage y
+comprueba que el total de peticiones admitidas no supera el límite
+
+Uso:
+    python benchmarks/limiter_multiproceso.py [--uri sqlite:///tmp/rl.sqlite] [--estrategia moving-window]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import STRATEGIES
+
+import app.utils.limiter_storage  # noqa: F401  (registra sqlite://)
+
+
+def _worker(uri, estrategia, limite, intentos, clave, salida):
+    storage = storage_from_string(uri)
+    limiter = STRATEGIES[estrategia](storage)
+    item = parse(limite)
+
+    admitidas = 0
+    inicio = time.perf_counter()
+    for _ in range(intentos):
+        if limiter.hit(item, clave):
+            admitidas += 1
+    duracion = time.perf_counter() - inicio
+    salida.put((admitidas, duracion / intentos))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--uri', default=None, help='Storage (por defecto un SQLite temporal)')
+    parser.add_argument('--estrategia', default='moving-window', choices=sorted(STRATEGIES))
+    parser.add_argument('--limite', default='20 per hour')
+    parser.add_argument('--procesos', type=int, default=4)
+    parser.add_argument('--intentos', type=int, default=50, help='Intentos por proceso')
+    args = parser.parse_args()
+
+    uri = args.uri or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'ratelimit.sqlite')
+    clave = f'verificacion/{os.getpid()}/{time.time()}'
+    salida = multiprocessing.Queue()
+
+    procesos = [
+        multiprocessing.Process(
+            target=_worker,
+            args=(uri, args.estrategia, args.limite, args.intentos, clave, salida)
+        )
+        for _ in range(args.procesos)
+    ]
+    for p in procesos:
+        p.start()
+    resultados = [salida.get() for _ in procesos]
+    for p in procesos:
+        p.join()
+
+    admitidas = sum(r[0] for r in resultados)
+    esperado = parse(args.limite).amount
+    latencia_us = sum(r[1] for r in resultados) / len(resultados) * 1e6
+
+    print(f"Storage: {uri} ({args.estrategia})")
+    print(f"Procesos: {args.procesos} x {args.intentos} intentos, límite '{args.limite}'")
+    print(f"Admitidas: {admitidas} (esperado {esperado})")
+    print(f"Latencia media por hit: {latencia_us:.1f} µs")
+
+    if admitidas != esperado:
+        print("✗ El límite no se respeta entre procesos")
+        sys.exit(1)
+    print("✓ El límite se respeta entre procesos")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+"""
+PostgreSQL Temporal para Benchmarks
+Cluster descartable (initdb + pg_ctl) y esquema completo de la app
+
+    python -m benchmarks.postgres_temporal   # arranca, aplica el esquema e imprime el DSN
+
+PostgresTemporal crea un cluster en un directorio temporal, escucha sólo
+en un socket Unix de ese directorio y lo borra al salir. Los binarios se
+buscan en PATH, en 'pg_config --bindir' y en /usr/lib/postgresql/*/bin.
+initdb no puede ejecutarse como root: en ese caso usa --dsn contra una
+base descartable existente.
+
+preparar_esquema() carga agencias_schema.sql y aplica migrations/ con el
+mismo aplicar_migraciones() del deploy.
+"""
+
+import glob
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+
+import psycopg2
+
+from app.utils.migraciones import MIGRACIONES_DIR, aplicar_migraciones
+
+
+ESQUEMA_BASE = os.path.join(os.path.dirname(MIGRACIONES_DIR), 'agencias_schema.sql')
+
+
+def _directorio_binarios():
+    if shutil.which('initdb'):
+        return os.path.dirname(shutil.which('initdb'))
+    if shutil.which('pg_config'):
+        bindir = subprocess.run(['pg_config', '--bindir'], capture_output=True, text=True).stdout.strip()
+        if os.path.isfile(os.path.join(bindir, 'initdb')):
+            return bindir
+    # Debian/Ubuntu: /usr/lib/postgresql/<versión>/bin (la más reciente)
+    candidatos = sorted(glob.glob('/usr/lib/postgresql/*/bin/initdb'),
+                        key=lambda r: int(r.split('/')[4]) if r.split('/')[4].isdigit() else 0)
+    if candidatos:
+        return os.path.dirname(candidatos[-1])
+    raise RuntimeError('No se encontró initdb: instala PostgreSQL o usa --dsn')
+
+
+def _puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class PostgresTemporal:
+    """
+    Context manager con un cluster PostgreSQL descartable.
+
+    Args:
+        durable (bool): Conserva fsync/synchronous_commit (por defecto se
+            desactivan: las cifras absolutas de escritura bajan, pero la
+            comparación entre dos ejecuciones sigue siendo válida)
+        parametros (dict): GUCs adicionales (p. ej. {'shared_buffers': '1GB'})
+    """
+
+    def __init__(self, durable=False, parametros=None):
+        self.durable = durable
+        self.parametros = parametros or {}
+        self.directorio = None
+        self.dsn = None
+        self._bindir = None
+
+    def __enter__(self):
+        if hasattr(os, 'geteuid') and os.geteuid() == 0:
+            raise RuntimeError('initdb no se ejecuta como root: usa un usuario sin privilegios o --dsn')
+
+        self._bindir = _directorio_binarios()
+        self.directorio = tempfile.mkdtemp(prefix='cupones-bench-')
+        datos = os.path.join(self.directorio, 'datos')
+        subprocess.run(
+            [os.path.join(self._bindir, 'initdb'), '-D', datos, '-U', 'postgres',
+             '-A', 'trust', '-E', 'UTF8', '--locale=C', '-N'],
+            check=True, stdout=subprocess.DEVNULL,
+        )
+
+        puerto = _puerto_libre()
+        parametros = {'listen_addresses': "''", 'max_connections': 200, **self.parametros}
+        if not self.durable:
+            parametros.update(fsync='off', synchronous_commit='off', full_page_writes='off')
+        opciones = f'-p {puerto} -k {self.directorio} ' + ' '.join(f'-c {k}={v}' for k, v in parametros.items())
+        try:
+            subprocess.run(
+                [os.path.join(self._bindir, 'pg_ctl'), '-D', datos, '-o', opciones,
+                 '-l', os.path.join(self.directorio, 'postgres.log'), '-w', 'start'],
+                check=True, stdout=subprocess.DEVNULL,
+            )
+        except subprocess.CalledProcessError:
+            shutil.rmtree(self.directorio, ignore_errors=True)
+            raise
+
+        self.dsn = f'postgresql://postgres@/postgres?host={self.directorio}&port={puerto}'
+        return self
+
+    def __exit__(self, *exc):
+        subprocess.run(
+            [os.path.join(self._bindir, 'pg_ctl'), '-D', os.path.join(self.directorio, 'datos'),
+             '-m', 'immediate', 'stop'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+        shutil.rmtree(self.directorio, ignore_errors=True)
+        return False
+
+
+def preparar_esquema(dsn):
+    """
+    Esquema base más todas las migraciones versionadas.
+
+    Args:
+        dsn (str): Base vacía
+
+    Returns:
+        list[str]: Migraciones aplicadas
+    """
+    conn = psycopg2.connect(dsn)
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('public.cupones') IS NOT NULL")
+            if not cur.fetchone()[0]:
+                with open(ESQUEMA_BASE, encoding='utf-8') as f:
+                    cur.execute(f.read())
+    finally:
+        conn.close()
+    return aplicar_migraciones(dsn)
+
+
+if __name__ == '__main__':
+    with PostgresTemporal() as pg:
+        print(f"✓ {len(preparar_esquema(pg.dsn))} migraciones aplicadas")
+        print(f"DSN: {pg.dsn}")
+        input('Enter para detener y borrar el cluster... ')
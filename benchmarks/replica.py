@@ -0,0 +1,144 @@
+"""
+Verificación de la Réplica de Lectura
+Enrutamiento de get_db() entre primario y réplica, retraso y read-your-writes
+
+    python benchmarks/replica.py [--primario postgresql://...] [--replica postgresql://...]
+
+Sin DSN comprueba la tabla de decisión de MonitorReplica (retraso, caída y
+lectura propia) con retrasos fijos. Con --primario (y --replica; por
+defecto la misma instancia, que cuenta como réplica sin retraso) monta una
+app mínima con dos rutas y comprueba a qué pool llega cada consulta
+(transaction_read_only = on sólo en la réplica), el desvío al primario
+tras una escritura del usuario y con la réplica atrasada, y mide el costo
+de la decisión por petición.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify
+
+from app.utils import db
+from app.utils.decorators import solo_lectura
+
+
+class _MonitorFijo(db.MonitorReplica):
+    """Retraso fijo en lugar de medirlo (sólo para la tabla de decisión)"""
+
+    def __init__(self, lag, lag_max=5.0):
+        super().__init__(lag_max=lag_max)
+        self._fijo = lag
+
+    def lag(self):
+        return self._fijo
+
+
+def verificar_decision():
+    ahora = time.time()
+    casos = (
+        ('réplica al día', _MonitorFijo(0.2), None, None),
+        ('réplica atrasada', _MonitorFijo(30.0), None, 'retraso'),
+        ('réplica caída', _MonitorFijo(None), None, 'caida'),
+        ('escritura reciente', _MonitorFijo(0.2), ahora - 0.5, 'lectura_propia'),
+        ('escritura ya replicada', _MonitorFijo(0.2), ahora - 10, None),
+    )
+    ok = True
+    for nombre, monitor, escritura_en, esperado in casos:
+        motivo = monitor.motivo_desvio(escritura_en)
+        marca = '✓' if motivo == esperado else '✗'
+        ok &= motivo == esperado
+        print(f"{marca} {nombre:<24} -> {motivo or 'replica'}")
+    return ok
+
+
+def _app(primario, replica):
+    app = Flask(__name__)
+    app.config.update(
+        SECRET_KEY='benchmark', DATABASE_URL=primario, DATABASE_REPLICA_URL=replica,
+        DB_POOL_MAX=4, DB_REPLICA_POOL_MAX=4, DB_REPLICA_VERIFICAR=0.5,
+    )
+    db.init_pool(config=app.config)
+    db.init_lectura_propia(app)
+
+    def _destino():
+        with db.get_db() as (_, cur):
+            cur.execute("SELECT current_setting('transaction_read_only') AS solo_lectura")
+            return 'replica' if cur.fetchone()['solo_lectura'] == 'on' else 'primario'
+
+    @app.route('/reporte')
+    @solo_lectura
+    def reporte():
+        return jsonify(destino=_destino())
+
+    @app.route('/escritura', methods=['POST'])
+    def escritura():
+        # Una transacción confirmada en el primario durante un POST
+        with db.get_db() as (_, cur):
+            cur.execute("SELECT 1")
+        return jsonify(destino='primario')
+
+    return app
+
+
+def verificar_enrutamiento(primario, replica, peticiones):
+    app = _app(primario, replica)
+    cliente = app.test_client()
+    ok = True
+
+    def comprobar(nombre, esperado):
+        nonlocal ok
+        destino = cliente.get('/reporte').get_json()['destino']
+        ok &= destino == esperado
+        print(f"{'✓' if destino == esperado else '✗'} {nombre:<32} -> {destino}")
+
+    comprobar('reporte @solo_lectura', 'replica')
+    cliente.post('/escritura')
+    comprobar('reporte tras escritura propia', 'primario')
+    time.sleep(db.monitor_replica.lag() + 1.1)
+    comprobar('reporte pasada la escritura', 'replica')
+
+    lag_max = db.monitor_replica.lag_max
+    db.monitor_replica.lag_max = -1
+    comprobar('réplica por encima de LAG_MAX', 'primario')
+    db.monitor_replica.lag_max = lag_max
+
+    with app.app_context(), db.en_replica():
+        with db.get_db() as (_, cur):
+            cur.execute("SELECT current_setting('transaction_read_only') AS solo_lectura")
+            en_replica = cur.fetchone()['solo_lectura'] == 'on'
+    ok &= en_replica
+    print(f"{'✓' if en_replica else '✗'} {'en_replica() fuera de petición':<32} -> "
+          f"{'replica' if en_replica else 'primario'}")
+
+    tiempos = []
+    for _ in range(peticiones):
+        inicio = time.perf_counter()
+        cliente.get('/reporte')
+        tiempos.append(time.perf_counter() - inicio)
+    print(f"  /reporte p50 {statistics.median(tiempos) * 1000:.2f} ms ({peticiones} peticiones), "
+          f"pools: primario {db.estadisticas_pool('primario')}, replica {db.estadisticas_pool('replica')}")
+
+    db.close_pool()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--primario', help='DSN del primario')
+    parser.add_argument('--replica', help='DSN de la réplica (por defecto el primario)')
+    parser.add_argument('--peticiones', type=int, default=500)
+    args = parser.parse_args()
+
+    ok = verificar_decision()
+    if args.primario:
+        ok &= verificar_enrutamiento(args.primario, args.replica or args.primario, args.peticiones)
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
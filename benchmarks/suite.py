@@ -0,0 +1,405 @@
+"""
+Suite de Rendimiento de Extremo a Extremo
+Escenarios de carga contra un PostgreSQL descartable, con línea base y umbrales de regresión
+
+    python -m benchmarks.suite [--cupones 100k] [--escenarios login,checkin,reportes,resumenes]
+                               [--hilos 8] [--duracion 20] [--dsn postgresql://...]
+                               [--linea-base benchmarks/linea_base.json] [--guardar] [--tolerancia 0.2]
+
+Sin --dsn levanta un cluster temporal (benchmarks/postgres_temporal.py),
+aplica esquema y migraciones y genera los datos sintéticos; con --dsn usa
+esa base (debe ser descartable: la suite escribe en ella).
+
+Escenarios (cada uno con --hilos concurrentes durante --duracion segundos):
+
+- login: ráfaga de logins; lectura del usuario por email y verificación
+  Argon2 en el pool acotado (los rechazos por saturación se cuentan aparte).
+- checkin: canje de cupones pendientes por código (buscar_codigo + UPDATE
+  de estado, con los triggers de resumen y NOTIFY de check-in).
+- reportes: /api/resumenes/semanal y /diario por el test client de la app
+  (sesión de administración, enrutamiento a réplica y ETags incluidos).
+- resumenes: reconstrucción completa de resumen_semanas y consolidación
+  completa de resumen_diario (secuencial, --repeticiones veces).
+
+El resultado (percentiles, throughput, errores y entorno) se escribe en
+--salida. Con --linea-base se compara contra la entrada de la misma escala
+y la suite sale con código 1 si p95 empeora o el throughput cae más que
+--tolerancia; --guardar la reemplaza por la ejecución actual.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import secrets
+import subprocess
+import threading
+import time
+from collections import deque
+from datetime import date, timedelta
+
+# Antes de importar la app: Config lee el entorno al importarse
+os.environ.setdefault('METRICAS_HABILITADAS', '0')
+os.environ.setdefault('EVENTOS_ORIGEN', 'memoria')
+os.environ.setdefault('RATELIMIT_STORAGE_URI', 'memory://')
+os.environ.setdefault('RESUMEN_DIARIO_SCHEDULER', '0')
+
+from benchmarks.datos_sinteticos import CONTRASENA, escala, generar  # noqa: E402
+from benchmarks.postgres_temporal import PostgresTemporal, preparar_esquema  # noqa: E402
+
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ESCENARIOS = ('login', 'checkin', 'reportes', 'resumenes')
+
+# Métricas comparadas con la línea base: (clave, True si mayor es peor)
+COMPARADAS = (('p95_ms', True), ('ops_por_segundo', False))
+
+
+def percentil(valores, p):
+    """Percentil por rango más cercano (valores ordenados)"""
+    if not valores:
+        return None
+    indice = min(len(valores) - 1, max(0, round(p / 100 * len(valores) + 0.5) - 1))
+    return valores[indice]
+
+
+def _resumir(latencias, duracion, errores, rechazos, primer_error):
+    latencias.sort()
+    return {
+        'operaciones': len(latencias),
+        'errores': errores,
+        'rechazos': rechazos,
+        'primer_error': primer_error,
+        'ops_por_segundo': round(len(latencias) / duracion, 1) if duracion else None,
+        **{f'p{p}_ms': round(percentil(latencias, p) * 1000, 2) if latencias else None for p in (50, 95, 99)},
+        'max_ms': round(latencias[-1] * 1000, 2) if latencias else None,
+    }
+
+
+def ejecutar_concurrente(app, operacion, hilos, duracion, rechazo=()):
+    """
+    Ejecuta operacion(aleatorio) en bucle desde varios hilos durante 'duracion' segundos.
+
+    La operación devuelve False cuando ya no queda trabajo (p. ej. sin
+    cupones por canjear). Las excepciones de 'rechazo' cuentan como
+    back-pressure, el resto como errores.
+
+    Returns:
+        dict: operaciones, errores, rechazos, ops_por_segundo y percentiles en ms
+    """
+    latencias, lock = [], threading.Lock()
+    contadores = {'errores': 0, 'rechazos': 0, 'primer_error': None}
+    fin = time.monotonic() + duracion
+
+    def _hilo(semilla):
+        aleatorio = random.Random(semilla)
+        propias = []
+        with app.app_context():
+            while time.monotonic() < fin:
+                inicio = time.perf_counter()
+                try:
+                    seguir = operacion(aleatorio)
+                except rechazo:
+                    with lock:
+                        contadores['rechazos'] += 1
+                    continue
+                except Exception as e:
+                    with lock:
+                        contadores['errores'] += 1
+                        contadores['primer_error'] = contadores['primer_error'] or repr(e)
+                    continue
+                if seguir is False:
+                    break
+                propias.append(time.perf_counter() - inicio)
+        with lock:
+            latencias.extend(propias)
+
+    comienzo = time.perf_counter()
+    trabajadores = [threading.Thread(target=_hilo, args=(i,)) for i in range(hilos)]
+    for t in trabajadores:
+        t.start()
+    for t in trabajadores:
+        t.join()
+    return _resumir(latencias, time.perf_counter() - comienzo, contadores['errores'],
+                    contadores['rechazos'], contadores['primer_error'])
+
+
+# ----------------------------------------------------------------------
+# Escenarios
+# ----------------------------------------------------------------------
+
+def escenario_login(app, args):
+    from app.utils.db import PoolAgotado, get_db
+    from app.utils.hash_pool import PoolSaturado, verificar_password
+
+    with app.app_context(), get_db() as (_, cur):
+        cur.execute("SELECT email FROM usuarios WHERE activo ORDER BY id")
+        emails = [fila['email'] for fila in cur.fetchall()]
+
+    def _login(aleatorio):
+        with get_db() as (_, cur):
+            cur.execute("SELECT id, password_hash, activo FROM usuarios WHERE email = %s",
+                        (aleatorio.choice(emails),))
+            usuario = cur.fetchone()
+        if not verificar_password(CONTRASENA, usuario['password_hash']):
+            raise AssertionError('contraseña rechazada')
+
+    return ejecutar_concurrente(app, _login, args.hilos, args.duracion, (PoolSaturado, PoolAgotado))
+
+
+def escenario_checkin(app, args):
+    from app.utils.db import PoolAgotado, get_db
+    from app.utils.particiones import buscar_codigo
+
+    with app.app_context(), get_db() as (_, cur):
+        cur.execute("""
+            SELECT codigo_alfanumerico FROM cupones
+            WHERE estado = 'nuevo' AND fecha_visita >= CURRENT_DATE - 30
+            LIMIT %s
+        """, (args.hilos * args.duracion * 2000,))
+        codigos = [fila['codigo_alfanumerico'] for fila in cur.fetchall()]
+    random.Random(3).shuffle(codigos)
+    pendientes = deque(codigos)
+
+    def _canjear(aleatorio):
+        try:
+            codigo = pendientes.pop()
+        except IndexError:
+            return False
+        cupon = buscar_codigo(codigo)
+        with get_db() as (_, cur):
+            cur.execute("""
+                UPDATE cupones SET estado = 'usado', fecha_uso = CURRENT_TIMESTAMP
+                WHERE id = %s AND created_at = %s AND estado = 'nuevo'
+            """, (cupon['id'], cupon['created_at']))
+        return True
+
+    return ejecutar_concurrente(app, _canjear, args.hilos, args.duracion, (PoolAgotado,))
+
+
+def escenario_reportes(app, args):
+    from app.utils.db import get_db
+    from app.utils.sesiones import registro_sesiones
+
+    with app.app_context(), get_db() as (_, cur):
+        cur.execute("SELECT id FROM usuarios ORDER BY id LIMIT 1")
+        admin_id = cur.fetchone()['id']
+        cur.execute("SELECT min(created_at)::date AS desde, max(created_at)::date AS hasta FROM cupones")
+        rango = cur.fetchone()
+    # El rango más largo (12 semanas) debe terminar antes de hoy
+    dias = max(1, (min(rango['hasta'], date.today()) - rango['desde']).days - 84)
+    clientes = threading.local()
+
+    def _cliente():
+        if getattr(clientes, 'cliente', None) is None:
+            cliente = app.test_client()
+            with cliente.session_transaction() as sesion:
+                sesion.update(user_id=admin_id, rol='admin', sid=secrets.token_urlsafe(16),
+                              epoca_usuario=registro_sesiones.registrar('u', admin_id, True))
+            clientes.cliente = cliente
+        return clientes.cliente
+
+    def _reporte(aleatorio):
+        # Rango de 4 a 12 semanas en una posición al azar (sin If-None-Match: sin 304)
+        desde = rango['desde'] + timedelta(days=aleatorio.randint(0, dias))
+        hasta = desde + timedelta(weeks=aleatorio.randint(4, 12))
+        if aleatorio.random() < 0.5:
+            url = f'/api/resumenes/semanal?desde={desde}&hasta={hasta}'
+        else:
+            url = f'/api/resumenes/diario?desde={desde}&hasta={hasta}&periodo=semana&agrupar=agencia'
+        respuesta = _cliente().get(url)
+        if respuesta.status_code != 200:
+            raise RuntimeError(f'{url} -> {respuesta.status_code}')
+
+    return ejecutar_concurrente(app, _reporte, args.hilos, args.duracion)
+
+
+def escenario_resumenes(app, args):
+    from app.utils.resumen_diario import consolidar_resumen_diario
+    from app.utils.resumenes import reconstruir_resumen_semanas
+
+    latencias, errores, primer_error = [], 0, None
+    comienzo = time.perf_counter()
+    with app.app_context():
+        for _ in range(args.repeticiones):
+            for reconstruir in (lambda: reconstruir_resumen_semanas(completo=True),
+                                lambda: consolidar_resumen_diario(completo=True)):
+                inicio = time.perf_counter()
+                try:
+                    reconstruir()
+                except Exception as e:
+                    errores += 1
+                    primer_error = primer_error or repr(e)
+                    continue
+                latencias.append(time.perf_counter() - inicio)
+    return _resumir(latencias, time.perf_counter() - comienzo, errores, 0, primer_error)
+
+
+FUNCIONES = {
+    'login': escenario_login,
+    'checkin': escenario_checkin,
+    'reportes': escenario_reportes,
+    'resumenes': escenario_resumenes,
+}
+
+
+# ----------------------------------------------------------------------
+# App, entorno y línea base
+# ----------------------------------------------------------------------
+
+def crear_app(dsn, hilos):
+    """create_app contra la base de la suite, con un pool por hilo y sin rate limiting"""
+    from app import create_app
+    from app.extensions import limiter
+    from app.utils.db import init_pool
+
+    app = create_app('development')
+    app.config.update(
+        SECRET_KEY=app.config['SECRET_KEY'] or secrets.token_hex(16),
+        DATABASE_URL=dsn,
+        DB_POOL_MAX=hilos,
+        DB_POOL_OVERFLOW=0,
+        DB_MAX_CONEXIONES=hilos * 2,
+    )
+    init_pool(config=app.config)
+    # Los escenarios repiten IP: el limiter los cortaría con 429
+    limiter.enabled = False
+    return app
+
+
+def entorno(dsn):
+    import psycopg2
+
+    conn = psycopg2.connect(dsn)
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SHOW server_version")
+            version = cur.fetchone()[0]
+    finally:
+        conn.close()
+    commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ,
+                            capture_output=True, text=True).stdout.strip() or None
+    return {
+        'fecha': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'postgres': version,
+        'cpus': os.cpu_count(),
+        'maquina': platform.node(),
+    }
+
+
+def comparar(actual, base, tolerancia):
+    """
+    Returns:
+        list[tuple[str, str, float, float, bool]]: (escenario, métrica, base, actual, regresión)
+    """
+    filas = []
+    for nombre, resultado in actual.items():
+        previo = base.get(nombre)
+        if not previo:
+            continue
+        for clave, mayor_es_peor in COMPARADAS:
+            a, b = resultado.get(clave), previo.get(clave)
+            if a is None or not b:
+                continue
+            regresion = a > b * (1 + tolerancia) if mayor_es_peor else a < b * (1 - tolerancia)
+            filas.append((nombre, clave, b, a, regresion))
+    return filas
+
+
+def ejecutar(dsn, args, preparar):
+    if preparar:
+        aplicadas = preparar_esquema(dsn)
+        print(f"✓ Esquema: {len(aplicadas)} migraciones")
+        datos = generar(dsn, escala(args.cupones), semilla=args.semilla, progreso=lambda m: None)
+        print(f"✓ Datos: {datos}")
+    else:
+        datos = None
+
+    app = crear_app(dsn, args.hilos)
+    resultados = {}
+    for nombre in args.escenarios:
+        resultado = FUNCIONES[nombre](app, args)
+        resultados[nombre] = resultado
+        marca = '✗' if resultado['errores'] else '✓'
+        print(f"{marca} {nombre:<10} {resultado['operaciones']:>7} ops  {resultado['ops_por_segundo']} ops/s  "
+              f"p50 {resultado['p50_ms']} ms  p95 {resultado['p95_ms']} ms  p99 {resultado['p99_ms']} ms  "
+              f"errores {resultado['errores']}  rechazos {resultado['rechazos']}")
+        if resultado['primer_error']:
+            print(f"    primer error: {resultado['primer_error']}")
+
+    from app.utils.db import close_pool
+    close_pool()
+    return {
+        'entorno': entorno(dsn),
+        'parametros': {'cupones': args.cupones, 'hilos': args.hilos, 'duracion': args.duracion,
+                       'repeticiones': args.repeticiones, 'semilla': args.semilla},
+        'datos': datos,
+        'escenarios': resultados,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dsn', help='Base descartable existente (por defecto, cluster temporal)')
+    parser.add_argument('--sin-preparar', action='store_true', help='Con --dsn: no cargar esquema ni datos')
+    parser.add_argument('--durable', action='store_true', help='Cluster temporal con fsync activado')
+    parser.add_argument('--cupones', default='100k', help='10k, 1m, 10m...')
+    parser.add_argument('--escenarios', default=','.join(ESCENARIOS))
+    parser.add_argument('--hilos', type=int, default=8)
+    parser.add_argument('--duracion', type=int, default=20, help='Segundos por escenario concurrente')
+    parser.add_argument('--repeticiones', type=int, default=3, help='Pasadas del escenario resumenes')
+    parser.add_argument('--semilla', type=int, default=7)
+    parser.add_argument('--salida', default=os.path.join(RAIZ, 'benchmarks', 'resultado.json'))
+    parser.add_argument('--linea-base', help='JSON con una entrada por escala de cupones')
+    parser.add_argument('--guardar', action='store_true', help='Reemplaza la línea base de esta escala')
+    parser.add_argument('--tolerancia', type=float, default=0.2, help='Empeoramiento admitido (0.2 = 20%%)')
+    args = parser.parse_args()
+    args.escenarios = [e for e in args.escenarios.split(',') if e]
+    desconocidos = [e for e in args.escenarios if e not in FUNCIONES]
+    if desconocidos:
+        parser.error(f"Escenarios desconocidos: {', '.join(desconocidos)}")
+
+    if args.dsn:
+        resultado = ejecutar(args.dsn, args, preparar=not args.sin_preparar)
+    else:
+        with PostgresTemporal(durable=args.durable) as pg:
+            resultado = ejecutar(pg.dsn, args, preparar=True)
+
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False, default=str)
+    print(f"✓ Resultado en {args.salida}")
+
+    if not args.linea_base:
+        return
+    try:
+        with open(args.linea_base, encoding='utf-8') as f:
+            linea_base = json.load(f)
+    except FileNotFoundError:
+        linea_base = {}
+
+    clave = str(escala(args.cupones))
+    regresiones = []
+    if clave in linea_base:
+        for nombre, metrica, base, actual, regresion in comparar(
+                resultado['escenarios'], linea_base[clave]['escenarios'], args.tolerancia):
+            print(f"{'✗' if regresion else '✓'} {nombre:<10} {metrica:<16} base {base:>10}  actual {actual:>10}")
+            if regresion:
+                regresiones.append(f'{nombre}.{metrica}')
+    else:
+        print(f"Sin línea base para {clave} cupones")
+
+    if args.guardar:
+        linea_base[clave] = resultado
+        with open(args.linea_base, 'w', encoding='utf-8') as f:
+            json.dump(linea_base, f, indent=2, ensure_ascii=False, default=str)
+        print(f"✓ Línea base de {clave} cupones actualizada en {args.linea_base}")
+    elif regresiones:
+        print(f"✗ Regresiones (tolerancia {args.tolerancia:.0%}): {', '.join(regresiones)}")
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""
+Configuración de Gunicorn
+Prepara el directorio de métricas multiproceso compartido por los workers
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+
+import os
+
+from app.config import Config
+
+
+# El mismo valor con el que Config reparte DB_MAX_CONEXIONES entre workers
+workers = Config.WEB_CONCURRENCY
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+
+# Hilos por worker: cada cliente SSE de check-in ocupa uno mientras está conectado
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+
+# Todos los workers (y /metrics) deben usar el mismo directorio
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', Config.METRICAS_DIR)
+
+
+def on_starting(server):
+    """Descarta las métricas de la ejecución anterior antes de crear los workers"""
+    from app.utils.metricas import limpiar_directorio
+
+    directorio = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    os.makedirs(directorio, exist_ok=True)
+    limpiar_directorio(directorio)
+
+
+def child_exit(server, worker):
+    """Los gauges 'live' de un worker terminado dejan de sumarse"""
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,123 @@
+--
+-- 0001: Reconstrucción incremental y set-based de resumen_semanas
+--
+-- Sustituye el bucle por día de procesar_datos_historicos() por un único
+-- GROUP BY por lote de semanas. Los filtros usan rangos sobre created_at
+-- (en lugar de DATE(created_at)) para que los índices sobre la columna
+-- puedan usarse.
+--
+
+--
+-- Name: resumen_semanas_watermark; Type: TABLE; Schema: public
+-- Marca de agua de la última reconstrucción (fila única)
+--
+
+CREATE TABLE IF NOT EXISTS public.resumen_semanas_watermark (
+    id boolean PRIMARY KEY DEFAULT true,
+    ultimo_cupon_id integer NOT NULL DEFAULT 0,
+    ultima_fecha_uso timestamp without time zone,
+    updated_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT resumen_semanas_watermark_unica CHECK (id)
+);
+
+INSERT INTO public.resumen_semanas_watermark (id) VALUES (true)
+ON CONFLICT (id) DO NOTHING;
+
+
+--
+-- Name: recalcular_semanas(date[]); Type: FUNCTION; Schema: public
+-- Recalcula las semanas indicadas (lunes de cada semana) con un único GROUP BY
+--
+
+CREATE OR REPLACE FUNCTION public.recalcular_semanas(p_inicios date[]) RETURNS integer
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    total_semanas INTEGER;
+BEGIN
+    INSERT INTO public.resumen_semanas (
+        año, mes, semana_mes, fecha_inicio_semana, fecha_fin_semana,
+        total_cupones, monto_total_semana, monto_parcial_semana,
+        cupones_usados, cupones_pendientes
+    )
+    SELECT
+        EXTRACT(YEAR FROM s.inicio)::INTEGER,
+        EXTRACT(MONTH FROM s.inicio)::INTEGER,
+        CEIL(EXTRACT(DAY FROM s.inicio) / 7.0)::INTEGER,
+        s.inicio,
+        s.inicio + 6,
+        COUNT(c.id),
+        COALESCE(SUM(c.monto_total), 0),
+        COALESCE(SUM(c.monto_parcial), 0),
+        COUNT(c.id) FILTER (WHERE c.estado = 'usado'),
+        COUNT(c.id) FILTER (WHERE c.estado = 'nuevo')
+    FROM (SELECT DISTINCT unnest(p_inicios) AS inicio) s
+    LEFT JOIN public.cupones c
+           ON c.created_at >= s.inicio
+          AND c.created_at < s.inicio + 7
+    GROUP BY s.inicio
+    ON CONFLICT (año, mes, semana_mes)
+    DO UPDATE SET
+        total_cupones = EXCLUDED.total_cupones,
+        monto_total_semana = EXCLUDED.monto_total_semana,
+        monto_parcial_semana = EXCLUDED.monto_parcial_semana,
+        cupones_usados = EXCLUDED.cupones_usados,
+        cupones_pendientes = EXCLUDED.cupones_pendientes,
+        updated_at = CURRENT_TIMESTAMP;
+
+    GET DIAGNOSTICS total_semanas = ROW_COUNT;
+    RETURN total_semanas;
+END;
+$$;
+
+
+--
+-- Name: semanas_modificadas(integer, timestamp); Type: FUNCTION; Schema: public
+-- Lunes de las semanas con cupones creados o usados después de la marca de agua
+--
+
+CREATE OR REPLACE FUNCTION public.semanas_modificadas(p_ultimo_id integer, p_ultima_fecha_uso timestamp without time zone)
+    RETURNS TABLE(inicio date)
+    LANGUAGE sql STABLE
+    AS $$
+    SELECT date_trunc('week', c.created_at)::date
+    FROM public.cupones c
+    WHERE c.id > p_ultimo_id
+    UNION
+    SELECT date_trunc('week', c.created_at)::date
+    FROM public.cupones c
+    WHERE p_ultima_fecha_uso IS NOT NULL
+      AND c.fecha_uso > p_ultima_fecha_uso
+    ORDER BY 1;
+$$;
+
+
+--
+-- Name: procesar_datos_historicos(); Type: FUNCTION; Schema: public
+-- Reemplazo set-based: recalcula todas las semanas con cupones en una sola pasada
+--
+
+CREATE OR REPLACE FUNCTION public.procesar_datos_historicos() RETURNS integer
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    RETURN public.recalcular_semanas(ARRAY(
+        SELECT DISTINCT date_trunc('week', created_at)::date
+        FROM public.cupones
+        WHERE created_at IS NOT NULL
+    ));
+END;
+$$;
+
+
+--
+-- Name: procesar_semana_actual(); Type: FUNCTION; Schema: public
+--
+
+CREATE OR REPLACE FUNCTION public.procesar_semana_actual() RETURNS void
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    PERFORM public.recalcular_semanas(ARRAY[date_trunc('week', CURRENT_DATE)::date]);
+END;
+$$;
@@ -0,0 +1,237 @@
+--
+-- 0002: resumen_semanas mantenido por triggers (deltas)
+--
+-- Cada INSERT/UPDATE/DELETE sobre cupones aplica la diferencia de contadores
+-- a la fila de la semana correspondiente. Los triggers son a nivel de sentencia
+-- con tablas de transición, de modo que una carga masiva genera un único upsert
+-- por semana afectada en lugar de uno por cupón.
+--
+
+--
+-- Name: bloquear_semanas_resumen(date[], boolean); Type: FUNCTION; Schema: public
+-- Advisory lock de transacción por semana de resumen_semanas: compartido
+-- para los deltas (no se bloquean entre sí), exclusivo para un recálculo
+-- absoluto de esas semanas. Siempre en orden de fecha (sin deadlocks)
+--
+
+CREATE OR REPLACE FUNCTION public.bloquear_semanas_resumen(p_inicios date[], p_exclusivo boolean DEFAULT false)
+    RETURNS void
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    inicio DATE;
+BEGIN
+    FOR inicio IN SELECT DISTINCT s FROM unnest(p_inicios) s WHERE s IS NOT NULL ORDER BY 1 LOOP
+        IF p_exclusivo THEN
+            PERFORM pg_advisory_xact_lock(hashtext('resumen_semanas'), inicio - DATE '2000-01-03');
+        ELSE
+            PERFORM pg_advisory_xact_lock_shared(hashtext('resumen_semanas'), inicio - DATE '2000-01-03');
+        END IF;
+    END LOOP;
+END;
+$$;
+
+
+--
+-- Name: aplicar_delta_resumen(); Type: FUNCTION; Schema: public
+--
+
+CREATE OR REPLACE FUNCTION public.aplicar_delta_resumen() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    delta TEXT;
+    semanas DATE[];
+BEGIN
+    -- Filas nuevas suman, filas viejas restan (las tablas de transición
+    -- sólo existen para el evento que disparó el trigger)
+    delta := CASE TG_OP
+        WHEN 'INSERT' THEN
+            'SELECT created_at, monto_total, monto_parcial, estado, 1 AS signo FROM nuevos'
+        WHEN 'DELETE' THEN
+            'SELECT created_at, monto_total, monto_parcial, estado, -1 AS signo FROM viejos'
+        ELSE
+            'SELECT created_at, monto_total, monto_parcial, estado, 1 AS signo FROM nuevos
+             UNION ALL
+             SELECT created_at, monto_total, monto_parcial, estado, -1 AS signo FROM viejos'
+    END;
+
+    -- Un recálculo en curso de estas semanas termina antes de sumar el delta
+    EXECUTE format(
+        'SELECT array_agg(DISTINCT date_trunc(''week'', created_at)::date) FROM (%s) delta',
+        delta
+    ) INTO semanas;
+    PERFORM public.bloquear_semanas_resumen(semanas);
+
+    EXECUTE format($q$
+        INSERT INTO public.resumen_semanas (
+            año, mes, semana_mes, fecha_inicio_semana, fecha_fin_semana,
+            total_cupones, monto_total_semana, monto_parcial_semana,
+            cupones_usados, cupones_pendientes
+        )
+        SELECT
+            EXTRACT(YEAR FROM d.inicio)::INTEGER,
+            EXTRACT(MONTH FROM d.inicio)::INTEGER,
+            CEIL(EXTRACT(DAY FROM d.inicio) / 7.0)::INTEGER,
+            d.inicio,
+            d.inicio + 6,
+            d.total,
+            d.monto_total,
+            d.monto_parcial,
+            d.usados,
+            d.pendientes
+        FROM (
+            SELECT
+                date_trunc('week', created_at)::date AS inicio,
+                SUM(signo)::INTEGER AS total,
+                SUM(signo * monto_total) AS monto_total,
+                SUM(signo * COALESCE(monto_parcial, 0)) AS monto_parcial,
+                COALESCE(SUM(signo) FILTER (WHERE estado = 'usado'), 0)::INTEGER AS usados,
+                COALESCE(SUM(signo) FILTER (WHERE estado = 'nuevo'), 0)::INTEGER AS pendientes
+            FROM (%s) delta
+            WHERE created_at IS NOT NULL
+            GROUP BY 1
+        ) d
+        -- Omitir semanas cuyo delta neto es cero (UPDATE que no toca contadores)
+        WHERE d.total <> 0 OR d.monto_total <> 0 OR d.monto_parcial <> 0
+           OR d.usados <> 0 OR d.pendientes <> 0
+        -- Orden estable para evitar deadlocks entre transacciones concurrentes
+        ORDER BY d.inicio
+        ON CONFLICT (año, mes, semana_mes)
+        DO UPDATE SET
+            total_cupones = resumen_semanas.total_cupones + EXCLUDED.total_cupones,
+            monto_total_semana = resumen_semanas.monto_total_semana + EXCLUDED.monto_total_semana,
+            monto_parcial_semana = resumen_semanas.monto_parcial_semana + EXCLUDED.monto_parcial_semana,
+            cupones_usados = resumen_semanas.cupones_usados + EXCLUDED.cupones_usados,
+            cupones_pendientes = resumen_semanas.cupones_pendientes + EXCLUDED.cupones_pendientes,
+            updated_at = CURRENT_TIMESTAMP
+    $q$, delta);
+
+    RETURN NULL;
+END;
+$$;
+
+
+--
+-- Name: cupones resumen_semanas_*; Type: TRIGGER; Schema: public
+-- Las tablas de transición exigen un trigger por evento
+--
+
+DROP TRIGGER IF EXISTS resumen_semanas_insert ON public.cupones;
+CREATE TRIGGER resumen_semanas_insert AFTER INSERT ON public.cupones
+    REFERENCING NEW TABLE AS nuevos
+    FOR EACH STATEMENT EXECUTE FUNCTION public.aplicar_delta_resumen();
+
+DROP TRIGGER IF EXISTS resumen_semanas_update ON public.cupones;
+CREATE TRIGGER resumen_semanas_update AFTER UPDATE ON public.cupones
+    REFERENCING OLD TABLE AS viejos NEW TABLE AS nuevos
+    FOR EACH STATEMENT EXECUTE FUNCTION public.aplicar_delta_resumen();
+
+DROP TRIGGER IF EXISTS resumen_semanas_delete ON public.cupones;
+CREATE TRIGGER resumen_semanas_delete AFTER DELETE ON public.cupones
+    REFERENCING OLD TABLE AS viejos
+    FOR EACH STATEMENT EXECUTE FUNCTION public.aplicar_delta_resumen();
+
+
+--
+-- Name: verificar_resumen_semanas(); Type: FUNCTION; Schema: public
+-- Compara los contadores mantenidos con un recálculo completo desde cupones
+--
+
+CREATE OR REPLACE FUNCTION public.verificar_resumen_semanas()
+    RETURNS TABLE(
+        fecha_inicio_semana date,
+        total_mantenido integer, total_real integer,
+        monto_total_mantenido numeric, monto_total_real numeric,
+        monto_parcial_mantenido numeric, monto_parcial_real numeric,
+        usados_mantenido integer, usados_real integer,
+        pendientes_mantenido integer, pendientes_real integer
+    )
+    LANGUAGE sql STABLE
+    AS $$
+    WITH recalculo AS (
+        SELECT
+            date_trunc('week', created_at)::date AS inicio,
+            COUNT(*)::INTEGER AS total,
+            COALESCE(SUM(monto_total), 0) AS monto_total,
+            COALESCE(SUM(monto_parcial), 0) AS monto_parcial,
+            COUNT(*) FILTER (WHERE estado = 'usado')::INTEGER AS usados,
+            COUNT(*) FILTER (WHERE estado = 'nuevo')::INTEGER AS pendientes
+        FROM public.cupones
+        WHERE created_at IS NOT NULL
+        GROUP BY 1
+    )
+    SELECT
+        COALESCE(r.fecha_inicio_semana, x.inicio),
+        COALESCE(r.total_cupones, 0), COALESCE(x.total, 0),
+        COALESCE(r.monto_total_semana, 0), COALESCE(x.monto_total, 0),
+        COALESCE(r.monto_parcial_semana, 0), COALESCE(x.monto_parcial, 0),
+        COALESCE(r.cupones_usados, 0), COALESCE(x.usados, 0),
+        COALESCE(r.cupones_pendientes, 0), COALESCE(x.pendientes, 0)
+    FROM public.resumen_semanas r
+    FULL OUTER JOIN recalculo x ON x.inicio = r.fecha_inicio_semana
+    WHERE COALESCE(r.total_cupones, 0) <> COALESCE(x.total, 0)
+       OR COALESCE(r.monto_total_semana, 0) <> COALESCE(x.monto_total, 0)
+       OR COALESCE(r.monto_parcial_semana, 0) <> COALESCE(x.monto_parcial, 0)
+       OR COALESCE(r.cupones_usados, 0) <> COALESCE(x.usados, 0)
+       OR COALESCE(r.cupones_pendientes, 0) <> COALESCE(x.pendientes, 0)
+    ORDER BY 1;
+$$;
+
+
+--
+-- Name: recalcular_semanas(date[]); Type: FUNCTION; Schema: public
+-- Redefinida para convivir con los triggers de deltas
+--
+
+CREATE OR REPLACE FUNCTION public.recalcular_semanas(p_inicios date[]) RETURNS integer
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    total_semanas INTEGER;
+BEGIN
+    -- Con los triggers activos, un recálculo absoluto no debe pisar deltas
+    -- de transacciones aún abiertas: el lock exclusivo de cada semana espera
+    -- a las que ya aplicaron su delta y retiene las nuevas sólo en estas
+    -- semanas. El INSERT siguiente toma su snapshot después de obtenerlos
+    PERFORM public.bloquear_semanas_resumen(p_inicios, true);
+
+    INSERT INTO public.resumen_semanas (
+        año, mes, semana_mes, fecha_inicio_semana, fecha_fin_semana,
+        total_cupones, monto_total_semana, monto_parcial_semana,
+        cupones_usados, cupones_pendientes
+    )
+    SELECT
+        EXTRACT(YEAR FROM s.inicio)::INTEGER,
+        EXTRACT(MONTH FROM s.inicio)::INTEGER,
+        CEIL(EXTRACT(DAY FROM s.inicio) / 7.0)::INTEGER,
+        s.inicio,
+        s.inicio + 6,
+        COUNT(c.id),
+        COALESCE(SUM(c.monto_total), 0),
+        COALESCE(SUM(c.monto_parcial), 0),
+        COUNT(c.id) FILTER (WHERE c.estado = 'usado'),
+        COUNT(c.id) FILTER (WHERE c.estado = 'nuevo')
+    FROM (SELECT DISTINCT unnest(p_inicios) AS inicio) s
+    LEFT JOIN public.cupones c
+           ON c.created_at >= s.inicio
+          AND c.created_at < s.inicio + 7
+    GROUP BY s.inicio
+    ON CONFLICT (año, mes, semana_mes)
+    DO UPDATE SET
+        total_cupones = EXCLUDED.total_cupones,
+        monto_total_semana = EXCLUDED.monto_total_semana,
+        monto_parcial_semana = EXCLUDED.monto_parcial_semana,
+        cupones_usados = EXCLUDED.cupones_usados,
+        cupones_pendientes = EXCLUDED.cupones_pendientes,
+        updated_at = CURRENT_TIMESTAMP;
+
+    GET DIAGNOSTICS total_semanas = ROW_COUNT;
+    RETURN total_semanas;
+END;
+$$;
+
+
+-- Sincronizar los contadores antes de empezar a aplicar deltas
+-- (CREATE TRIGGER bloquea escrituras en cupones hasta el COMMIT)
+SELECT public.procesar_datos_historicos();
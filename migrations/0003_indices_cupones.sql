@@ -0,0 +1,60 @@
+-- migracion: sin-transaccion
+--
+-- 0003: Índices de cupones para check-in y reportes
+--
+-- Se construyen con CREATE INDEX CONCURRENTLY para no bloquear escrituras
+-- durante el deploy. Cada índice se elimina antes de crearse: si una
+-- ejecución anterior falló a mitad, el índice quedó INVALID y
+-- IF NOT EXISTS lo daría por bueno.
+--
+
+--
+-- Dashboard de check-in: cupones de una agencia para una fecha de visita
+--
+
+DROP INDEX CONCURRENTLY IF EXISTS public.idx_cupones_agencia_fecha_visita;
+CREATE INDEX CONCURRENTLY idx_cupones_agencia_fecha_visita
+    ON public.cupones USING btree (agencia_id, fecha_visita)
+    INCLUDE (estado);
+
+--
+-- Pendientes de check-in (parcial: sólo los cupones sin usar)
+--
+
+DROP INDEX CONCURRENTLY IF EXISTS public.idx_cupones_pendientes_fecha_visita;
+CREATE INDEX CONCURRENTLY idx_cupones_pendientes_fecha_visita
+    ON public.cupones USING btree (fecha_visita, agencia_id)
+    WHERE estado = 'nuevo';
+
+--
+-- Reportes semanales: rango sobre created_at con los montos incluidos
+-- (permite index-only scans en los agregados)
+--
+
+DROP INDEX CONCURRENTLY IF EXISTS public.idx_cupones_created_at;
+CREATE INDEX CONCURRENTLY idx_cupones_created_at
+    ON public.cupones USING btree (created_at)
+    INCLUDE (monto_total, monto_parcial, estado);
+
+DROP INDEX CONCURRENTLY IF EXISTS public.idx_cupones_agencia_created_at;
+CREATE INDEX CONCURRENTLY idx_cupones_agencia_created_at
+    ON public.cupones USING btree (agencia_id, created_at);
+
+--
+-- Consultas existentes que filtran por DATE(created_at)
+--
+
+DROP INDEX CONCURRENTLY IF EXISTS public.idx_cupones_fecha_creacion;
+CREATE INDEX CONCURRENTLY idx_cupones_fecha_creacion
+    ON public.cupones USING btree ((created_at::date));
+
+--
+-- Marca de agua de resumen_semanas (cupones usados desde la última pasada)
+--
+
+DROP INDEX CONCURRENTLY IF EXISTS public.idx_cupones_fecha_uso;
+CREATE INDEX CONCURRENTLY idx_cupones_fecha_uso
+    ON public.cupones USING btree (fecha_uso)
+    WHERE fecha_uso IS NOT NULL;
+
+ANALYZE public.cupones;
@@ -0,0 +1,311 @@
+--
+-- 0004: Particionado mensual de cupones por created_at
+--
+-- Convierte cupones en una tabla particionada por rango (un mes por
+-- partición). Toma un bloqueo exclusivo sobre cupones mientras copia los
+-- datos: ejecutar como paso previo al deploy (flask db migrar), no con
+-- tráfico de check-in activo.
+--
+-- La unicidad global de codigo_alfanumerico no puede expresarse con un
+-- índice único sobre la tabla particionada (tendría que incluir created_at),
+-- así que se delega en cupones_codigos, que además conserva los códigos de
+-- las particiones archivadas.
+--
+-- cupones_default (partición DEFAULT) recibe las filas cuyo mes todavía no
+-- tiene partición: un INSERT nunca falla por falta de partición.
+-- crear_particion_cupones() mueve esas filas a la partición del mes al
+-- crearla y 'flask cupones particiones' alerta mientras queden filas.
+--
+
+--
+-- Name: cupones_codigos; Type: TABLE; Schema: public
+-- Registro global de códigos emitidos (incluye cupones archivados)
+--
+
+CREATE TABLE public.cupones_codigos (
+    codigo_alfanumerico character varying(6) NOT NULL,
+    cupon_id integer NOT NULL,
+    created_at timestamp without time zone NOT NULL,
+    CONSTRAINT cupones_codigos_pkey PRIMARY KEY (codigo_alfanumerico)
+);
+
+CREATE SCHEMA IF NOT EXISTS archivo;
+
+
+--
+-- Tabla nueva: mismas columnas y defaults que la actual
+--
+
+ALTER TABLE public.cupones RENAME TO cupones_sin_particionar;
+ALTER TABLE public.cupones_sin_particionar DISABLE TRIGGER USER;
+
+-- La clave de partición no admite NULL (una fecha_visita futura no cuenta
+-- como creación: se acota a la fecha actual)
+UPDATE public.cupones_sin_particionar
+SET created_at = COALESCE(fecha_uso, LEAST(fecha_visita::timestamp, LOCALTIMESTAMP), LOCALTIMESTAMP)
+WHERE created_at IS NULL;
+
+CREATE TABLE public.cupones (
+    LIKE public.cupones_sin_particionar INCLUDING DEFAULTS
+) PARTITION BY RANGE (created_at);
+
+ALTER TABLE public.cupones ALTER COLUMN created_at SET NOT NULL;
+
+
+--
+-- Name: cupones_default; Type: TABLE; Schema: public
+-- Partición DEFAULT: filas de meses sin partición propia
+--
+
+CREATE TABLE public.cupones_default PARTITION OF public.cupones DEFAULT;
+
+
+--
+-- Name: crear_particion_cupones(date); Type: FUNCTION; Schema: public
+-- Crea (si no existe) la partición del mes que contiene p_fecha
+--
+-- Si cupones_default tiene filas de ese mes, CREATE TABLE ... PARTITION OF
+-- fallaría: se crea la tabla suelta, se le mueven las filas y se adjunta.
+-- El DELETE sobre la partición y el INSERT en la tabla suelta no disparan
+-- los triggers de sentencia de cupones (cupones_codigos, resumen_semanas),
+-- que ya contaron esas filas.
+--
+
+CREATE OR REPLACE FUNCTION public.crear_particion_cupones(p_fecha date) RETURNS text
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    inicio DATE := date_trunc('month', p_fecha)::date;
+    fin DATE := (date_trunc('month', p_fecha) + INTERVAL '1 month')::date;
+    nombre TEXT := format('cupones_p%s', to_char(p_fecha, 'YYYY_MM'));
+BEGIN
+    IF to_regclass(format('public.%I', nombre)) IS NOT NULL
+       OR to_regclass(format('archivo.%I', nombre)) IS NOT NULL THEN
+        RETURN nombre;
+    END IF;
+
+    IF EXISTS (
+        SELECT 1 FROM public.cupones_default
+        WHERE created_at >= inicio AND created_at < fin
+    ) THEN
+        EXECUTE format('CREATE TABLE public.%I (LIKE public.cupones INCLUDING DEFAULTS)', nombre);
+        EXECUTE format(
+            'WITH movidas AS (
+                 DELETE FROM public.cupones_default
+                 WHERE created_at >= %L AND created_at < %L
+                 RETURNING *
+             )
+             INSERT INTO public.%I SELECT * FROM movidas',
+            inicio, fin, nombre
+        );
+        EXECUTE format(
+            'ALTER TABLE public.cupones ATTACH PARTITION public.%I FOR VALUES FROM (%L) TO (%L)',
+            nombre, inicio, fin
+        );
+    ELSE
+        EXECUTE format(
+            'CREATE TABLE public.%I PARTITION OF public.cupones FOR VALUES FROM (%L) TO (%L)',
+            nombre, inicio, fin
+        );
+    END IF;
+    RETURN nombre;
+END;
+$$;
+
+
+--
+-- Name: crear_particiones_cupones(date, date); Type: FUNCTION; Schema: public
+-- Crea las particiones mensuales que cubren el rango [p_desde, p_hasta]
+--
+
+CREATE OR REPLACE FUNCTION public.crear_particiones_cupones(p_desde date, p_hasta date) RETURNS integer
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    mes DATE;
+    total INTEGER := 0;
+BEGIN
+    FOR mes IN
+        SELECT generate_series(date_trunc('month', p_desde), date_trunc('month', p_hasta), INTERVAL '1 month')::date
+    LOOP
+        PERFORM public.crear_particion_cupones(mes);
+        total := total + 1;
+    END LOOP;
+    RETURN total;
+END;
+$$;
+
+
+-- Todo el rango de los datos existentes (created_at puede ser posterior a
+-- hoy) y, como mínimo, los próximos tres meses
+SELECT public.crear_particiones_cupones(
+    COALESCE((SELECT MIN(created_at)::date FROM public.cupones_sin_particionar), CURRENT_DATE),
+    GREATEST(
+        (SELECT MAX(created_at)::date FROM public.cupones_sin_particionar),
+        (CURRENT_DATE + INTERVAL '3 months')::date
+    )
+);
+
+
+--
+-- Copia de datos y reemplazo de la tabla original
+--
+
+INSERT INTO public.cupones SELECT * FROM public.cupones_sin_particionar;
+
+INSERT INTO public.cupones_codigos (codigo_alfanumerico, cupon_id, created_at)
+SELECT codigo_alfanumerico, id, created_at FROM public.cupones_sin_particionar;
+
+-- La secuencia pertenece a la tabla vieja: transferirla antes del DROP
+ALTER SEQUENCE public.cupones_id_seq OWNED BY NONE;
+DROP TABLE public.cupones_sin_particionar;
+ALTER SEQUENCE public.cupones_id_seq OWNED BY public.cupones.id;
+
+
+--
+-- Restricciones e índices (se propagan a cada partición)
+--
+
+ALTER TABLE public.cupones
+    ADD CONSTRAINT cupones_pkey PRIMARY KEY (id, created_at);
+
+ALTER TABLE public.cupones
+    ADD CONSTRAINT cupones_agencia_id_fkey FOREIGN KEY (agencia_id) REFERENCES public.agencias(id);
+
+ALTER TABLE public.cupones
+    ADD CONSTRAINT cupones_empleado_id_fkey FOREIGN KEY (empleado_id) REFERENCES public.usuarios(id);
+
+CREATE INDEX idx_cupones_codigo ON public.cupones USING btree (codigo_alfanumerico);
+CREATE INDEX idx_cupones_empleado_id ON public.cupones USING btree (empleado_id);
+CREATE INDEX idx_cupones_agencia_fecha_visita ON public.cupones USING btree (agencia_id, fecha_visita) INCLUDE (estado);
+CREATE INDEX idx_cupones_pendientes_fecha_visita ON public.cupones USING btree (fecha_visita, agencia_id) WHERE estado = 'nuevo';
+CREATE INDEX idx_cupones_created_at ON public.cupones USING btree (created_at) INCLUDE (monto_total, monto_parcial, estado);
+CREATE INDEX idx_cupones_agencia_created_at ON public.cupones USING btree (agencia_id, created_at);
+CREATE INDEX idx_cupones_fecha_creacion ON public.cupones USING btree ((created_at::date));
+CREATE INDEX idx_cupones_fecha_uso ON public.cupones USING btree (fecha_uso) WHERE fecha_uso IS NOT NULL;
+
+
+--
+-- Name: registrar_codigos_cupones(); Type: FUNCTION; Schema: public
+-- Mantiene cupones_codigos; un código repetido aborta la sentencia
+--
+
+CREATE OR REPLACE FUNCTION public.registrar_codigos_cupones() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO public.cupones_codigos (codigo_alfanumerico, cupon_id, created_at)
+        SELECT codigo_alfanumerico, id, created_at FROM nuevos;
+    ELSIF TG_OP = 'UPDATE' THEN
+        DELETE FROM public.cupones_codigos cc
+        USING viejos v JOIN nuevos n ON n.id = v.id
+        WHERE cc.codigo_alfanumerico = v.codigo_alfanumerico
+          AND (n.codigo_alfanumerico, n.created_at) IS DISTINCT FROM (v.codigo_alfanumerico, v.created_at);
+        INSERT INTO public.cupones_codigos (codigo_alfanumerico, cupon_id, created_at)
+        SELECT n.codigo_alfanumerico, n.id, n.created_at
+        FROM nuevos n JOIN viejos v ON v.id = n.id
+        WHERE (n.codigo_alfanumerico, n.created_at) IS DISTINCT FROM (v.codigo_alfanumerico, v.created_at);
+    ELSE
+        DELETE FROM public.cupones_codigos cc
+        USING viejos v
+        WHERE cc.codigo_alfanumerico = v.codigo_alfanumerico;
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+
+--
+-- Triggers (en la tabla padre: se aplican a todas las particiones)
+--
+
+CREATE TRIGGER cupones_codigos_insert AFTER INSERT ON public.cupones
+    REFERENCING NEW TABLE AS nuevos
+    FOR EACH STATEMENT EXECUTE FUNCTION public.registrar_codigos_cupones();
+
+CREATE TRIGGER cupones_codigos_update AFTER UPDATE ON public.cupones
+    REFERENCING OLD TABLE AS viejos NEW TABLE AS nuevos
+    FOR EACH STATEMENT EXECUTE FUNCTION public.registrar_codigos_cupones();
+
+CREATE TRIGGER cupones_codigos_delete AFTER DELETE ON public.cupones
+    REFERENCING OLD TABLE AS viejos
+    FOR EACH STATEMENT EXECUTE FUNCTION public.registrar_codigos_cupones();
+
+CREATE TRIGGER resumen_semanas_insert AFTER INSERT ON public.cupones
+    REFERENCING NEW TABLE AS nuevos
+    FOR EACH STATEMENT EXECUTE FUNCTION public.aplicar_delta_resumen();
+
+CREATE TRIGGER resumen_semanas_update AFTER UPDATE ON public.cupones
+    REFERENCING OLD TABLE AS viejos NEW TABLE AS nuevos
+    FOR EACH STATEMENT EXECUTE FUNCTION public.aplicar_delta_resumen();
+
+CREATE TRIGGER resumen_semanas_delete AFTER DELETE ON public.cupones
+    REFERENCING OLD TABLE AS viejos
+    FOR EACH STATEMENT EXECUTE FUNCTION public.aplicar_delta_resumen();
+
+
+--
+-- Name: verificar_resumen_semanas(); Type: FUNCTION; Schema: public
+-- Las semanas con días archivados (anteriores al fin del último mes
+-- archivado) quedan fuera de la comparación: resumen_semanas conserva su
+-- histórico
+--
+
+CREATE OR REPLACE FUNCTION public.verificar_resumen_semanas()
+    RETURNS TABLE(
+        fecha_inicio_semana date,
+        total_mantenido integer, total_real integer,
+        monto_total_mantenido numeric, monto_total_real numeric,
+        monto_parcial_mantenido numeric, monto_parcial_real numeric,
+        usados_mantenido integer, usados_real integer,
+        pendientes_mantenido integer, pendientes_real integer
+    )
+    LANGUAGE sql STABLE
+    AS $$
+    WITH recalculo AS (
+        SELECT
+            date_trunc('week', created_at)::date AS inicio,
+            COUNT(*)::INTEGER AS total,
+            COALESCE(SUM(monto_total), 0) AS monto_total,
+            COALESCE(SUM(monto_parcial), 0) AS monto_parcial,
+            COUNT(*) FILTER (WHERE estado = 'usado')::INTEGER AS usados,
+            COUNT(*) FILTER (WHERE estado = 'nuevo')::INTEGER AS pendientes
+        FROM public.cupones
+        GROUP BY 1
+    ),
+    -- Primera semana completa en cupones: el lunes del primer cupón, o
+    -- posterior al último mes archivado (esa semana tiene días archivados)
+    retenido AS (
+        SELECT GREATEST(
+            (SELECT date_trunc('week', MIN(created_at))::date FROM public.cupones),
+            (SELECT MAX(to_date(substring(c.relname FROM 10), 'YYYY_MM') + interval '1 month')::date
+             FROM pg_class c
+             JOIN pg_namespace n ON n.oid = c.relnamespace
+             WHERE n.nspname = 'archivo' AND c.relname ~ '^cupones_p\d{4}_\d{2}$')
+        ) AS desde
+    )
+    SELECT
+        COALESCE(r.fecha_inicio_semana, x.inicio),
+        COALESCE(r.total_cupones, 0), COALESCE(x.total, 0),
+        COALESCE(r.monto_total_semana, 0), COALESCE(x.monto_total, 0),
+        COALESCE(r.monto_parcial_semana, 0), COALESCE(x.monto_parcial, 0),
+        COALESCE(r.cupones_usados, 0), COALESCE(x.usados, 0),
+        COALESCE(r.cupones_pendientes, 0), COALESCE(x.pendientes, 0)
+    FROM public.resumen_semanas r
+    FULL OUTER JOIN recalculo x ON x.inicio = r.fecha_inicio_semana
+    CROSS JOIN retenido
+    WHERE COALESCE(r.fecha_inicio_semana, x.inicio) >= retenido.desde
+      AND (COALESCE(r.total_cupones, 0) <> COALESCE(x.total, 0)
+       OR COALESCE(r.monto_total_semana, 0) <> COALESCE(x.monto_total, 0)
+       OR COALESCE(r.monto_parcial_semana, 0) <> COALESCE(x.monto_parcial, 0)
+       OR COALESCE(r.cupones_usados, 0) <> COALESCE(x.usados, 0)
+       OR COALESCE(r.cupones_pendientes, 0) <> COALESCE(x.pendientes, 0))
+    ORDER BY 1;
+$$;
+
+
+-- Las filas con created_at NULL pasan a contar en su semana
+SELECT public.procesar_datos_historicos();
+
+ANALYZE public.cupones;
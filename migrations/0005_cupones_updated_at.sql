@@ -0,0 +1,20 @@
+--
+-- 0005: Marca de modificación en cupones
+--
+-- updated_at identifica la versión de un cupón: los comprobantes PDF se
+-- cachean por (id, updated_at). El DEFAULT se evalúa una vez al añadir la
+-- columna, sin reescribir las particiones existentes.
+--
+
+ALTER TABLE public.cupones
+    ADD COLUMN IF NOT EXISTS updated_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP;
+
+--
+-- Name: cupones update_cupones_updated_at; Type: TRIGGER; Schema: public
+-- Trigger de fila en la tabla particionada (se clona en cada partición)
+--
+
+DROP TRIGGER IF EXISTS update_cupones_updated_at ON public.cupones;
+
+CREATE TRIGGER update_cupones_updated_at BEFORE UPDATE ON public.cupones
+    FOR EACH ROW EXECUTE FUNCTION public.update_updated_at_column();
@@ -0,0 +1,86 @@
+--
+-- 0006: Asignación de códigos de cupón sin colisiones
+--
+-- Los códigos se derivan de una secuencia: cada valor se permuta con una
+-- red de Feistel sobre 30 bits (biyectiva, así que dos valores distintos
+-- nunca dan el mismo código) y se codifica en 6 caracteres de un alfabeto
+-- de 32 símbolos sin caracteres ambiguos (0/O, 1/I). El resultado parece
+-- aleatorio pero no necesita reintentos. Sólo los códigos legacy (generados
+-- al azar antes de esta migración) pueden coincidir; reservar_codigos_cupones
+-- los salta consultando cupones_codigos.
+--
+
+CREATE SEQUENCE IF NOT EXISTS public.cupones_codigo_seq
+    AS bigint
+    MINVALUE 0
+    MAXVALUE 1073741823
+    START WITH 0
+    NO CYCLE;
+
+
+--
+-- Name: codigo_cupon(bigint); Type: FUNCTION; Schema: public
+-- Permutación de Feistel (4 rondas, mitades de 15 bits) + base32
+--
+
+CREATE OR REPLACE FUNCTION public.codigo_cupon(n bigint) RETURNS character varying
+    LANGUAGE plpgsql IMMUTABLE STRICT PARALLEL SAFE
+    AS $$
+DECLARE
+    alfabeto CONSTANT text := '23456789ABCDEFGHJKLMNPQRSTUVWXYZ';
+    claves CONSTANT integer[] := ARRAY[11083, 27361, 4919, 19571];
+    izq integer := (n >> 15) & 32767;
+    der integer := n & 32767;
+    tmp integer;
+    valor bigint;
+    codigo text := '';
+BEGIN
+    FOR i IN 1..4 LOOP
+        tmp := der;
+        der := izq # ((((der * 7919) + claves[i]) # (der >> 7)) & 32767);
+        izq := tmp;
+    END LOOP;
+
+    valor := (izq::bigint << 15) | der;
+    FOR i IN 1..6 LOOP
+        codigo := substr(alfabeto, (valor & 31)::integer + 1, 1) || codigo;
+        valor := valor >> 5;
+    END LOOP;
+    RETURN codigo;
+END;
+$$;
+
+
+--
+-- Name: reservar_codigos_cupones(integer); Type: FUNCTION; Schema: public
+-- Devuelve `cantidad` códigos nuevos, descartando los que ya existan
+--
+
+CREATE OR REPLACE FUNCTION public.reservar_codigos_cupones(cantidad integer)
+    RETURNS TABLE(orden integer, codigo character varying)
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    codigos varchar[] := '{}';
+BEGIN
+    WHILE cardinality(codigos) < cantidad LOOP
+        codigos := codigos || ARRAY(
+            SELECT c.codigo
+            FROM (
+                SELECT public.codigo_cupon(nextval('public.cupones_codigo_seq')) AS codigo
+                FROM generate_series(1, cantidad - cardinality(codigos))
+            ) c
+            WHERE NOT EXISTS (
+                SELECT 1 FROM public.cupones_codigos cc WHERE cc.codigo_alfanumerico = c.codigo
+            )
+        );
+    END LOOP;
+
+    RETURN QUERY SELECT t.orden::integer, t.codigo FROM unnest(codigos) WITH ORDINALITY AS t(codigo, orden);
+END;
+$$;
+
+
+-- Los INSERT sin código explícito también usan la secuencia permutada
+ALTER TABLE public.cupones
+    ALTER COLUMN codigo_alfanumerico SET DEFAULT public.codigo_cupon(nextval('public.cupones_codigo_seq'));
@@ -0,0 +1,42 @@
+--
+-- 0007: Aviso de check-in en tiempo real
+--
+-- Cada cambio de estado o fecha_uso de un cupón emite NOTIFY en el canal
+-- 'cupones_checkin' con un JSON pequeño. El aviso es transaccional: sólo se
+-- entrega si el UPDATE hace commit, y en el orden de los commits.
+--
+-- El id del evento sale de una secuencia global, así que es el mismo en
+-- todos los workers y el cliente SSE puede reanudar (Last-Event-ID) contra
+-- cualquiera de ellos.
+--
+
+CREATE SEQUENCE IF NOT EXISTS public.cupones_eventos_seq;
+
+CREATE OR REPLACE FUNCTION public.notificar_checkin_cupon() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    PERFORM pg_notify('cupones_checkin', json_build_object(
+        'id', nextval('public.cupones_eventos_seq'),
+        'cupon_id', NEW.id,
+        'agencia_id', NEW.agencia_id,
+        'codigo', NEW.codigo_alfanumerico,
+        'estado', NEW.estado,
+        'fecha_uso', NEW.fecha_uso
+    )::text);
+    RETURN NULL;
+END;
+$$;
+
+--
+-- Name: cupones notificar_checkin_cupones; Type: TRIGGER; Schema: public
+-- Trigger de fila en la tabla particionada; el WHEN descarta las
+-- ediciones que no tocan el check-in sin entrar en plpgsql
+--
+
+DROP TRIGGER IF EXISTS notificar_checkin_cupones ON public.cupones;
+
+CREATE TRIGGER notificar_checkin_cupones AFTER UPDATE OF estado, fecha_uso ON public.cupones
+    FOR EACH ROW
+    WHEN (OLD.estado IS DISTINCT FROM NEW.estado OR OLD.fecha_uso IS DISTINCT FROM NEW.fecha_uso)
+    EXECUTE FUNCTION public.notificar_checkin_cupon();
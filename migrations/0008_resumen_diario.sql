@@ -0,0 +1,123 @@
+--
+-- 0008: Resumen diario multidimensional (agencia x empleado/vendedor x día x estado)
+--
+-- Una fila por combinación con actividad: número de cupones y sumas de
+-- monto_total/monto_parcial, por día de creación. Los gráficos por agencia
+-- o vendedor leen estas filas en lugar de agregar cupones.
+--
+-- No se mantiene por triggers: varios check-ins simultáneos de la misma
+-- agencia y vendedor actualizarían la misma fila del día y se serializarían
+-- en su bloqueo. Se consolida por lotes (app/utils/resumen_diario.py) los
+-- días cerrados hasta consolidado_hasta; las consultas leen de cupones sólo
+-- los días posteriores (hoy).
+--
+-- Las claves no admiten NULL: 0 = sin agencia/empleado, '' = sin vendedor.
+-- Las filas de días cuyas particiones se archivan se conservan.
+--
+
+CREATE TABLE IF NOT EXISTS public.resumen_diario (
+    dia date NOT NULL,
+    agencia_id integer NOT NULL DEFAULT 0,
+    empleado_id integer NOT NULL DEFAULT 0,
+    vendedor character varying(255) NOT NULL DEFAULT '',
+    estado character varying(20) NOT NULL,
+    cupones integer NOT NULL,
+    monto_total numeric(14,2) NOT NULL,
+    monto_parcial numeric(14,2) NOT NULL,
+    CONSTRAINT resumen_diario_pkey PRIMARY KEY (dia, agencia_id, empleado_id, vendedor, estado)
+);
+
+CREATE INDEX IF NOT EXISTS idx_resumen_diario_agencia_dia
+    ON public.resumen_diario USING btree (agencia_id, dia);
+CREATE INDEX IF NOT EXISTS idx_resumen_diario_empleado_dia
+    ON public.resumen_diario USING btree (empleado_id, dia);
+
+
+--
+-- Name: resumen_diario_watermark; Type: TABLE; Schema: public
+-- Última consolidación (fila única): marca sobre updated_at y último día consolidado
+--
+
+CREATE TABLE IF NOT EXISTS public.resumen_diario_watermark (
+    id boolean PRIMARY KEY DEFAULT true,
+    ultima_actualizacion timestamp without time zone,
+    consolidado_hasta date,
+    updated_at timestamp without time zone DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT resumen_diario_watermark_unica CHECK (id)
+);
+
+INSERT INTO public.resumen_diario_watermark (id) VALUES (true)
+ON CONFLICT (id) DO NOTHING;
+
+
+-- idx_cupones_updated_at (cupones creados o editados desde la última
+-- consolidación) se construye sin bloquear escrituras en 0012
+
+
+--
+-- Name: recalcular_resumen_diario(date[]); Type: FUNCTION; Schema: public
+-- Reemplaza las filas de los días indicados con un único GROUP BY
+--
+
+CREATE OR REPLACE FUNCTION public.recalcular_resumen_diario(p_dias date[]) RETURNS integer
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    total_filas INTEGER;
+BEGIN
+    DELETE FROM public.resumen_diario WHERE dia = ANY(p_dias);
+
+    INSERT INTO public.resumen_diario (
+        dia, agencia_id, empleado_id, vendedor, estado,
+        cupones, monto_total, monto_parcial
+    )
+    SELECT
+        d.dia,
+        COALESCE(c.agencia_id, 0),
+        COALESCE(c.empleado_id, 0),
+        COALESCE(c.vendedor, ''),
+        COALESCE(c.estado, 'nuevo'),
+        COUNT(*),
+        SUM(c.monto_total),
+        SUM(COALESCE(c.monto_parcial, 0))
+    FROM (SELECT DISTINCT unnest(p_dias) AS dia) d
+    JOIN public.cupones c
+      ON c.created_at >= d.dia
+     AND c.created_at < d.dia + 1
+    GROUP BY 1, 2, 3, 4, 5;
+
+    GET DIAGNOSTICS total_filas = ROW_COUNT;
+    RETURN total_filas;
+END;
+$$;
+
+
+--
+-- Name: dias_modificados(timestamp, date); Type: FUNCTION; Schema: public
+-- Días (anteriores a p_hasta) con cupones creados o editados después de p_desde
+--
+
+CREATE OR REPLACE FUNCTION public.dias_modificados(p_desde timestamp without time zone, p_hasta date)
+    RETURNS TABLE(dia date)
+    LANGUAGE sql STABLE
+    AS $$
+    SELECT DISTINCT c.created_at::date
+    FROM public.cupones c
+    WHERE (p_desde IS NULL OR c.updated_at > p_desde)
+      AND c.created_at < p_hasta
+    ORDER BY 1;
+$$;
+
+
+-- Carga inicial de los días cerrados
+SELECT public.recalcular_resumen_diario(ARRAY(
+    SELECT DISTINCT created_at::date
+    FROM public.cupones
+    WHERE created_at < CURRENT_DATE
+));
+
+UPDATE public.resumen_diario_watermark
+SET ultima_actualizacion = now()::timestamp,
+    consolidado_hasta = CURRENT_DATE - 1,
+    updated_at = CURRENT_TIMESTAMP
+WHERE id;
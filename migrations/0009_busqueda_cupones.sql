@@ -0,0 +1,52 @@
+--
+-- 0009: Búsqueda aproximada de cupones (pg_trgm)
+--
+-- Funciones de normalización (minúsculas, sin acentos, sin signos) y la
+-- extensión pg_trgm. Los índices GIN de trigramas sobre nombre y
+-- apellido, documento y código están en 0014.
+--
+-- Si la extensión no se puede instalar (sin permisos o no disponible) la
+-- migración sólo crea las funciones de normalización y la aplicación usa
+-- el índice en memoria de app/utils/busqueda.py.
+--
+
+--
+-- Name: normalizar_busqueda(text); Type: FUNCTION; Schema: public
+-- Minúsculas y sin acentos. translate() es IMMUTABLE (unaccent() no), así
+-- que puede usarse en índices de expresión
+--
+
+CREATE OR REPLACE FUNCTION public.normalizar_busqueda(texto text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE
+    AS $$
+    SELECT lower(translate(
+        COALESCE(texto, ''),
+        'ÁÀÂÄÃÉÈÊËÍÌÎÏÓÒÔÖÕÚÙÛÜÑÇáàâäãéèêëíìîïóòôöõúùûüñç',
+        'AAAAAEEEEIIIIOOOOOUUUUNCaaaaaeeeeiiiiooooouuuunc'
+    ));
+$$;
+
+--
+-- Name: normalizar_documento(text); Type: FUNCTION; Schema: public
+-- DNI/pasaporte sin puntos, guiones ni espacios
+--
+
+CREATE OR REPLACE FUNCTION public.normalizar_documento(texto text) RETURNS text
+    LANGUAGE sql IMMUTABLE PARALLEL SAFE
+    AS $$
+    SELECT regexp_replace(upper(COALESCE(texto, '')), '[^0-9A-Z]', '', 'g');
+$$;
+
+
+--
+-- Extensión pg_trgm: los índices de trigramas se crean sin transacción en
+-- 0014 (que queda pendiente mientras la extensión no esté instalada)
+--
+
+DO $$
+BEGIN
+    CREATE EXTENSION IF NOT EXISTS pg_trgm;
+EXCEPTION WHEN OTHERS THEN
+    RAISE NOTICE 'pg_trgm no disponible (%): la búsqueda usará el índice en memoria', SQLERRM;
+END;
+$$;
@@ -0,0 +1,234 @@
+--
+-- 0010: Dimensión calendario
+--
+-- Una fila por día con su semana natural (lunes a domingo) y la semana del
+-- mes a la que pertenece (año, mes y semana_mes del lunes). Reemplaza el
+-- cálculo de obtener_semana_natural(), que era plpgsql VOLATILE (no se
+-- podía inlinear ni usar en índices), y es la misma tabla que lee
+-- app/utils/calendario.py: la regla de semana_mes vive en un solo sitio.
+--
+
+CREATE TABLE IF NOT EXISTS public.calendario (
+    fecha date NOT NULL,
+    "año" integer NOT NULL,
+    mes integer NOT NULL,
+    semana_mes integer NOT NULL,
+    fecha_inicio_semana date NOT NULL,
+    fecha_fin_semana date NOT NULL,
+    dia_semana smallint NOT NULL,  -- ISO: 1 = lunes ... 7 = domingo
+    CONSTRAINT calendario_pkey PRIMARY KEY (fecha)
+);
+
+CREATE INDEX IF NOT EXISTS idx_calendario_inicio_semana
+    ON public.calendario USING btree (fecha_inicio_semana);
+
+
+--
+-- Name: extender_calendario(date, date); Type: FUNCTION; Schema: public
+-- Genera (o completa) los días del rango; idempotente. Empieza en el lunes
+-- de p_desde: resumen_semanas busca cada semana por su fecha_inicio_semana
+--
+
+CREATE OR REPLACE FUNCTION public.extender_calendario(p_desde date, p_hasta date) RETURNS integer
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    total_dias INTEGER;
+BEGIN
+    INSERT INTO public.calendario (
+        fecha, "año", mes, semana_mes, fecha_inicio_semana, fecha_fin_semana, dia_semana
+    )
+    SELECT
+        d.fecha,
+        EXTRACT(YEAR FROM d.inicio)::INTEGER,
+        EXTRACT(MONTH FROM d.inicio)::INTEGER,
+        CEIL(EXTRACT(DAY FROM d.inicio) / 7.0)::INTEGER,
+        d.inicio,
+        d.inicio + 6,
+        EXTRACT(ISODOW FROM d.fecha)::SMALLINT
+    FROM (
+        SELECT g::date AS fecha, date_trunc('week', g)::date AS inicio
+        FROM generate_series(date_trunc('week', p_desde), p_hasta, interval '1 day') g
+    ) d
+    ON CONFLICT (fecha) DO NOTHING;
+
+    GET DIAGNOSTICS total_dias = ROW_COUNT;
+    RETURN total_dias;
+END;
+$$;
+
+
+-- Desde el lunes de la semana del primer cupón (o de 2020) hasta 10 años adelante
+SELECT public.extender_calendario(
+    date_trunc('week', LEAST(
+        COALESCE((SELECT MIN(created_at)::date FROM public.cupones), DATE '2020-01-01'),
+        DATE '2020-01-01'
+    ))::date,
+    (CURRENT_DATE + interval '10 years')::date
+);
+
+
+--
+-- Name: obtener_semana_natural(date); Type: FUNCTION; Schema: public
+-- Misma firma, ahora SQL STABLE sobre calendario: el planificador la
+-- inlinea como una búsqueda por clave primaria. Las fechas fuera de la
+-- tabla se calculan con la regla de extender_calendario(), como antes
+--
+
+DROP FUNCTION IF EXISTS public.obtener_semana_natural(date);
+
+CREATE FUNCTION public.obtener_semana_natural(fecha date)
+    RETURNS TABLE("año" integer, mes integer, semana_mes integer, fecha_inicio date, fecha_fin date)
+    LANGUAGE sql STABLE PARALLEL SAFE
+    AS $$
+    SELECT c."año", c.mes, c.semana_mes, c.fecha_inicio_semana, c.fecha_fin_semana
+    FROM public.calendario c
+    WHERE c.fecha = $1
+    UNION ALL
+    SELECT
+        EXTRACT(YEAR FROM s.inicio)::INTEGER,
+        EXTRACT(MONTH FROM s.inicio)::INTEGER,
+        CEIL(EXTRACT(DAY FROM s.inicio) / 7.0)::INTEGER,
+        s.inicio,
+        s.inicio + 6
+    FROM (SELECT date_trunc('week', $1)::date AS inicio) s
+    WHERE NOT EXISTS (SELECT 1 FROM public.calendario c WHERE c.fecha = $1);
+$$;
+
+
+--
+-- Name: recalcular_semanas(date[]); Type: FUNCTION; Schema: public
+-- año/mes/semana_mes salen de calendario (antes se recalculaban aquí);
+-- obtener_semana_natural() no pierde semanas que falten en la tabla
+--
+
+CREATE OR REPLACE FUNCTION public.recalcular_semanas(p_inicios date[]) RETURNS integer
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    total_semanas INTEGER;
+BEGIN
+    -- Con los triggers activos, un recálculo absoluto no debe pisar deltas
+    -- de transacciones aún abiertas: el lock exclusivo de cada semana espera
+    -- a las que ya aplicaron su delta y retiene las nuevas sólo en estas
+    -- semanas. El INSERT siguiente toma su snapshot después de obtenerlos
+    PERFORM public.bloquear_semanas_resumen(p_inicios, true);
+
+    INSERT INTO public.resumen_semanas (
+        año, mes, semana_mes, fecha_inicio_semana, fecha_fin_semana,
+        total_cupones, monto_total_semana, monto_parcial_semana,
+        cupones_usados, cupones_pendientes
+    )
+    SELECT
+        cal."año",
+        cal.mes,
+        cal.semana_mes,
+        cal.fecha_inicio,
+        cal.fecha_fin,
+        COUNT(c.id),
+        COALESCE(SUM(c.monto_total), 0),
+        COALESCE(SUM(c.monto_parcial), 0),
+        COUNT(c.id) FILTER (WHERE c.estado = 'usado'),
+        COUNT(c.id) FILTER (WHERE c.estado = 'nuevo')
+    FROM (SELECT DISTINCT unnest(p_inicios) AS inicio) s
+    CROSS JOIN LATERAL public.obtener_semana_natural(s.inicio) cal
+    LEFT JOIN public.cupones c
+           ON c.created_at >= s.inicio
+          AND c.created_at < s.inicio + 7
+    GROUP BY 1, 2, 3, 4, 5
+    ON CONFLICT (año, mes, semana_mes)
+    DO UPDATE SET
+        total_cupones = EXCLUDED.total_cupones,
+        monto_total_semana = EXCLUDED.monto_total_semana,
+        monto_parcial_semana = EXCLUDED.monto_parcial_semana,
+        cupones_usados = EXCLUDED.cupones_usados,
+        cupones_pendientes = EXCLUDED.cupones_pendientes,
+        updated_at = CURRENT_TIMESTAMP;
+
+    GET DIAGNOSTICS total_semanas = ROW_COUNT;
+    RETURN total_semanas;
+END;
+$$;
+
+
+--
+-- Name: aplicar_delta_resumen(); Type: FUNCTION; Schema: public
+-- Igual que en 0002, con la semana tomada de calendario (con el cálculo
+-- de respaldo de obtener_semana_natural() fuera de la tabla)
+--
+
+CREATE OR REPLACE FUNCTION public.aplicar_delta_resumen() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+DECLARE
+    delta TEXT;
+    semanas DATE[];
+BEGIN
+    -- Filas nuevas suman, filas viejas restan (las tablas de transición
+    -- sólo existen para el evento que disparó el trigger)
+    delta := CASE TG_OP
+        WHEN 'INSERT' THEN
+            'SELECT created_at, monto_total, monto_parcial, estado, 1 AS signo FROM nuevos'
+        WHEN 'DELETE' THEN
+            'SELECT created_at, monto_total, monto_parcial, estado, -1 AS signo FROM viejos'
+        ELSE
+            'SELECT created_at, monto_total, monto_parcial, estado, 1 AS signo FROM nuevos
+             UNION ALL
+             SELECT created_at, monto_total, monto_parcial, estado, -1 AS signo FROM viejos'
+    END;
+
+    -- Un recálculo en curso de estas semanas termina antes de sumar el delta
+    EXECUTE format(
+        'SELECT array_agg(DISTINCT date_trunc(''week'', created_at)::date) FROM (%s) delta',
+        delta
+    ) INTO semanas;
+    PERFORM public.bloquear_semanas_resumen(semanas);
+
+    EXECUTE format($q$
+        INSERT INTO public.resumen_semanas (
+            año, mes, semana_mes, fecha_inicio_semana, fecha_fin_semana,
+            total_cupones, monto_total_semana, monto_parcial_semana,
+            cupones_usados, cupones_pendientes
+        )
+        SELECT
+            cal."año",
+            cal.mes,
+            cal.semana_mes,
+            cal.fecha_inicio,
+            cal.fecha_fin,
+            d.total,
+            d.monto_total,
+            d.monto_parcial,
+            d.usados,
+            d.pendientes
+        FROM (
+            SELECT
+                date_trunc('week', created_at)::date AS inicio,
+                SUM(signo)::INTEGER AS total,
+                SUM(signo * monto_total) AS monto_total,
+                SUM(signo * COALESCE(monto_parcial, 0)) AS monto_parcial,
+                COALESCE(SUM(signo) FILTER (WHERE estado = 'usado'), 0)::INTEGER AS usados,
+                COALESCE(SUM(signo) FILTER (WHERE estado = 'nuevo'), 0)::INTEGER AS pendientes
+            FROM (%s) delta
+            WHERE created_at IS NOT NULL
+            GROUP BY 1
+        ) d
+        CROSS JOIN LATERAL public.obtener_semana_natural(d.inicio) cal
+        -- Omitir semanas cuyo delta neto es cero (UPDATE que no toca contadores)
+        WHERE d.total <> 0 OR d.monto_total <> 0 OR d.monto_parcial <> 0
+           OR d.usados <> 0 OR d.pendientes <> 0
+        -- Orden estable para evitar deadlocks entre transacciones concurrentes
+        ORDER BY d.inicio
+        ON CONFLICT (año, mes, semana_mes)
+        DO UPDATE SET
+            total_cupones = resumen_semanas.total_cupones + EXCLUDED.total_cupones,
+            monto_total_semana = resumen_semanas.monto_total_semana + EXCLUDED.monto_total_semana,
+            monto_parcial_semana = resumen_semanas.monto_parcial_semana + EXCLUDED.monto_parcial_semana,
+            cupones_usados = resumen_semanas.cupones_usados + EXCLUDED.cupones_usados,
+            cupones_pendientes = resumen_semanas.cupones_pendientes + EXCLUDED.cupones_pendientes,
+            updated_at = CURRENT_TIMESTAMP
+    $q$, delta);
+
+    RETURN NULL;
+END;
+$$;
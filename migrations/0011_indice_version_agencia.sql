@@ -0,0 +1,19 @@
+-- migracion: sin-transaccion
+--
+-- 0011: Versión de los datos de una agencia
+--
+-- Las respuestas condicionales (ETag) de las APIs comparan
+-- max(updated_at) de los cupones de la agencia antes de ejecutar la
+-- consulta completa. Con este índice es un recorrido de un extremo por
+-- partición (Index Only Scan Backward), sin leer las filas.
+--
+-- Sin transacción: aplicar_migraciones() lo crea ON ONLY en cupones, con
+-- CONCURRENTLY en cada partición y las adjunta, sin bloquear check-ins.
+--
+
+--
+-- Name: idx_cupones_agencia_updated_at; Type: INDEX; Schema: public
+--
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cupones_agencia_updated_at
+    ON public.cupones USING btree (agencia_id, updated_at);
@@ -0,0 +1,17 @@
+-- migracion: sin-transaccion
+--
+-- 0012: Índice de cupones por updated_at para la consolidación de resumen_diario
+--
+-- Sale de 0008, que lo creaba dentro de su transacción: sobre la tabla
+-- particionada eso bloquea las escrituras de cada partición mientras se
+-- construye. aplicar_migraciones() lo crea ON ONLY en cupones, con
+-- CONCURRENTLY en cada partición y las adjunta (ver app/utils/migraciones.py).
+--
+
+--
+-- Name: idx_cupones_updated_at; Type: INDEX; Schema: public
+-- Localiza los cupones creados o editados desde la última consolidación
+--
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cupones_updated_at
+    ON public.cupones USING btree (updated_at) INCLUDE (created_at);
@@ -0,0 +1,49 @@
+--
+-- 0013: Días de resumen_diario afectados por borrados de cupones
+--
+-- La consolidación encuentra los días modificados por updated_at, pero un
+-- cupón borrado ya no está en cupones: su día quedaba con los contadores
+-- anteriores. Un trigger de sentencia anota los días de las filas borradas
+-- y consolidar_resumen_diario() los recalcula (y los quita de la tabla).
+--
+-- Desvincular una partición (archivado) no dispara DELETE: esos días
+-- conservan sus filas, como hasta ahora.
+--
+
+--
+-- Name: resumen_diario_pendientes; Type: TABLE; Schema: public
+-- Días a recalcular en la próxima consolidación
+--
+
+CREATE TABLE IF NOT EXISTS public.resumen_diario_pendientes (
+    dia date NOT NULL,
+    CONSTRAINT resumen_diario_pendientes_pkey PRIMARY KEY (dia)
+);
+
+
+--
+-- Name: registrar_dias_borrados(); Type: FUNCTION; Schema: public
+--
+
+CREATE OR REPLACE FUNCTION public.registrar_dias_borrados() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+BEGIN
+    -- Orden estable para evitar deadlocks entre borrados concurrentes
+    INSERT INTO public.resumen_diario_pendientes (dia)
+    SELECT DISTINCT created_at::date FROM viejos
+    ORDER BY 1
+    ON CONFLICT (dia) DO NOTHING;
+    RETURN NULL;
+END;
+$$;
+
+
+--
+-- Name: cupones resumen_diario_delete; Type: TRIGGER; Schema: public
+--
+
+DROP TRIGGER IF EXISTS resumen_diario_delete ON public.cupones;
+CREATE TRIGGER resumen_diario_delete AFTER DELETE ON public.cupones
+    REFERENCING OLD TABLE AS viejos
+    FOR EACH STATEMENT EXECUTE FUNCTION public.registrar_dias_borrados();
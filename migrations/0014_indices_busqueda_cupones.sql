@@ -0,0 +1,37 @@
+-- migracion: sin-transaccion
+-- migracion: requiere-extension pg_trgm
+--
+-- 0014: Índices de trigramas para la búsqueda de cupones
+--
+-- Índices GIN sobre los campos normalizados de 0009: nombre y apellido,
+-- documento y código. Sirven para LIKE '%...%', similarity (%) y
+-- word_similarity (<%), de modo que la búsqueda de recepción deja de
+-- recorrer cupones completa.
+--
+-- Salen de 0009, que los creaba dentro de su transacción: sobre la tabla
+-- particionada eso bloquea las escrituras de cada partición mientras se
+-- construyen. aplicar_migraciones() los crea ON ONLY en cupones, con
+-- CONCURRENTLY en cada partición y las adjunta. Sin pg_trgm la migración
+-- queda pendiente y la búsqueda usa el índice en memoria.
+--
+
+--
+-- Name: idx_cupones_busqueda_nombre; Type: INDEX; Schema: public
+--
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cupones_busqueda_nombre
+    ON public.cupones USING gin (public.normalizar_busqueda(nombre || ' ' || apellido) gin_trgm_ops);
+
+--
+-- Name: idx_cupones_busqueda_documento; Type: INDEX; Schema: public
+--
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cupones_busqueda_documento
+    ON public.cupones USING gin (public.normalizar_documento(dni_pasaporte) gin_trgm_ops);
+
+--
+-- Name: idx_cupones_busqueda_codigo; Type: INDEX; Schema: public
+--
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cupones_busqueda_codigo
+    ON public.cupones USING gin (upper(codigo_alfanumerico) gin_trgm_ops);
@@ -0,0 +1,29 @@
+"""
+Pruebas del alcance por agencia según el rol de la sesión
+"""
+
+import pytest
+from flask import Flask, session
+
+from app.utils.decorators import agencia_de_sesion
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.secret_key = 'pruebas'
+    return app
+
+
+@pytest.mark.parametrize('rol, agencia, consulta, esperado', [
+    ('empleado', 7, '?agencia_id=3', (True, 7)),
+    ('empleado', None, '?agencia_id=3', (False, None)),
+    ('admin', None, '?agencia_id=3', (True, 3)),
+    ('contador', None, '', (True, None)),
+    (None, None, '', (False, None)),
+])
+def test_alcance_por_rol(app, rol, agencia, consulta, esperado):
+    with app.test_request_context(f'/api/eventos/checkin{consulta}'):
+        session['rol'] = rol
+        session['agencia_id'] = agencia
+        assert agencia_de_sesion() == esperado
@@ -0,0 +1,53 @@
+"""
+Pruebas de la invalidación por etiquetas del cache de dos niveles
+"""
+
+from datetime import date, datetime
+
+import pytest
+from flask import Flask
+
+from app.extensions import cache
+from app.utils.cache_backend import cacheado, etiquetas_cupon, etiquetas_rango, invalidar_etiquetas
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.config.update(CACHE_TYPE='app.utils.cache_backend.CacheDosNiveles', CACHE_DEFAULT_TIMEOUT=120)
+    cache.init_app(app)
+    with app.app_context():
+        yield app
+
+
+def test_etiquetas_de_escritura_y_de_lectura_coinciden():
+    assert etiquetas_cupon(3, datetime(2026, 10, 15, 9), 'kayak') == [
+        'agencia:3', 'semana:2026-10-12', 'agencia:3:semana:2026-10-12', 'servicio:kayak',
+    ]
+    assert etiquetas_rango(date(2026, 10, 11), date(2026, 10, 19), 3) == [
+        'agencia:3:semana:2026-10-05', 'agencia:3:semana:2026-10-12', 'agencia:3:semana:2026-10-19',
+    ]
+
+
+def test_una_escritura_solo_desaloja_las_lecturas_que_la_incluyen(app):
+    llamadas = []
+
+    @cacheado(etiquetas=etiquetas_rango)
+    def consulta(desde, hasta, agencia_id=None):
+        llamadas.append((desde, agencia_id))
+        return [len(llamadas)]
+
+    octubre, septiembre = (date(2026, 10, 12), date(2026, 10, 18)), (date(2026, 9, 7), date(2026, 9, 13))
+    for agencia_id in (None, 3, 4):
+        consulta(*octubre, agencia_id=agencia_id)
+        consulta(*septiembre, agencia_id=agencia_id)
+    assert len(llamadas) == 6
+
+    # Cupón de la agencia 3 en la semana del 12 de octubre
+    invalidar_etiquetas(*etiquetas_cupon(3, date(2026, 10, 15)))
+
+    for agencia_id in (None, 3, 4):
+        consulta(*octubre, agencia_id=agencia_id)
+        consulta(*septiembre, agencia_id=agencia_id)
+    # Sólo se recalculan octubre de todas las agencias y octubre de la agencia 3
+    assert llamadas[6:] == [(octubre[0], None), (octubre[0], 3)]
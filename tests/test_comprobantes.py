@@ -0,0 +1,37 @@
+"""
+Pruebas de la espera acotada del pool de render de comprobantes
+"""
+
+import os
+import time
+
+import pytest
+
+from app.utils.comprobantes import MotorComprobantes, MotorNoDisponible
+
+
+@pytest.fixture
+def motor():
+    motor = MotorComprobantes(procesos=1, timeout=0.5)
+    yield motor
+    motor.cerrar()
+
+
+def test_tiempo_agotado(motor):
+    pool = motor._pool()
+    tareas = [motor._enviar(pool, time.sleep, 2)]
+
+    inicio = time.monotonic()
+    with pytest.raises(MotorNoDisponible):
+        list(motor._resultados(pool, tareas))
+    assert time.monotonic() - inicio < 1.5
+    assert motor.estadisticas()['timeouts'] == 1
+
+
+def test_proceso_caido_renueva_el_pool(motor):
+    pool = motor._pool()
+
+    with pytest.raises(MotorNoDisponible):
+        list(motor._resultados(pool, [motor._enviar(pool, os._exit, 1)]))
+    assert motor._pool() is not pool
+    assert next(motor._resultados(motor._pool(), [motor._enviar(motor._pool(), abs, -3)])) == 3
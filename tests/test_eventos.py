@@ -0,0 +1,54 @@
+"""
+Pruebas del bus de eventos de check-in en memoria (EVENTOS_ORIGEN='memoria')
+"""
+
+from app.utils.eventos import RECARGAR, BusEventos
+
+
+def _bus(historial=10, max_cola=5, max_clientes=4):
+    bus = BusEventos(historial=historial, max_cola=max_cola)
+    bus.origen, bus.max_clientes, bus._cobertura = 'memoria', max_clientes, 0
+    return bus
+
+
+def test_reparte_solo_a_la_agencia_del_cliente():
+    bus = _bus()
+    agencia_1, _ = bus.suscribir(1)
+    todas, _ = bus.suscribir(None)
+
+    bus.publicar({'cupon_id': 10, 'agencia_id': 1})
+    bus.publicar({'cupon_id': 20, 'agencia_id': 2})
+
+    assert [e['cupon_id'] for e in agencia_1.esperar(0)] == [10]
+    assert [e['cupon_id'] for e in todas.esperar(0)] == [10, 20]
+
+
+def test_cola_desbordada_pide_recargar():
+    bus = _bus()
+    lento, _ = bus.suscribir(None)
+    for i in range(20):
+        bus.publicar({'cupon_id': i, 'agencia_id': 1})
+
+    assert lento.esperar(0) is RECARGAR
+
+
+def test_reanuda_dentro_del_historial_y_recarga_fuera():
+    bus = _bus()
+    for i in range(20):
+        bus.publicar({'cupon_id': i, 'agencia_id': 1 if i % 2 else 2})
+
+    _, pendientes = bus.suscribir(1, ultimo_id=15)
+    assert [e['id'] for e in pendientes] == [16, 18, 20]
+    # El 3 ya salió del historial de 10 eventos
+    _, pendientes = bus.suscribir(1, ultimo_id=3)
+    assert pendientes is None
+    assert bus.estadisticas()['recargas'] == 1
+
+
+def test_limite_de_clientes_por_worker():
+    bus = _bus(max_clientes=1)
+    primera, _ = bus.suscribir(1)
+
+    assert bus.suscribir(1) == (None, None)
+    bus.cancelar(primera)
+    assert bus.suscribir(1)[0] is not None
@@ -0,0 +1,61 @@
+"""
+Pruebas de la neutralización de fórmulas en CSV (el XLSX conserva el texto)
+"""
+
+import csv
+import io
+import re
+import zipfile
+from decimal import Decimal
+
+from app.utils.exportacion import generar_csv, generar_xlsx
+
+
+COLUMNAS = ('nombre', 'telefono', 'actividades_tour', 'monto_total')
+
+FILAS = [
+    ('=HYPERLINK("http://x","y")', '+54 9 11 1234-5678', ['@SUM(A1)'], Decimal('-12.50')),
+    ('-2+3', '\t=1+1', [], 10),
+    ('\r=cmd', 'Ana', ['City Tour'], None),
+]
+
+
+def _leer_csv():
+    contenido = b''.join(generar_csv(COLUMNAS, [FILAS])).decode('utf-8-sig')
+    return list(csv.reader(io.StringIO(contenido)))[1:]
+
+
+def _leer_xlsx():
+    contenido = b''.join(generar_xlsx(COLUMNAS, [FILAS]))
+    with zipfile.ZipFile(io.BytesIO(contenido)) as zf:
+        return zf.read('xl/worksheets/sheet1.xml').decode('utf-8')
+
+
+def test_csv_antepone_apostrofo_a_formulas():
+    filas = _leer_csv()
+
+    assert filas[0][0] == "'=HYPERLINK(\"http://x\",\"y\")"
+    assert filas[0][2] == "'@SUM(A1)"
+    assert filas[1][:2] == ["'-2+3", "'\t=1+1"]
+    assert filas[2][0] == "'\r=cmd"
+
+
+def test_csv_conserva_numeros_telefonos_y_texto_normal():
+    filas = _leer_csv()
+
+    assert filas[0][1] == '+54 9 11 1234-5678'
+    assert filas[0][3] == '-12.50'
+    assert filas[2][1:3] == ['Ana', 'City Tour']
+
+
+def test_xlsx_cadenas_inline_sin_modificar():
+    hoja = _leer_xlsx()
+
+    assert '<f>' not in hoja
+    textos = re.findall(r'<t xml:space="preserve">(.*?)</t>', hoja, re.S)
+    assert '=HYPERLINK("http://x","y")' in textos
+    assert '+54 9 11 1234-5678' in textos
+    assert '@SUM(A1)' in textos
+    assert '-2+3' in textos
+    assert not any(texto.startswith("'") for texto in textos)
+    assert '<c><v>-12.50</v></c>' in hoja
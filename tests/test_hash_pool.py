@@ -0,0 +1,35 @@
+"""
+Pruebas de la reconfiguración del pool de hashing con trabajos en curso
+"""
+
+import threading
+import time
+
+from app.utils.hash_pool import HashPool
+
+
+def test_reconfigurar_drena_los_trabajos_en_curso():
+    pool = HashPool(max_workers=1, max_cola=0, timeout=2.0)
+    liberar = threading.Event()
+    resultados = []
+
+    hilo = threading.Thread(target=lambda: resultados.append(pool.ejecutar(lambda: liberar.wait(2) and 'viejo')))
+    hilo.start()
+    while pool.estadisticas()['en_ejecucion'] == 0:
+        time.sleep(0.01)
+
+    reconfigurador = threading.Thread(target=pool.configurar, args=(2, 1, 2.0))
+    reconfigurador.start()
+    time.sleep(0.05)
+    # configurar() espera al trabajo admitido con los límites anteriores
+    assert reconfigurador.is_alive()
+
+    liberar.set()
+    hilo.join()
+    reconfigurador.join()
+
+    assert resultados == ['viejo']
+    assert pool.ejecutar(lambda x: x * 2, 21) == 42
+    estadisticas = pool.estadisticas()
+    assert estadisticas['max_workers'] == 2
+    assert (estadisticas['en_cola'], estadisticas['en_ejecucion'], estadisticas['completados']) == (0, 0, 2)
@@ -0,0 +1,37 @@
+"""
+Pruebas del storage SQLite del rate limiting entre procesos
+(la versión de benchmarks/limiter_multiproceso.py que corre con pytest)
+"""
+
+import multiprocessing
+
+import pytest
+from limits import parse
+from limits.storage import storage_from_string
+from limits.strategies import STRATEGIES
+
+import app.utils.limiter_storage  # noqa: F401  (registra sqlite://)
+
+LIMITE = '20 per hour'
+
+
+def _worker(uri, estrategia, intentos, salida):
+    limiter = STRATEGIES[estrategia](storage_from_string(uri))
+    item = parse(LIMITE)
+    salida.put(sum(1 for _ in range(intentos) if limiter.hit(item, 'prueba')))
+
+
+@pytest.mark.parametrize('estrategia', sorted(STRATEGIES))
+def test_el_limite_se_respeta_entre_procesos(tmp_path, estrategia):
+    uri = 'sqlite:///' + str(tmp_path / 'ratelimit.sqlite')
+    contexto = multiprocessing.get_context('spawn')
+    salida = contexto.Queue()
+    procesos = [contexto.Process(target=_worker, args=(uri, estrategia, 15, salida)) for _ in range(4)]
+    for proceso in procesos:
+        proceso.start()
+    admitidas = sum(salida.get(timeout=60) for _ in procesos)
+    for proceso in procesos:
+        proceso.join(30)
+        assert proceso.exitcode == 0
+
+    assert admitidas == parse(LIMITE).amount
@@ -0,0 +1,34 @@
+"""
+Pruebas del registro de los hooks de métricas por aplicación
+"""
+
+from flask import Flask
+
+from app.utils import metricas as modulo
+from app.utils.metricas import init_metricas, metricas
+
+
+def _app(tmp_path, habilitadas=True):
+    app = Flask(__name__)
+    app.config.update(METRICAS_HABILITADAS=habilitadas, METRICAS_DIR=str(tmp_path),
+                      METRICAS_SQL_LENTA_MS=200)
+    return app
+
+
+def test_cada_app_registra_sus_hooks(tmp_path, monkeypatch):
+    # Métricas ya creadas por una app anterior del mismo proceso (p. ej. otra prueba)
+    monkeypatch.setattr(metricas, 'activas', True)
+    apps = [_app(tmp_path), _app(tmp_path)]
+    for app in apps:
+        init_metricas(app)
+
+    for app in apps:
+        assert modulo._antes_de_peticion in app.before_request_funcs[None]
+        assert modulo._despues_de_peticion in app.after_request_funcs[None]
+
+
+def test_deshabilitadas_no_registra_hooks(tmp_path):
+    app = _app(tmp_path, habilitadas=False)
+    init_metricas(app)
+
+    assert not app.before_request_funcs
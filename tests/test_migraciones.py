@@ -0,0 +1,168 @@
+"""
+Pruebas de las migraciones sin transacción y de los índices concurrentes
+sobre tablas particionadas
+"""
+
+import psycopg2
+
+from app.utils import migraciones
+from app.utils.migraciones import crear_indice_particionado
+
+
+class CursorFalso:
+    """Registra las sentencias y responde las dos consultas de catálogo"""
+
+    def __init__(self, relkind, particiones):
+        self.relkind = relkind
+        self.particiones = particiones
+        self.sentencias = []
+        self._resultado = []
+
+    def execute(self, sql, params=None):
+        if 'SELECT relkind' in sql:
+            self._resultado = [(self.relkind,)] if self.relkind else []
+        elif 'FROM pg_inherits' in sql:
+            self._resultado = self.particiones
+        else:
+            self.sentencias.append(' '.join(sql.split()))
+            self._resultado = []
+
+    def fetchone(self):
+        return self._resultado[0] if self._resultado else None
+
+    def fetchall(self):
+        return self._resultado
+
+
+SENTENCIA = """CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cupones_updated_at
+    ON public.cupones USING btree (updated_at) INCLUDE (created_at)"""
+
+
+def test_reparte_el_indice_por_particion():
+    cur = CursorFalso('p', [
+        ('cupones_default', 'cupones_default_idx_cupones_updated_at', None),
+        ('cupones_p2026_10', 'cupones_p2026_10_idx_cupones_updated_at', False),
+    ])
+
+    assert crear_indice_particionado(cur, SENTENCIA)
+    assert cur.sentencias == [
+        'CREATE INDEX IF NOT EXISTS idx_cupones_updated_at ON ONLY public.cupones '
+        'USING btree (updated_at) INCLUDE (created_at)',
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS "cupones_default_idx_cupones_updated_at" '
+        'ON public."cupones_default" USING btree (updated_at) INCLUDE (created_at)',
+        'ALTER INDEX public.idx_cupones_updated_at ATTACH PARTITION public."cupones_default_idx_cupones_updated_at"',
+        # Índice INVALID de una ejecución interrumpida: se reconstruye
+        'DROP INDEX CONCURRENTLY IF EXISTS public."cupones_p2026_10_idx_cupones_updated_at"',
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS "cupones_p2026_10_idx_cupones_updated_at" '
+        'ON public."cupones_p2026_10" USING btree (updated_at) INCLUDE (created_at)',
+        'ALTER INDEX public.idx_cupones_updated_at ATTACH PARTITION public."cupones_p2026_10_idx_cupones_updated_at"',
+    ]
+
+
+def test_tabla_sin_particionar_se_ejecuta_tal_cual():
+    cur = CursorFalso('r', [])
+
+    assert not crear_indice_particionado(cur, SENTENCIA)
+    assert cur.sentencias == []
+
+
+def test_otras_sentencias_no_se_tocan():
+    cur = CursorFalso('p', [])
+
+    assert not crear_indice_particionado(cur, 'DROP INDEX CONCURRENTLY IF EXISTS public.idx_cupones_codigo')
+    assert not crear_indice_particionado(cur, 'CREATE INDEX idx ON public.cupones (id)')
+
+
+class ConexionFalsa:
+    """Imita a psycopg2: activar autocommit con una transacción abierta falla"""
+
+    def __init__(self, aplicadas):
+        self.aplicadas = aplicadas
+        self.en_transaccion = False
+        self._autocommit = False
+        self.sentencias = []
+
+    @property
+    def autocommit(self):
+        return self._autocommit
+
+    @autocommit.setter
+    def autocommit(self, valor):
+        if self.en_transaccion:
+            raise psycopg2.ProgrammingError('set_session cannot be used inside a transaction')
+        self._autocommit = valor
+
+    def cursor(self):
+        return CursorConexion(self)
+
+    def commit(self):
+        self.en_transaccion = False
+
+    def rollback(self):
+        self.en_transaccion = False
+
+    def close(self):
+        pass
+
+
+class CursorConexion:
+    """Abre la transacción de la conexión como psycopg2 fuera de autocommit"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._resultado = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        if not self.conn.autocommit:
+            self.conn.en_transaccion = True
+        self.conn.sentencias.append(' '.join(sql.split()))
+        if 'SELECT version FROM' in sql:
+            self._resultado = [(v,) for v in self.conn.aplicadas]
+        elif 'SELECT relkind' in sql:
+            self._resultado = [('r',)]
+        else:
+            self._resultado = []
+
+    def fetchone(self):
+        return self._resultado[0] if self._resultado else None
+
+    def fetchall(self):
+        return self._resultado
+
+
+def test_primera_pendiente_sin_transaccion(tmp_path, monkeypatch):
+    (tmp_path / '0001_base.sql').write_text('CREATE TABLE t (id int);\n')
+    (tmp_path / '0002_indice.sql').write_text(
+        '-- migracion: sin-transaccion\n'
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_t ON public.t (id);\n'
+    )
+    conn = ConexionFalsa(aplicadas=['0001_base'])
+    monkeypatch.setattr(migraciones, 'MIGRACIONES_DIR', str(tmp_path))
+    monkeypatch.setattr(migraciones.psycopg2, 'connect', lambda url: conn)
+
+    assert migraciones.aplicar_migraciones('postgresql://falsa') == ['0002_indice']
+    assert 'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_t ON public.t (id)' in conn.sentencias
+    assert conn.sentencias[-1] == 'INSERT INTO public.schema_migrations (version) VALUES (%s)'
+    assert not conn.autocommit
+
+
+def test_pendiente_sin_la_extension_requerida(tmp_path, monkeypatch):
+    (tmp_path / '0001_indices.sql').write_text(
+        '-- migracion: sin-transaccion\n'
+        '-- migracion: requiere-extension pg_trgm\n'
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_t ON public.t USING gin (x gin_trgm_ops);\n'
+    )
+    (tmp_path / '0002_base.sql').write_text('CREATE TABLE u (id int);\n')
+    conn = ConexionFalsa(aplicadas=[])
+    monkeypatch.setattr(migraciones, 'MIGRACIONES_DIR', str(tmp_path))
+    monkeypatch.setattr(migraciones.psycopg2, 'connect', lambda url: conn)
+
+    # pg_extension no devuelve filas: 0001 queda pendiente, sin registrarse
+    assert migraciones.aplicar_migraciones('postgresql://falsa') == ['0002_base']
+    assert not any('idx_t' in sentencia for sentencia in conn.sentencias)
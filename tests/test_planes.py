@@ -0,0 +1,57 @@
+"""
+Pruebas de la verificación de planes sobre cupones particionada
+"""
+
+from app.utils.planes import _indices_del_plan, comprobar_plan
+
+
+# EXPLAIN (FORMAT JSON) de 'checkin_por_codigo' con cupones particionada:
+# un Append con un Index Scan por partición, sobre los índices hijos
+PLAN_PARTICIONADO = {
+    'Node Type': 'Append',
+    'Plans': [
+        {
+            'Node Type': 'Index Scan',
+            'Relation Name': 'cupones_p2026_09',
+            'Index Name': 'cupones_p2026_09_codigo_alfanumerico_idx',
+        },
+        {
+            'Node Type': 'Bitmap Heap Scan',
+            'Relation Name': 'cupones_p2026_10',
+            'Plans': [{
+                'Node Type': 'Bitmap Index Scan',
+                'Index Name': 'cupones_p2026_10_codigo_alfanumerico_idx',
+            }],
+        },
+    ],
+}
+
+RAICES = {
+    'cupones_p2026_09_codigo_alfanumerico_idx': 'idx_cupones_codigo',
+    'cupones_p2026_10_codigo_alfanumerico_idx': 'idx_cupones_codigo',
+}
+
+
+def test_indices_del_plan_recorre_particiones():
+    assert _indices_del_plan(PLAN_PARTICIONADO) == set(RAICES)
+
+
+def test_plan_particionado_se_compara_por_indice_raiz():
+    resultado = comprobar_plan('checkin_por_codigo', PLAN_PARTICIONADO, 'idx_cupones_codigo', RAICES)
+
+    assert resultado['ok']
+    assert resultado['usados'] == ['idx_cupones_codigo']
+
+
+def test_indice_de_otra_raiz_no_cuenta():
+    raices = dict.fromkeys(RAICES, 'idx_cupones_created_at')
+
+    resultado = comprobar_plan('checkin_por_codigo', PLAN_PARTICIONADO, 'idx_cupones_codigo', raices)
+
+    assert not resultado['ok']
+
+
+def test_tabla_sin_particionar_conserva_el_nombre():
+    plan = {'Node Type': 'Index Scan', 'Index Name': 'idx_cupones_codigo'}
+
+    assert comprobar_plan('checkin_por_codigo', plan, 'idx_cupones_codigo', {})['ok']
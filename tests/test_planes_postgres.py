@@ -0,0 +1,54 @@
+"""
+Planes reales de las consultas críticas (EXPLAIN sobre el esquema migrado)
+
+Usa PRUEBAS_DATABASE_URL (una base descartable: se le aplican las
+migraciones) o un cluster temporal de benchmarks/postgres_temporal.py; sin
+ninguno de los dos las pruebas se omiten.
+"""
+
+import os
+import subprocess
+
+import psycopg2
+import pytest
+from psycopg2.extras import RealDictCursor
+
+from app.utils.planes import CONSULTAS_CRITICAS, explicar_planes
+from benchmarks.postgres_temporal import PostgresTemporal, preparar_esquema
+
+
+@pytest.fixture(scope='module')
+def dsn():
+    url = os.getenv('PRUEBAS_DATABASE_URL')
+    if url:
+        preparar_esquema(url)
+        yield url
+        return
+
+    cluster = PostgresTemporal()
+    try:
+        cluster.__enter__()
+    except (RuntimeError, OSError, subprocess.CalledProcessError) as e:
+        pytest.skip(f'Sin PostgreSQL para EXPLAIN: {e}')
+    try:
+        preparar_esquema(cluster.dsn)
+        yield cluster.dsn
+    finally:
+        cluster.__exit__(None, None, None)
+
+
+@pytest.fixture(scope='module')
+def resultados(dsn):
+    conn = psycopg2.connect(dsn, cursor_factory=RealDictCursor)
+    try:
+        with conn.cursor() as cur:
+            return {r['nombre']: r for r in explicar_planes(cur)}
+    finally:
+        conn.close()
+
+
+@pytest.mark.parametrize('nombre', [consulta[0] for consulta in CONSULTAS_CRITICAS])
+def test_consulta_usa_su_indice(resultados, nombre):
+    resultado = resultados[nombre]
+
+    assert resultado['ok'], f"esperado {resultado['esperado']}, usados {resultado['usados']}"
@@ -0,0 +1,37 @@
+"""
+Pruebas de la decisión réplica/primario de MonitorReplica con retrasos fijos
+"""
+
+import time
+
+import pytest
+
+from app.utils.db import MonitorReplica
+
+
+class MonitorFijo(MonitorReplica):
+    """Retraso fijo en lugar de medirlo en la réplica"""
+
+    def __init__(self, lag, lag_max=5.0):
+        super().__init__(lag_max=lag_max)
+        self._fijo = lag
+
+    def lag(self):
+        return self._fijo
+
+
+@pytest.mark.parametrize('lag, hace, esperado', [
+    (0.2, None, None),
+    (30.0, None, 'retraso'),
+    (None, None, 'caida'),
+    (0.2, 0.5, 'lectura_propia'),
+    (0.2, 10, None),
+], ids=['al_dia', 'atrasada', 'caida', 'escritura_reciente', 'escritura_replicada'])
+def test_motivo_desvio(lag, hace, esperado):
+    escritura_en = time.time() - hace if hace is not None else None
+
+    assert MonitorFijo(lag).motivo_desvio(escritura_en) == esperado
+
+
+def test_retraso_por_encima_de_lag_max_tiene_prioridad():
+    assert MonitorFijo(3.0, lag_max=2.0).motivo_desvio(time.time()) == 'retraso'
@@ -0,0 +1,63 @@
+"""
+Pruebas del registro de sesiones con el almacén SQLite compartido
+"""
+
+import multiprocessing
+
+import pytest
+from flask import Flask
+
+from app.utils.sesiones import RegistroSesiones
+
+
+def _registro(ruta):
+    app = Flask(__name__)
+    app.config.update(SESIONES_CACHE_MAX=100, SESIONES_CACHE_TTL=60,
+                      SESIONES_REDIS_URL=None, SESIONES_SQLITE_PATH=str(ruta))
+    registro = RegistroSesiones()
+    registro.init_app(app)
+    return registro
+
+
+@pytest.fixture
+def registro(tmp_path):
+    return _registro(tmp_path / 'sesiones.db')
+
+
+def test_check_in_no_deshace_una_desactivacion(registro):
+    registro.registrar_si_falta('u', 1, True)
+    # El login leyó activo=True, pero la desactivación se registró antes que su check-in
+    registro.registrar('u', 1, False)
+
+    assert registro.registrar_si_falta('u', 1, True) == (1, False)
+    assert registro.estado('u', 1) == (1, False)
+
+
+def test_revocar_conserva_el_flag(registro):
+    registro.registrar('u', 1, False)
+
+    assert registro.registrar('u', 1, None, revocar=True) == 2
+    assert registro.estado('u', 1) == (2, False)
+
+
+def _revocar_varias(ruta, veces):
+    registro = _registro(ruta)
+    for _ in range(veces):
+        registro.registrar('u', 1, None, revocar=True)
+
+
+def test_incrementos_atomicos_entre_procesos(tmp_path):
+    ruta = tmp_path / 'sesiones.db'
+    # Abierto en el padre durante el fork, como en gunicorn con preload_app
+    registro = _registro(ruta)
+    registro.registrar_si_falta('u', 1, True)
+
+    contexto = multiprocessing.get_context('fork')
+    procesos = [contexto.Process(target=_revocar_varias, args=(ruta, 50)) for _ in range(4)]
+    for proceso in procesos:
+        proceso.start()
+    for proceso in procesos:
+        proceso.join(30)
+        assert proceso.exitcode == 0
+
+    assert registro.estado('u', 1) == (200, True)